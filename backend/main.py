@@ -3,7 +3,9 @@ from fastapi import FastAPI, HTTPException
 
 from fastapi.middleware.cors import CORSMiddleware
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, func
+
+from sqlalchemy.exc import OperationalError
 
 from sqlalchemy.orm import sessionmaker
 
@@ -11,14 +13,32 @@ from models.database_models import (
 
     Base, League, Currency, ItemBase, ModGroup, 
 
-    CurrencyExchangeRate, ProfitOpportunity
+    CurrencyExchangeRate, CurrencyPrice, CurrencyPairQuote, PriceHistory, ProfitOpportunity
 
 )
 
 from scripts.scheduler import DataScheduler
 
+from scripts.portfolio_optimizer import (
+
+    LEAGUE_ID, optimize, candidate_from_opportunity, latest_per_recipe
+
+)
+
+from scripts.currency_arbitrage import ArbitrageGraph, scan as scan_arbitrage
+
+from scripts.price_history_asof import RATE_COLUMNS, convert_series
+
+from scripts.reverse_search import ReverseSearchIndex, parse_targets
+
+from scripts.modifier_search import ensure_search_index, search_modifiers
+
 from datetime import datetime
 
+import sqlite3
+
+import threading
+
 import uvicorn
 
 
@@ -67,6 +87,22 @@ scheduler = DataScheduler()
 
 
 
+# Reverse search index, built on first use and refreshed when the DB changes
+
+reverse_index = None
+
+reverse_lock = threading.Lock()
+
+
+
+# Arbitrage graph per league, moved to the latest rates edge by edge on each request
+
+arbitrage_graphs = {}
+
+arbitrage_lock = threading.Lock()
+
+
+
 @app.on_event("startup")
 
 async def startup_event():
@@ -255,6 +291,176 @@ def get_exchange_rates():
 
 
 
+@app.get("/api/currency/arbitrage")
+
+def get_currency_arbitrage(min_profit: float = 0.0, max_length: int = 4, league_id: int = LEAGUE_ID):
+
+    """Profitable currency cycles (negative cycles in the log-rate graph), min_profit in %"""
+
+    session = SessionLocal()
+
+    try:
+
+        try:
+
+            latest = session.query(func.max(CurrencyPairQuote.recorded_at)).filter(
+
+                CurrencyPairQuote.league_id == league_id
+
+            ).scalar()
+
+            quotes = session.query(
+
+                CurrencyPairQuote.pay_currency, CurrencyPairQuote.get_currency, CurrencyPairQuote.rate
+
+            ).filter(
+
+                CurrencyPairQuote.league_id == league_id,
+
+                CurrencyPairQuote.recorded_at == latest
+
+            ).all() if latest else []
+
+        except OperationalError:
+
+            session.rollback()
+
+            quotes = []
+
+        
+
+        rate = session.query(CurrencyExchangeRate).filter(
+
+            CurrencyExchangeRate.league_id == league_id
+
+        ).order_by(CurrencyExchangeRate.last_updated.desc()).first()
+
+        # Newest row per currency first; from_rows keeps only that one
+
+        prices = session.query(
+
+            Currency.name, CurrencyPrice.price_chaos, CurrencyPrice.price_divine
+
+        ).join(CurrencyPrice, CurrencyPrice.currency_id == Currency.id).filter(
+
+            CurrencyPrice.league_id == league_id
+
+        ).order_by(CurrencyPrice.last_updated.desc(), CurrencyPrice.id.desc()).all()
+
+        
+
+        latest_rates = ArbitrageGraph.from_rows(
+
+            quotes,
+
+            (rate.divine_to_exalt, rate.divine_to_chaos, rate.exalt_to_chaos) if rate else None,
+
+            prices
+
+        )
+
+    finally:
+
+        session.close()
+
+    
+
+    with arbitrage_lock:
+
+        graph = arbitrage_graphs.setdefault(league_id, ArbitrageGraph())
+
+        graph.sync(latest_rates)
+
+        return scan_arbitrage(graph, max(2, min(max_length, 6)), min_profit / 100.0)
+
+
+
+@app.get("/api/price-history/{item_base_id}")
+
+def get_price_history(item_base_id: int, currency: str = "divine", basis: str = "asof"):
+
+    """Price history in divine / exalted / chaos, at the rate in force when recorded (basis=asof) or today's"""
+
+    if currency != "divine" and currency not in RATE_COLUMNS:
+
+        raise HTTPException(status_code=400, detail="currency must be divine, exalted or chaos")
+
+    if basis not in ("asof", "current"):
+
+        raise HTTPException(status_code=400, detail="basis must be asof or current")
+
+    
+
+    session = SessionLocal()
+
+    try:
+
+        points = session.query(PriceHistory.recorded_at, PriceHistory.price_divine).filter(
+
+            PriceHistory.item_base_id == item_base_id,
+
+            PriceHistory.price_divine > 0
+
+        ).order_by(PriceHistory.recorded_at).all()
+
+        rate_points = []
+
+        if currency != "divine":
+
+            column = getattr(CurrencyExchangeRate, RATE_COLUMNS[currency])
+
+            rate_points = session.query(CurrencyExchangeRate.last_updated, column).filter(
+
+                column > 0
+
+            ).order_by(CurrencyExchangeRate.last_updated).all()
+
+    finally:
+
+        session.close()
+
+    
+
+    if currency == "divine":
+
+        rows = [{"recorded_at": t, "price_divine": p, "price": p, "rate": 1.0} for t, p in points]
+
+    else:
+
+        rows = convert_series(points, rate_points, basis)
+
+    
+
+    return {
+
+        "item_base_id": item_base_id,
+
+        "currency": currency,
+
+        "basis": basis,
+
+        "history": [
+
+            {
+
+                "recorded_at": r["recorded_at"].isoformat(),
+
+                "price_divine": r["price_divine"],
+
+                "price": r["price"],
+
+                "rate": r["rate"]
+
+            }
+
+            for r in rows
+
+        ]
+
+    }
+
+
+
 @app.get("/api/bases")
 
 def get_bases(limit: int = 100):
@@ -333,6 +539,68 @@ def get_modifiers(limit: int = 100):
 
 
 
+@app.get("/api/reverse-search")
+
+def reverse_search(mods: str, ilvl: int = 82, limit: int = 10):
+
+    """Item types / bases that can roll every mod, cheapest expected total cost first (mods = "id[:min_tier],...")"""
+
+    global reverse_index
+
+    try:
+
+        targets = parse_targets(mods)
+
+    except ValueError as e:
+
+        raise HTTPException(status_code=400, detail=str(e))
+
+    
+
+    with reverse_lock:
+
+        if reverse_index is None:
+
+            conn = sqlite3.connect(engine.url.database, check_same_thread=False)
+
+            reverse_index = ReverseSearchIndex(conn)
+
+        else:
+
+            reverse_index.refresh()
+
+        try:
+
+            return reverse_index.search(targets, ilvl, max(1, min(limit, 100)))
+
+        except ValueError as e:
+
+            raise HTTPException(status_code=400, detail=str(e))
+
+
+
+@app.get("/api/modifiers/search")
+
+def search_modifiers_endpoint(q: str = "", tags: str = "", item_type: str = None,
+
+                              limit: int = 20, offset: int = 0):
+
+    """Full-text (FTS5, bm25-ranked) and tag search over modifiers; tags = comma-separated, all required"""
+
+    conn = sqlite3.connect(engine.url.database)
+
+    try:
+
+        ensure_search_index(conn)
+
+        return search_modifiers(conn, q, tags.split(",") if tags else [], item_type, limit, offset)
+
+    finally:
+
+        conn.close()
+
+
+
 @app.get("/api/profit-opportunities")
 
 def get_profit_opportunities(limit: int = 10):
@@ -387,6 +655,54 @@ def get_profit_opportunities(limit: int = 10):
 
 
 
+@app.get("/api/portfolio/optimize")
+
+def optimize_portfolio(budget: float, risk_tolerance: float = 0.5, max_per_craft: int = 5):
+
+    """Allocate a Divine budget across profit opportunities (bounded knapsack)"""
+
+    if budget <= 0:
+
+        raise HTTPException(status_code=400, detail="budget must be positive")
+
+    
+
+    session = SessionLocal()
+
+    try:
+
+        columns = [c.name for c in ProfitOpportunity.__table__.columns]
+
+        # Analyzers append a row per run: keep the newest per recipe in the league
+
+        rows = session.query(ProfitOpportunity).filter(
+
+            ProfitOpportunity.league_id == LEAGUE_ID
+
+        ).order_by(ProfitOpportunity.calculated_at.desc(), ProfitOpportunity.id.desc()).all()
+
+        candidates = latest_per_recipe([
+
+            candidate_from_opportunity({c: getattr(o, c) for c in columns}, max_per_craft)
+
+            for o in rows
+
+        ])
+
+    finally:
+
+        session.close()
+
+    
+
+    # risk_tolerance 1.0 = risk neutral, 0.0 = mean minus one std per craft
+
+    risk_aversion = 1.0 - min(max(risk_tolerance, 0.0), 1.0)
+
+    return optimize(candidates, budget, risk_aversion)
+
+
+
 @app.get("/api/stats")
 
 def get_stats():
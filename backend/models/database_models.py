@@ -1,5 +1,5 @@
 
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, JSON, Index
 
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -89,6 +89,8 @@ class ModGroup(Base):
 
     tags = Column(JSON)
 
+    item_type = Column(String(100))   # modifier_tiers.item_type the tier ladder belongs to
+
 
 
 # 5. 모드 티어
@@ -187,6 +189,16 @@ class CurrencyExchangeRate(Base):
 
     league = relationship("League")
 
+    
+
+    # As-of lookups by time (price_history_asof.py)
+
+    __table_args__ = (
+
+        Index('ix_currency_exchange_rates_time', 'league_id', 'last_updated'),
+
+    )
+
 
 
 # 9. 개별 커런시 가격
@@ -373,6 +385,14 @@ class PriceHistory(Base):
 
     league = relationship("League")
 
+    
+
+    __table_args__ = (
+
+        Index('ix_price_history_base_time', 'item_base_id', 'league_id', 'recorded_at'),
+
+    )
+
 
 
 # 15. Essence
@@ -401,6 +421,66 @@ class Essence(Base):
 
 
 
+# 16. 커런시 페어 시세 (거래소 원본 호가)
+
+class CurrencyPairQuote(Base):
+
+    __tablename__ = 'currency_pair_quotes'
+
+    id = Column(Integer, primary_key=True)
+
+    league_id = Column(Integer, ForeignKey('leagues.id'))
+
+    pay_currency = Column(String(100))
+
+    get_currency = Column(String(100))
+
+    rate = Column(Float)
+
+    stock = Column(Integer, nullable=True)
+
+    offers = Column(Integer)
+
+    source = Column(String(50))
+
+    recorded_at = Column(DateTime, default=datetime.utcnow)
+
+    
+
+    league = relationship("League")
+
+
+
+# 17. 환율 소스별 원본 (융합 출처)
+
+class ExchangeRateSource(Base):
+
+    __tablename__ = 'exchange_rate_sources'
+
+    id = Column(Integer, primary_key=True)
+
+    exchange_rate_id = Column(Integer, ForeignKey('currency_exchange_rates.id'), nullable=True)
+
+    source = Column(String(50))
+
+    divine_to_exalt = Column(Float, nullable=True)
+
+    divine_to_chaos = Column(Float, nullable=True)
+
+    accepted = Column(Boolean, default=False)
+
+    reason = Column(String(200), nullable=True)
+
+    latency_ms = Column(Integer, nullable=True)
+
+    recorded_at = Column(DateTime, default=datetime.utcnow)
+
+    
+
+    exchange_rate = relationship("CurrencyExchangeRate")
+
+
+
 # 데이터베이스 초기화 함수
 
 def init_db():
@@ -445,7 +525,7 @@ def init_db():
 
     
 
-    print("✅ 데이터베이스 초기화 완료 (15개 테이블)")
+    print("✅ 데이터베이스 초기화 완료 (17개 테이블)")
 
 
 
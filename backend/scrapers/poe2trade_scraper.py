@@ -29,39 +29,17 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
 
-logging.basicConfig(level=logging.INFO)
-
-logger = logging.getLogger(__name__)
-
-
-
-SYDNEY_TZ = pytz.timezone('Australia/Sydney')
-
-
-
-CURRENCY_TO_CHAOS = {
-
-    'transmute': 0.01,
-
-    'augment': 0.02,
-
-    'chance': 0.1,
+from scripts.currency_normalizer import shared_normalizer
 
-    'alchemy': 0.5,
 
-    'regal': 3,
 
-    'chaos': 1,
-
-    'vaal': 1.5,
+logging.basicConfig(level=logging.INFO)
 
-    'exalted': 8.5,
+logger = logging.getLogger(__name__)
 
-    'divine': 370,
 
-    'annul': 250,
 
-}
+SYDNEY_TZ = pytz.timezone('Australia/Sydney')
 
 
 
@@ -89,6 +67,8 @@ class PoE2TradeScraper:
 
         self.min_request_interval = 1.5
 
+        self.rates = shared_normalizer()
+
     
 
     def _rate_limit(self):
@@ -103,14 +83,6 @@ class PoE2TradeScraper:
 
     
 
-    def _convert_to_chaos(self, amount: float, currency: str) -> float:
-
-        multiplier = CURRENCY_TO_CHAOS.get(currency.lower(), 1)
-
-        return amount * multiplier
-
-    
-
     def search_base_item(self, base_type: str, min_ilvl: int = None, max_results: int = 5) -> Optional[Dict]:
 
         self._rate_limit()
@@ -241,25 +213,23 @@ class PoE2TradeScraper:
 
         
 
-        prices_chaos = []
+        amounts, currencies = [], []
 
         for item in items:
 
-            try:
-
-                price_info = item.get("listing", {}).get("price", {})
+            price_info = item.get("listing", {}).get("price") or {}
 
-                amount = price_info.get("amount", 0)
+            amounts.append(price_info.get("amount", 0))
 
-                currency = price_info.get("currency", "chaos")
+            currencies.append(price_info.get("currency", "chaos"))
 
-                chaos_value = self._convert_to_chaos(amount, currency)
+        
 
-                prices_chaos.append(chaos_value)
+        # Unknown currencies convert to 0 and are dropped
 
-            except:
+        chaos_unit = self.rates.value("chaos")
 
-                pass
+        prices_chaos = [v / chaos_unit for v in self.rates.to_divine_many(amounts, currencies) if v > 0]
 
         
 
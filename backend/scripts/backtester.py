@@ -0,0 +1,443 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Strategy Backtester
+
+Replays the stored price / exchange-rate history day by day: each day the
+
+opportunities (cost vectors from profit_opportunities) are re-scored at
+
+that day's prices, the best ones are "executed" within a budget, and each
+
+craft is sold HOLD_DAYS later at the prices of that day. Reports the PnL
+
+curve and predicted vs realized ROI per recipe.
+
+
+
+Craft outcomes are not simulated: each trade replays the stored cost and
+
+output vectors at market prices, so "realized" ROI only measures how prices
+
+drifted between entry and exit, not how the craft itself rolled.
+
+
+
+Recipes' quantities (and so their pool / probability state) do not change
+
+during a replay, so every opportunity is valued over all days at once:
+
+one cost and one revenue curve, built from per-input price rows. Days
+
+before an input's first observation stay unpriced and the recipe is skipped.
+
+"""
+
+import json
+
+import os
+
+import sqlite3
+
+import sys
+
+from datetime import datetime
+
+from pathlib import Path
+
+from typing import Dict, List, Optional
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+from scripts.price_scenarios import PriceHistoryBook
+
+
+
+BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
+
+DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
+
+OUTPUT_FILE = BASE_DIR / "data" / "backtest.json"
+
+LEAGUE_ID = 1
+
+
+
+HOLD_DAYS = 2               # craft on day d, sell on day d + HOLD_DAYS
+
+MIN_ROI = 20.0              # % predicted ROI needed to execute
+
+DAILY_BUDGET = 100.0        # Divine spent per day at most
+
+MAX_CRAFTS_PER_DAY = 5
+
+
+
+
+
+class PricePanel:
+
+    """Day x input price grid (Divine), forward-filled and built lazily per input;
+
+    None before an input's first observation"""
+
+    def __init__(self, book: PriceHistoryBook):
+
+        self.book = book
+
+        self.days = sorted({d for points in book.series.values() for d in points})
+
+        # Keyed by (name, fallback): inputs without history can carry a different
+
+        # point price per opportunity
+
+        self.rows: Dict[tuple, List[Optional[float]]] = {}
+
+
+
+    def row(self, name: str, fallback: float = 0.0) -> List[Optional[float]]:
+
+        key = (name, fallback)
+
+        if key in self.rows:
+
+            return self.rows[key]
+
+        points = self.book.series.get(name)
+
+        if not points:
+
+            price = self.book.current.get(name, fallback)
+
+            row = [price] * len(self.days)
+
+        else:
+
+            # As-of: last observation on or before each day; nothing known before the first
+
+            row, last = [], None
+
+            for day in self.days:
+
+                last = points.get(day, last)
+
+                row.append(last)
+
+        self.rows[key] = row
+
+        return row
+
+
+
+    def curve(self, quantities: Dict[str, float], prices: Dict[str, float]) -> List[Optional[float]]:
+
+        """Value of a quantity vector on every day; None while any input is unpriced"""
+
+        acc = [0.0] * len(self.days)
+
+        for name, qty in quantities.items():
+
+            if qty:
+
+                row = self.row(name, prices.get(name, 0.0))
+
+                acc = [None if a is None or p is None else a + qty * p for a, p in zip(acc, row)]
+
+        return acc
+
+
+
+
+
+class Backtester:
+
+    def __init__(self, book: PriceHistoryBook, opportunities: List[dict],
+
+                 hold_days: int = HOLD_DAYS, min_roi: float = MIN_ROI,
+
+                 daily_budget: float = DAILY_BUDGET, max_per_day: int = MAX_CRAFTS_PER_DAY):
+
+        self.panel = PricePanel(book)
+
+        self.opportunities = opportunities
+
+        self.hold_days = hold_days
+
+        self.min_roi = min_roi
+
+        self.daily_budget = daily_budget
+
+        self.max_per_day = max_per_day
+
+
+
+        # Cached per opportunity: cost and revenue on every day
+
+        self.costs: List[List[Optional[float]]] = []
+
+        self.revenues: List[List[Optional[float]]] = []
+
+        for opp in opportunities:
+
+            prices = opp.get('prices', {})
+
+            self.costs.append(self.panel.curve(opp.get('inputs', {}), prices))
+
+            self.revenues.append(self.panel.curve(opp.get('outputs', {}), prices))
+
+
+
+    def run(self) -> dict:
+
+        days = self.panel.days
+
+        trades = []
+
+        realized_by_day = [0.0] * len(days)
+
+        spent_by_day = [0.0] * len(days)
+
+
+
+        # Entries whose exit would fall past the last recorded day cannot be realized
+
+        for d in range(max(len(days) - self.hold_days, 0)):
+
+            candidates = []
+
+            for i in range(len(self.opportunities)):
+
+                cost, revenue = self.costs[i][d], self.revenues[i][d]
+
+                if cost is not None and revenue is not None and cost > 0:
+
+                    roi = (revenue - cost) / cost * 100
+
+                    if roi >= self.min_roi:
+
+                        candidates.append((roi, i))
+
+            candidates.sort(reverse=True)
+
+
+
+            budget = self.daily_budget
+
+            for roi, i in candidates[:self.max_per_day]:
+
+                cost = self.costs[i][d]
+
+                if cost > budget:
+
+                    continue
+
+                budget -= cost
+
+                exit_day = d + self.hold_days
+
+                pnl = self.revenues[i][exit_day] - cost
+
+                realized_by_day[exit_day] += pnl
+
+                spent_by_day[d] += cost
+
+                trades.append({
+
+                    'recipe': self.opportunities[i].get('recipe') or self.opportunities[i].get('name'),
+
+                    'entry_day': days[d],
+
+                    'exit_day': days[exit_day],
+
+                    'cost': cost,
+
+                    'predicted_roi': roi,
+
+                    'realized_pnl': pnl,
+
+                    'realized_roi': pnl / cost * 100,
+
+                })
+
+
+
+        curve = []
+
+        cumulative = 0.0
+
+        for d, day in enumerate(days):
+
+            cumulative += realized_by_day[d]
+
+            curve.append({'day': day, 'spent': spent_by_day[d],
+
+                          'realized': realized_by_day[d], 'cumulative_pnl': cumulative})
+
+
+
+        return {'days': len(days), 'trades': trades, 'curve': curve,
+
+                'recipes': summarize_recipes(trades, self.opportunities)}
+
+
+
+
+
+def summarize_recipes(trades: List[dict], opportunities: List[dict]) -> List[dict]:
+
+    """Predicted vs realized ROI per recipe (and the ROI stored on ProfitOpportunity)"""
+
+    stored = {(o.get('recipe') or o.get('name')): o.get('stored_roi') for o in opportunities}
+
+    grouped: Dict[str, List[dict]] = {}
+
+    for t in trades:
+
+        grouped.setdefault(t['recipe'], []).append(t)
+
+    summary = []
+
+    for recipe, rows in grouped.items():
+
+        cost = sum(t['cost'] for t in rows)
+
+        pnl = sum(t['realized_pnl'] for t in rows)
+
+        summary.append({
+
+            'recipe': recipe,
+
+            'trades': len(rows),
+
+            'stored_roi': stored.get(recipe),
+
+            'predicted_roi': sum(t['predicted_roi'] for t in rows) / len(rows),
+
+            'realized_roi': pnl / cost * 100 if cost > 0 else 0.0,
+
+            'realized_pnl': pnl,
+
+            'hit_rate': sum(1 for t in rows if t['realized_pnl'] > 0) / len(rows),
+
+        })
+
+    summary.sort(key=lambda s: -s['realized_pnl'])
+
+    return summary
+
+
+
+
+
+def load_opportunities(conn: sqlite3.Connection, league_id: int = LEAGUE_ID) -> List[dict]:
+
+    """Latest cost vector per recipe from profit_opportunities"""
+
+    seen = set()
+
+    opportunities = []
+
+    for path, roi in conn.execute("""
+
+        SELECT crafting_path, roi_percentage FROM profit_opportunities
+
+        WHERE league_id = ? ORDER BY calculated_at DESC, id DESC
+
+    """, (league_id,)):
+
+        data = json.loads(path) if path else {}
+
+        recipe = data.get('recipe') or data.get('name')
+
+        if data.get('inputs') and recipe not in seen:
+
+            seen.add(recipe)
+
+            data['stored_roi'] = roi
+
+            opportunities.append(data)
+
+    return opportunities
+
+
+
+
+
+def main():
+
+    print("="*60)
+
+    print("Strategy Backtest")
+
+    print("="*60)
+
+
+
+    conn = sqlite3.connect(DB_PATH)
+
+    book = PriceHistoryBook.load(conn)
+
+    opportunities = load_opportunities(conn)
+
+    conn.close()
+
+
+
+    start = datetime.now()
+
+    result = Backtester(book, opportunities).run()
+
+    elapsed = (datetime.now() - start).total_seconds()
+
+
+
+    print(f"Days replayed: {result['days']}")
+
+    print(f"Opportunities: {len(opportunities)}")
+
+    print(f"Trades: {len(result['trades'])} ({elapsed:.2f}s)")
+
+    if result['curve']:
+
+        print(f"Final PnL: {result['curve'][-1]['cumulative_pnl']:.2f} Divine")
+
+
+
+    print("\nPredicted vs realized ROI (stored vectors repriced at exit - price drift only):")
+
+    for r in result['recipes'][:15]:
+
+        stored = f"{r['stored_roi']:.0f}%" if r['stored_roi'] is not None else "-"
+
+        print(f"  {str(r['recipe'])[:35]:<35} {r['trades']:3d} trades  stored {stored:>6}  "
+
+              f"predicted {r['predicted_roi']:6.1f}%  realized {r['realized_roi']:6.1f}%  "
+
+              f"hit {r['hit_rate']*100:3.0f}%")
+
+
+
+    OUTPUT_FILE.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(OUTPUT_FILE, 'w') as f:
+
+        json.dump(result, f, indent=2, ensure_ascii=False)
+
+    print(f"\nSaved to: {OUTPUT_FILE}")
+
+
+
+
+
+if __name__ == "__main__":
+
+    main()
+
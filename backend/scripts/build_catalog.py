@@ -0,0 +1,273 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Build Catalog
+
+Builds and their slot / target-mod requirements, kept as data instead of code:
+
+data/builds.json is the fixture, rows in the build_catalog table override or
+
+extend it. Adding a build needs no code change.
+
+
+
+  python scripts/build_catalog.py            # import the fixture into the DB
+
+  python scripts/build_catalog.py other.json # import another file
+
+"""
+
+import json
+
+import sqlite3
+
+import sys
+
+from datetime import datetime
+
+from pathlib import Path
+
+from typing import Dict, Optional
+
+
+
+BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
+
+DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
+
+BUILDS_FILE = BASE_DIR / "data" / "builds.json"
+
+
+
+MOD_TYPES = ('prefix', 'suffix')
+
+DEFAULT_DEMAND = 'medium'
+
+
+
+
+
+def validate_build(name: str, info: dict) -> dict:
+
+    """Normalised copy of one build entry; raises ValueError on a malformed one"""
+
+    items = []
+
+    for i, item in enumerate(info.get('items') or []):
+
+        missing = [k for k in ('slot', 'item_type', 'base', 'target_mods') if not item.get(k)]
+
+        if missing:
+
+            raise ValueError(f"{name} item {i}: missing {', '.join(missing)}")
+
+        if not isinstance(item.get('estimated_sale', 0), (int, float)):
+
+            raise ValueError(f"{name} / {item['slot']}: estimated_sale must be a number")
+
+        mods = []
+
+        for mod in item['target_mods']:
+
+            if mod.get('type') not in MOD_TYPES or not mod.get('name'):
+
+                raise ValueError(f"{name} / {item['slot']}: bad target mod {mod}")
+
+            mods.append({'name': mod['name'], 'type': mod['type']})
+
+        items.append({
+
+            'slot': item['slot'],
+
+            'item_type': item['item_type'],
+
+            'base': item['base'],
+
+            'target_mods': mods,
+
+            'estimated_sale': item.get('estimated_sale') or 0,
+
+        })
+
+    if not items:
+
+        raise ValueError(f"{name}: no items")
+
+    return {
+
+        'description': info.get('description', ''),
+
+        'demand': info.get('demand') or DEFAULT_DEMAND,
+
+        'items': items,
+
+    }
+
+
+
+
+
+def ensure_table(conn: sqlite3.Connection):
+
+    conn.execute("""
+
+        CREATE TABLE IF NOT EXISTS build_catalog (
+
+            name TEXT PRIMARY KEY,
+
+            description TEXT,
+
+            demand TEXT,
+
+            items TEXT NOT NULL,
+
+            updated_at TEXT
+
+        )
+
+    """)
+
+
+
+
+
+def load_builds(conn: Optional[sqlite3.Connection] = None,
+
+                path: Optional[Path] = None) -> Dict[str, dict]:
+
+    """Fixture builds, then build_catalog rows on top (same name wins from the DB)"""
+
+    path = Path(path) if path else BUILDS_FILE
+
+    builds = {}
+
+    if path.exists():
+
+        with open(path, 'r') as f:
+
+            for name, info in json.load(f).items():
+
+                builds[name] = validate_build(name, info)
+
+
+
+    if conn is not None:
+
+        exists = conn.execute(
+
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'build_catalog'"
+
+        ).fetchone()
+
+        if exists:
+
+            for name, description, demand, items in conn.execute(
+
+                    "SELECT name, description, demand, items FROM build_catalog ORDER BY name"):
+
+                builds[name] = validate_build(name, {
+
+                    'description': description,
+
+                    'demand': demand,
+
+                    'items': json.loads(items),
+
+                })
+
+    return builds
+
+
+
+
+
+def save_builds(conn: sqlite3.Connection, builds: Dict[str, dict]) -> int:
+
+    """Upsert builds into build_catalog; returns the number written"""
+
+    ensure_table(conn)
+
+    now = datetime.now().isoformat()
+
+    rows = []
+
+    for name, info in builds.items():
+
+        build = validate_build(name, info)
+
+        rows.append((name, build['description'], build['demand'],
+
+                     json.dumps(build['items'], ensure_ascii=False), now))
+
+    conn.executemany("""
+
+        INSERT INTO build_catalog (name, description, demand, items, updated_at)
+
+        VALUES (?, ?, ?, ?, ?)
+
+        ON CONFLICT(name) DO UPDATE SET
+
+            description = excluded.description,
+
+            demand = excluded.demand,
+
+            items = excluded.items,
+
+            updated_at = excluded.updated_at
+
+    """, rows)
+
+    conn.commit()
+
+    return len(rows)
+
+
+
+
+
+def main():
+
+    print("="*60)
+
+    print("Build Catalog Import")
+
+    print("="*60)
+
+
+
+    path = Path(sys.argv[1]) if len(sys.argv) > 1 else BUILDS_FILE
+
+    with open(path, 'r') as f:
+
+        builds = json.load(f)
+
+
+
+    conn = sqlite3.connect(DB_PATH)
+
+    written = save_builds(conn, builds)
+
+    total = len(load_builds(conn, path))
+
+    conn.close()
+
+
+
+    items = sum(len(b['items']) for b in builds.values())
+
+    print(f"Imported {written} builds ({items} items) from {path}")
+
+    print(f"Catalog now holds {total} builds")
+
+
+
+
+
+if __name__ == "__main__":
+
+    main()
+
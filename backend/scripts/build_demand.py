@@ -0,0 +1,875 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Build Demand Aggregation
+
+Streams ladder / build dumps (JSON lines, one character per line), maps each
+
+equipped item's explicit mod lines onto `modifiers` rows and keeps
+
+- exact counts per (item_type, modifier_id) and (item_type, base)
+
+- SpaceSaving heavy-hitter counts per (item_type, mod combination)
+
+The most demanded combinations go to the build catalog as craft targets.
+
+
+
+Dump line: {"name": ..., "class": ..., "items": [{"baseType": "Gold Ring",
+
+            "explicitMods": ["+80 to maximum Life", ...]}, ...]}
+
+("itemData" wrappers, "equipment", "base_type" and mods.explicit also accepted)
+
+
+
+  python scripts/build_demand.py dump1.jsonl [dump2.jsonl ...]
+
+"""
+
+import heapq
+
+import json
+
+import os
+
+import sqlite3
+
+import sys
+
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+from itertools import combinations
+
+from pathlib import Path
+
+from typing import Dict, Hashable, List, Optional
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+from scripts.build_catalog import ensure_table, load_builds, save_builds
+
+from scripts.mod_parser import ModParser
+
+from scripts.outcome_index import OutcomeIndex
+
+
+
+BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
+
+DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
+
+STATE_FILE = BASE_DIR / "data" / "mod_demand.json"
+
+
+
+SKETCH_CAPACITY = 5000      # tracked (item_type, mod set) combinations
+
+COMBO_SIZES = (2, 3)        # demanded mod sets = every pair / triple on an item
+
+TOP_TARGETS = 20            # combinations exported to the build catalog
+
+MIN_TARGET_SHARE = 0.01     # ... each on at least this share of its item type's items
+
+DEMAND_LEVELS = ((0.10, 'very_high'), (0.03, 'high'))   # share -> label, else 'medium'
+
+CHUNK_BYTES = 32 * 1024 * 1024   # dump byte range handed to one worker process
+
+
+
+
+
+class SpaceSaving:
+
+    """
+
+    Heavy hitters in bounded memory: at most `capacity` keys are tracked and a
+
+    new key replaces the current minimum, inheriting its count as error.
+
+    For every tracked key: count - error <= true count <= count.
+
+    """
+
+    def __init__(self, capacity: int = SKETCH_CAPACITY):
+
+        self.capacity = capacity
+
+        self.counts: Dict[Hashable, int] = {}
+
+        self.errors: Dict[Hashable, int] = {}
+
+        self.total = 0
+
+        # (count, key), one entry per key; counts may lag behind (refreshed on pop)
+
+        self._heap: List[tuple] = []
+
+
+
+    def __len__(self) -> int:
+
+        return len(self.counts)
+
+
+
+    def _pop_min(self) -> tuple:
+
+        heap = self._heap
+
+        while True:
+
+            count, key = heap[0]
+
+            actual = self.counts[key]
+
+            if actual == count:
+
+                heapq.heappop(heap)
+
+                return count, key
+
+            heapq.heapreplace(heap, (actual, key))
+
+
+
+    def add(self, key: Hashable, count: int = 1):
+
+        self.total += count
+
+        counts = self.counts
+
+        if key in counts:
+
+            counts[key] += count
+
+            return
+
+        if len(counts) < self.capacity:
+
+            counts[key] = count
+
+            self.errors[key] = 0
+
+            heapq.heappush(self._heap, (count, key))
+
+            return
+
+        floor, evicted = self._pop_min()
+
+        del counts[evicted]
+
+        del self.errors[evicted]
+
+        counts[key] = floor + count
+
+        self.errors[key] = floor
+
+        heapq.heappush(self._heap, (floor + count, key))
+
+
+
+    def min_count(self) -> int:
+
+        """Upper bound on the count of any key that is not tracked"""
+
+        if len(self.counts) < self.capacity or not self._heap:
+
+            return 0
+
+        count, key = self._pop_min()
+
+        heapq.heappush(self._heap, (count, key))
+
+        return count
+
+
+
+    def top(self, n: Optional[int] = None) -> List[tuple]:
+
+        """[(key, count, error)] by count, highest first"""
+
+        ranked = sorted(self.counts.items(), key=lambda kv: (-kv[1], kv[0]))
+
+        return [(k, c, self.errors[k]) for k, c in ranked[:n]]
+
+
+
+    def merge(self, other: 'SpaceSaving') -> 'SpaceSaving':
+
+        """Sketch of both streams; a key missing on one side may hide up to its min_count"""
+
+        floor_self, floor_other = self.min_count(), other.min_count()
+
+        merged = {}
+
+        for key in set(self.counts) | set(other.counts):
+
+            count = error = 0
+
+            for sketch, floor in ((self, floor_self), (other, floor_other)):
+
+                if key in sketch.counts:
+
+                    count += sketch.counts[key]
+
+                    error += sketch.errors[key]
+
+                else:
+
+                    count += floor
+
+                    error += floor
+
+            merged[key] = (count, error)
+
+
+
+        result = SpaceSaving(self.capacity)
+
+        result.total = self.total + other.total
+
+        for key, (count, error) in sorted(merged.items(), key=lambda kv: -kv[1][0])[:self.capacity]:
+
+            result.counts[key] = count
+
+            result.errors[key] = error
+
+        result._heap = [(c, k) for k, c in result.counts.items()]
+
+        heapq.heapify(result._heap)
+
+        return result
+
+
+
+    def to_dict(self) -> dict:
+
+        return {
+
+            'capacity': self.capacity,
+
+            'total': self.total,
+
+            'entries': [[key, count, error] for key, count, error in self.top()],
+
+        }
+
+
+
+    @classmethod
+
+    def from_dict(cls, data: dict, key=tuple) -> 'SpaceSaving':
+
+        """`key` rebuilds the hashable key from its JSON form"""
+
+        sketch = cls(data.get('capacity', SKETCH_CAPACITY))
+
+        sketch.total = data.get('total', 0)
+
+        for raw, count, error in data.get('entries', []):
+
+            k = key(raw)
+
+            sketch.counts[k] = count
+
+            sketch.errors[k] = error
+
+        sketch._heap = [(c, k) for k, c in sketch.counts.items()]
+
+        heapq.heapify(sketch._heap)
+
+        return sketch
+
+
+
+
+
+def load_base_item_types(conn: sqlite3.Connection) -> Dict[str, str]:
+
+    """Base name -> modifier_tiers item_type (item_bases, then build catalog bases)"""
+
+    base_types = {}
+
+    try:
+
+        for name, item_type in conn.execute("""
+
+            SELECT ib.name, it.name FROM item_bases ib
+
+            JOIN item_types it ON ib.item_type_id = it.id
+
+        """):
+
+            base_types[name] = item_type
+
+    except sqlite3.OperationalError:
+
+        pass  # item tables not created yet
+
+    for build in load_builds(conn).values():
+
+        for item in build['items']:
+
+            base_types.setdefault(item['base'], item['item_type'])
+
+    return base_types
+
+
+
+
+
+def _combo_key(raw) -> tuple:
+
+    return raw[0], tuple(raw[1])
+
+
+
+
+
+class DemandAggregator:
+
+    def __init__(self, parser: ModParser, base_types: Dict[str, str],
+
+                 capacity: int = SKETCH_CAPACITY):
+
+        self.parser = parser
+
+        self.base_types = base_types
+
+        self.combos = SpaceSaving(capacity)
+
+        self.mod_counts: Dict[tuple, int] = {}      # (item_type, modifier_id) -> items
+
+        self.base_counts: Dict[tuple, int] = {}     # (item_type, base) -> items
+
+        self.item_counts: Dict[str, int] = {}       # item_type -> items
+
+        self.characters = 0
+
+        self.items = 0
+
+        self.unmapped = 0
+
+        self.bad_lines = 0
+
+        self.files: Dict[str, list] = {}            # path -> [size, mtime] already ingested
+
+
+
+    # ------------------------------------------------------------
+
+    # Ingestion
+
+    # ------------------------------------------------------------
+
+    def add_item(self, item: dict):
+
+        item = item.get('itemData', item)
+
+        self.items += 1
+
+        base = item.get('baseType') or item.get('base_type')
+
+        item_type = self.base_types.get(base)
+
+        if item_type is None:
+
+            self.unmapped += 1
+
+            return
+
+        lines = item.get('explicitMods') or (item.get('mods') or {}).get('explicit') or []
+
+        resolve = self.parser.modifier_id
+
+        ids = tuple(sorted({m for m in (resolve(line, item_type) for line in lines) if m}))
+
+
+
+        self.item_counts[item_type] = self.item_counts.get(item_type, 0) + 1
+
+        key = (item_type, base)
+
+        self.base_counts[key] = self.base_counts.get(key, 0) + 1
+
+        mod_counts = self.mod_counts
+
+        for mod_id in ids:
+
+            key = (item_type, mod_id)
+
+            mod_counts[key] = mod_counts.get(key, 0) + 1
+
+        add = self.combos.add
+
+        for size in COMBO_SIZES:
+
+            for combo in combinations(ids, size):
+
+                add((item_type, combo))
+
+
+
+    def ingest_range(self, path: Path, start: int = 0, end: Optional[int] = None) -> int:
+
+        """Stream the dump lines that start inside [start, end); returns items read"""
+
+        before = self.items
+
+        with open(path, 'rb') as f:
+
+            if start:
+
+                # Finish the line that straddles `start`; it belongs to the previous range
+
+                f.seek(start - 1)
+
+                f.readline()
+
+            pos = f.tell()
+
+            for line in f:
+
+                if end is not None and pos >= end:
+
+                    break
+
+                pos += len(line)
+
+                if not line.strip():
+
+                    continue
+
+                try:
+
+                    record = json.loads(line)
+
+                except ValueError:
+
+                    self.bad_lines += 1
+
+                    continue
+
+                self.characters += 1
+
+                for item in record.get('items') or record.get('equipment') or []:
+
+                    self.add_item(item)
+
+        return self.items - before
+
+
+
+    def ingest_files(self, paths: List[Path], workers: int = None, db_path: Path = None) -> int:
+
+        """
+
+        Ingest what is new in every dump. Dumps are append-only JSON lines: a dump
+
+        that grew is read from its previously ingested size, one that shrank was
+
+        rewritten and is skipped (its earlier counts cannot be taken back).
+
+        Large ranges are cut into CHUNK_BYTES pieces, counted by worker processes
+
+        and merged back - every count and sketch here is mergeable.
+
+        """
+
+        pending = []
+
+        for path in paths:
+
+            stat = os.stat(path)
+
+            mark = [stat.st_size, stat.st_mtime]
+
+            seen = self.files.get(str(path))
+
+            offset = seen[0] if seen else 0
+
+            if stat.st_size < offset:
+
+                print(f"[WARN] {path} shrank since it was ingested - skipped, "
+
+                      f"rebuild the state from scratch to recount it")
+
+                continue
+
+            if seen != mark:
+
+                pending.append((path, mark, offset))
+
+        if not pending:
+
+            return 0
+
+
+
+        before = self.items
+
+        jobs = [(str(path), start, min(start + CHUNK_BYTES, mark[0]))
+
+                for path, mark, offset in pending for start in range(offset, mark[0], CHUNK_BYTES)]
+
+        if workers == 1 or len(jobs) <= 1:
+
+            for path, start, end in jobs:
+
+                self.ingest_range(Path(path), start, end)
+
+        else:
+
+            initargs = (str(db_path or DB_PATH), self.base_types, self.combos.capacity)
+
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+
+                                     initargs=initargs) as executor:
+
+                for state in executor.map(_ingest_chunk, jobs):
+
+                    self.merge_state(state)
+
+
+
+        for path, mark, _ in pending:
+
+            self.files[str(path)] = mark
+
+        return self.items - before
+
+
+
+    # ------------------------------------------------------------
+
+    # Targets
+
+    # ------------------------------------------------------------
+
+    def targets(self, limit: int = TOP_TARGETS) -> List[dict]:
+
+        """Most demanded combinations, counted conservatively (count - error)"""
+
+        result = []
+
+        for (item_type, mod_ids), count, error in self.combos.top():
+
+            items = self.item_counts.get(item_type, 0)
+
+            share = (count - error) / items if items else 0
+
+            if share < MIN_TARGET_SHARE:
+
+                continue
+
+            result.append({
+
+                'item_type': item_type,
+
+                'modifier_ids': list(mod_ids),
+
+                'count': count - error,
+
+                'share': share,
+
+            })
+
+        result.sort(key=lambda t: -t['count'])
+
+        return result[:limit]
+
+
+
+    def top_base(self, item_type: str) -> Optional[str]:
+
+        bases = [(n, b) for (t, b), n in self.base_counts.items() if t == item_type]
+
+        return max(bases)[1] if bases else None
+
+
+
+    def to_catalog(self, conn: sqlite3.Connection, outcomes: OutcomeIndex = None,
+
+                   limit: int = TOP_TARGETS) -> Dict[str, dict]:
+
+        """Targets as build catalog entries (estimated_sale from the outcome index)"""
+
+        mod_info = {mod_id: (name, mod_type) for mod_id, name, mod_type
+
+                    in conn.execute("SELECT id, name, mod_type FROM modifiers")}
+
+        builds = {}
+
+        for target in self.targets(limit):
+
+            item_type = target['item_type']
+
+            base = self.top_base(item_type)
+
+            mods = [mod_info[m] for m in target['modifier_ids'] if m in mod_info]
+
+            if not base or not mods:
+
+                continue
+
+            demand = next((label for share, label in DEMAND_LEVELS if target['share'] >= share),
+
+                          'medium')
+
+            sale = outcomes.value([(m, 0) for m in target['modifier_ids']]) if outcomes else 0
+
+            name = f"Demand_{item_type}_{'_'.join(str(m) for m in target['modifier_ids'])}"
+
+            builds[name] = {
+
+                'description': f"래더 수요: {item_type} 아이템의 {target['share'] * 100:.1f}%",
+
+                'demand': demand,
+
+                'items': [{
+
+                    'slot': item_type,
+
+                    'item_type': item_type,
+
+                    'base': base,
+
+                    'target_mods': [{'name': n, 'type': t} for n, t in mods],
+
+                    'estimated_sale': round(sale, 1),
+
+                }],
+
+            }
+
+        return builds
+
+
+
+    # ------------------------------------------------------------
+
+    # Persistence
+
+    # ------------------------------------------------------------
+
+    def to_dict(self) -> dict:
+
+        return {
+
+            'combos': self.combos.to_dict(),
+
+            'mod_counts': [[t, m, n] for (t, m), n in self.mod_counts.items()],
+
+            'base_counts': [[t, b, n] for (t, b), n in self.base_counts.items()],
+
+            'item_counts': self.item_counts,
+
+            'characters': self.characters,
+
+            'items': self.items,
+
+            'unmapped': self.unmapped,
+
+            'bad_lines': self.bad_lines,
+
+            'files': self.files,
+
+        }
+
+
+
+    def load_state(self, data: dict):
+
+        self.combos = SpaceSaving.from_dict(data.get('combos', {}), key=_combo_key)
+
+        self.mod_counts = {(t, m): n for t, m, n in data.get('mod_counts', [])}
+
+        self.base_counts = {(t, b): n for t, b, n in data.get('base_counts', [])}
+
+        self.item_counts = dict(data.get('item_counts', {}))
+
+        self.characters = data.get('characters', 0)
+
+        self.items = data.get('items', 0)
+
+        self.unmapped = data.get('unmapped', 0)
+
+        self.bad_lines = data.get('bad_lines', 0)
+
+        self.files = dict(data.get('files', {}))
+
+
+
+    def merge_state(self, data: dict):
+
+        """Add another aggregator's counts (to_dict() form) into this one"""
+
+        self.combos = self.combos.merge(SpaceSaving.from_dict(data.get('combos', {}), key=_combo_key))
+
+        for t, m, n in data.get('mod_counts', []):
+
+            self.mod_counts[(t, m)] = self.mod_counts.get((t, m), 0) + n
+
+        for t, b, n in data.get('base_counts', []):
+
+            self.base_counts[(t, b)] = self.base_counts.get((t, b), 0) + n
+
+        for t, n in data.get('item_counts', {}).items():
+
+            self.item_counts[t] = self.item_counts.get(t, 0) + n
+
+        self.characters += data.get('characters', 0)
+
+        self.items += data.get('items', 0)
+
+        self.unmapped += data.get('unmapped', 0)
+
+        self.bad_lines += data.get('bad_lines', 0)
+
+
+
+    def save(self, path: Path = STATE_FILE):
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(path, 'w') as f:
+
+            json.dump(self.to_dict(), f)
+
+
+
+
+
+# Per-process parser, built once by the pool initializer
+
+_worker_context = None
+
+
+
+
+
+def _init_worker(db_path: str, base_types: Dict[str, str], capacity: int):
+
+    global _worker_context
+
+    conn = sqlite3.connect(db_path)
+
+    _worker_context = (ModParser(conn), base_types, capacity)
+
+    conn.close()
+
+
+
+
+
+def _ingest_chunk(job: tuple) -> dict:
+
+    path, start, end = job
+
+    aggregator = DemandAggregator(*_worker_context)
+
+    aggregator.ingest_range(Path(path), start, end)
+
+    return aggregator.to_dict()
+
+
+
+
+
+def main():
+
+    print("="*60)
+
+    print("Build Demand Aggregation")
+
+    print("="*60)
+
+
+
+    dumps = [Path(p) for p in sys.argv[1:]]
+
+    if not dumps:
+
+        print("Usage: build_demand.py dump.jsonl [dump.jsonl ...]")
+
+        return
+
+
+
+    conn = sqlite3.connect(DB_PATH)
+
+    aggregator = DemandAggregator(ModParser(conn), load_base_item_types(conn))
+
+    if STATE_FILE.exists():
+
+        with open(STATE_FILE, 'r') as f:
+
+            aggregator.load_state(json.load(f))
+
+
+
+    start = time.time()
+
+    items = aggregator.ingest_files(dumps)
+
+    elapsed = time.time() - start
+
+    if items:
+
+        print(f"Ingested {items} items in {elapsed:.1f}s ({items / max(elapsed, 1e-9) * 60:,.0f}/min)")
+
+    else:
+
+        print("Nothing new to ingest")
+
+    print(f"Unmapped bases: {aggregator.unmapped}, bad lines: {aggregator.bad_lines}")
+
+    aggregator.save(STATE_FILE)
+
+
+
+    print(f"\nTop demanded combinations:")
+
+    for target in aggregator.targets(10):
+
+        print(f"  {target['item_type']:<20} {target['modifier_ids']} "
+
+              f"{target['count']} items ({target['share'] * 100:.1f}%)")
+
+
+
+    # Demand targets are regenerated on every run
+
+    builds = aggregator.to_catalog(conn, OutcomeIndex.from_db(conn))
+
+    ensure_table(conn)
+
+    conn.execute("DELETE FROM build_catalog WHERE name LIKE 'Demand\\_%' ESCAPE '\\'")
+
+    written = save_builds(conn, builds) if builds else 0
+
+    conn.close()
+
+    print(f"\nBuild catalog targets written: {written}")
+
+    print(f"State saved to: {STATE_FILE}")
+
+
+
+
+
+if __name__ == "__main__":
+
+    main()
+
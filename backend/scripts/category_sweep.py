@@ -0,0 +1,647 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Category Sweep - prices many bases per trade query
+
+One search per (item category, min ilvl), sorted by price, then paged fetches.
+
+Listings are grouped by baseType client-side; because the stream is price
+
+sorted, the first listing seen for a base is its floor.
+
+~20 categories x 3 ilvl bands x (1 search + 5 fetches) instead of 2 requests per base.
+
+Only the cheapest MAX_PAGES x FETCH_BATCH listings of a band are fetched, so a
+
+band with more listings can leave bases unseen; those are reported and can be
+
+handed to the single-item collector queue (--enqueue).
+
+Progress is checkpointed to data/category_sweep.json.
+
+"""
+
+import os
+
+import sys
+
+import requests
+
+import json
+
+import sqlite3
+
+import time
+
+from pathlib import Path
+
+from datetime import datetime
+
+from typing import Dict, List
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.step5d_full_price_collector import collected_prices_lock
+
+from scripts.price_job_queue import PriceJobQueue
+
+from scripts.currency_normalizer import shared_normalizer
+
+from scripts.price_sketch import PriceSketchBook, KLLSketch, merge_stored, summarize
+
+
+
+BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
+
+DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
+
+PRICE_FILE = BASE_DIR / "data" / "collected_prices.json"
+
+SWEEP_FILE = BASE_DIR / "data" / "category_sweep.json"
+
+
+
+# SETTINGS
+
+REQUEST_DELAY = 3           # between searches
+
+FETCH_DELAY = 1.5           # between fetch pages
+
+FETCH_BATCH = 10            # ids per fetch (trade API maximum)
+
+MAX_PAGES = 5               # fetch pages per search (50 cheapest listings)
+
+PRICES_PER_BASE = 3         # listings kept per base
+
+MIN_ILVL_BANDS = (75, 80, 82)
+
+
+
+# Trade API category filter -> item type label used by the collectors
+
+SWEEP_CATEGORIES = {
+
+    'accessory.amulet': 'Accessories',
+
+    'accessory.ring': 'Accessories',
+
+    'accessory.belt': 'Accessories',
+
+    'armour.chest': 'Armour',
+
+    'armour.helmet': 'Armour',
+
+    'armour.gloves': 'Armour',
+
+    'armour.boots': 'Armour',
+
+    'armour.shield': 'Armour',
+
+    'armour.buckler': 'Armour',
+
+    'armour.focus': 'Armour',
+
+    'armour.quiver': 'Armour',
+
+    'weapon.bow': 'Weapons',
+
+    'weapon.crossbow': 'Weapons',
+
+    'weapon.wand': 'Weapons',
+
+    'weapon.sceptre': 'Weapons',
+
+    'weapon.staff': 'Weapons',
+
+    'weapon.warstaff': 'Weapons',
+
+    'weapon.onemace': 'Weapons',
+
+    'weapon.twomace': 'Weapons',
+
+    'weapon.spear': 'Weapons',
+
+    'flask.life': 'Flasks',
+
+    'flask.mana': 'Flasks',
+
+}
+
+
+
+# Trade API category filter -> ItemType name prefixes of its bases in the DB
+
+CATEGORY_ITEM_TYPES = {
+
+    'accessory.amulet': ('Amulets',),
+
+    'accessory.ring': ('Rings',),
+
+    'accessory.belt': ('Belts',),
+
+    'armour.chest': ('Body_Armours',),
+
+    'armour.helmet': ('Helmets',),
+
+    'armour.gloves': ('Gloves',),
+
+    'armour.boots': ('Boots',),
+
+    'armour.shield': ('Shields',),
+
+    'armour.buckler': ('Bucklers',),
+
+    'armour.focus': ('Foci',),
+
+    'armour.quiver': ('Quivers',),
+
+    'weapon.bow': ('Bows',),
+
+    'weapon.crossbow': ('Crossbows',),
+
+    'weapon.wand': ('Wands',),
+
+    'weapon.sceptre': ('Sceptres',),
+
+    'weapon.staff': ('Staves',),
+
+    'weapon.warstaff': ('Quarterstaves',),
+
+    'weapon.onemace': ('One_Hand_Maces',),
+
+    'weapon.twomace': ('Two_Hand_Maces',),
+
+    'weapon.spear': ('Spears',),
+
+}
+
+
+
+
+
+def group_floors(listings: List[dict], per_base: int = PRICES_PER_BASE) -> Dict[str, dict]:
+
+    """Group a price-sorted listing stream by baseType; first listing per base is the floor"""
+
+    bases: Dict[str, dict] = {}
+
+    for entry in listings:
+
+        item = entry.get('item', {})
+
+        price = entry.get('listing', {}).get('price')
+
+        base = item.get('baseType')
+
+        if not base or not price:
+
+            continue
+
+        row = {'amount': price.get('amount'), 'currency': price.get('currency'), 'ilvl': item.get('ilvl')}
+
+        group = bases.setdefault(base, {'lowest': row, 'all_prices': [], 'seen': 0})
+
+        group['seen'] += 1
+
+        if len(group['all_prices']) < per_base:
+
+            group['all_prices'].append(row)
+
+    return bases
+
+
+
+
+
+class CategorySweeper:
+
+    def __init__(self, league: str = "Fate of the Vaal"):
+
+        self.session = requests.Session()
+
+        self.session.headers.update({
+
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+
+            "Accept": "application/json",
+
+            "Content-Type": "application/json"
+
+        })
+
+        self.league = league
+
+        self.base_url = "https://www.pathofexile.com/api/trade2"
+
+        self.state = self._load_checkpoint()
+
+        self.requests_made = 0
+
+
+
+    def _load_checkpoint(self) -> dict:
+
+        if SWEEP_FILE.exists():
+
+            with open(SWEEP_FILE, 'r') as f:
+
+                return json.load(f)
+
+        return {'done': {}, 'bases': {}, 'last_update': None}
+
+
+
+    def _save_checkpoint(self):
+
+        self.state['last_update'] = datetime.now().isoformat()
+
+        SWEEP_FILE.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(SWEEP_FILE, 'w') as f:
+
+            json.dump(self.state, f, indent=2, ensure_ascii=False)
+
+
+
+    @staticmethod
+
+    def build_query(category: str, min_ilvl: int) -> dict:
+
+        return {
+
+            "query": {
+
+                "status": {"option": "online"},
+
+                "filters": {
+
+                    "type_filters": {"filters": {
+
+                        "category": {"option": category},
+
+                        "rarity": {"option": "nonunique"}
+
+                    }},
+
+                    "misc_filters": {"filters": {"ilvl": {"min": min_ilvl}}}
+
+                }
+
+            },
+
+            "sort": {"price": "asc"}
+
+        }
+
+
+
+    def sweep_one(self, category: str, min_ilvl: int) -> dict:
+
+        """One search, up to MAX_PAGES fetches; returns grouped floors"""
+
+        try:
+
+            response = self.session.post(
+
+                f"{self.base_url}/search/poe2/{self.league}",
+
+                json=self.build_query(category, min_ilvl),
+
+                timeout=20
+
+            )
+
+            self.requests_made += 1
+
+            if response.status_code == 429:
+
+                return {'error': 'RATE_LIMITED', 'retry': True}
+
+            if response.status_code != 200:
+
+                return {'error': f'HTTP {response.status_code}'}
+
+
+
+            data = response.json()
+
+            found = data.get('result', [])
+
+            ids = found[:FETCH_BATCH * MAX_PAGES]
+
+            listings = []
+
+            for start in range(0, len(ids), FETCH_BATCH):
+
+                time.sleep(FETCH_DELAY)
+
+                fetch_resp = self.session.get(
+
+                    f"{self.base_url}/fetch/{','.join(ids[start:start + FETCH_BATCH])}",
+
+                    params={"query": data.get('id')},
+
+                    timeout=20
+
+                )
+
+                self.requests_made += 1
+
+                if fetch_resp.status_code == 429:
+
+                    return {'error': 'RATE_LIMITED', 'retry': True}
+
+                if fetch_resp.status_code != 200:
+
+                    break
+
+                listings.extend(r for r in fetch_resp.json().get('result', []) if r)
+
+
+
+            # Listings past the fetched pages may hold bases we never saw
+
+            truncated = max(data.get('total') or 0, len(found)) > len(ids)
+
+            return {'success': True, 'total': data.get('total'), 'listings': len(listings),
+
+                    'truncated': truncated, 'bases': group_floors(listings)}
+
+
+
+        except requests.exceptions.Timeout:
+
+            return {'error': 'Timeout', 'retry': True}
+
+        except Exception as e:
+
+            return {'error': str(e)}
+
+
+
+    def sweep(self, categories: List[str] = None, bands=MIN_ILVL_BANDS, enqueue: bool = False):
+
+        categories = categories or list(SWEEP_CATEGORIES)
+
+        jobs = [(c, b) for c in categories for b in bands if f"{c}|{b}" not in self.state['done']]
+
+
+
+        print("="*60)
+
+        print("Category Sweep")
+
+        print("="*60)
+
+        print(f"Searches to run: {len(jobs)} (max {len(jobs) * (1 + MAX_PAGES)} requests)")
+
+        print("="*60)
+
+
+
+        for i, (category, min_ilvl) in enumerate(jobs):
+
+            print(f"[{i+1}/{len(jobs)}] {category:<20} ilvl {min_ilvl}+", end=" ")
+
+            result = self.sweep_one(category, min_ilvl)
+
+
+
+            if result.get('retry'):
+
+                print("⚠ RATE LIMITED - stopping, progress saved")
+
+                break
+
+            if not result.get('success'):
+
+                print(f"✗ {result.get('error')}")
+
+            else:
+
+                now = datetime.now().isoformat()
+
+                for base, group in result['bases'].items():
+
+                    group.update({'type': SWEEP_CATEGORIES.get(category), 'collected_at': now})
+
+                    self.state['bases'].setdefault(base, {})[str(min_ilvl)] = group
+
+                self.state['done'][f"{category}|{min_ilvl}"] = now
+
+                self._save_checkpoint()
+
+                print(f"✓ {result['listings']} listings, {len(result['bases'])} bases (total {result['total']})"
+
+                      + (" [truncated]" if result['truncated'] else ""))
+
+
+
+            if i < len(jobs) - 1:
+
+                time.sleep(REQUEST_DELAY)
+
+
+
+        merged = self.merge_into_collected(min(bands))
+
+        print(f"\nRequests made: {self.requests_made}")
+
+        print(f"Bases priced: {len(self.state['bases'])}, merged into {PRICE_FILE.name}: {merged}")
+
+
+
+        unpriced = self.unpriced_bases(categories, min(bands))
+
+        if unpriced:
+
+            print(f"Unpriced bases (beyond the {FETCH_BATCH * MAX_PAGES} cheapest listings "
+
+                  f"or not listed): {len(unpriced)}")
+
+            print("  " + ", ".join(item['name'] for item in unpriced[:10]))
+
+            if enqueue:
+
+                queue = PriceJobQueue()
+
+                added = queue.enqueue(unpriced)
+
+                print(f"Enqueued {added} for the single-item collector - queue: {queue.stats()}")
+
+                queue.close()
+
+
+
+    def unpriced_bases(self, categories: List[str], min_ilvl: int) -> List[dict]:
+
+        """DB bases of the swept categories that got no floor in the `min_ilvl` band"""
+
+        prefixes = tuple(p for c in categories for p in CATEGORY_ITEM_TYPES.get(c, ()))
+
+        if not prefixes or not Path(DB_PATH).exists():
+
+            return []
+
+        conn = sqlite3.connect(DB_PATH)
+
+        try:
+
+            rows = conn.execute("""
+
+                SELECT ib.name, it.name FROM item_bases ib
+
+                JOIN item_types it ON ib.item_type_id = it.id
+
+                ORDER BY ib.name
+
+            """).fetchall()
+
+        except sqlite3.OperationalError:
+
+            rows = []  # item tables not created yet
+
+        finally:
+
+            conn.close()
+
+        return [{'name': name, 'type': item_type} for name, item_type in rows
+
+                if item_type.startswith(prefixes)
+
+                and str(min_ilvl) not in self.state['bases'].get(name, {})]
+
+
+
+    def merge_into_collected(self, min_ilvl: int) -> int:
+
+        """Write band floors into collected_prices.json unless a newer single-item price exists"""
+
+        # Same lock as the full price collector's workers, held for the whole read-modify-write
+
+        with collected_prices_lock():
+
+            return self._merge_locked(min_ilvl)
+
+
+
+    def _merge_locked(self, min_ilvl: int) -> int:
+
+        collected = {'items': {}, 'failed': [], 'last_update': None}
+
+        if PRICE_FILE.exists():
+
+            with open(PRICE_FILE, 'r') as f:
+
+                collected = json.load(f)
+
+
+
+        book = PriceSketchBook(shared_normalizer(DB_PATH).as_dict())
+
+        merged = 0
+
+        for base, by_band in self.state['bases'].items():
+
+            group = by_band.get(str(min_ilvl))
+
+            if not group:
+
+                continue
+
+            existing = collected['items'].get(base)
+
+            if existing and existing.get('collected_at', '') >= group['collected_at']:
+
+                continue
+
+            # Sweep prices fold into the stored 24h sketch; other fields (listings_total) stay
+
+            book.add_prices(base, group['all_prices'])
+
+            sketch, started = merge_stored(existing, book.sketches.pop(base, KLLSketch()))
+
+            entry = dict(existing or {})
+
+            entry.update({
+
+                'type': group['type'],
+
+                'lowest': group['lowest'],
+
+                'all_prices': group['all_prices'],
+
+                'estimate': summarize(sketch),
+
+                'sketch': sketch.to_dict(),
+
+                'sketch_started': started,
+
+                'collected_at': group['collected_at'],
+
+                'source': 'category_sweep'
+
+            })
+
+            collected['items'][base] = entry
+
+            if base in collected.get('failed', []):
+
+                collected['failed'].remove(base)
+
+                collected.get('failed_at', {}).pop(base, None)
+
+            merged += 1
+
+
+
+        collected['last_update'] = datetime.now().isoformat()
+
+        PRICE_FILE.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(PRICE_FILE, 'w') as f:
+
+            json.dump(collected, f, indent=2, ensure_ascii=False)
+
+        return merged
+
+
+
+    def reset(self):
+
+        """Start a fresh sweep (keeps nothing from the checkpoint)"""
+
+        self.state = {'done': {}, 'bases': {}, 'last_update': None}
+
+        self._save_checkpoint()
+
+
+
+
+
+def main():
+
+    sweeper = CategorySweeper()
+
+    if '--reset' in sys.argv:
+
+        sweeper.reset()
+
+    categories = [a for a in sys.argv[1:] if not a.startswith('--')]
+
+    sweeper.sweep(categories or None, enqueue='--enqueue' in sys.argv)
+
+
+
+
+
+if __name__ == "__main__":
+
+    main()
+
@@ -13,6 +13,8 @@ NO external API calls - all local calculations
 
 import os
 
+import sys
+
 import sqlite3
 
 import json
@@ -21,6 +23,16 @@ from datetime import datetime
 
 
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+from scripts.rare_event import RareEventEstimator
+
+from scripts.roll_values import RollTable, expected_divines
+
+
+
 DB_PATH = os.path.expanduser("~/poe2-profit-optimizer/backend/poe2_profit_optimizer.db")
 
 
@@ -329,6 +341,52 @@ class ProbabilityCalculator:
 
     
 
+    def calculate_roll_probability(self, target_mod, mod_pool, tier, min_value):
+
+        """
+
+        Probability of hitting a tier AND rolling at least min_value on it,
+
+        plus the Divine Orbs expected to reroll a low roll up to min_value
+
+        """
+
+        available = self.get_available_mods(mod_pool, self.ilvl)
+
+        total_weight = self.calculate_total_weight(mod_pool, self.ilvl)
+
+        
+
+        if target_mod not in available or tier not in available[target_mod]:
+
+            return {"tier_rate": 0.0, "roll_rate": 0.0, "success_rate": 0.0,
+
+                    "avg_divines": float('inf')}
+
+        
+
+        weight, min_val, max_val = available[target_mod][tier]
+
+        tier_rate = weight / total_weight if total_weight > 0 else 0.0
+
+        roll_rate = RollTable.uniform(min_val, max_val).prob_at_least(min_value)
+
+        
+
+        return {
+
+            "tier_rate": tier_rate,
+
+            "roll_rate": roll_rate,
+
+            "success_rate": tier_rate * roll_rate,
+
+            "avg_divines": max(expected_divines(roll_rate) - 1, 0),
+
+        }
+
+    
+
     def calculate_plus3_amulet_probability(self, skill_type="Projectile"):
 
         """
@@ -499,6 +557,80 @@ class ProbabilityCalculator:
 
     
 
+    def estimate_plus3_amulet_probability(self, skill_type="Projectile", relative_error=0.03):
+
+        """
+
+        Importance-sampled +3 amulet probability (both +1 prefixes on one item)
+
+        with a confidence interval, instead of the slot approximation above
+
+        """
+
+        prefix_pool = self.get_available_mods(AMULET_PREFIX_MODS, self.ilvl)
+
+        
+
+        weights, groups, names = [], [], []
+
+        for mod_name, tiers in prefix_pool.items():
+
+            for tier, (weight, _, _) in tiers.items():
+
+                weights.append(weight)
+
+                groups.append(mod_name)
+
+                names.append(mod_name)
+
+        
+
+        primary_mod = f"+1 to Level of all {skill_type} Skill Gems"
+
+        secondary_mod = "+1 to Level of all Skill Gems"
+
+        requirements = [
+
+            [i for i, n in enumerate(names) if n == primary_mod],
+
+            [i for i, n in enumerate(names) if n == secondary_mod],
+
+        ]
+
+        if not all(requirements):
+
+            return {"skill_type": skill_type, "success_rate": 0.0, "avg_attempts": float('inf')}
+
+        
+
+        estimator = RareEventEstimator(weights, requirements, groups=groups)
+
+        result = estimator.estimate_until(relative_error=relative_error)
+
+        
+
+        return {
+
+            "skill_type": skill_type,
+
+            "ilvl": self.ilvl,
+
+            "success_rate": result["probability"],
+
+            "ci_low": result["ci_low"],
+
+            "ci_high": result["ci_high"],
+
+            "relative_error": result["relative_error"],
+
+            "avg_attempts": result["avg_attempts"],
+
+            "samples": result["samples"],
+
+        }
+
+    
+
     def calculate_breach_ring_probability(self, target_damage_type="Lightning"):
 
         """
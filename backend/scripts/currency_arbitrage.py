@@ -0,0 +1,649 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Currency Triangular Arbitrage Detector
+
+Log-rate graph over every traded currency:
+
+    edge u -> v, weight = -log(units of v received for 1 u)
+
+A negative cycle is a loop of trades that ends with more than it started.
+
+- full check: Bellman-Ford from a virtual source (potentials kept when clean)
+
+- single rate change: SPFA from the changed edge only, O(1) if potentials still hold
+
+- refresh: sync() moves a long-lived graph to the latest rows edge by edge
+
+- listing: profitable cycles up to MAX_CYCLE_LEN hops
+
+"""
+
+import math
+
+import sqlite3
+
+import time
+
+from collections import deque
+
+from pathlib import Path
+
+from typing import Dict, List, Optional, Tuple
+
+
+
+BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
+
+DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
+
+LEAGUE_ID = 1
+
+
+
+MAX_CYCLE_LEN = 4           # triangular + one extra hop
+
+MID_SPREAD = 0.01           # haircut on mid prices (quotes from order books are executable)
+
+EPS = 1e-12
+
+
+
+
+
+class ArbitrageGraph:
+
+    def __init__(self):
+
+        self.adj: Dict[str, Dict[str, float]] = {}
+
+        self.sources: Dict[Tuple[str, str], str] = {}
+
+        self.potential: Dict[str, float] = {}
+
+        self.clean = False      # potentials valid and no negative cycle
+
+        self.last_cycle: Optional[List[str]] = None
+
+
+
+    # ------------------------------------------------------------
+
+    # Building
+
+    # ------------------------------------------------------------
+
+    def _node(self, name: str):
+
+        if name not in self.adj:
+
+            self.adj[name] = {}
+
+            self.potential[name] = 0.0
+
+
+
+    def set_edge(self, u: str, v: str, received: float, source: str = ''):
+
+        """1 u -> `received` v. Keeps the best rate per direction."""
+
+        if received <= 0 or u == v:
+
+            return
+
+        self._node(u)
+
+        self._node(v)
+
+        weight = -math.log(received)
+
+        if weight < self.adj[u].get(v, float('inf')):
+
+            self.adj[u][v] = weight
+
+            self.sources[(u, v)] = source
+
+        self.clean = False
+
+
+
+    def add_quote(self, pay: str, get: str, rate: float, source: str = 'quote'):
+
+        """Order-book quote: `rate` pay buys one get"""
+
+        self.set_edge(pay, get, 1.0 / rate, source)
+
+
+
+    def add_mid(self, a: str, b: str, b_per_a: float, source: str = 'mid', spread: float = MID_SPREAD):
+
+        """Mid price, both directions with a haircut"""
+
+        self.set_edge(a, b, b_per_a * (1 - spread), source)
+
+        self.set_edge(b, a, (1 - spread) / b_per_a, source)
+
+
+
+    @classmethod
+
+    def from_rows(cls, quotes=(), exchange_rate=None, prices=()) -> 'ArbitrageGraph':
+
+        """
+
+        quotes:        (pay, get, rate) from currency_pair_quotes
+
+        exchange_rate: (divine_to_exalt, divine_to_chaos, exalt_to_chaos) or None
+
+        prices:        (name, price_chaos, price_divine) from currency_prices, newest
+
+                       first; only the first row per currency is used
+
+        """
+
+        graph = cls()
+
+        for pay, get, rate in quotes:
+
+            if rate:
+
+                graph.add_quote(pay, get, rate, 'trade_exchange')
+
+        if exchange_rate:
+
+            d2e, d2c, e2c = exchange_rate
+
+            if d2e:
+
+                graph.add_mid('Divine Orb', 'Exalted Orb', d2e, 'exchange_rate')
+
+            if d2c:
+
+                graph.add_mid('Divine Orb', 'Chaos Orb', d2c, 'exchange_rate')
+
+            if e2c:
+
+                graph.add_mid('Exalted Orb', 'Chaos Orb', e2c, 'exchange_rate')
+
+        seen = set()
+
+        for name, price_chaos, price_divine in prices:
+
+            if name in seen:
+
+                continue
+
+            seen.add(name)
+
+            if price_chaos and name != 'Chaos Orb':
+
+                graph.add_mid(name, 'Chaos Orb', price_chaos, 'currency_price')
+
+            if price_divine and name != 'Divine Orb':
+
+                graph.add_mid(name, 'Divine Orb', price_divine, 'currency_price')
+
+        return graph
+
+
+
+    @classmethod
+
+    def from_db(cls, conn: sqlite3.Connection, league_id: int = LEAGUE_ID) -> 'ArbitrageGraph':
+
+        quotes = conn.execute("""
+
+            SELECT pay_currency, get_currency, rate FROM currency_pair_quotes
+
+            WHERE league_id = ? AND recorded_at = (
+
+                SELECT MAX(recorded_at) FROM currency_pair_quotes WHERE league_id = ?)
+
+        """, (league_id, league_id)).fetchall() if _has_table(conn, 'currency_pair_quotes') else []
+
+        rate = conn.execute("""
+
+            SELECT divine_to_exalt, divine_to_chaos, exalt_to_chaos FROM currency_exchange_rates
+
+            WHERE league_id = ? ORDER BY last_updated DESC LIMIT 1
+
+        """, (league_id,)).fetchone()
+
+        prices = conn.execute("""
+
+            SELECT c.name, cp.price_chaos, cp.price_divine
+
+            FROM currency_prices cp JOIN currencies c ON cp.currency_id = c.id
+
+            WHERE cp.league_id = ?
+
+            ORDER BY cp.last_updated DESC, cp.id DESC
+
+        """, (league_id,)).fetchall()
+
+        return cls.from_rows(quotes, rate, prices)
+
+
+
+    # ------------------------------------------------------------
+
+    # Detection
+
+    # ------------------------------------------------------------
+
+    def _trace(self, parent: Dict[str, str], start: str) -> List[str]:
+
+        """Walk parents n times to land inside the cycle, then collect it"""
+
+        node = start
+
+        for _ in range(len(self.adj)):
+
+            node = parent[node]
+
+        cycle, x = [node], parent[node]
+
+        while x != node:
+
+            cycle.append(x)
+
+            x = parent[x]
+
+        cycle.reverse()
+
+        return cycle
+
+
+
+    def detect(self) -> Optional[List[str]]:
+
+        """Bellman-Ford from a virtual source; returns one negative cycle or None"""
+
+        if self.clean:
+
+            return None
+
+        pot = {v: 0.0 for v in self.adj}
+
+        parent: Dict[str, str] = {}
+
+        for _ in range(len(self.adj)):
+
+            changed = None
+
+            for u, edges in self.adj.items():
+
+                pu = pot[u]
+
+                for v, w in edges.items():
+
+                    if pu + w < pot[v] - EPS:
+
+                        pot[v] = pu + w
+
+                        parent[v] = u
+
+                        changed = v
+
+            if changed is None:
+
+                self.potential, self.clean, self.last_cycle = pot, True, None
+
+                return None
+
+        self.potential, self.clean = pot, False
+
+        self.last_cycle = self._trace(parent, changed)
+
+        return self.last_cycle
+
+
+
+    def update_rate(self, u: str, v: str, received: float, source: str = 'update') -> Optional[List[str]]:
+
+        """
+
+        Replace one directed rate and re-check incrementally.
+
+        Returns a negative cycle through the new edge, or None.
+
+        """
+
+        if received <= 0 or u == v:
+
+            raise ValueError(f"rate {u} -> {v} must be positive between two currencies, got {received}")
+
+        return self._set_weight(u, v, -math.log(received), source)
+
+
+
+    def _set_weight(self, u: str, v: str, weight: float, source: str) -> Optional[List[str]]:
+
+        self._node(u)
+
+        self._node(v)
+
+        was_clean = self.clean
+
+        self.adj[u][v] = weight
+
+        self.sources[(u, v)] = source
+
+
+
+        if not was_clean:
+
+            return self.detect()
+
+        pot = self.potential
+
+        if pot[u] + weight >= pot[v] - EPS:
+
+            self.clean = True      # potentials still feasible: nothing can have appeared
+
+            return None
+
+
+
+        # SPFA from v; a new cycle must use u -> v
+
+        pot[v] = pot[u] + weight
+
+        parent = {v: u}
+
+        count = {v: 1}
+
+        queue, queued = deque([v]), {v}
+
+        n = len(self.adj)
+
+        while queue:
+
+            x = queue.popleft()
+
+            queued.discard(x)
+
+            px = pot[x]
+
+            for y, w in self.adj[x].items():
+
+                if px + w < pot[y] - EPS:
+
+                    pot[y] = px + w
+
+                    parent[y] = x
+
+                    if y == v or count.get(y, 0) >= n:
+
+                        self.clean = False
+
+                        self.last_cycle = self._trace(parent, y)
+
+                        return self.last_cycle
+
+                    count[y] = count.get(y, 0) + 1
+
+                    if y not in queued:
+
+                        queue.append(y)
+
+                        queued.add(y)
+
+        self.clean = True
+
+        return None
+
+
+
+    def sync(self, target: 'ArbitrageGraph') -> int:
+
+        """
+
+        Move to target's rates edge by edge instead of rebuilding. While the graph
+
+        is clean every changed edge goes through the incremental check, so moves
+
+        that keep the potentials feasible never rerun Bellman-Ford; once a cycle
+
+        is known the rest is applied directly and detect() runs once on the next scan.
+
+        Returns the number of edges changed.
+
+        """
+
+        changed = 0
+
+        # Dropping edges keeps the potentials feasible; a known cycle is rechecked
+
+        for u, edges in self.adj.items():
+
+            for v in [v for v in edges if v not in target.adj.get(u, {})]:
+
+                del edges[v]
+
+                self.sources.pop((u, v), None)
+
+                changed += 1
+
+        for name in [n for n in self.adj if n not in target.adj]:
+
+            del self.adj[name]
+
+            del self.potential[name]
+
+
+
+        for u, edges in target.adj.items():
+
+            for v, weight in edges.items():
+
+                source = target.sources.get((u, v), '')
+
+                if self.adj.get(u, {}).get(v) == weight:
+
+                    self.sources[(u, v)] = source
+
+                    continue
+
+                if self.clean:
+
+                    self._set_weight(u, v, weight, source)
+
+                else:
+
+                    self._node(u)
+
+                    self._node(v)
+
+                    self.adj[u][v] = weight
+
+                    self.sources[(u, v)] = source
+
+                changed += 1
+
+        if not self.clean:
+
+            self.last_cycle = None
+
+        return changed
+
+
+
+    # ------------------------------------------------------------
+
+    # Reporting
+
+    # ------------------------------------------------------------
+
+    def cycle_gain(self, cycle: List[str]) -> float:
+
+        """Fractional profit of going once around the cycle"""
+
+        total = sum(self.adj[a][b] for a, b in zip(cycle, cycle[1:] + cycle[:1]))
+
+        return math.exp(-total) - 1
+
+
+
+    def cycles(self, max_len: int = MAX_CYCLE_LEN, min_profit: float = 0.0) -> List[dict]:
+
+        """
+
+        All profitable simple cycles up to max_len hops (skipped when the graph is clean).
+
+        Edges are reweighted by the Bellman-Ford potentials (cycle weights unchanged),
+
+        so only the few edges left negative can start a cycle, and a path whose
+
+        reduced weight exceeds the total negative slack is pruned.
+
+        """
+
+        if self.detect() is None:
+
+            return []
+
+        pot = self.potential
+
+        reduced = {u: {v: w + pot[u] - pot[v] for v, w in edges.items()} for u, edges in self.adj.items()}
+
+        negative = [(u, v) for u, edges in reduced.items() for v, w in edges.items() if w < -EPS]
+
+        slack = -sum(reduced[u][v] for u, v in negative)
+
+        limit = -math.log1p(min_profit)
+
+        found: Dict[tuple, tuple] = {}
+
+
+
+        def dfs(start, node, path, weight):
+
+            for nxt, w in reduced[node].items():
+
+                total = weight + w
+
+                if nxt == start:
+
+                    if total < limit - EPS:
+
+                        k = path.index(min(path))
+
+                        key = tuple(path[k:] + path[:k])
+
+                        found[key] = (list(key), math.exp(-total) - 1)
+
+                elif len(path) < max_len and nxt not in path and total < slack:
+
+                    path.append(nxt)
+
+                    dfs(start, nxt, path, total)
+
+                    path.pop()
+
+
+
+        for u, v in negative:
+
+            dfs(u, v, [u, v], reduced[u][v])
+
+
+
+        found = sorted(found.values(), key=lambda c: -c[1])
+
+        return [{
+
+            'cycle': path + [path[0]],
+
+            'profit_pct': gain * 100,
+
+            'legs': [{'from': a, 'to': b, 'rate': math.exp(-self.adj[a][b]), 'source': self.sources.get((a, b))}
+
+                     for a, b in zip(path, path[1:] + path[:1])],
+
+        } for path, gain in found]
+
+
+
+
+
+def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,)).fetchone() is not None
+
+
+
+
+
+def scan(graph: ArbitrageGraph, max_len: int = MAX_CYCLE_LEN, min_profit: float = 0.0) -> dict:
+
+    start = time.perf_counter()
+
+    cycles = graph.cycles(max_len, min_profit)
+
+    return {
+
+        'currencies': len(graph.adj),
+
+        'edges': sum(len(e) for e in graph.adj.values()),
+
+        'count': len(cycles),
+
+        'cycles': cycles,
+
+        'elapsed_ms': (time.perf_counter() - start) * 1000,
+
+    }
+
+
+
+
+
+def main():
+
+    print("="*60)
+
+    print("Currency Arbitrage Scan")
+
+    print("="*60)
+
+
+
+    conn = sqlite3.connect(DB_PATH)
+
+    graph = ArbitrageGraph.from_db(conn)
+
+    conn.close()
+
+
+
+    result = scan(graph)
+
+    print(f"Currencies: {result['currencies']}, edges: {result['edges']}, "
+
+          f"scan: {result['elapsed_ms']:.2f} ms")
+
+    if not result['cycles']:
+
+        print("\nNo profitable cycles")
+
+    for c in result['cycles'][:10]:
+
+        print(f"\n  +{c['profit_pct']:.2f}%  {' -> '.join(c['cycle'])}")
+
+        for leg in c['legs']:
+
+            print(f"      {leg['from']} -> {leg['to']}: {leg['rate']:.6g} ({leg['source']})")
+
+
+
+
+
+if __name__ == "__main__":
+
+    main()
+
@@ -0,0 +1,599 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Currency Normalizer
+
+One shared conversion table for every analyzer and collector: the latest
+
+currency_prices / currency_exchange_rates rows loaded into a Divine-value
+
+vector indexed by currency code (trade API codes such as 'exalted', or full
+
+currency names). Reloads only when a newer rate row exists, converts whole
+
+listing batches with one lookup per distinct currency, and answers as-of
+
+conversions from the rate history.
+
+"""
+
+import sqlite3
+
+import time
+
+from array import array
+
+from bisect import bisect_right
+
+from datetime import datetime
+
+from pathlib import Path
+
+from typing import Dict, Iterable, List, Optional, Union
+
+
+
+BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
+
+DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
+
+LEAGUE_ID = 1
+
+
+
+REFRESH_SECONDS = 300       # shared instances re-check the DB this often
+
+
+
+# Trade listing codes -> currencies.name
+
+CURRENCY_CODES = {
+
+    'divine': 'Divine Orb',
+
+    'exalted': 'Exalted Orb',
+
+    'chaos': 'Chaos Orb',
+
+    'regal': 'Regal Orb',
+
+    'alch': 'Orb of Alchemy',
+
+    'transmute': 'Orb of Transmutation',
+
+    'aug': 'Orb of Augmentation',
+
+    'chance': 'Orb of Chance',
+
+    'vaal': 'Vaal Orb',
+
+    'annul': 'Orb of Annulment',
+
+}
+
+
+
+# Spellings used across the scripts
+
+ALIASES = {
+
+    'exalt': 'exalted',
+
+    'alchemy': 'alch',
+
+    'augment': 'aug',
+
+    'augmentation': 'aug',
+
+    'transmutation': 'transmute',
+
+    'annulment': 'annul',
+
+}
+
+
+
+# Used until the DB has a rate (Divine per unit)
+
+FALLBACK_DIVINE_VALUE = {
+
+    'divine': 1.0,
+
+    'exalted': 1 / 150,
+
+    'chaos': 1 / 370,
+
+    'regal': 3 / 370,
+
+    'alch': 0.5 / 370,
+
+    'transmute': 0.01 / 370,
+
+    'aug': 0.02 / 370,
+
+    'chance': 0.1 / 370,
+
+    'vaal': 1.5 / 370,
+
+    'annul': 250 / 370,
+
+}
+
+
+
+NAME_TO_CODE = {name: code for code, name in CURRENCY_CODES.items()}
+
+
+
+When = Union[datetime, str, float, int]
+
+
+
+
+
+def _epoch(when: When) -> float:
+
+    if isinstance(when, (int, float)):
+
+        return float(when)
+
+    if isinstance(when, str):
+
+        when = datetime.fromisoformat(when.replace('Z', '+00:00'))
+
+    return when.timestamp()
+
+
+
+
+
+def canonical_code(currency: str) -> str:
+
+    """'Exalted Orb' / 'exalt' / 'exalted' -> 'exalted'; other names pass through"""
+
+    if currency in NAME_TO_CODE:
+
+        return NAME_TO_CODE[currency]
+
+    lowered = currency.lower()
+
+    lowered = ALIASES.get(lowered, lowered)
+
+    return lowered if lowered in CURRENCY_CODES else currency
+
+
+
+
+
+class CurrencyNormalizer:
+
+    def __init__(self, conn: Optional[sqlite3.Connection] = None,
+
+                 league_id: int = LEAGUE_ID, db_path: Path = DB_PATH):
+
+        # A missing DB file means fallback rates only (and no empty file is created)
+
+        if conn is None:
+
+            conn = sqlite3.connect(str(db_path) if Path(db_path).exists() else ':memory:',
+
+                                   check_same_thread=False)
+
+        self.conn = conn
+
+        self.league_id = league_id
+
+        self.codes: List[str] = []
+
+        self.index: Dict[str, int] = {}
+
+        self.values = array('d')
+
+        self.version = None
+
+        self.loaded_at = 0.0
+
+        self._history: Optional[Dict[str, tuple]] = None
+
+        self.refresh(force=True)
+
+
+
+    # ------------------------------------------------------------
+
+    # Loading
+
+    # ------------------------------------------------------------
+
+    def _slot(self, code: str) -> int:
+
+        if code not in self.index:
+
+            self.index[code] = len(self.codes)
+
+            self.codes.append(code)
+
+            self.values.append(0.0)
+
+        return self.index[code]
+
+
+
+    def _set(self, code: str, value: Optional[float]):
+
+        if value and value > 0:
+
+            self.values[self._slot(code)] = value
+
+
+
+    def _version(self) -> tuple:
+
+        """Latest rate timestamps; a change means new rates were written"""
+
+        try:
+
+            prices = self.conn.execute(
+
+                "SELECT MAX(last_updated), COUNT(*) FROM currency_prices WHERE league_id = ?",
+
+                (self.league_id,)).fetchone()
+
+            rates = self.conn.execute(
+
+                "SELECT MAX(last_updated), COUNT(*) FROM currency_exchange_rates WHERE league_id = ?",
+
+                (self.league_id,)).fetchone()
+
+        except sqlite3.OperationalError:
+
+            return (None, None)
+
+        return (tuple(prices), tuple(rates))
+
+
+
+    def refresh(self, force: bool = False) -> bool:
+
+        """Reload the vector if the DB has newer rates; returns True when reloaded"""
+
+        self.loaded_at = time.time()
+
+        version = self._version()
+
+        if not force and version == self.version:
+
+            return False
+
+        self.version = version
+
+        self._history = None
+
+
+
+        for i in range(len(self.values)):
+
+            self.values[i] = 0.0
+
+        for code, value in FALLBACK_DIVINE_VALUE.items():
+
+            self._set(code, value)
+
+
+
+        try:
+
+            # Ascending, so the newest row per currency wins
+
+            for name, price_divine in self.conn.execute("""
+
+                SELECT c.name, cp.price_divine
+
+                FROM currency_prices cp
+
+                JOIN currencies c ON cp.currency_id = c.id
+
+                WHERE cp.league_id = ?
+
+                ORDER BY cp.last_updated, cp.id
+
+            """, (self.league_id,)):
+
+                self._set(canonical_code(name), price_divine)
+
+
+
+            # Fused exchange rates are the authority for the two main pairs
+
+            row = self.conn.execute("""
+
+                SELECT divine_to_exalt, divine_to_chaos FROM currency_exchange_rates
+
+                WHERE league_id = ? ORDER BY last_updated DESC LIMIT 1
+
+            """, (self.league_id,)).fetchone()
+
+            if row:
+
+                self._set('exalted', 1 / row[0] if row[0] else None)
+
+                self._set('chaos', 1 / row[1] if row[1] else None)
+
+        except sqlite3.OperationalError:
+
+            pass  # tables not created yet - fallbacks only
+
+        self.values[self._slot('divine')] = 1.0
+
+        return True
+
+
+
+    def maybe_refresh(self, max_age: float = REFRESH_SECONDS) -> bool:
+
+        if time.time() - self.loaded_at >= max_age:
+
+            return self.refresh()
+
+        return False
+
+
+
+    # ------------------------------------------------------------
+
+    # Current conversion
+
+    # ------------------------------------------------------------
+
+    def value(self, currency: str) -> float:
+
+        """Divine per unit of `currency` (0.0 when unknown)"""
+
+        i = self.index.get(canonical_code(currency)) if currency else None
+
+        return self.values[i] if i is not None else 0.0
+
+
+
+    def to_divine(self, amount: float, currency: str) -> float:
+
+        return (amount or 0) * self.value(currency)
+
+
+
+    def convert(self, amount: float, currency: str, target: str = 'divine') -> float:
+
+        unit = self.value(target)
+
+        return self.to_divine(amount, currency) / unit if unit else 0.0
+
+
+
+    def rate(self, currency: str, target: str) -> float:
+
+        """Units of `target` per one `currency` (e.g. rate('divine', 'exalted'))"""
+
+        return self.convert(1.0, currency, target)
+
+
+
+    def to_divine_many(self, amounts: Iterable[float], currencies: Iterable[str]) -> List[float]:
+
+        """Batch conversion: each distinct currency is resolved once"""
+
+        resolved: Dict[str, float] = {}
+
+        out = []
+
+        for amount, currency in zip(amounts, currencies):
+
+            value = resolved.get(currency)
+
+            if value is None:
+
+                value = resolved[currency] = self.value(currency)
+
+            out.append((amount or 0) * value)
+
+        return out
+
+
+
+    def as_dict(self) -> Dict[str, float]:
+
+        """{code or alias or name: Divine value} for code that takes a plain rate table"""
+
+        table = {code: self.values[i] for code, i in self.index.items()}
+
+        for alias, code in ALIASES.items():
+
+            table[alias] = table.get(code, 0.0)
+
+        for code, name in CURRENCY_CODES.items():
+
+            table[name] = table.get(code, 0.0)
+
+        return table
+
+
+
+    # ------------------------------------------------------------
+
+    # As-of conversion
+
+    # ------------------------------------------------------------
+
+    def _load_history(self) -> Dict[str, tuple]:
+
+        """code -> (sorted epoch list, Divine values) from every stored rate row"""
+
+        points: Dict[str, List[tuple]] = {}
+
+        try:
+
+            for name, price_divine, updated in self.conn.execute("""
+
+                SELECT c.name, cp.price_divine, cp.last_updated
+
+                FROM currency_prices cp
+
+                JOIN currencies c ON cp.currency_id = c.id
+
+                WHERE cp.league_id = ? AND cp.price_divine > 0 AND cp.last_updated IS NOT NULL
+
+            """, (self.league_id,)):
+
+                points.setdefault(canonical_code(name), []).append((_epoch(updated), price_divine))
+
+            for to_exalt, to_chaos, updated in self.conn.execute("""
+
+                SELECT divine_to_exalt, divine_to_chaos, last_updated FROM currency_exchange_rates
+
+                WHERE league_id = ? AND last_updated IS NOT NULL
+
+            """, (self.league_id,)):
+
+                if to_exalt:
+
+                    points.setdefault('exalted', []).append((_epoch(updated), 1 / to_exalt))
+
+                if to_chaos:
+
+                    points.setdefault('chaos', []).append((_epoch(updated), 1 / to_chaos))
+
+        except sqlite3.OperationalError:
+
+            pass
+
+
+
+        history = {}
+
+        for code, rows in points.items():
+
+            rows.sort()
+
+            history[code] = ([t for t, _ in rows], [v for _, v in rows])
+
+        return history
+
+
+
+    def history(self, currency: str) -> tuple:
+
+        """(sorted epoch list, Divine values) recorded for `currency`"""
+
+        if self._history is None:
+
+            self._history = self._load_history()
+
+        return self._history.get(canonical_code(currency), ([], []))
+
+
+
+    def value_at(self, currency: str, when: When) -> float:
+
+        """Divine value in force at `when`; before the first record the earliest one is used"""
+
+        if canonical_code(currency) == 'divine':
+
+            return 1.0
+
+        times, values = self.history(currency)
+
+        if not times:
+
+            return self.value(currency)
+
+        i = bisect_right(times, _epoch(when)) - 1
+
+        return values[max(i, 0)]
+
+
+
+    def to_divine_at(self, amount: float, currency: str, when: When) -> float:
+
+        return (amount or 0) * self.value_at(currency, when)
+
+
+
+    def to_divine_many_at(self, amounts: Iterable[float], currencies: Iterable[str],
+
+                          whens: Iterable[When]) -> List[float]:
+
+        return [self.to_divine_at(a, c, w) for a, c, w in zip(amounts, currencies, whens)]
+
+
+
+    def close(self):
+
+        self.conn.close()
+
+
+
+
+
+_shared: Dict[tuple, CurrencyNormalizer] = {}
+
+
+
+
+
+def shared_normalizer(db_path: Path = DB_PATH, league_id: int = LEAGUE_ID) -> CurrencyNormalizer:
+
+    """Process-wide instance per (DB, league), refreshed at most every REFRESH_SECONDS"""
+
+    key = (str(db_path), league_id)
+
+    if key not in _shared:
+
+        _shared[key] = CurrencyNormalizer(league_id=league_id, db_path=db_path)
+
+    else:
+
+        _shared[key].maybe_refresh()
+
+    return _shared[key]
+
+
+
+
+
+def main():
+
+    print("="*60)
+
+    print("Currency Normalizer")
+
+    print("="*60)
+
+
+
+    normalizer = CurrencyNormalizer()
+
+    print(f"Currencies: {len(normalizer.codes)}")
+
+    print(f"1 Divine = {normalizer.rate('divine', 'exalted'):.1f} Exalted = "
+
+          f"{normalizer.rate('divine', 'chaos'):.1f} Chaos")
+
+    print("\nDivine value per unit:")
+
+    for code in sorted(normalizer.codes, key=lambda c: -normalizer.value(c))[:20]:
+
+        print(f"  {code:<40} {normalizer.value(code):.6f}")
+
+    normalizer.close()
+
+
+
+
+
+if __name__ == "__main__":
+
+    main()
+
@@ -0,0 +1,649 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Bulk Currency Pricer - trade exchange endpoint, no browser
+
+- 1 request for the static id table (currency / essence / omen names)
+
+- 1 exchange request per (anchor currency, want chunk) with all items wanted at once
+
+- pair quotes fitted into one log-value per currency (least squares), so the
+
+  cross-rate matrix is consistent: rate(a->c) == rate(a->b) * rate(b->c)
+
+- every CurrencyPrice row + raw pair quotes written in one transaction
+
+Responses can be recorded (--record DIR) and replayed (--replay DIR) for tests.
+
+"""
+
+import json
+
+import math
+
+import sqlite3
+
+import time
+
+from datetime import datetime
+
+from pathlib import Path
+
+from typing import Dict, List, Optional, Tuple
+
+
+
+import requests
+
+
+
+BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
+
+DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
+
+LEAGUE_ID = 1
+
+LEAGUE_NAME = "Fate of the Vaal"
+
+
+
+TRADE_BASE = "https://www.pathofexile.com/api/trade2"
+
+
+
+# Static category id -> currencies.type
+
+STATIC_CATEGORIES = {
+
+    'Currency': 'Orb',
+
+    'Essences': 'Essence',
+
+    'Ritual': 'Omen',
+
+}
+
+
+
+ANCHORS = ('exalted', 'chaos', 'divine')   # currencies we quote everything in
+
+NUMERAIRE = 'divine'
+
+WANT_CHUNK = 40             # wanted ids per exchange request
+
+QUOTE_DEPTH = 3             # best offers averaged per pair
+
+EXCHANGE_DELAY = 2          # seconds between live requests
+
+FIT_ITERATIONS = 500
+
+FIT_TOLERANCE = 1e-10
+
+
+
+
+
+class HttpTransport:
+
+    """Live trade API; optionally records every response to a directory"""
+
+    def __init__(self, record_dir: Optional[Path] = None):
+
+        self.session = requests.Session()
+
+        self.session.headers.update({
+
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+
+            "Accept": "application/json",
+
+            "Content-Type": "application/json"
+
+        })
+
+        self.record_dir = Path(record_dir) if record_dir else None
+
+        self.requests_made = 0
+
+
+
+    def fetch(self, name: str, url: str, body: Optional[dict] = None) -> dict:
+
+        if self.requests_made:
+
+            time.sleep(EXCHANGE_DELAY)
+
+        if body is None:
+
+            response = self.session.get(url, timeout=30)
+
+        else:
+
+            response = self.session.post(url, json=body, timeout=30)
+
+        self.requests_made += 1
+
+        response.raise_for_status()
+
+        data = response.json()
+
+        if self.record_dir:
+
+            self.record_dir.mkdir(parents=True, exist_ok=True)
+
+            with open(self.record_dir / f"{name}.json", 'w') as f:
+
+                json.dump(data, f, ensure_ascii=False)
+
+        return data
+
+
+
+
+
+class RecordedTransport:
+
+    """Replays responses saved by HttpTransport(record_dir=...)"""
+
+    def __init__(self, record_dir: Path):
+
+        self.record_dir = Path(record_dir)
+
+        self.requests_made = 0
+
+
+
+    def fetch(self, name: str, url: str, body: Optional[dict] = None) -> dict:
+
+        path = self.record_dir / f"{name}.json"
+
+        if not path.exists():
+
+            # A silent {} would replay as "no offers" and price nothing
+
+            raise FileNotFoundError(f"No recorded response '{name}' in {self.record_dir}")
+
+        self.requests_made += 1
+
+        with open(path, 'r') as f:
+
+            return json.load(f)
+
+
+
+
+
+def parse_static(data: dict) -> Dict[str, dict]:
+
+    """trade id -> {'name', 'type'} for the priced categories"""
+
+    entries = {}
+
+    for category in data.get('result', []):
+
+        ctype = STATIC_CATEGORIES.get(category.get('id'))
+
+        if not ctype:
+
+            continue
+
+        for entry in category.get('entries', []):
+
+            if entry.get('id') and entry.get('text'):
+
+                entries[entry['id']] = {
+
+                    'name': entry['text'],
+
+                    'type': 'Omen' if entry['text'].startswith('Omen') else ctype,
+
+                }
+
+    return entries
+
+
+
+
+
+def parse_exchange(data: dict) -> Dict[Tuple[str, str], List[tuple]]:
+
+    """(pay id, get id) -> [(rate pay-per-get, stock)] from one exchange response"""
+
+    offers: Dict[Tuple[str, str], List[tuple]] = {}
+
+    results = data.get('result') or {}
+
+    for listing in (results.values() if isinstance(results, dict) else results):
+
+        for offer in (listing or {}).get('listing', {}).get('offers', []):
+
+            pay = offer.get('exchange', {})
+
+            get = offer.get('item', {})
+
+            if pay.get('amount') and get.get('amount'):
+
+                offers.setdefault((pay['currency'], get['currency']), []).append(
+
+                    (pay['amount'] / get['amount'], get.get('stock')))
+
+    return offers
+
+
+
+
+
+class CrossRateFit:
+
+    """
+
+    One log-value per currency fitted to all pair quotes:
+
+        v[get] - v[pay] = log(rate)   (weighted by offer count)
+
+    Gauss-Seidel with v[NUMERAIRE] fixed at 0 -> values in Divine.
+
+    """
+
+    def __init__(self, quotes: List[dict], numeraire: str = NUMERAIRE):
+
+        self.numeraire = numeraire
+
+        self.edges: Dict[str, List[tuple]] = {}
+
+        for q in quotes:
+
+            w = math.log1p(q['offers'])
+
+            lr = math.log(q['rate'])
+
+            self.edges.setdefault(q['get'], []).append((q['pay'], lr, w))
+
+            self.edges.setdefault(q['pay'], []).append((q['get'], -lr, w))
+
+        self.values = self._solve()
+
+
+
+    def _solve(self) -> Dict[str, float]:
+
+        if self.numeraire not in self.edges:
+
+            return {}
+
+        # Only the component connected to the numeraire can be priced
+
+        reach, stack = {self.numeraire}, [self.numeraire]
+
+        while stack:
+
+            for other, _, _ in self.edges[stack.pop()]:
+
+                if other not in reach:
+
+                    reach.add(other)
+
+                    stack.append(other)
+
+
+
+        values = {c: 0.0 for c in reach}
+
+        order = sorted(reach - {self.numeraire})
+
+        for _ in range(FIT_ITERATIONS):
+
+            delta = 0.0
+
+            for c in order:
+
+                num = sum(w * (values[o] + lr) for o, lr, w in self.edges[c])
+
+                den = sum(w for _, _, w in self.edges[c])
+
+                new = num / den
+
+                delta = max(delta, abs(new - values[c]))
+
+                values[c] = new
+
+            if delta < FIT_TOLERANCE:
+
+                break
+
+        return values
+
+
+
+    def rate(self, pay: str, get: str) -> Optional[float]:
+
+        """Units of `pay` for one `get`"""
+
+        if pay in self.values and get in self.values:
+
+            return math.exp(self.values[get] - self.values[pay])
+
+        return None
+
+
+
+    def matrix(self, ids: List[str] = None) -> Dict[str, Dict[str, float]]:
+
+        """matrix[a][b] = units of b for one a"""
+
+        ids = ids or sorted(self.values)
+
+        return {a: {b: self.rate(b, a) for b in ids} for a in ids}
+
+
+
+    def max_residual(self) -> float:
+
+        """Largest |log| gap between a raw quote and the fitted rate"""
+
+        worst = 0.0
+
+        for get, edges in self.edges.items():
+
+            for pay, lr, _ in edges:
+
+                if get in self.values and pay in self.values:
+
+                    worst = max(worst, abs(self.values[get] - self.values[pay] - lr))
+
+        return worst
+
+
+
+
+
+class ExchangePricer:
+
+    def __init__(self, transport=None, league: str = LEAGUE_NAME):
+
+        self.transport = transport or HttpTransport()
+
+        self.league = league
+
+        self.static: Dict[str, dict] = {}
+
+        self.quotes: List[dict] = []
+
+        self.fit: Optional[CrossRateFit] = None
+
+
+
+    def fetch(self):
+
+        self.static = parse_static(self.transport.fetch('static', f"{TRADE_BASE}/data/static"))
+
+        ids = sorted(self.static)
+
+        offers: Dict[Tuple[str, str], List[tuple]] = {}
+
+        for anchor in ANCHORS:
+
+            wants = [i for i in ids if i != anchor]
+
+            for k in range(0, len(wants), WANT_CHUNK):
+
+                body = {
+
+                    "query": {
+
+                        "status": {"option": "online"},
+
+                        "have": [anchor],
+
+                        "want": wants[k:k + WANT_CHUNK]
+
+                    },
+
+                    "sort": {"have": "asc"},
+
+                    "engine": "new"
+
+                }
+
+                data = self.transport.fetch(f"exchange_{anchor}_{k // WANT_CHUNK}",
+
+                                            f"{TRADE_BASE}/exchange/poe2/{self.league}", body)
+
+                for pair, rows in parse_exchange(data).items():
+
+                    offers.setdefault(pair, []).extend(rows)
+
+
+
+        self.quotes = []
+
+        for (pay, get), rows in offers.items():
+
+            best = sorted(rows)[:QUOTE_DEPTH]
+
+            self.quotes.append({
+
+                'pay': pay,
+
+                'get': get,
+
+                'rate': sum(r for r, _ in best) / len(best),
+
+                'stock': sum(s or 0 for _, s in best),
+
+                'offers': len(rows),
+
+            })
+
+        self.fit = CrossRateFit(self.quotes)
+
+        return self
+
+
+
+    def prices(self) -> Dict[str, dict]:
+
+        """Currency name -> chaos/divine price from the fitted values"""
+
+        prices = {}
+
+        if not self.fit or 'chaos' not in self.fit.values:
+
+            return prices
+
+        for trade_id, value in self.fit.values.items():
+
+            info = self.static.get(trade_id, {'name': trade_id, 'type': 'Orb'})
+
+            prices[info['name']] = {
+
+                'type': info['type'],
+
+                'price_divine': math.exp(value),
+
+                'price_chaos': math.exp(value - self.fit.values['chaos']),
+
+            }
+
+        return prices
+
+
+
+    def write(self, conn: sqlite3.Connection, league_id: int = LEAGUE_ID) -> int:
+
+        """All CurrencyPrice rows and raw pair quotes in a single transaction"""
+
+        prices = self.prices()
+
+        if not prices:
+
+            return 0
+
+        now = datetime.now()
+
+        with conn:
+
+            ensure_quote_table(conn)
+
+            ids = dict(conn.execute("SELECT name, id FROM currencies").fetchall())
+
+            for name, p in prices.items():
+
+                if name not in ids:
+
+                    cur = conn.execute("INSERT INTO currencies (name, type) VALUES (?, ?)", (name, p['type']))
+
+                    ids[name] = cur.lastrowid
+
+            conn.execute(f"""
+
+                DELETE FROM currency_prices WHERE league_id = ?
+
+                AND currency_id IN ({','.join('?' * len(prices))})
+
+            """, [league_id] + [ids[n] for n in prices])
+
+            conn.executemany("""
+
+                INSERT INTO currency_prices (league_id, currency_id, price_chaos, price_divine, last_updated)
+
+                VALUES (?, ?, ?, ?, ?)
+
+            """, [(league_id, ids[n], p['price_chaos'], p['price_divine'], now) for n, p in prices.items()])
+
+            conn.executemany("""
+
+                INSERT INTO currency_pair_quotes
+
+                (league_id, pay_currency, get_currency, rate, stock, offers, source, recorded_at)
+
+                VALUES (?, ?, ?, ?, ?, ?, 'trade_exchange', ?)
+
+            """, [(league_id, self.name_of(q['pay']), self.name_of(q['get']), q['rate'],
+
+                   q['stock'], q['offers'], now) for q in self.quotes])
+
+        return len(prices)
+
+
+
+    def name_of(self, trade_id: str) -> str:
+
+        return self.static.get(trade_id, {}).get('name', trade_id)
+
+
+
+
+
+def ensure_quote_table(conn: sqlite3.Connection):
+
+    """Same schema as models.CurrencyPairQuote, for DBs created before it existed"""
+
+    conn.execute("""
+
+        CREATE TABLE IF NOT EXISTS currency_pair_quotes (
+
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+
+            league_id INTEGER REFERENCES leagues(id),
+
+            pay_currency VARCHAR(100),
+
+            get_currency VARCHAR(100),
+
+            rate FLOAT,
+
+            stock INTEGER,
+
+            offers INTEGER,
+
+            source VARCHAR(50),
+
+            recorded_at DATETIME
+
+        )
+
+    """)
+
+    conn.execute("""
+
+        CREATE INDEX IF NOT EXISTS idx_pair_quotes_time
+
+        ON currency_pair_quotes(league_id, recorded_at)
+
+    """)
+
+
+
+
+
+def main():
+
+    import sys
+
+
+
+    transport = None
+
+    if '--replay' in sys.argv:
+
+        transport = RecordedTransport(Path(sys.argv[sys.argv.index('--replay') + 1]))
+
+    elif '--record' in sys.argv:
+
+        transport = HttpTransport(Path(sys.argv[sys.argv.index('--record') + 1]))
+
+
+
+    print("="*60)
+
+    print("Bulk Currency Pricer (trade exchange)")
+
+    print(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    print("="*60)
+
+
+
+    pricer = ExchangePricer(transport).fetch()
+
+    prices = pricer.prices()
+
+    print(f"Requests: {pricer.transport.requests_made}")
+
+    print(f"Pair quotes: {len(pricer.quotes)}, priced currencies: {len(prices)}")
+
+    if pricer.fit:
+
+        print(f"Max quote residual: {pricer.fit.max_residual()*100:.2f}% (log)")
+
+
+
+    for name, p in sorted(prices.items(), key=lambda kv: -kv[1]['price_divine'])[:15]:
+
+        print(f"  {name:<35} {p['price_divine']:10.4f} div  {p['price_chaos']:10.2f} chaos")
+
+
+
+    if prices and '--dry-run' not in sys.argv:
+
+        conn = sqlite3.connect(DB_PATH)
+
+        written = pricer.write(conn)
+
+        conn.close()
+
+        print(f"\n[DB] Wrote {written} currency prices in one transaction")
+
+
+
+
+
+if __name__ == "__main__":
+
+    main()
+
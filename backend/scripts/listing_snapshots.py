@@ -0,0 +1,633 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Listing Snapshot Differ
+
+Every collection pass stores the listing ids (and known prices) a search
+
+returned. Consecutive snapshots of the same search are diffed as id maps,
+
+linear in listing count, to infer:
+
+- sold:      a cheap listing vanished (buyers take the floor first)
+
+- delisted:  a listing further up the price ladder vanished
+
+- repriced:  same listing id, different price
+
+Listings pushed out of a truncated result window by newer, cheaper ones are
+
+not counted. Sales aggregate into velocity per (base, mod signature), which
+
+fills FinishedPrice.sales_count_24h / avg_sale_time_hours.
+
+"""
+
+import json
+
+import os
+
+import sqlite3
+
+import sys
+
+import time
+
+from datetime import datetime
+
+from pathlib import Path
+
+from typing import Dict, List, Optional
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+from scripts.outcome_index import signature
+
+
+
+BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
+
+DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
+
+SNAPSHOT_PATH = BASE_DIR / "data" / "listing_snapshots.db"
+
+LEAGUE_ID = 1
+
+
+
+SALE_RANK = 5               # vanished listings this close to the floor count as sales
+
+KEEP_SNAPSHOTS = 3          # snapshots kept per search (events keep the history)
+
+VELOCITY_HOURS = 24
+
+
+
+
+
+def _now() -> float:
+
+    return time.time()
+
+
+
+
+
+def signature_key(mods) -> str:
+
+    """'id:tier,id:tier' form of outcome_index.signature ('' = base only)"""
+
+    return ','.join(f"{m}:{t}" for m, t in signature(mods))
+
+
+
+
+
+def _parse_indexed(value: Optional[str]) -> Optional[float]:
+
+    """Trade API 'indexed' timestamp -> epoch seconds"""
+
+    if not value:
+
+        return None
+
+    try:
+
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+    except ValueError:
+
+        return None
+
+
+
+
+
+def diff_snapshots(prev: Dict[str, dict], curr: Dict[str, dict], truncated: bool,
+
+                   now: float, sale_rank: int = SALE_RANK) -> List[dict]:
+
+    """
+
+    prev / curr: listing_id -> {'rank', 'amount', 'currency', 'listed_at'}
+
+    truncated:   the current search returned fewer ids than its total
+
+    """
+
+    events = []
+
+    new_count = sum(1 for listing_id in curr if listing_id not in prev)
+
+    # A listing this deep in the old window may just have been pushed past the end
+
+    push_rank = len(curr) - new_count
+
+
+
+    for listing_id, old in prev.items():
+
+        new = curr.get(listing_id)
+
+        if new is None:
+
+            if truncated and old['rank'] >= push_rank:
+
+                continue
+
+            listed_at = old.get('listed_at')
+
+            events.append({
+
+                'listing_id': listing_id,
+
+                'event': 'sold' if old['rank'] < sale_rank else 'delisted',
+
+                'amount': old.get('amount'),
+
+                'currency': old.get('currency'),
+
+                'old_amount': None,
+
+                'listed_hours': (now - listed_at) / 3600 if listed_at else None,
+
+            })
+
+        elif (old.get('amount') is not None and new.get('amount') is not None
+
+              and (old['amount'], old.get('currency')) != (new['amount'], new.get('currency'))):
+
+            events.append({
+
+                'listing_id': listing_id,
+
+                'event': 'repriced',
+
+                'amount': new['amount'],
+
+                'currency': new.get('currency'),
+
+                'old_amount': old['amount'],
+
+                'listed_hours': None,
+
+            })
+
+    return events
+
+
+
+
+
+class ListingSnapshotStore:
+
+    def __init__(self, path: Path = SNAPSHOT_PATH):
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.conn = sqlite3.connect(str(path), timeout=30, isolation_level=None)
+
+        self.conn.row_factory = sqlite3.Row
+
+        self.conn.execute("PRAGMA journal_mode=WAL")
+
+        self._create_tables()
+
+
+
+    def _create_tables(self):
+
+        self.conn.executescript("""
+
+            CREATE TABLE IF NOT EXISTS snapshots (
+
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+
+                search_key TEXT NOT NULL,
+
+                base_type TEXT,
+
+                signature TEXT DEFAULT '',
+
+                total INTEGER,
+
+                taken_at REAL
+
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_snapshots_key ON snapshots(search_key, taken_at);
+
+            CREATE TABLE IF NOT EXISTS snapshot_listings (
+
+                snapshot_id INTEGER NOT NULL,
+
+                listing_id TEXT NOT NULL,
+
+                rank INTEGER,
+
+                amount REAL,
+
+                currency TEXT,
+
+                listed_at REAL,
+
+                PRIMARY KEY (snapshot_id, listing_id)
+
+            );
+
+            CREATE TABLE IF NOT EXISTS listing_events (
+
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+
+                search_key TEXT,
+
+                base_type TEXT,
+
+                signature TEXT DEFAULT '',
+
+                listing_id TEXT,
+
+                event TEXT,
+
+                amount REAL,
+
+                currency TEXT,
+
+                old_amount REAL,
+
+                listed_hours REAL,
+
+                detected_at REAL
+
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_listing_events_group
+
+                ON listing_events(base_type, signature, detected_at);
+
+        """)
+
+
+
+    def _write(self, fn):
+
+        """Run fn inside an IMMEDIATE transaction (one writer at a time)"""
+
+        self.conn.execute("BEGIN IMMEDIATE")
+
+        try:
+
+            result = fn()
+
+            self.conn.execute("COMMIT")
+
+            return result
+
+        except Exception:
+
+            self.conn.execute("ROLLBACK")
+
+            raise
+
+
+
+    def _latest(self, search_key: str) -> Optional[int]:
+
+        row = self.conn.execute(
+
+            "SELECT id FROM snapshots WHERE search_key = ? ORDER BY taken_at DESC, id DESC LIMIT 1",
+
+            (search_key,)).fetchone()
+
+        return row['id'] if row else None
+
+
+
+    def _listings(self, snapshot_id: int) -> Dict[str, dict]:
+
+        return {
+
+            row['listing_id']: dict(row)
+
+            for row in self.conn.execute(
+
+                "SELECT listing_id, rank, amount, currency, listed_at FROM snapshot_listings "
+
+                "WHERE snapshot_id = ?", (snapshot_id,))
+
+        }
+
+
+
+    def known_prices(self, search_key: str) -> Dict[str, tuple]:
+
+        """listing_id -> (amount, currency) from the latest snapshot of a search"""
+
+        snapshot_id = self._latest(search_key)
+
+        if not snapshot_id:
+
+            return {}
+
+        return {lid: (row['amount'], row['currency']) for lid, row in self._listings(snapshot_id).items()}
+
+
+
+    def record(self, search_key: str, listing_ids: List[str], priced: Dict[str, dict] = None,
+
+               total: Optional[int] = None, base_type: str = None, mods=()) -> Dict[str, int]:
+
+        """
+
+        Store one search result (ids in price order) and diff it against the previous pass.
+
+        priced: listing_id -> {'amount', 'currency', 'indexed'} for the fetched listings.
+
+        Returns event counts.
+
+        """
+
+        priced = priced or {}
+
+        sig = signature_key(mods)
+
+        now = _now()
+
+
+
+        def run():
+
+            prev_id = self._latest(search_key)
+
+            prev = self._listings(prev_id) if prev_id else {}
+
+
+
+            curr = {}
+
+            for rank, listing_id in enumerate(listing_ids):
+
+                info = priced.get(listing_id, {})
+
+                old = prev.get(listing_id, {})
+
+                curr[listing_id] = {
+
+                    'rank': rank,
+
+                    'amount': info.get('amount', old.get('amount')),
+
+                    'currency': info.get('currency', old.get('currency')),
+
+                    'listed_at': _parse_indexed(info.get('indexed')) or old.get('listed_at') or now,
+
+                }
+
+
+
+            cur = self.conn.execute("""
+
+                INSERT INTO snapshots (search_key, base_type, signature, total, taken_at)
+
+                VALUES (?, ?, ?, ?, ?)
+
+            """, (search_key, base_type, sig, total, now))
+
+            snapshot_id = cur.lastrowid
+
+            self.conn.executemany("""
+
+                INSERT INTO snapshot_listings (snapshot_id, listing_id, rank, amount, currency, listed_at)
+
+                VALUES (?, ?, ?, ?, ?, ?)
+
+            """, [(snapshot_id, lid, c['rank'], c['amount'], c['currency'], c['listed_at'])
+
+                  for lid, c in curr.items()])
+
+
+
+            counts = {'sold': 0, 'delisted': 0, 'repriced': 0, 'new': 0}
+
+            if prev_id:
+
+                truncated = total is not None and total > len(listing_ids)
+
+                events = diff_snapshots(prev, curr, truncated, now)
+
+                self.conn.executemany("""
+
+                    INSERT INTO listing_events
+
+                    (search_key, base_type, signature, listing_id, event, amount, currency,
+
+                     old_amount, listed_hours, detected_at)
+
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+
+                """, [(search_key, base_type, sig, e['listing_id'], e['event'], e['amount'],
+
+                       e['currency'], e['old_amount'], e['listed_hours'], now) for e in events])
+
+                for e in events:
+
+                    counts[e['event']] += 1
+
+                counts['new'] = sum(1 for lid in curr if lid not in prev)
+
+            self._prune(search_key)
+
+            return counts
+
+        return self._write(run)
+
+
+
+    def _prune(self, search_key: str):
+
+        old = [row['id'] for row in self.conn.execute(
+
+            "SELECT id FROM snapshots WHERE search_key = ? ORDER BY taken_at DESC, id DESC LIMIT -1 OFFSET ?",
+
+            (search_key, KEEP_SNAPSHOTS))]
+
+        if old:
+
+            marks = ','.join('?' * len(old))
+
+            self.conn.execute(f"DELETE FROM snapshot_listings WHERE snapshot_id IN ({marks})", old)
+
+            self.conn.execute(f"DELETE FROM snapshots WHERE id IN ({marks})", old)
+
+
+
+    def velocity(self, hours: float = VELOCITY_HOURS) -> Dict[tuple, dict]:
+
+        """(base_type, signature) -> sales / delists / reprices in the window and avg hours to sell"""
+
+        since = _now() - hours * 3600
+
+        result = {}
+
+        for row in self.conn.execute("""
+
+            SELECT base_type, signature,
+
+                   SUM(event = 'sold') AS sold,
+
+                   SUM(event = 'delisted') AS delisted,
+
+                   SUM(event = 'repriced') AS repriced,
+
+                   AVG(CASE WHEN event = 'sold' THEN listed_hours END) AS avg_sale_hours
+
+            FROM listing_events
+
+            WHERE detected_at >= ?
+
+            GROUP BY base_type, signature
+
+        """, (since,)):
+
+            result[(row['base_type'], row['signature'] or '')] = {
+
+                'sold': row['sold'] or 0,
+
+                'delisted': row['delisted'] or 0,
+
+                'repriced': row['repriced'] or 0,
+
+                'avg_sale_hours': row['avg_sale_hours'],
+
+            }
+
+        return result
+
+
+
+    def close(self):
+
+        self.conn.close()
+
+
+
+
+
+def apply_to_finished_prices(conn: sqlite3.Connection, velocity: Dict[tuple, dict],
+
+                             league_id: int = LEAGUE_ID) -> int:
+
+    """Fill sales_count_24h / avg_sale_time_hours; exact mod signature first, else base level"""
+
+    rows = conn.execute("""
+
+        SELECT fp.id, ib.name, fp.target_mods FROM finished_prices fp
+
+        JOIN item_bases ib ON fp.item_base_id = ib.id
+
+        WHERE fp.league_id = ?
+
+    """, (league_id,)).fetchall()
+
+
+
+    updates = []
+
+    for fp_id, base_name, target_mods in rows:
+
+        try:
+
+            mods = [(m['modifier_id'], m.get('tier')) for m in json.loads(target_mods or '[]')
+
+                    if isinstance(m, dict) and m.get('modifier_id')]
+
+        except (ValueError, TypeError):
+
+            mods = []
+
+        stats = velocity.get((base_name, signature_key(mods))) or velocity.get((base_name, ''))
+
+        if stats:
+
+            updates.append((stats['sold'], stats['avg_sale_hours'], fp_id))
+
+
+
+    with conn:
+
+        conn.executemany(
+
+            "UPDATE finished_prices SET sales_count_24h = ?, avg_sale_time_hours = ? WHERE id = ?",
+
+            updates)
+
+    return len(updates)
+
+
+
+
+
+def main():
+
+    print("="*60)
+
+    print("Listing Snapshot Velocity")
+
+    print("="*60)
+
+
+
+    store = ListingSnapshotStore()
+
+    velocity = store.velocity()
+
+    searches = store.conn.execute("SELECT COUNT(DISTINCT search_key) FROM snapshots").fetchone()[0]
+
+    store.close()
+
+
+
+    print(f"Searches tracked: {searches}")
+
+    print(f"Groups with events (last {VELOCITY_HOURS}h): {len(velocity)}")
+
+
+
+    print("\nFastest movers:")
+
+    for (base, sig), stats in sorted(velocity.items(), key=lambda kv: -kv[1]['sold'])[:15]:
+
+        hours = f"{stats['avg_sale_hours']:.1f}h" if stats['avg_sale_hours'] is not None else "-"
+
+        label = f"{base} [{sig}]" if sig else base
+
+        print(f"  {label[:45]:<45} sold {stats['sold']:3d}  delisted {stats['delisted']:3d}  "
+
+              f"repriced {stats['repriced']:3d}  to sell {hours}")
+
+
+
+    conn = sqlite3.connect(DB_PATH)
+
+    updated = apply_to_finished_prices(conn, velocity)
+
+    conn.close()
+
+    print(f"\n[DB] FinishedPrice rows updated: {updated}")
+
+
+
+
+
+if __name__ == "__main__":
+
+    main()
+
@@ -0,0 +1,531 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Trade Listing Mod-Text Parser
+
+"+44% of [Armour|Armour] also applies to [ElementalDamage|Elemental Damage]"
+
+  -> template "#% of armour also applies to elemental damage", values [44.0]
+
+  -> (modifier_id, tier) from the modifiers / modifier_tiers tables
+
+Templates are canonicalised once, so most lines resolve with one dict lookup;
+
+the rest go through a token-set index (word order / punctuation / plurals ignored).
+
+"""
+
+import json
+
+import os
+
+import re
+
+import sqlite3
+
+import sys
+
+import time
+
+from pathlib import Path
+
+from typing import Dict, List, Optional, Tuple
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+from scripts.roll_values import RANGE_PATTERN, load_mod_tier_bounds, parse_value_ranges
+
+
+
+BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
+
+DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
+
+LISTINGS_FILE = BASE_DIR / "data" / "profitable_items.json"
+
+PARSED_FILE = BASE_DIR / "data" / "parsed_listings.json"
+
+
+
+# [Tag|Display] -> Display, [Display] -> Display
+
+MARKUP_PATTERN = re.compile(r'\[(?:[^\]|]*\|)?([^\]]*)\]')
+
+NUMBER_PATTERN = re.compile(r'[+-]?\d+(?:\.\d+)?')
+
+# hybrid names are stored glued: "#% increased Armour# to maximum Life"
+
+HYBRID_SPLIT = re.compile(r'(?<=[A-Za-z])(?=[+-]?#)')
+
+TOKEN_PATTERN = re.compile(r'[a-z]+')
+
+# modifier_id() cache is dropped wholesale once it holds this many line shapes
+
+LINE_CACHE_SIZE = 200000
+
+# Lines that differ only in their digits share a template
+
+DIGITS = str.maketrans('', '', '0123456789')
+
+
+
+
+
+def token_set(key: str) -> frozenset:
+
+    return frozenset(t.rstrip('s') for t in TOKEN_PATTERN.findall(key))
+
+
+
+
+
+def strip_markup(line: str) -> str:
+
+    return MARKUP_PATTERN.sub(r'\1', line)
+
+
+
+
+
+def canonical(text: str) -> Tuple[str, List[float]]:
+
+    """Template key (numbers -> '#', sign dropped, lower-case) and the numbers in order"""
+
+    values = []
+
+
+
+    def repl(m):
+
+        values.append(float(m.group(0)))
+
+        return '#'
+
+
+
+    text = RANGE_PATTERN.sub('#', text)
+
+    text = NUMBER_PATTERN.sub(repl, text)
+
+    return ' '.join(text.replace('+#', '#').lower().split()), values
+
+
+
+
+
+def load_tier_index(conn: sqlite3.Connection) -> Dict[tuple, List[tuple]]:
+
+    """
+
+    (template key, item_type, mod_type) -> [(tier, min_value, max_value)] from mod_tiers,
+
+    best tier first. Rows without a typed mod group are under (key, None, None).
+
+    """
+
+    index: Dict[tuple, List[tuple]] = {}
+
+    for (template, item_type, mod_type, tier), (lo, hi) in load_mod_tier_bounds(conn).items():
+
+        index.setdefault((canonical(template)[0], item_type, mod_type), []).append((tier, lo, hi))
+
+    for rows in index.values():
+
+        rows.sort(reverse=True)
+
+    return index
+
+
+
+
+
+def tier_ladder(index: Dict[tuple, List[tuple]], key: str, item_type: Optional[str],
+
+                mod_type: Optional[str]) -> List[tuple]:
+
+    """Tier rows of one mod on one item type; untyped rows are the fallback"""
+
+    return index.get((key, item_type, mod_type)) or index.get((key, None, None)) or []
+
+
+
+
+
+class ModParser:
+
+    def __init__(self, conn: sqlite3.Connection):
+
+        # template -> [(modifier_id, name, mod_type, part index, part count)]
+
+        self.templates: Dict[str, List[tuple]] = {}
+
+        # (modifier_id, item_type) -> [(tier, min_ilvl)]
+
+        self.tiers: Dict[tuple, List[tuple]] = {}
+
+        # (template, item_type, mod_type) -> [(tier, min_value, max_value)], best tier first
+
+        self.bounds: Dict[tuple, List[tuple]] = load_tier_index(conn)
+
+        self.token_sets: Dict[tuple, List[str]] = {}
+
+        # (modifier_id, part index) -> value ranges written in that part of the name
+
+        self.part_ranges: Dict[tuple, List[Tuple[float, float]]] = {}
+
+        self._cache: Dict[tuple, Optional[dict]] = {}
+
+        self._line_cache: Dict[tuple, Optional[int]] = {}
+
+
+
+        for mod_id, name, mod_type in conn.execute("SELECT id, name, mod_type FROM modifiers"):
+
+            parts = [p for p in HYBRID_SPLIT.split(name) if p.strip()]
+
+            for k, part in enumerate(parts):
+
+                key = canonical(part)[0]
+
+                self.part_ranges[(mod_id, k)] = parse_value_ranges(part)
+
+                self.templates.setdefault(key, []).append((mod_id, name, mod_type, k, len(parts)))
+
+
+
+        for mod_id, item_type, tier, min_ilvl in conn.execute(
+
+                "SELECT modifier_id, item_type, tier, min_ilvl FROM modifier_tiers"):
+
+            self.tiers.setdefault((mod_id, item_type), []).append((tier, min_ilvl))
+
+
+
+        for key in self.templates:
+
+            self.token_sets.setdefault((token_set(key), key.count('#')), []).append(key)
+
+
+
+    # ------------------------------------------------------------
+
+    # Matching
+
+    # ------------------------------------------------------------
+
+    def _fuzzy(self, key: str) -> Optional[str]:
+
+        """Template with the same words and '#' count ("Evasion Rating, +#" style variants)"""
+
+        keys = self.token_sets.get((token_set(key), key.count('#')))
+
+        return keys[0] if keys else None
+
+
+
+    def _fits(self, candidate: tuple, values: List[float]) -> bool:
+
+        """Rolled values inside the ranges written in the candidate's own name part"""
+
+        ranges = self.part_ranges.get((candidate[0], candidate[3]))
+
+        return bool(ranges and values and len(ranges) <= len(values)
+
+                    and all(lo <= v <= hi for (lo, hi), v in zip(ranges, values)))
+
+
+
+    def _pick(self, candidates: List[tuple], item_type: Optional[str],
+
+              values: Optional[List[float]] = None) -> tuple:
+
+        """
+
+        Prefer mods rollable on the item type, then mods whose own range holds
+
+        the rolled value, then single-line (non-hybrid) mods
+
+        """
+
+        if item_type:
+
+            on_type = [c for c in candidates if (c[0], item_type) in self.tiers]
+
+            candidates = on_type or candidates
+
+        if values and len(candidates) > 1:
+
+            fitting = [c for c in candidates if self._fits(c, values)]
+
+            candidates = fitting or candidates
+
+        return min(candidates, key=lambda c: c[4])
+
+
+
+    def match_template(self, key: str, item_type: Optional[str] = None,
+
+                       values: Optional[List[float]] = None) -> Tuple[Optional[tuple], Optional[str]]:
+
+        """(modifier_id, name, mod_type, part, count) for a template key, and 'exact' / 'fuzzy'"""
+
+        candidates = self.templates.get(key)
+
+        if candidates:
+
+            return self._pick(candidates, item_type, values), 'exact'
+
+        fuzzy = self._fuzzy(key)
+
+        candidates = self.templates.get(fuzzy) if fuzzy else None
+
+        if candidates:
+
+            return self._pick(candidates, item_type, values), 'fuzzy'
+
+        return None, None
+
+
+
+    def _tier(self, picked: tuple, key: str, values: List[float], item_type: Optional[str],
+
+              ilvl: Optional[int]) -> Tuple[Optional[int], bool]:
+
+        """
+
+        (tier, exact) - the tier whose value bounds hold the rolled (first) value;
+
+        a value outside every tier gets the nearest one, not exact.
+
+        None when the template has no bounds and the name carries no range.
+
+        """
+
+        tiers = tier_ladder(self.bounds, key, item_type, picked[2])
+
+        if tiers and values:
+
+            value = values[0]
+
+            for tier, lo, hi in tiers:
+
+                if lo <= value <= hi:
+
+                    return tier, True
+
+            nearest = min(tiers, key=lambda t: max(t[1] - value, value - t[2]))
+
+            return nearest[0], False
+
+        # Desecrated names carry their own range: a value inside it pins the tier row
+
+        rows = self.tiers.get((picked[0], item_type), []) if item_type else []
+
+        if ilvl is not None:
+
+            rows = [r for r in rows if r[1] <= ilvl] or rows
+
+        if rows and self._fits(picked, values):
+
+            return max(rows)[0], True
+
+        return None, False
+
+
+
+    def parse_line(self, line: str, item_type: Optional[str] = None,
+
+                   ilvl: Optional[int] = None) -> dict:
+
+        text = strip_markup(line).strip()
+
+        key, values = canonical(text)
+
+        cache_key = (key, item_type, ilvl, tuple(values))
+
+        if cache_key not in self._cache:
+
+            picked, match = self.match_template(key, item_type, values)
+
+            if picked:
+
+                mod_id, name, mod_type, part, count = picked
+
+                tier, tier_exact = self._tier(picked, key, values, item_type, ilvl)
+
+                self._cache[cache_key] = {
+
+                    'modifier_id': mod_id, 'name': name, 'mod_type': mod_type,
+
+                    'hybrid_part': part if count > 1 else None,
+
+                    'tier': tier, 'tier_exact': tier_exact, 'match': match,
+
+                }
+
+            else:
+
+                self._cache[cache_key] = None
+
+
+
+        resolved = self._cache[cache_key]
+
+        result = {'text': text, 'template': key, 'values': values}
+
+        result.update(resolved or {'modifier_id': None, 'match': None})
+
+        return result
+
+
+
+    def modifier_id(self, line: str, item_type: Optional[str] = None) -> Optional[int]:
+
+        """
+
+        Fast path for bulk counting: modifier_id only (no values / tier),
+
+        cached on the digit-less line so re-rolled values skip the regexes entirely
+
+        """
+
+        cache_key = (line.translate(DIGITS), item_type)
+
+        try:
+
+            return self._line_cache[cache_key]
+
+        except KeyError:
+
+            pass
+
+        if len(self._line_cache) >= LINE_CACHE_SIZE:
+
+            self._line_cache.clear()
+
+        picked, _ = self.match_template(canonical(strip_markup(line).strip())[0], item_type)
+
+        mod_id = picked[0] if picked else None
+
+        self._line_cache[cache_key] = mod_id
+
+        return mod_id
+
+
+
+    def parse_listing(self, listing: dict, item_type: Optional[str] = None) -> dict:
+
+        """Listing as saved in profitable_items.json (mods.explicit / mods.implicit)"""
+
+        mods = listing.get('mods', {})
+
+        ilvl = listing.get('ilvl')
+
+        return {
+
+            'base_type': listing.get('base_type'),
+
+            'ilvl': ilvl,
+
+            'price': {'amount': listing.get('price_amount'), 'currency': listing.get('price_currency')},
+
+            'explicit': [self.parse_line(l, item_type, ilvl) for l in mods.get('explicit', [])],
+
+            'implicit': [self.parse_line(l, item_type, ilvl) for l in mods.get('implicit', [])],
+
+        }
+
+
+
+
+
+def main():
+
+    print("="*60)
+
+    print("Listing Mod Parser")
+
+    print("="*60)
+
+
+
+    from scripts.build_demand import load_base_item_types
+
+
+
+    conn = sqlite3.connect(DB_PATH)
+
+    start = time.time()
+
+    parser = ModParser(conn)
+
+    base_types = load_base_item_types(conn)
+
+    conn.close()
+
+    print(f"Templates: {len(parser.templates)} (compiled in {time.time() - start:.2f}s)")
+
+
+
+    with open(LISTINGS_FILE, 'r') as f:
+
+        listings = json.load(f).get('expensive_items', [])
+
+
+
+    start = time.time()
+
+    parsed = [parser.parse_listing(l, base_types.get(l.get('base_type'))) for l in listings]
+
+    elapsed = time.time() - start
+
+
+
+    lines = [m for p in parsed for m in p['explicit']]
+
+    matched = [m for m in lines if m['modifier_id']]
+
+    print(f"Listings: {len(parsed)}, explicit lines: {len(lines)}, matched: {len(matched)} "
+
+          f"({len(matched) / max(len(lines), 1) * 100:.1f}%)")
+
+    print(f"Parse time: {elapsed * 1000:.1f} ms")
+
+
+
+    unmatched = sorted({m['template'] for m in lines if not m['modifier_id']})
+
+    if unmatched:
+
+        print("\nUnmatched templates:")
+
+        for t in unmatched[:15]:
+
+            print(f"  {t}")
+
+
+
+    PARSED_FILE.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(PARSED_FILE, 'w') as f:
+
+        json.dump(parsed, f, indent=2, ensure_ascii=False)
+
+    print(f"\nSaved to: {PARSED_FILE}")
+
+
+
+
+
+if __name__ == "__main__":
+
+    main()
+
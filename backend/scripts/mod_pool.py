@@ -0,0 +1,311 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Compiled Modifier Pools
+
+Loads the modifier tiers of one item type once into flat, index-aligned lists
+
+so probability engines can work on arrays instead of re-querying the DB
+
+"""
+
+import json
+
+import sqlite3
+
+from pathlib import Path
+
+from typing import Dict, List, Optional, Tuple
+
+
+
+BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
+
+DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
+
+
+
+MOD_TYPES = ('prefix', 'suffix')
+
+
+
+
+
+class CompiledModPool:
+
+    """
+
+    Every tier row rollable on (item_type, ilvl), stored column-wise.
+
+    Entry i of each list describes the same tier row.
+
+    """
+
+    def __init__(self, item_type: str, ilvl: int, rows: List[dict]):
+
+        self.item_type = item_type
+
+        self.ilvl = ilvl
+
+        self.modifier_ids: List[int] = []
+
+        self.names: List[str] = []
+
+        self.mod_types: List[str] = []
+
+        self.tiers: List[int] = []
+
+        self.min_ilvls: List[int] = []
+
+        self.weights: List[int] = []
+
+        self.tags: List[Tuple[str, ...]] = []
+
+        self.is_desecrated: List[bool] = []
+
+
+
+        for row in rows:
+
+            self.modifier_ids.append(row['id'])
+
+            self.names.append(row['name'])
+
+            self.mod_types.append(row['mod_type'])
+
+            self.tiers.append(row['tier'])
+
+            self.min_ilvls.append(row['min_ilvl'])
+
+            self.weights.append(row['weight'] or 0)
+
+            self.tags.append(tuple(row['tags']))
+
+            self.is_desecrated.append(bool(row.get('is_desecrated', False)))
+
+
+
+        # Index lists per affix type and per tag
+
+        self.indices_by_type: Dict[str, List[int]] = {t: [] for t in MOD_TYPES}
+
+        self.tag_index: Dict[str, List[int]] = {}
+
+        for i, mod_type in enumerate(self.mod_types):
+
+            self.indices_by_type.setdefault(mod_type, []).append(i)
+
+            for tag in self.tags[i]:
+
+                self.tag_index.setdefault(tag, []).append(i)
+
+
+
+        self.total_weight: Dict[str, int] = {
+
+            mod_type: sum(self.weights[i] for i in indices)
+
+            for mod_type, indices in self.indices_by_type.items()
+
+        }
+
+
+
+    def __len__(self) -> int:
+
+        return len(self.weights)
+
+
+
+    def find(self, name: str, mod_type: str = None) -> List[int]:
+
+        """Indices whose name contains `name` ('#' placeholders ignored)"""
+
+        needle = name.replace('#', '').strip().lower()
+
+        candidates = self.indices_by_type.get(mod_type, []) if mod_type else range(len(self))
+
+        return [i for i in candidates
+
+                if needle in self.names[i].replace('#', '').strip().lower()]
+
+
+
+    def probability(self, index: int) -> float:
+
+        """Chance that one roll of this entry's affix type lands on the entry"""
+
+        total = self.total_weight.get(self.mod_types[index], 0)
+
+        return self.weights[index] / total if total > 0 else 0.0
+
+
+
+    def entry(self, index: int) -> dict:
+
+        """Row-shaped view of one entry (same keys as get_available_mods)"""
+
+        return {
+
+            'id': self.modifier_ids[index],
+
+            'name': self.names[index],
+
+            'mod_type': self.mod_types[index],
+
+            'tags': list(self.tags[index]),
+
+            'tier': self.tiers[index],
+
+            'min_ilvl': self.min_ilvls[index],
+
+            'weight': self.weights[index],
+
+            'is_desecrated': self.is_desecrated[index],
+
+        }
+
+
+
+
+
+def compile_pool(conn: sqlite3.Connection, item_type: str, ilvl: int,
+
+                 include_desecrated: bool = False) -> CompiledModPool:
+
+    """Run the pool query once and compile the result"""
+
+    query = """
+
+        SELECT
+
+            m.id,
+
+            m.name,
+
+            m.mod_type,
+
+            m.tags,
+
+            mt.tier,
+
+            mt.min_ilvl,
+
+            mt.weight,
+
+            mt.is_desecrated
+
+        FROM modifiers m
+
+        JOIN modifier_tiers mt ON m.id = mt.modifier_id
+
+        WHERE mt.item_type = ?
+
+        AND mt.min_ilvl <= ?
+
+    """
+
+    if not include_desecrated:
+
+        query += " AND mt.is_desecrated = 0"
+
+    query += " ORDER BY m.mod_type, mt.weight DESC, m.id"
+
+
+
+    rows = []
+
+    for row in conn.execute(query, (item_type, ilvl)).fetchall():
+
+        rows.append({
+
+            'id': row[0],
+
+            'name': row[1],
+
+            'mod_type': row[2],
+
+            'tags': json.loads(row[3]) if row[3] else [],
+
+            'tier': row[4],
+
+            'min_ilvl': row[5],
+
+            'weight': row[6],
+
+            'is_desecrated': bool(row[7]),
+
+        })
+
+    return CompiledModPool(item_type, ilvl, rows)
+
+
+
+
+
+class ModPoolCache:
+
+    """
+
+    Compiles each (item_type, ilvl) pool once per connection.
+
+    `pools` seeds the cache with already compiled pools (e.g. a snapshot handed
+
+    to worker processes); the DB is only opened for pools that are missing.
+
+    """
+
+    def __init__(self, conn: Optional[sqlite3.Connection] = None, db_path: Path = DB_PATH,
+
+                 pools: Optional[Dict[tuple, CompiledModPool]] = None):
+
+        self.conn = conn
+
+        self.db_path = db_path
+
+        self._pools: Dict[tuple, CompiledModPool] = dict(pools or {})
+
+
+
+    def get(self, item_type: str, ilvl: int = 82,
+
+            include_desecrated: bool = False) -> CompiledModPool:
+
+        key = (item_type, ilvl, include_desecrated)
+
+        if key not in self._pools:
+
+            if self.conn is None:
+
+                self.conn = sqlite3.connect(self.db_path)
+
+            self._pools[key] = compile_pool(self.conn, item_type, ilvl, include_desecrated)
+
+        return self._pools[key]
+
+
+
+    def snapshot(self) -> Dict[tuple, CompiledModPool]:
+
+        """Compiled pools so far (picklable, read-only by convention)"""
+
+        return dict(self._pools)
+
+
+
+    def clear(self):
+
+        self._pools.clear()
+
+
+
+    def close(self):
+
+        if self.conn is not None:
+
+            self.conn.close()
+
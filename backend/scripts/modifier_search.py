@@ -0,0 +1,417 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Modifier Search Index
+
+- modifier_fts: FTS5 over normalised modifier names (+ tags), rowid = modifiers.id
+
+- modifier_tags: inverted tag index built from modifiers.tags
+
+- modifier_search_state: stale flag set by triggers on modifiers
+
+Rebuilt by step3_import_v5_data.py after every import; ensure_search_index()
+
+rebuilds it on first use for DBs imported earlier and whenever any writer
+
+(step1, manual edits) has touched modifiers since the last build.
+
+
+
+  python scripts/modifier_search.py "energy shield" --tags defences --item-type Helmets_int
+
+"""
+
+import json
+
+import os
+
+import re
+
+import sqlite3
+
+import sys
+
+import time
+
+from pathlib import Path
+
+from typing import List, Optional
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+from scripts.mod_parser import canonical, strip_markup
+
+
+
+BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
+
+DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
+
+
+
+WORD_PATTERN = re.compile(r'[a-z0-9]+')
+
+NAME_WEIGHT = 10.0          # bm25 column weights: name vs tags
+
+TAG_WEIGHT = 1.0
+
+MAX_PAGE_SIZE = 100
+
+
+
+# Plain SQL so every connection writing to modifiers marks the index stale
+
+SEARCH_TRIGGERS = {
+
+    'modifier_search_insert': "AFTER INSERT ON modifiers",
+
+    'modifier_search_update': "AFTER UPDATE OF name, tags ON modifiers",
+
+    'modifier_search_delete': "AFTER DELETE ON modifiers",
+
+}
+
+
+
+
+
+def normalize_name(name: str) -> str:
+
+    """"+(13—17)% to [Fire|Fire] Resistance" -> "to fire resistance" (numbers / markup dropped)"""
+
+    key = canonical(strip_markup(name))[0]
+
+    return ' '.join(WORD_PATTERN.findall(key))
+
+
+
+
+
+def fts_query(q: str) -> str:
+
+    """User text -> FTS5 query: every word required, the last one as a prefix"""
+
+    words = WORD_PATTERN.findall(normalize_name(q))
+
+    if not words:
+
+        return ''
+
+    terms = [f'"{w}"' for w in words]
+
+    terms[-1] += '*'
+
+    return ' '.join(terms)
+
+
+
+
+
+def rebuild_search_index(conn: sqlite3.Connection) -> int:
+
+    """(Re)create modifier_fts and modifier_tags from the modifiers table; returns rows indexed"""
+
+    cursor = conn.cursor()
+
+    cursor.execute("DROP TABLE IF EXISTS modifier_fts")
+
+    cursor.execute("DROP TABLE IF EXISTS modifier_tags")
+
+    cursor.execute("""
+
+        CREATE VIRTUAL TABLE modifier_fts USING fts5(
+
+            name, tags, tokenize = 'porter unicode61'
+
+        )
+
+    """)
+
+    cursor.execute("""
+
+        CREATE TABLE modifier_tags (
+
+            tag TEXT NOT NULL,
+
+            modifier_id INTEGER NOT NULL,
+
+            PRIMARY KEY (tag, modifier_id)
+
+        ) WITHOUT ROWID
+
+    """)
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tier_modifier ON modifier_tiers(modifier_id, item_type)")
+
+
+
+    docs, tag_rows = [], []
+
+    for mod_id, name, tags in cursor.execute("SELECT id, name, tags FROM modifiers").fetchall():
+
+        tag_list = [t.lower() for t in (json.loads(tags) if tags else [])]
+
+        docs.append((mod_id, normalize_name(name), ' '.join(tag_list)))
+
+        tag_rows.extend((t, mod_id) for t in set(tag_list))
+
+    cursor.executemany("INSERT INTO modifier_fts (rowid, name, tags) VALUES (?, ?, ?)", docs)
+
+    cursor.executemany("INSERT INTO modifier_tags (tag, modifier_id) VALUES (?, ?)", tag_rows)
+
+
+
+    cursor.execute("""
+
+        CREATE TABLE IF NOT EXISTS modifier_search_state (
+
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+
+            stale INTEGER NOT NULL DEFAULT 0,
+
+            indexed INTEGER
+
+        )
+
+    """)
+
+    cursor.execute("INSERT OR REPLACE INTO modifier_search_state (id, stale, indexed) VALUES (1, 0, ?)",
+
+                   (len(docs),))
+
+    for name, event in SEARCH_TRIGGERS.items():
+
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+        cursor.execute(f"""
+
+            CREATE TRIGGER {name} {event}
+
+            BEGIN
+
+                UPDATE modifier_search_state SET stale = 1 WHERE id = 1;
+
+            END
+
+        """)
+
+    conn.commit()
+
+    return len(docs)
+
+
+
+
+
+def ensure_search_index(conn: sqlite3.Connection) -> bool:
+
+    """(Re)build the index if it is missing or modifiers changed since; True if it was built"""
+
+    objects = {name for name, in conn.execute(
+
+        "SELECT name FROM sqlite_master WHERE name IN ('modifier_fts', 'modifier_search_state') "
+
+        f"OR (type = 'trigger' AND name IN ({','.join('?' * len(SEARCH_TRIGGERS))}))",
+
+        list(SEARCH_TRIGGERS))}
+
+    # Triggers go with the modifiers table when an import drops and recreates it
+
+    if objects >= {'modifier_fts', 'modifier_search_state', *SEARCH_TRIGGERS}:
+
+        state = conn.execute("SELECT stale FROM modifier_search_state WHERE id = 1").fetchone()
+
+        if state is not None and not state[0]:
+
+            return False
+
+    rebuild_search_index(conn)
+
+    return True
+
+
+
+
+
+def search_modifiers(conn: sqlite3.Connection, q: str = '', tags: Optional[List[str]] = None,
+
+                     item_type: Optional[str] = None, limit: int = 20, offset: int = 0) -> dict:
+
+    """Ranked (bm25) when `q` is given, otherwise by name; every tag must match"""
+
+    match = fts_query(q) if q else ''
+
+    tags = sorted({t.strip().lower() for t in tags or [] if t.strip()})
+
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    offset = max(0, offset)
+
+
+
+    joins, where, params = [], [], []
+
+    if match:
+
+        joins.append("JOIN modifier_fts ON modifier_fts.rowid = m.id")
+
+        where.append("modifier_fts MATCH ?")
+
+        params.append(match)
+
+    elif q:
+
+        # Nothing searchable left after normalisation (e.g. only numbers)
+
+        return {'total': 0, 'limit': limit, 'offset': offset, 'results': []}
+
+    if tags:
+
+        where.append(f"""m.id IN (
+
+            SELECT modifier_id FROM modifier_tags WHERE tag IN ({','.join('?' * len(tags))})
+
+            GROUP BY modifier_id HAVING COUNT(*) = ?
+
+        )""")
+
+        params.extend(tags)
+
+        params.append(len(tags))
+
+    if item_type:
+
+        where.append("""EXISTS (
+
+            SELECT 1 FROM modifier_tiers mt WHERE mt.modifier_id = m.id AND mt.item_type = ?
+
+        )""")
+
+        params.append(item_type)
+
+
+
+    base = f"FROM modifiers m {' '.join(joins)}" + (f" WHERE {' AND '.join(where)}" if where else "")
+
+    total = conn.execute(f"SELECT COUNT(*) {base}", params).fetchone()[0]
+
+    rank = f"bm25(modifier_fts, {NAME_WEIGHT}, {TAG_WEIGHT})" if match else "0"
+
+    order = "score, m.name" if match else "m.name, m.id"
+
+    rows = conn.execute(f"""
+
+        SELECT m.id, m.name, m.mod_type, m.tags, {rank} AS score
+
+        {base}
+
+        ORDER BY {order}
+
+        LIMIT ? OFFSET ?
+
+    """, params + [limit, offset]).fetchall()
+
+
+
+    return {
+
+        'total': total,
+
+        'limit': limit,
+
+        'offset': offset,
+
+        'results': [
+
+            {
+
+                'id': mod_id,
+
+                'name': name,
+
+                'mod_type': mod_type,
+
+                'tags': json.loads(mod_tags) if mod_tags else [],
+
+                'score': round(-score, 4) if match else None,
+
+            }
+
+            for mod_id, name, mod_type, mod_tags, score in rows
+
+        ],
+
+    }
+
+
+
+
+
+def main():
+
+    print("="*60)
+
+    print("Modifier Search")
+
+    print("="*60)
+
+
+
+    args = sys.argv[1:]
+
+    tags, item_type = [], None
+
+    if '--tags' in args:
+
+        i = args.index('--tags')
+
+        tags = args[i + 1].split(',')
+
+        del args[i:i + 2]
+
+    if '--item-type' in args:
+
+        i = args.index('--item-type')
+
+        item_type = args[i + 1]
+
+        del args[i:i + 2]
+
+
+
+    conn = sqlite3.connect(DB_PATH)
+
+    if ensure_search_index(conn):
+
+        print("Search index built")
+
+
+
+    start = time.time()
+
+    found = search_modifiers(conn, ' '.join(args), tags, item_type)
+
+    print(f"{found['total']} matches in {(time.time() - start) * 1000:.2f} ms\n")
+
+    for r in found['results']:
+
+        print(f"  [{r['id']:>5}] {r['mod_type']:<6} {r['name'][:50]:<50} {','.join(r['tags'])}")
+
+    conn.close()
+
+
+
+
+
+if __name__ == "__main__":
+
+    main()
+
@@ -0,0 +1,445 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Outcome Valuation Index
+
+Maps canonical mod-set signatures - sorted (modifier_id, tier) tuples - to
+
+observed price statistics, so simulated craft outcomes are priced by hash
+
+lookup. Unseen signatures fall back to the nearest listed subset (a price
+
+floor: the outcome is at least that good) or superset (a ceiling).
+
+Tiers are the mod_tiers rows resolved from rolled values (mod_parser.py);
+
+higher tier numbers are better rolls (T9 flat damage beats T8).
+
+"""
+
+import json
+
+import os
+
+import sqlite3
+
+import sys
+
+from pathlib import Path
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+from scripts.mod_parser import PARSED_FILE
+
+from scripts.currency_normalizer import CurrencyNormalizer
+
+
+
+BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
+
+DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
+
+LEAGUE_ID = 1
+
+
+
+Signature = Tuple[Tuple[int, int], ...]
+
+
+
+
+
+def signature(mods: Iterable) -> Signature:
+
+    """Canonical key: sorted (modifier_id, tier); an unresolved tier counts as 0 (worst)"""
+
+    return tuple(sorted((int(m[0]), int(m[1] or 0)) for m in mods))
+
+
+
+
+
+def price_stats(prices: List[float]) -> dict:
+
+    ordered = sorted(prices)
+
+    n = len(ordered)
+
+    mid = n // 2
+
+    median = ordered[mid] if n % 2 else (ordered[mid - 1] + ordered[mid]) / 2
+
+    return {
+
+        'count': n,
+
+        'min': ordered[0],
+
+        'median': median,
+
+        'mean': sum(ordered) / n,
+
+        'max': ordered[-1],
+
+    }
+
+
+
+
+
+class OutcomeIndex:
+
+    def __init__(self):
+
+        self.prices: Dict[Signature, List[float]] = {}
+
+        self.by_mod: Dict[int, set] = {}         # modifier_id -> signatures containing it
+
+        self._stats: Dict[Signature, dict] = {}
+
+        self._cache: Dict[Signature, dict] = {}
+
+
+
+    def __len__(self) -> int:
+
+        return len(self.prices)
+
+
+
+    def add(self, mods: Iterable, price_divine: float):
+
+        sig = signature(mods)
+
+        if not sig or price_divine <= 0:
+
+            return
+
+        self.prices.setdefault(sig, []).append(price_divine)
+
+        for mod_id, _ in sig:
+
+            self.by_mod.setdefault(mod_id, set()).add(sig)
+
+        self._stats.pop(sig, None)
+
+        self._cache.clear()
+
+
+
+    def stats(self, sig: Signature) -> Optional[dict]:
+
+        if sig not in self.prices:
+
+            return None
+
+        if sig not in self._stats:
+
+            self._stats[sig] = price_stats(self.prices[sig])
+
+        return self._stats[sig]
+
+
+
+    # ------------------------------------------------------------
+
+    # Nearest-match fallbacks
+
+    # ------------------------------------------------------------
+
+    @staticmethod
+
+    def _covers(better: Signature, worse: Signature) -> bool:
+
+        """Every mod of `worse` appears in `better` at the same or a higher tier"""
+
+        tiers = dict(better)
+
+        return all(mod_id in tiers and tiers[mod_id] >= tier for mod_id, tier in worse)
+
+
+
+    def _best_subset(self, sig: Signature) -> Optional[Signature]:
+
+        mod_ids = {m for m, _ in sig}
+
+        candidates = set()
+
+        for mod_id in mod_ids:
+
+            candidates |= self.by_mod.get(mod_id, set())
+
+        subsets = [c for c in candidates
+
+                   if len(c) <= len(sig) and self._covers(sig, c)]
+
+        if not subsets:
+
+            return None
+
+        # Most mods in common first, then the highest floor
+
+        return max(subsets, key=lambda c: (len(c), self.stats(c)['median']))
+
+
+
+    def _best_superset(self, sig: Signature) -> Optional[Signature]:
+
+        candidates = None
+
+        for mod_id, _ in sig:
+
+            found = self.by_mod.get(mod_id, set())
+
+            candidates = set(found) if candidates is None else candidates & found
+
+            if not candidates:
+
+                return None
+
+        supersets = [c for c in candidates if self._covers(c, sig)]
+
+        if not supersets:
+
+            return None
+
+        # Fewest extra mods first, then the lowest ceiling
+
+        return min(supersets, key=lambda c: (len(c), self.stats(c)['median']))
+
+
+
+    def lookup(self, mods: Iterable) -> dict:
+
+        """{'match': exact|subset|superset|None, 'signature', 'stats'}"""
+
+        sig = signature(mods)
+
+        cached = self._cache.get(sig)
+
+        if cached is not None:
+
+            return cached
+
+
+
+        if sig in self.prices:
+
+            result = {'match': 'exact', 'signature': sig, 'stats': self.stats(sig)}
+
+        else:
+
+            sub = self._best_subset(sig)
+
+            sup = self._best_superset(sig)
+
+            # Nearest by mod-count distance; ties go to the conservative floor
+
+            if sub and (not sup or len(sig) - len(sub) <= len(sup) - len(sig)):
+
+                result = {'match': 'subset', 'signature': sub, 'stats': self.stats(sub)}
+
+            elif sup:
+
+                result = {'match': 'superset', 'signature': sup, 'stats': self.stats(sup)}
+
+            else:
+
+                result = {'match': None, 'signature': None, 'stats': None}
+
+
+
+        self._cache[sig] = result
+
+        return result
+
+
+
+    def value(self, mods: Iterable, default: float = 0.0) -> float:
+
+        """Median price of the nearest match, or `default`"""
+
+        stats = self.lookup(mods)['stats']
+
+        return stats['median'] if stats else default
+
+
+
+    def value_many(self, outcomes: Iterable[Iterable], default: float = 0.0) -> List[float]:
+
+        return [self.value(mods, default) for mods in outcomes]
+
+
+
+    def expected_value(self, distribution: Dict[Signature, float], default: float = 0.0) -> float:
+
+        """Probability-weighted value of an outcome distribution {signature: probability}"""
+
+        return sum(p * self.value(sig, default) for sig, p in distribution.items())
+
+
+
+    # ------------------------------------------------------------
+
+    # Loading
+
+    # ------------------------------------------------------------
+
+    def add_parsed_listings(self, parsed_listings: List[dict], rates: Dict[str, float]) -> int:
+
+        """Listings from mod_parser.parse_listing; prices converted to Divine"""
+
+        added = 0
+
+        for parsed in parsed_listings:
+
+            price = parsed['price']
+
+            value = (price.get('amount') or 0) * rates.get(price.get('currency'), 0.0)
+
+            mods = [(m['modifier_id'], m.get('tier')) for m in parsed['explicit'] if m.get('modifier_id')]
+
+            if mods and value > 0:
+
+                self.add(mods, value)
+
+                added += 1
+
+        return added
+
+
+
+    def add_finished_prices(self, conn: sqlite3.Connection, league_id: int = LEAGUE_ID,
+
+                            unlisted_only: bool = True) -> int:
+
+        """FinishedPrice rows whose target_mods carry modifier ids (valuation_model.py)
+
+
+
+        Those prices are model predictions fitted on the same listings, so by default
+
+        only signatures with no listed price yet are filled in - observed medians stay
+
+        observed, and a listing is never counted twice.
+
+        """
+
+        added = 0
+
+        listed = set(self.prices) if unlisted_only else set()
+
+        rows = conn.execute("""
+
+            SELECT target_mods, avg_price_divine FROM finished_prices
+
+            WHERE league_id = ? AND avg_price_divine > 0
+
+        """, (league_id,)).fetchall()
+
+        for target_mods, price in rows:
+
+            try:
+
+                mods = [(m['modifier_id'], m.get('tier')) for m in json.loads(target_mods or '[]')
+
+                        if isinstance(m, dict) and m.get('modifier_id')]
+
+            except (ValueError, TypeError):
+
+                continue
+
+            if mods and signature(mods) not in listed:
+
+                self.add(mods, price)
+
+                added += 1
+
+        return added
+
+
+
+    @classmethod
+
+    def from_db(cls, conn: sqlite3.Connection, parsed_file: Path = PARSED_FILE,
+
+                league_id: int = LEAGUE_ID) -> 'OutcomeIndex':
+
+        """Observed listings first; FinishedPrice predictions only where nothing is listed"""
+
+        index = cls()
+
+        if parsed_file.exists():
+
+            with open(parsed_file, 'r') as f:
+
+                index.add_parsed_listings(json.load(f), CurrencyNormalizer(conn, league_id).as_dict())
+
+        try:
+
+            index.add_finished_prices(conn, league_id)
+
+        except sqlite3.OperationalError:
+
+            pass  # finished_prices not created yet
+
+        return index
+
+
+
+
+
+def main():
+
+    print("="*60)
+
+    print("Outcome Valuation Index")
+
+    print("="*60)
+
+
+
+    conn = sqlite3.connect(DB_PATH)
+
+    index = OutcomeIndex.from_db(conn)
+
+    conn.close()
+
+
+
+    print(f"Signatures: {len(index)}")
+
+    print(f"Modifiers indexed: {len(index.by_mod)}")
+
+
+
+    print("\nMost listed mod sets:")
+
+    top = sorted(index.prices, key=lambda s: -len(index.prices[s]))[:10]
+
+    for sig in top:
+
+        stats = index.stats(sig)
+
+        mods = ' '.join(f"{m}:T{t}" for m, t in sig)
+
+        print(f"  {stats['count']:3d}x  median {stats['median']:8.2f} div  [{mods}]")
+
+
+
+
+
+if __name__ == "__main__":
+
+    main()
+
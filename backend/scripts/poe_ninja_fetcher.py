@@ -7,7 +7,9 @@ PoE2 Price Fetcher from poe.ninja API
 
 - Fetches real-time currency prices
 
-- Caches to local SQLite database
+- All overview endpoints fetched concurrently over one pooled, gzip-enabled session
+
+- Bulk upsert into local SQLite database (one transaction)
 
 - Rate limit safe: designed for hourly updates only
 
@@ -17,15 +19,27 @@ import os
 
 import sqlite3
 
-import json
+import sys
 
 import time
 
+from concurrent.futures import ThreadPoolExecutor
+
 from datetime import datetime
 
-from urllib.request import urlopen, Request
 
-from urllib.error import URLError, HTTPError
+
+import requests
+
+from requests.adapters import HTTPAdapter
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+from scripts.rate_fusion import submit_sample
 
 
 
@@ -55,63 +69,99 @@ ENDPOINTS = {
 
 
 
-# Minimum delay between API calls (seconds)
+REQUEST_TIMEOUT = 15
 
-API_DELAY = 2
 
 
+_session = None
 
 
 
-def fetch_api(url, timeout=30):
 
-    """Fetch data from poe.ninja API with proper error handling"""
 
-    headers = {
+def get_session():
 
-        "User-Agent": "PoE2-Profit-Optimizer/1.0 (Educational Project)",
+    """One keep-alive session shared by all fetches (requests sends Accept-Encoding: gzip)"""
 
-        "Accept": "application/json",
+    global _session
 
-    }
+    if _session is None:
 
-    
+        _session = requests.Session()
 
-    try:
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=len(ENDPOINTS) + 2, max_retries=1)
 
-        req = Request(url, headers=headers)
+        _session.mount("https://", adapter)
 
-        with urlopen(req, timeout=timeout) as response:
+        _session.headers.update({
 
-            data = response.read().decode("utf-8")
+            "User-Agent": "PoE2-Profit-Optimizer/1.0 (Educational Project)",
 
-            return json.loads(data)
+            "Accept": "application/json",
+
+            "Accept-Encoding": "gzip, deflate",
+
+        })
+
+    return _session
 
-    except HTTPError as e:
 
-        print(f"  [ERROR] HTTP {e.code}: {e.reason}")
 
-        return None
 
-    except URLError as e:
 
-        print(f"  [ERROR] URL Error: {e.reason}")
+def fetch_api(url, timeout=REQUEST_TIMEOUT):
+
+    """Fetch data from poe.ninja API with proper error handling"""
+
+    try:
+
+        response = get_session().get(url, timeout=timeout)
+
+        response.raise_for_status()
+
+        return response.json()
+
+    except requests.exceptions.HTTPError as e:
+
+        print(f"  [ERROR] HTTP {e.response.status_code}: {e.response.reason}")
 
         return None
 
-    except Exception as e:
+    except requests.exceptions.RequestException as e:
 
         print(f"  [ERROR] {type(e).__name__}: {e}")
 
         return None
 
+    except ValueError as e:
+
+        print(f"  [ERROR] Invalid JSON: {e}")
+
+        return None
+
+
+
+
+
+def fetch_all(endpoints=None):
+
+    """Fetch every overview endpoint concurrently -> {category: data or None}"""
+
+    endpoints = endpoints or ENDPOINTS
+
+    with ThreadPoolExecutor(max_workers=len(endpoints)) as pool:
+
+        futures = {category: pool.submit(fetch_api, url) for category, url in endpoints.items()}
+
+        return {category: future.result() for category, future in futures.items()}
+
 
 
 
 
 def parse_currency_data(data):
 
-    """Parse poe.ninja currency response"""
+    """Parse poe.ninja currency response (one pass over items, one over lines)"""
 
     if not data:
 
@@ -119,33 +169,25 @@ def parse_currency_data(data):
 
     
 
-    prices = {}
-
-    
-
     # PoE2 API structure: lines + items
 
-    lines = data.get("lines", [])
-
-    items = {item["id"]: item for item in data.get("items", [])}
+    names = {item["id"]: item.get("name", "Unknown") for item in data.get("items", []) if "id" in item}
 
     
 
-    for line in lines:
-
-        item_id = line.get("id")
+    prices = {}
 
-        if item_id and item_id in items:
+    for line in data.get("lines", []):
 
-            name = items[item_id].get("name", "Unknown")
+        name = names.get(line.get("id"))
 
-            # primaryValue is in Chaos equivalent
+        # primaryValue is in Chaos equivalent
 
-            chaos_value = line.get("primaryValue", 0)
+        chaos_value = line.get("primaryValue") or 0
 
-            if chaos_value and chaos_value > 0:
+        if name and chaos_value > 0:
 
-                prices[name] = chaos_value
+            prices[name] = chaos_value
 
     
 
@@ -157,7 +199,7 @@ def parse_currency_data(data):
 
 def update_database(prices, divine_chaos_rate):
 
-    """Update database with fetched prices"""
+    """Bulk upsert fetched prices through a preloaded name -> id map"""
 
     conn = sqlite3.connect(DB_PATH)
 
@@ -165,76 +207,76 @@ def update_database(prices, divine_chaos_rate):
 
     
 
-    updated_count = 0
+    cursor.execute("SELECT name, id FROM currencies")
+
+    currency_ids = dict(cursor.fetchall())
 
     
 
-    for name, chaos_value in prices.items():
+    now = datetime.now()
 
-        # Calculate divine value
+    rows = [
 
-        divine_value = chaos_value / divine_chaos_rate if divine_chaos_rate > 0 else 0
+        (LEAGUE_ID, currency_ids[name], chaos_value,
 
-        
+         chaos_value / divine_chaos_rate if divine_chaos_rate > 0 else 0, now)
 
-        # Try to find currency in our database
+        for name, chaos_value in prices.items() if name in currency_ids
 
-        cursor.execute("SELECT id FROM currencies WHERE name = ?", (name,))
+    ]
 
-        result = cursor.fetchone()
+    updated_count = len(rows)
 
-        
+    
 
-        if result:
+    if rows:
 
-            currency_id = result[0]
+        cursor.execute(f"""
 
-            # Update or insert price
+            DELETE FROM currency_prices 
 
-            cursor.execute("""
+            WHERE league_id = ? AND currency_id IN ({','.join('?' * len(rows))})
 
-                DELETE FROM currency_prices 
+        """, [LEAGUE_ID] + [row[1] for row in rows])
 
-                WHERE currency_id = ? AND league_id = ?
+        cursor.executemany("""
 
-            """, (currency_id, LEAGUE_ID))
+            INSERT INTO currency_prices 
 
-            
+            (league_id, currency_id, price_chaos, price_divine, last_updated)
 
-            cursor.execute("""
+            VALUES (?, ?, ?, ?, ?)
 
-                INSERT INTO currency_prices 
+        """, rows)
 
-                (league_id, currency_id, price_chaos, price_divine, last_updated)
+    
 
-                VALUES (?, ?, ?, ?, ?)
+    conn.commit()
 
-            """, (LEAGUE_ID, currency_id, chaos_value, divine_value, datetime.now()))
+    
 
-            
+    # Exchange rate (Exalted Orb's own chaos value, not a fixed ratio) goes through
 
-            updated_count += 1
+    # fusion: checked against rate history, written only if accepted
 
-    
+    exalt_chaos_rate = prices.get("Exalted Orb", 0)
 
-    # Update exchange rate
+    if divine_chaos_rate > 0 and exalt_chaos_rate > 0:
 
-    if divine_chaos_rate > 0:
+        fused = submit_sample(conn, 'poe.ninja', {
 
-        cursor.execute("""
+            'divine_to_exalt': divine_chaos_rate / exalt_chaos_rate,
 
-            INSERT INTO currency_exchange_rates 
+            'divine_to_chaos': divine_chaos_rate,
 
-            (league_id, divine_to_exalt, divine_to_chaos, exalt_to_chaos, last_updated)
+        }, LEAGUE_ID, now)
 
-            VALUES (?, ?, ?, ?, ?)
+        if not fused:
 
-        """, (LEAGUE_ID, divine_chaos_rate / 2.5, divine_chaos_rate, 2.5, datetime.now()))
+            print("  [WARN] poe.ninja exchange rate rejected by fusion - previous rate kept")
 
     
 
-    conn.commit()
-
     conn.close()
 
     
@@ -265,17 +307,19 @@ def main():
 
     
 
-    # Fetch each category
+    # Fetch all categories at once
 
-    for category, url in ENDPOINTS.items():
+    start = time.time()
 
-        print(f"\n[{category.upper()}] Fetching from poe.ninja...")
+    responses = fetch_all()
 
-        print(f"  URL: {url[:80]}...")
+    print(f"\nFetched {len(responses)} endpoints in {time.time() - start:.2f}s")
 
-        
+    
+
+    for category, data in responses.items():
 
-        data = fetch_api(url)
+        print(f"\n[{category.upper()}] poe.ninja")
 
         
 
@@ -315,12 +359,6 @@ def main():
 
             print(f"  [WARN] Failed to fetch {category}")
 
-        
-
-        # Rate limit protection
-
-        time.sleep(API_DELAY)
-
     
 
     # Summary
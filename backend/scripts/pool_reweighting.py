@@ -0,0 +1,419 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Catalyst / Omen Pool Reweighting
+
+Applies tag-based weight multipliers to a compiled mod pool.
+
+Entries are grouped by (mod_type, tags) once, so every multiplier set
+
+only rescales a handful of group totals instead of re-querying the DB.
+
+"""
+
+import os
+
+import sys
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+from scripts.mod_pool import CompiledModPool, ModPoolCache
+
+
+
+# Catalyst -> modifier tag it favours (jewellery quality)
+
+CATALYSTS = {
+
+    'Flesh Catalyst': 'life',
+
+    'Neural Catalyst': 'mana',
+
+    'Carapace Catalyst': 'defences',
+
+    'Reaver Catalyst': 'attack',
+
+    'Sibilant Catalyst': 'caster',
+
+    'Skittering Catalyst': 'speed',
+
+    'Adaptive Catalyst': 'attribute',
+
+    "Chayula's Catalyst": 'chaos',
+
+    "Esh's Catalyst": 'lightning',
+
+    "Tul's Catalyst": 'cold',
+
+    "Xoph's Catalyst": 'fire',
+
+    "Uul-Netol's Catalyst": 'physical',
+
+}
+
+
+
+MAX_CATALYST_QUALITY = 20
+
+
+
+# Omen -> multipliers keyed by tag or by affix type ('prefix' / 'suffix')
+
+OMENS = {
+
+    'Omen of Sinistral Exaltation': {'suffix': 0.0},
+
+    'Omen of Dextral Exaltation': {'prefix': 0.0},
+
+    'Omen of Sinistral Coronation': {'suffix': 0.0},
+
+    'Omen of Dextral Coronation': {'prefix': 0.0},
+
+}
+
+
+
+
+
+def catalyst_multipliers(catalyst: str, quality: int) -> Dict[str, float]:
+
+    """Quality% on the item raises the weight of the catalyst's tag by quality%"""
+
+    tag = CATALYSTS[catalyst]
+
+    quality = max(0, min(quality, MAX_CATALYST_QUALITY))
+
+    return {tag: 1.0 + quality / 100.0}
+
+
+
+
+
+def omen_multipliers(omens: Iterable[str]) -> Dict[str, float]:
+
+    return combine_multipliers(*(OMENS[name] for name in omens))
+
+
+
+
+
+def combine_multipliers(*multiplier_sets: Dict[str, float]) -> Dict[str, float]:
+
+    """Multipliers on the same key stack multiplicatively"""
+
+    combined: Dict[str, float] = {}
+
+    for multipliers in multiplier_sets:
+
+        for key, value in multipliers.items():
+
+            combined[key] = combined.get(key, 1.0) * value
+
+    return combined
+
+
+
+
+
+class PoolReweighter:
+
+    """Mask-and-scale reweighting with cached renormalised totals"""
+
+    def __init__(self, pool: CompiledModPool):
+
+        self.pool = pool
+
+
+
+        # Group entries that every multiplier set scales identically
+
+        self.group_keys: List[Tuple[str, frozenset]] = []
+
+        self.group_of: List[int] = []
+
+        self.group_weight: List[int] = []
+
+        group_ids: Dict[Tuple[str, frozenset], int] = {}
+
+        for i, weight in enumerate(pool.weights):
+
+            key = (pool.mod_types[i], frozenset(pool.tags[i]))
+
+            if key not in group_ids:
+
+                group_ids[key] = len(self.group_keys)
+
+                self.group_keys.append(key)
+
+                self.group_weight.append(0)
+
+            gid = group_ids[key]
+
+            self.group_of.append(gid)
+
+            self.group_weight[gid] += weight
+
+
+
+        self._cache: Dict[tuple, Tuple[List[float], Dict[str, float]]] = {}
+
+
+
+    @staticmethod
+
+    def _cache_key(multipliers: Optional[Dict[str, float]]) -> tuple:
+
+        return tuple(sorted((multipliers or {}).items()))
+
+
+
+    def _scaled(self, multipliers: Optional[Dict[str, float]]) -> Tuple[List[float], Dict[str, float]]:
+
+        """Per-group factors and per-affix totals for one multiplier set"""
+
+        key = self._cache_key(multipliers)
+
+        cached = self._cache.get(key)
+
+        if cached is not None:
+
+            return cached
+
+
+
+        multipliers = multipliers or {}
+
+        factors = []
+
+        totals = {mod_type: 0.0 for mod_type in self.pool.indices_by_type}
+
+        for gid, (mod_type, tags) in enumerate(self.group_keys):
+
+            factor = multipliers.get(mod_type, 1.0)
+
+            for tag in tags:
+
+                factor *= multipliers.get(tag, 1.0)
+
+            factors.append(factor)
+
+            totals[mod_type] += self.group_weight[gid] * factor
+
+
+
+        self._cache[key] = (factors, totals)
+
+        return factors, totals
+
+
+
+    def totals(self, multipliers: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+
+        return self._scaled(multipliers)[1]
+
+
+
+    def weights(self, multipliers: Optional[Dict[str, float]] = None) -> List[float]:
+
+        """Reweighted weight of every entry"""
+
+        factors, _ = self._scaled(multipliers)
+
+        return [w * factors[g] for w, g in zip(self.pool.weights, self.group_of)]
+
+
+
+    def probabilities(self, multipliers: Optional[Dict[str, float]] = None) -> List[float]:
+
+        """Per-entry chance within its own affix pool"""
+
+        factors, totals = self._scaled(multipliers)
+
+        pool = self.pool
+
+        return [
+
+            (w * factors[g] / totals[t]) if totals[t] > 0 else 0.0
+
+            for w, g, t in zip(pool.weights, self.group_of, pool.mod_types)
+
+        ]
+
+
+
+    def probability(self, indices: Iterable[int],
+
+                    multipliers: Optional[Dict[str, float]] = None,
+
+                    combined: bool = False) -> float:
+
+        """
+
+        Chance of one roll landing on any of `indices`.
+
+        combined=False normalises within the targets' affix pools (both, when the
+
+        targets mix prefixes and suffixes), combined=True over prefixes and
+
+        suffixes together (omens matter here).
+
+        """
+
+        factors, totals = self._scaled(multipliers)
+
+        pool = self.pool
+
+        hit = 0.0
+
+        mod_types = set()
+
+        for i in indices:
+
+            mod_types.add(pool.mod_types[i])
+
+            hit += pool.weights[i] * factors[self.group_of[i]]
+
+        if not mod_types:
+
+            return 0.0
+
+        total = sum(totals.values()) if combined else sum(totals[t] for t in mod_types)
+
+        return hit / total if total > 0 else 0.0
+
+
+
+    def scan(self, indices: List[int],
+
+             options: Dict[str, Dict[str, float]],
+
+             combined: bool = False,
+
+             baseline: Optional[Dict[str, float]] = None) -> List[dict]:
+
+        """Evaluate one target under many multiplier sets; lift is against `baseline`"""
+
+        base = self.probability(indices, baseline, combined)
+
+        results = []
+
+        for label, multipliers in options.items():
+
+            prob = self.probability(indices, multipliers, combined)
+
+            results.append({
+
+                'option': label,
+
+                'probability': prob,
+
+                'lift': prob / base if base > 0 else 0.0,
+
+            })
+
+        return sorted(results, key=lambda r: -r['probability'])
+
+
+
+    def scan_catalysts(self, indices: List[int],
+
+                       qualities: Iterable[int] = (5, 10, 15, 20),
+
+                       omens: Iterable[str] = ()) -> List[dict]:
+
+        """Which catalyst, at which quality, best favours the target (lift over the omens alone)"""
+
+        omens = list(omens)
+
+        omen_mult = omen_multipliers(omens)
+
+        options = {}
+
+        for catalyst in CATALYSTS:
+
+            for quality in qualities:
+
+                options[f"{catalyst} @{quality}%"] = combine_multipliers(
+
+                    catalyst_multipliers(catalyst, quality), omen_mult)
+
+        return self.scan(indices, options, combined=bool(omens), baseline=omen_mult)
+
+
+
+    def clear_cache(self):
+
+        self._cache.clear()
+
+
+
+
+
+def demo():
+
+    """Catalyst scan for Breach Ring lightning flat damage"""
+
+    print("="*60)
+
+    print("Catalyst Reweighting - Rings @ ilvl 82")
+
+    print("="*60)
+
+
+
+    cache = ModPoolCache()
+
+    pool = cache.get('Rings', 82)
+
+    reweighter = PoolReweighter(pool)
+
+
+
+    target = pool.find('Lightning damage to Attacks', 'prefix')
+
+    if not target:
+
+        print("[WARN] Target mod not found - import modifier data first")
+
+        cache.close()
+
+        return
+
+
+
+    print(f"\nTarget: {pool.names[target[0]]}")
+
+    print(f"Base chance per prefix roll: {reweighter.probability(target)*100:.4f}%")
+
+    print(f"Base chance per exalt (any affix): {reweighter.probability(target, combined=True)*100:.4f}%")
+
+
+
+    print("\nTop catalyst options:")
+
+    for row in reweighter.scan_catalysts(target, omens=['Omen of Sinistral Exaltation'])[:8]:
+
+        print(f"  {row['option']:<45} {row['probability']*100:8.4f}%  x{row['lift']:.2f}")
+
+
+
+    cache.close()
+
+
+
+
+
+if __name__ == "__main__":
+
+    demo()
+
@@ -0,0 +1,395 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Budget-Constrained Crafting Portfolio Optimizer
+
+Chooses which crafts to run, and how many of each, for a Divine budget.
+
+Bounded knapsack (binary splitting + 1-D DP over discretised budget)
+
+maximising risk-adjusted expected profit: mean - risk_aversion * std.
+
+"""
+
+import json
+
+import math
+
+import sqlite3
+
+import time
+
+from pathlib import Path
+
+from typing import Dict, List
+
+
+
+BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
+
+DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
+
+LEAGUE_ID = 1
+
+
+
+DEFAULT_BUDGET_CELLS = 1000  # budget resolution of the DP
+
+DEFAULT_MAX_COUNT = 5        # max crafts of one opportunity per session
+
+
+
+
+
+def risk_adjusted_value(candidate: dict, risk_aversion: float) -> float:
+
+    return candidate['expected_profit'] - risk_aversion * candidate.get('profit_std', 0.0)
+
+
+
+
+
+def _split_counts(count: int) -> List[int]:
+
+    """Binary splitting: 1, 2, 4, ..., remainder (any 0..count is a subset sum)"""
+
+    parts = []
+
+    k = 1
+
+    while count > 0:
+
+        take = min(k, count)
+
+        parts.append(take)
+
+        count -= take
+
+        k *= 2
+
+    return parts
+
+
+
+
+
+def optimize(candidates: List[dict], budget: float, risk_aversion: float = 0.5,
+
+             cells: int = DEFAULT_BUDGET_CELLS) -> dict:
+
+    """
+
+    Args:
+
+        candidates: dicts with id, name, cost, expected_profit, profit_std, max_count
+
+        budget: Divine available for the session
+
+        risk_aversion: 0 = risk neutral, 1 = mean minus one std per craft
+
+        cells: budget discretisation (costs are rounded up, never overspends)
+
+
+
+    Returns:
+
+        Selected crafts with counts and portfolio totals
+
+    """
+
+    started = time.time()
+
+    unit = budget / cells if budget > 0 else 1.0
+
+
+
+    # Split bounded counts into 0/1 items, dropping crafts that can't pay off
+
+    items = []  # (candidate index, count, weight cells, value)
+
+    for ci, cand in enumerate(candidates):
+
+        value = risk_adjusted_value(cand, risk_aversion)
+
+        cost = cand.get('cost', 0.0)
+
+        if value <= 0 or cost > budget:
+
+            continue
+
+        weight = max(1, math.ceil(cost / unit - 1e-9))
+
+        max_count = min(cand.get('max_count', DEFAULT_MAX_COUNT), cells // weight)
+
+        for part in _split_counts(max_count):
+
+            items.append((ci, part, weight * part, value * part))
+
+
+
+    # 1-D DP; taken[k] records which budgets used item k (for backtracking)
+
+    dp = [0.0] * (cells + 1)
+
+    taken = []
+
+    for _, _, w, v in items:
+
+        if w > cells:
+
+            taken.append(None)
+
+            continue
+
+        head = dp[:w]
+
+        tail = [a if a >= b + v else b + v for a, b in zip(dp[w:], dp[:-w])]
+
+        taken.append(bytes(1 if t != a else 0 for t, a in zip(tail, dp[w:])))
+
+        dp = head + tail
+
+
+
+    # Backtrack from the best budget cell
+
+    best_cell = max(range(cells + 1), key=lambda c: dp[c])
+
+    counts: Dict[int, int] = {}
+
+    c = best_cell
+
+    for k in range(len(items) - 1, -1, -1):
+
+        ci, part, w, _ = items[k]
+
+        flags = taken[k]
+
+        if flags is not None and c >= w and flags[c - w]:
+
+            counts[ci] = counts.get(ci, 0) + part
+
+            c -= w
+
+
+
+    selections = []
+
+    total_cost = total_profit = total_var = 0.0
+
+    for ci, count in sorted(counts.items(), key=lambda kv: -risk_adjusted_value(candidates[kv[0]], risk_aversion)):
+
+        cand = candidates[ci]
+
+        std = cand.get('profit_std', 0.0)
+
+        selections.append({
+
+            'id': cand.get('id'),
+
+            'name': cand.get('name'),
+
+            'count': count,
+
+            'unit_cost': cand['cost'],
+
+            'total_cost': cand['cost'] * count,
+
+            'expected_profit': cand['expected_profit'] * count,
+
+            'profit_std': std * math.sqrt(count),
+
+        })
+
+        total_cost += cand['cost'] * count
+
+        total_profit += cand['expected_profit'] * count
+
+        total_var += std * std * count
+
+
+
+    return {
+
+        'budget': budget,
+
+        'risk_aversion': risk_aversion,
+
+        'spent': total_cost,
+
+        'unspent': budget - total_cost,
+
+        'expected_profit': total_profit,
+
+        'profit_std': math.sqrt(total_var),
+
+        'risk_adjusted_profit': dp[best_cell],
+
+        'selections': selections,
+
+        'candidates': len(candidates),
+
+        'elapsed_ms': round((time.time() - started) * 1000, 1),
+
+    }
+
+
+
+
+
+def candidate_from_opportunity(row, max_count: int = DEFAULT_MAX_COUNT) -> dict:
+
+    """
+
+    Candidate from a profit_opportunities row.
+
+    With success probability p the sale is all-or-nothing, so the
+
+    per-craft profit std is sale * sqrt((1 - p) / p).
+
+    """
+
+    cost = (row['base_cost_divine'] or 0.0) + (row['crafting_cost_divine'] or 0.0)
+
+    sale = row['expected_sale_price_divine'] or 0.0
+
+    p = row['success_probability']
+
+    std = sale * math.sqrt((1 - p) / p) if p and 0 < p < 1 else 0.0
+
+    path = row['crafting_path'] or {}
+
+    if isinstance(path, str):
+
+        path = json.loads(path)
+
+    return {
+
+        'id': row['id'],
+
+        'name': path.get('recipe') or path.get('name') or f"opportunity #{row['id']}",
+
+        'cost': cost,
+
+        'expected_profit': row['net_profit_divine'] or (sale - cost),
+
+        'profit_std': std,
+
+        'max_count': max_count,
+
+    }
+
+
+
+
+
+def latest_per_recipe(candidates: List[dict]) -> List[dict]:
+
+    """
+
+    First candidate per recipe name. The analyzers append a row per run,
+
+    so callers pass candidates newest first.
+
+    """
+
+    seen = set()
+
+    latest = []
+
+    for c in candidates:
+
+        if c['name'] not in seen:
+
+            seen.add(c['name'])
+
+            latest.append(c)
+
+    return latest
+
+
+
+
+
+def load_candidates(conn: sqlite3.Connection, league_id: int = LEAGUE_ID,
+
+                    max_count: int = DEFAULT_MAX_COUNT) -> List[dict]:
+
+    """Latest profit_opportunities row per recipe in the league"""
+
+    conn.row_factory = sqlite3.Row
+
+    rows = conn.execute("""
+
+        SELECT id, base_cost_divine, crafting_cost_divine, expected_sale_price_divine,
+
+               net_profit_divine, success_probability, crafting_path
+
+        FROM profit_opportunities
+
+        WHERE league_id = ?
+
+        ORDER BY calculated_at DESC, id DESC
+
+    """, (league_id,)).fetchall()
+
+    return latest_per_recipe([candidate_from_opportunity(r, max_count) for r in rows])
+
+
+
+
+
+def main():
+
+    import sys
+
+
+
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else 100.0
+
+    risk_aversion = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+
+
+
+    print("="*60)
+
+    print(f"Crafting Portfolio - budget {budget} Divine, risk aversion {risk_aversion}")
+
+    print("="*60)
+
+
+
+    conn = sqlite3.connect(DB_PATH)
+
+    candidates = load_candidates(conn)
+
+    conn.close()
+
+
+
+    result = optimize(candidates, budget, risk_aversion)
+
+    for s in result['selections']:
+
+        print(f"  {s['count']:>3} x {s['name'][:40]:<40} cost {s['total_cost']:8.2f} "
+
+              f"profit {s['expected_profit']:8.2f} ± {s['profit_std']:.2f}")
+
+    print(f"\nSpent {result['spent']:.2f} / {budget} Divine")
+
+    print(f"Expected profit {result['expected_profit']:.2f} ± {result['profit_std']:.2f} Divine")
+
+    print(f"({result['candidates']} candidates in {result['elapsed_ms']} ms)")
+
+
+
+
+
+if __name__ == "__main__":
+
+    main()
+
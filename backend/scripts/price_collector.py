@@ -13,10 +13,20 @@ import os
 
 import sqlite3
 
+import sys
+
 from datetime import datetime
 
 
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+from scripts.rate_fusion import submit_sample
+
+
+
 DB_PATH = os.path.expanduser("~/poe2-profit-optimizer/backend/poe2_profit_optimizer.db")
 
 LEAGUE_ID = 1  # Fate of Vaal
@@ -117,17 +127,19 @@ def main():
 
     
 
-    cursor.execute("""
+    fused = submit_sample(conn, 'price_collector', {
 
-        INSERT INTO currency_exchange_rates (league_id, divine_to_exalt, divine_to_chaos, exalt_to_chaos, last_updated)
+        'divine_to_exalt': DIVINE_TO_EXALT, 'divine_to_chaos': DIVINE_TO_CHAOS,
 
-        VALUES (?, ?, ?, ?, ?)
+    }, LEAGUE_ID)
 
-    """, (LEAGUE_ID, DIVINE_TO_EXALT, DIVINE_TO_CHAOS, DIVINE_TO_CHAOS / DIVINE_TO_EXALT, datetime.now()))
+    if fused:
 
-    conn.commit()
+        print("  1 Divine = {} Exalt = {} Chaos".format(DIVINE_TO_EXALT, DIVINE_TO_CHAOS))
+
+    else:
 
-    print("  1 Divine = {} Exalt = {} Chaos".format(DIVINE_TO_EXALT, DIVINE_TO_CHAOS))
+        print("  [--] Rejected by rate fusion (disagrees with rate history)")
 
     
 
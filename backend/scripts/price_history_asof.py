@@ -0,0 +1,359 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+As-Of Price History Join
+
+Re-expresses PriceHistory (stored in Divine) in another currency using the
+
+exchange rate that was in force when each price was recorded. Both series
+
+are sorted by time and merged in one pass - no per-row rate subqueries.
+
+basis='current' uses today's rate instead, for comparison.
+
+"""
+
+import os
+
+import sqlite3
+
+import sys
+
+from bisect import bisect_right
+
+from datetime import datetime
+
+from pathlib import Path
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+from scripts.currency_normalizer import CurrencyNormalizer, canonical_code
+
+
+
+BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
+
+DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
+
+LEAGUE_ID = 1
+
+
+
+# Units of the currency per Divine, as stored on currency_exchange_rates
+
+RATE_COLUMNS = {
+
+    'exalted': 'divine_to_exalt',
+
+    'chaos': 'divine_to_chaos',
+
+}
+
+
+
+ASOF_INDEXES = [
+
+    "CREATE INDEX IF NOT EXISTS ix_price_history_base_time "
+
+    "ON price_history (item_base_id, league_id, recorded_at)",
+
+    "CREATE INDEX IF NOT EXISTS ix_currency_exchange_rates_time "
+
+    "ON currency_exchange_rates (league_id, last_updated)",
+
+]
+
+
+
+
+
+def _ts(value) -> datetime:
+
+    if isinstance(value, datetime):
+
+        return value
+
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+
+
+
+
+
+def ensure_indexes(conn: sqlite3.Connection):
+
+    """Time indexes for DBs created before the models declared them"""
+
+    for sql in ASOF_INDEXES:
+
+        conn.execute(sql)
+
+    conn.commit()
+
+
+
+
+
+def asof_join(times: Sequence[datetime], rate_times: Sequence[datetime]) -> List[int]:
+
+    """
+
+    For each time, the index of the last rate at or before it (-1 = none yet).
+
+    Both sequences sorted ascending: one merge pass.
+
+    """
+
+    out = []
+
+    j = -1
+
+    n = len(rate_times)
+
+    for t in times:
+
+        while j + 1 < n and rate_times[j + 1] <= t:
+
+            j += 1
+
+        out.append(j)
+
+    return out
+
+
+
+
+
+def asof_lookup(when: datetime, rate_times: Sequence[datetime]) -> int:
+
+    """Single-point version of asof_join (bisect)"""
+
+    return bisect_right(rate_times, when) - 1
+
+
+
+
+
+def convert_series(points: List[Tuple[datetime, float]], rate_points: List[Tuple[datetime, float]],
+
+                   basis: str = 'asof') -> List[dict]:
+
+    """
+
+    points:      [(recorded_at, price_divine)]
+
+    rate_points: [(last_updated, units per Divine)]
+
+    Prices before the first rate use the earliest rate.
+
+    """
+
+    points = sorted((_ts(t), p) for t, p in points)
+
+    rate_points = sorted((_ts(t), r) for t, r in rate_points if r)
+
+    if not rate_points:
+
+        return [{'recorded_at': t, 'price_divine': p, 'price': None, 'rate': None} for t, p in points]
+
+
+
+    rate_times = [t for t, _ in rate_points]
+
+    rates = [r for _, r in rate_points]
+
+    if basis == 'current':
+
+        idx = [len(rates) - 1] * len(points)
+
+    else:
+
+        idx = asof_join([t for t, _ in points], rate_times)
+
+
+
+    result = []
+
+    for (t, price), i in zip(points, idx):
+
+        rate = rates[max(i, 0)]
+
+        result.append({'recorded_at': t, 'price_divine': price, 'price': price * rate, 'rate': rate})
+
+    return result
+
+
+
+
+
+class AsOfHistory:
+
+    """Price histories converted to any currency basis"""
+
+
+
+    def __init__(self, conn: sqlite3.Connection, league_id: int = LEAGUE_ID):
+
+        self.conn = conn
+
+        self.league_id = league_id
+
+        self._timelines: Dict[str, List[tuple]] = {}
+
+
+
+    def timeline(self, currency: str) -> List[tuple]:
+
+        """[(time, units of currency per Divine)] ascending"""
+
+        code = canonical_code(currency)
+
+        if code not in self._timelines:
+
+            if code == 'divine':
+
+                points = []
+
+            elif code in RATE_COLUMNS:
+
+                points = [(_ts(t), r) for t, r in self.conn.execute(f"""
+
+                    SELECT last_updated, {RATE_COLUMNS[code]} FROM currency_exchange_rates
+
+                    WHERE league_id = ? AND last_updated IS NOT NULL AND {RATE_COLUMNS[code]} > 0
+
+                    ORDER BY last_updated
+
+                """, (self.league_id,))]
+
+            else:
+
+                # Other currencies: the normalizer's per-currency price history
+
+                times, values = CurrencyNormalizer(self.conn, self.league_id).history(code)
+
+                points = [(datetime.fromtimestamp(t), 1 / v) for t, v in zip(times, values) if v > 0]
+
+            self._timelines[code] = points
+
+        return self._timelines[code]
+
+
+
+    def history(self, item_base_id: Optional[int] = None) -> Dict[int, List[tuple]]:
+
+        """item_base_id -> [(recorded_at, price_divine)]"""
+
+        sql = """
+
+            SELECT item_base_id, recorded_at, price_divine FROM price_history
+
+            WHERE league_id = ? AND price_divine > 0 AND recorded_at IS NOT NULL
+
+        """
+
+        params: list = [self.league_id]
+
+        if item_base_id is not None:
+
+            sql += " AND item_base_id = ?"
+
+            params.append(item_base_id)
+
+        series: Dict[int, List[tuple]] = {}
+
+        for base_id, recorded_at, price in self.conn.execute(sql + " ORDER BY recorded_at", params):
+
+            series.setdefault(base_id, []).append((_ts(recorded_at), price))
+
+        return series
+
+
+
+    def convert(self, currency: str = 'exalted', item_base_id: Optional[int] = None,
+
+                basis: str = 'asof') -> Dict[int, List[dict]]:
+
+        """Every (or one) base's history in `currency`, one merge pass per base"""
+
+        code = canonical_code(currency)
+
+        series = self.history(item_base_id)
+
+        if code == 'divine':
+
+            return {b: [{'recorded_at': t, 'price_divine': p, 'price': p, 'rate': 1.0} for t, p in pts]
+
+                    for b, pts in series.items()}
+
+        timeline = self.timeline(code)
+
+        return {b: convert_series(pts, timeline, basis) for b, pts in series.items()}
+
+
+
+
+
+def main():
+
+    print("="*60)
+
+    print("As-Of Price History")
+
+    print("="*60)
+
+
+
+    conn = sqlite3.connect(DB_PATH)
+
+    ensure_indexes(conn)
+
+    asof = AsOfHistory(conn)
+
+    names = dict(conn.execute("SELECT id, name FROM item_bases").fetchall())
+
+
+
+    asof_ex = asof.convert('exalted')
+
+    current_ex = asof.convert('exalted', basis='current')
+
+    conn.close()
+
+
+
+    print(f"Bases with history: {len(asof_ex)}")
+
+    print(f"Exchange-rate points: {len(asof.timeline('exalted'))}")
+
+    print("\nLatest price in Exalted (as-of rate vs today's rate):")
+
+    for base_id, points in list(asof_ex.items())[:15]:
+
+        last, now = points[-1], current_ex[base_id][-1]
+
+        if last['price'] is None:
+
+            continue
+
+        print(f"  {names.get(base_id, base_id)[:35]:<35} {last['price']:10.1f} ex  "
+
+              f"(today {now['price']:10.1f} ex)  {last['recorded_at']:%Y-%m-%d}")
+
+
+
+
+
+if __name__ == "__main__":
+
+    main()
+
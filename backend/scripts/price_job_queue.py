@@ -0,0 +1,533 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Durable Price Job Queue
+
+SQLite-backed queue of pricing tasks shared by several collector workers:
+
+- leases with heartbeats (a crashed worker's jobs return to the queue)
+
+- retry counts with backoff, dead-lettering after MAX_ATTEMPTS
+
+- one request budget (token bucket) shared by all workers
+
+"""
+
+import json
+
+import os
+
+import sqlite3
+
+import time
+
+from pathlib import Path
+
+from typing import Dict, List, Optional
+
+
+
+BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
+
+QUEUE_PATH = BASE_DIR / "data" / "price_queue.db"
+
+
+
+LEASE_SECONDS = 120         # lease length, renewed by heartbeat
+
+MAX_ATTEMPTS = 4            # attempts before a job is dead-lettered
+
+RETRY_BACKOFF = 300         # seconds, doubled per failed attempt
+
+IDLE_POLL = 30              # longest a worker sleeps before looking at the queue again
+
+
+
+# Shared budget: trade API allows roughly one search+fetch pair every ~4.5s
+
+BUDGET_CAPACITY = 10        # burst size (requests)
+
+BUDGET_REFILL = 0.45        # requests per second, all workers together
+
+
+
+
+
+def _now() -> float:
+
+    return time.time()
+
+
+
+
+
+class PriceJobQueue:
+
+    def __init__(self, path: Path = QUEUE_PATH):
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.conn = sqlite3.connect(str(path), timeout=30, isolation_level=None)
+
+        self.conn.row_factory = sqlite3.Row
+
+        self.conn.execute("PRAGMA journal_mode=WAL")
+
+        self._create_tables()
+
+
+
+    def _create_tables(self):
+
+        self.conn.executescript("""
+
+            CREATE TABLE IF NOT EXISTS price_jobs (
+
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+
+                item_name TEXT NOT NULL UNIQUE,
+
+                item_type TEXT,
+
+                priority REAL DEFAULT 0,
+
+                status TEXT DEFAULT 'pending',
+
+                attempts INTEGER DEFAULT 0,
+
+                lease_owner TEXT,
+
+                lease_expires REAL,
+
+                not_before REAL DEFAULT 0,
+
+                last_error TEXT,
+
+                result TEXT,
+
+                created_at REAL,
+
+                updated_at REAL
+
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_price_jobs_ready
+
+                ON price_jobs(status, priority DESC, not_before);
+
+            CREATE TABLE IF NOT EXISTS request_budget (
+
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+
+                tokens REAL,
+
+                updated_at REAL
+
+            );
+
+        """)
+
+        self.conn.execute("INSERT OR IGNORE INTO request_budget VALUES (1, ?, ?)",
+
+                          (BUDGET_CAPACITY, _now()))
+
+
+
+    def _write(self, fn):
+
+        """Run fn inside an IMMEDIATE transaction (one writer at a time)"""
+
+        self.conn.execute("BEGIN IMMEDIATE")
+
+        try:
+
+            result = fn()
+
+            self.conn.execute("COMMIT")
+
+            return result
+
+        except Exception:
+
+            self.conn.execute("ROLLBACK")
+
+            raise
+
+
+
+    # ------------------------------------------------------------
+
+    # Producers
+
+    # ------------------------------------------------------------
+
+    def enqueue(self, items: List[dict], priority: float = 0.0, requeue_done: bool = False) -> int:
+
+        """Add {'name', 'type', optional 'priority'} items; existing jobs keep their state"""
+
+        def run():
+
+            now = _now()
+
+            added = 0
+
+            for item in items:
+
+                prio = item.get('priority', priority)
+
+                cur = self.conn.execute("""
+
+                    INSERT OR IGNORE INTO price_jobs (item_name, item_type, priority, created_at, updated_at)
+
+                    VALUES (?, ?, ?, ?, ?)
+
+                """, (item['name'], item.get('type'), prio, now, now))
+
+                if cur.rowcount:
+
+                    added += 1
+
+                elif requeue_done:
+
+                    cur = self.conn.execute("""
+
+                        UPDATE price_jobs
+
+                        SET status = 'pending', priority = ?, attempts = 0, not_before = 0, updated_at = ?
+
+                        WHERE item_name = ? AND status IN ('done', 'dead')
+
+                    """, (prio, now, item['name']))
+
+                    added += cur.rowcount
+
+            return added
+
+        return self._write(run)
+
+
+
+    # ------------------------------------------------------------
+
+    # Workers
+
+    # ------------------------------------------------------------
+
+    def lease(self, worker_id: str, lease_seconds: int = LEASE_SECONDS) -> Optional[dict]:
+
+        """Claim the highest-priority ready job; expired leases are reclaimed first"""
+
+        def run():
+
+            now = _now()
+
+            self._reclaim_expired(now)
+
+            row = self.conn.execute("""
+
+                SELECT * FROM price_jobs
+
+                WHERE status = 'pending' AND not_before <= ?
+
+                ORDER BY priority DESC, id
+
+                LIMIT 1
+
+            """, (now,)).fetchone()
+
+            if not row:
+
+                return None
+
+            self.conn.execute("""
+
+                UPDATE price_jobs
+
+                SET status = 'leased', lease_owner = ?, lease_expires = ?,
+
+                    attempts = attempts + 1, updated_at = ?
+
+                WHERE id = ?
+
+            """, (worker_id, now + lease_seconds, now, row['id']))
+
+            job = dict(row)
+
+            job['attempts'] += 1
+
+            return job
+
+        return self._write(run)
+
+
+
+    def _reclaim_expired(self, now: float):
+
+        """Jobs of crashed workers go back to pending (or dead if out of attempts)"""
+
+        self.conn.execute("""
+
+            UPDATE price_jobs
+
+            SET status = CASE WHEN attempts >= ? THEN 'dead' ELSE 'pending' END,
+
+                last_error = 'lease expired (' || IFNULL(lease_owner, '?') || ')',
+
+                lease_owner = NULL, lease_expires = NULL, updated_at = ?
+
+            WHERE status = 'leased' AND lease_expires < ?
+
+        """, (MAX_ATTEMPTS, now, now))
+
+
+
+    def heartbeat(self, job_id: int, worker_id: str, lease_seconds: int = LEASE_SECONDS) -> bool:
+
+        """Extend a lease; False means the lease was lost and the job must be dropped"""
+
+        def run():
+
+            cur = self.conn.execute("""
+
+                UPDATE price_jobs SET lease_expires = ?, updated_at = ?
+
+                WHERE id = ? AND lease_owner = ? AND status = 'leased'
+
+            """, (_now() + lease_seconds, _now(), job_id, worker_id))
+
+            return cur.rowcount == 1
+
+        return self._write(run)
+
+
+
+    def complete(self, job_id: int, worker_id: str, result: Optional[dict] = None) -> bool:
+
+        def run():
+
+            cur = self.conn.execute("""
+
+                UPDATE price_jobs
+
+                SET status = 'done', result = ?, lease_owner = NULL, lease_expires = NULL,
+
+                    last_error = NULL, updated_at = ?
+
+                WHERE id = ? AND lease_owner = ? AND status = 'leased'
+
+            """, (json.dumps(result, ensure_ascii=False) if result else None, _now(), job_id, worker_id))
+
+            return cur.rowcount == 1
+
+        return self._write(run)
+
+
+
+    def fail(self, job_id: int, worker_id: str, error: str, retry: bool = True) -> str:
+
+        """Record a failure; returns the new status ('pending' or 'dead')"""
+
+        def run():
+
+            row = self.conn.execute(
+
+                "SELECT attempts FROM price_jobs WHERE id = ? AND lease_owner = ?",
+
+                (job_id, worker_id)).fetchone()
+
+            if not row:
+
+                return 'lost'
+
+            dead = not retry or row['attempts'] >= MAX_ATTEMPTS
+
+            status = 'dead' if dead else 'pending'
+
+            backoff = RETRY_BACKOFF * (2 ** (row['attempts'] - 1))
+
+            self.conn.execute("""
+
+                UPDATE price_jobs
+
+                SET status = ?, last_error = ?, not_before = ?,
+
+                    lease_owner = NULL, lease_expires = NULL, updated_at = ?
+
+                WHERE id = ?
+
+            """, (status, error, _now() + backoff, _now(), job_id))
+
+            return status
+
+        return self._write(run)
+
+
+
+    def next_ready(self) -> Optional[float]:
+
+        """
+
+        Seconds until some job can be leased: a pending job's backoff ending or a
+
+        leased job's lease expiring. None once nothing is pending or leased.
+
+        """
+
+        row = self.conn.execute("""
+
+            SELECT MIN(CASE WHEN status = 'pending' THEN not_before ELSE lease_expires END)
+
+            FROM price_jobs WHERE status IN ('pending', 'leased')
+
+        """).fetchone()
+
+        if row[0] is None:
+
+            return None
+
+        return max(0.0, row[0] - _now())
+
+
+
+    # ------------------------------------------------------------
+
+    # Shared request budget
+
+    # ------------------------------------------------------------
+
+    def acquire_requests(self, count: int = 1) -> float:
+
+        """Take `count` tokens if available; otherwise return seconds to wait"""
+
+        def run():
+
+            now = _now()
+
+            row = self.conn.execute("SELECT tokens, updated_at FROM request_budget WHERE id = 1").fetchone()
+
+            tokens = min(BUDGET_CAPACITY, row['tokens'] + (now - row['updated_at']) * BUDGET_REFILL)
+
+            if tokens >= count:
+
+                self.conn.execute("UPDATE request_budget SET tokens = ?, updated_at = ? WHERE id = 1",
+
+                                  (tokens - count, now))
+
+                return 0.0
+
+            self.conn.execute("UPDATE request_budget SET tokens = ?, updated_at = ? WHERE id = 1",
+
+                              (tokens, now))
+
+            return (count - tokens) / BUDGET_REFILL
+
+        return self._write(run)
+
+
+
+    def wait_for_requests(self, count: int = 1):
+
+        while True:
+
+            wait = self.acquire_requests(count)
+
+            if wait <= 0:
+
+                return
+
+            time.sleep(wait)
+
+
+
+    def drain_budget(self):
+
+        """Empty the bucket after a 429 so every worker backs off"""
+
+        self._write(lambda: self.conn.execute(
+
+            "UPDATE request_budget SET tokens = 0, updated_at = ? WHERE id = 1", (_now(),)))
+
+
+
+    # ------------------------------------------------------------
+
+    # Inspection
+
+    # ------------------------------------------------------------
+
+    def stats(self) -> Dict[str, int]:
+
+        rows = self.conn.execute("SELECT status, COUNT(*) FROM price_jobs GROUP BY status").fetchall()
+
+        return {row[0]: row[1] for row in rows}
+
+
+
+    def dead_letters(self, limit: int = 50) -> List[dict]:
+
+        rows = self.conn.execute("""
+
+            SELECT item_name, attempts, last_error FROM price_jobs
+
+            WHERE status = 'dead' ORDER BY updated_at DESC LIMIT ?
+
+        """, (limit,)).fetchall()
+
+        return [dict(row) for row in rows]
+
+
+
+    def close(self):
+
+        self.conn.close()
+
+
+
+
+
+def default_worker_id() -> str:
+
+    return f"{os.uname().nodename}:{os.getpid()}"
+
+
+
+
+
+def main():
+
+    queue = PriceJobQueue()
+
+    print("="*60)
+
+    print("Price Job Queue")
+
+    print("="*60)
+
+    for status, count in sorted(queue.stats().items()):
+
+        print(f"  {status:<10} {count}")
+
+    dead = queue.dead_letters(10)
+
+    if dead:
+
+        print("\nDead letters:")
+
+        for job in dead:
+
+            print(f"  {job['item_name'][:40]:<40} x{job['attempts']}  {job['last_error']}")
+
+    queue.close()
+
+
+
+
+
+if __name__ == "__main__":
+
+    main()
+
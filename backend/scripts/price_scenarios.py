@@ -0,0 +1,603 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Price Scenario Sweep Engine
+
+Evaluates every opportunity under thousands of bootstrapped price scenarios.
+
+Each opportunity is a net quantity vector over priced inputs (currencies,
+
+bases, finished items); profit under all scenarios is one sparse
+
+vector-by-matrix product instead of rerunning the analyzers.
+
+"""
+
+import math
+
+import random
+
+import sqlite3
+
+from datetime import datetime
+
+from pathlib import Path
+
+from typing import Dict, List, Optional
+
+
+
+BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
+
+DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
+
+LEAGUE_ID = 1
+
+
+
+NUMERAIRE = 'Divine Orb'   # every price is expressed in Divine
+
+DEFAULT_DAILY_VOL = 0.05   # inputs without history get a lognormal shock of this size
+
+DEFAULT_SCENARIOS = 2000
+
+DEFAULT_HORIZON_DAYS = 1
+
+
+
+
+
+def _day(ts) -> str:
+
+    if isinstance(ts, datetime):
+
+        return ts.strftime('%Y-%m-%d')
+
+    return str(ts)[:10]
+
+
+
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+
+    if not sorted_values:
+
+        return 0.0
+
+    pos = q * (len(sorted_values) - 1)
+
+    lo = int(pos)
+
+    hi = min(lo + 1, len(sorted_values) - 1)
+
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+
+
+
+class PriceHistoryBook:
+
+    """Current prices and daily price series, all in Divine"""
+
+    def __init__(self, current: Dict[str, float], series: Dict[str, Dict[str, float]]):
+
+        self.current = dict(current)
+
+        self.current[NUMERAIRE] = 1.0
+
+        self.series = series
+
+
+
+    @classmethod
+
+    def load(cls, conn: sqlite3.Connection, league_id: int = LEAGUE_ID) -> 'PriceHistoryBook':
+
+        current: Dict[str, float] = {}
+
+        series: Dict[str, Dict[str, float]] = {}
+
+
+
+        def add(name, day, price):
+
+            if price and price > 0:
+
+                series.setdefault(name, {})[day] = price
+
+
+
+        # Currency / base point prices (CurrencyPrice, BasePrice); newest row wins
+
+        for name, price in conn.execute("""
+
+            SELECT c.name, cp.price_divine
+
+            FROM currency_prices cp
+
+            JOIN currencies c ON cp.currency_id = c.id
+
+            WHERE cp.league_id = ?
+
+            ORDER BY cp.last_updated, cp.id
+
+        """, (league_id,)):
+
+            if price:
+
+                current[name] = price
+
+        for name, price in conn.execute("""
+
+            SELECT ib.name, bp.price_divine
+
+            FROM base_prices bp
+
+            JOIN item_bases ib ON bp.item_base_id = ib.id
+
+            WHERE bp.league_id = ?
+
+            ORDER BY bp.last_updated, bp.id
+
+        """, (league_id,)):
+
+            if price:
+
+                current[name] = price
+
+
+
+        # Exalt / Chaos timelines from the exchange rate history
+
+        for d2e, d2c, ts in conn.execute("""
+
+            SELECT divine_to_exalt, divine_to_chaos, last_updated
+
+            FROM currency_exchange_rates
+
+            WHERE league_id = ?
+
+            ORDER BY last_updated
+
+        """, (league_id,)):
+
+            if d2e:
+
+                add('Exalted Orb', _day(ts), 1.0 / d2e)
+
+            if d2c:
+
+                add('Chaos Orb', _day(ts), 1.0 / d2c)
+
+
+
+        # Base timelines (PriceHistory)
+
+        for name, price, ts in conn.execute("""
+
+            SELECT ib.name, ph.price_divine, ph.recorded_at
+
+            FROM price_history ph
+
+            JOIN item_bases ib ON ph.item_base_id = ib.id
+
+            WHERE ph.league_id = ?
+
+            ORDER BY ph.recorded_at
+
+        """, (league_id,)):
+
+            add(name, _day(ts), price)
+
+
+
+        for name, points in series.items():
+
+            if name not in current and points:
+
+                current[name] = points[max(points)]
+
+        return cls(current, series)
+
+
+
+    def daily_returns(self) -> Dict[str, Dict[str, float]]:
+
+        """input -> {day: log return vs previous recorded day}"""
+
+        returns: Dict[str, Dict[str, float]] = {}
+
+        for name, points in self.series.items():
+
+            days = sorted(points)
+
+            returns[name] = {
+
+                day: math.log(points[day] / points[prev])
+
+                for prev, day in zip(days, days[1:])
+
+            }
+
+        return returns
+
+
+
+
+
+class ScenarioEngine:
+
+    """
+
+    Scenario matrix: one row per input, one column per scenario.
+
+    Scenarios resample whole days (keeps cross-input correlation);
+
+    inputs without history get an independent lognormal shock.
+
+    """
+
+    def __init__(self, book: PriceHistoryBook, scenarios: int = DEFAULT_SCENARIOS,
+
+                 horizon_days: int = DEFAULT_HORIZON_DAYS,
+
+                 default_vol: float = DEFAULT_DAILY_VOL, seed: Optional[int] = None):
+
+        self.book = book
+
+        self.n_scenarios = scenarios
+
+        self.horizon_days = horizon_days
+
+        self.default_vol = default_vol
+
+        self.rng = random.Random(seed)
+
+        self.returns = book.daily_returns()
+
+        self.days = sorted({d for r in self.returns.values() for d in r})
+
+        self._day_draws = [
+
+            [self.rng.randrange(len(self.days)) for _ in range(horizon_days)]
+
+            for _ in range(scenarios)
+
+        ] if self.days else []
+
+        # Keyed by (name, base price): names without history can carry a different
+
+        # point price per opportunity (e.g. 'Essence (avg)' across builds)
+
+        self.rows: Dict[tuple, List[float]] = {}
+
+        self._shocks: Dict[str, List[float]] = {}
+
+        self._row_stats: Dict[tuple, tuple] = {}
+
+
+
+    def source(self, name: str) -> str:
+
+        if name == NUMERAIRE:
+
+            return 'numeraire'
+
+        return 'bootstrap' if self.returns.get(name) else 'modelled'
+
+
+
+    def shocks(self, name: str) -> List[float]:
+
+        """Per-scenario price multipliers of one input (drawn once per name)"""
+
+        if name not in self._shocks:
+
+            if self.returns.get(name):
+
+                rets = self.returns[name]
+
+                days = self.days
+
+                shocks = [math.exp(sum(rets.get(days[d], 0.0) for d in draw))
+
+                          for draw in self._day_draws]
+
+            else:
+
+                sigma = self.default_vol * math.sqrt(self.horizon_days)
+
+                gauss = self.rng.gauss
+
+                shocks = [math.exp(gauss(-0.5 * sigma * sigma, sigma))
+
+                          for _ in range(self.n_scenarios)]
+
+            self._shocks[name] = shocks
+
+        return self._shocks[name]
+
+
+
+    def row(self, name: str, point_price: Optional[float] = None) -> List[float]:
+
+        """Scenario prices of one input at its base price (built once, then cached)"""
+
+        base = self.book.current.get(name, point_price or 0.0)
+
+        key = (name, base)
+
+        if key in self.rows:
+
+            return self.rows[key]
+
+        if name == NUMERAIRE or base <= 0:
+
+            row = [base] * self.n_scenarios
+
+        else:
+
+            row = [base * m for m in self.shocks(name)]
+
+        self.rows[key] = row
+
+        return row
+
+
+
+    def profit_vector(self, opportunity: dict) -> List[float]:
+
+        """Net value of one opportunity under every scenario"""
+
+        acc = [0.0] * self.n_scenarios
+
+        prices = opportunity.get('prices', {})
+
+        for name, qty in net_quantities(opportunity).items():
+
+            if qty == 0:
+
+                continue
+
+            row = self.row(name, prices.get(name))
+
+            acc = [a + qty * p for a, p in zip(acc, row)]
+
+        return acc
+
+
+
+    def evaluate(self, opportunities: List[dict], risk_aversion: float = 1.0) -> List[dict]:
+
+        """Profit distribution and per-input sensitivities for every opportunity"""
+
+        results = []
+
+        for opp in opportunities:
+
+            profits = self.profit_vector(opp)
+
+            ordered = sorted(profits)
+
+            n = len(profits)
+
+            mean = sum(profits) / n
+
+            std = math.sqrt(sum((p - mean) ** 2 for p in profits) / max(n - 1, 1))
+
+            results.append({
+
+                'name': opp.get('name') or opp.get('recipe'),
+
+                'point_profit': point_profit(opp, self.book.current),
+
+                'mean_profit': mean,
+
+                'std_profit': std,
+
+                'p5': _percentile(ordered, 0.05),
+
+                'p50': _percentile(ordered, 0.50),
+
+                'p95': _percentile(ordered, 0.95),
+
+                'prob_loss': sum(1 for p in profits if p < 0) / n,
+
+                'risk_adjusted': mean - risk_aversion * std,
+
+                'sensitivities': self.sensitivities(opp, profits, mean, std),
+
+            })
+
+        results.sort(key=lambda r: -r['risk_adjusted'])
+
+        return results
+
+
+
+    def sensitivities(self, opportunity: dict, profits: List[float],
+
+                      mean: float, std: float) -> List[dict]:
+
+        """
+
+        Per input: profit change for +10% in its price, and the correlation
+
+        of its scenario price with the opportunity's profit
+
+        """
+
+        out = []
+
+        prices = opportunity.get('prices', {})
+
+        for name, qty in net_quantities(opportunity).items():
+
+            if qty == 0:
+
+                continue
+
+            row = self.row(name, prices.get(name))
+
+            current = self.book.current.get(name, prices.get(name, 0.0))
+
+            key = (name, current)
+
+            if key not in self._row_stats:
+
+                r_mean = sum(row) / len(row)
+
+                r_std = math.sqrt(sum((p - r_mean) ** 2 for p in row) / max(len(row) - 1, 1))
+
+                self._row_stats[key] = (r_mean, r_std)
+
+            r_mean, r_std = self._row_stats[key]
+
+            if std > 0 and r_std > 0:
+
+                cov = sum((p - mean) * (r - r_mean) for p, r in zip(profits, row)) / max(len(row) - 1, 1)
+
+                corr = cov / (std * r_std)
+
+            else:
+
+                corr = 0.0
+
+            out.append({
+
+                'input': name,
+
+                'quantity': qty,
+
+                'price': current,
+
+                'delta_10pct': qty * current * 0.10,
+
+                'correlation': corr,
+
+                'source': self.source(name),
+
+            })
+
+        out.sort(key=lambda s: -abs(s['delta_10pct']))
+
+        return out
+
+
+
+
+
+def net_quantities(opportunity: dict) -> Dict[str, float]:
+
+    """outputs - inputs, keyed by priced item name"""
+
+    net: Dict[str, float] = {}
+
+    for name, qty in opportunity.get('outputs', {}).items():
+
+        net[name] = net.get(name, 0.0) + qty
+
+    for name, qty in opportunity.get('inputs', {}).items():
+
+        net[name] = net.get(name, 0.0) - qty
+
+    return net
+
+
+
+
+
+def point_profit(opportunity: dict, current: Dict[str, float]) -> float:
+
+    prices = opportunity.get('prices', {})
+
+    return sum(qty * current.get(name, prices.get(name, 0.0))
+
+               for name, qty in net_quantities(opportunity).items())
+
+
+
+
+
+def main():
+
+    import json
+
+    print("="*60)
+
+    print("Price Scenario Sweep")
+
+    print("="*60)
+
+
+
+    conn = sqlite3.connect(DB_PATH)
+
+    book = PriceHistoryBook.load(conn)
+
+    engine = ScenarioEngine(book, seed=42)
+
+
+
+    # The analyzers append a row per run: keep the latest cost vector per recipe
+
+    seen = set()
+
+    opportunities = []
+
+    for (path,) in conn.execute("""
+
+        SELECT crafting_path FROM profit_opportunities
+
+        WHERE league_id = ? ORDER BY calculated_at DESC, id DESC
+
+    """, (LEAGUE_ID,)):
+
+        data = json.loads(path) if path else {}
+
+        recipe = data.get('recipe') or data.get('name')
+
+        if data.get('inputs') and recipe not in seen:
+
+            seen.add(recipe)
+
+            opportunities.append(data)
+
+    conn.close()
+
+
+
+    print(f"Inputs with history: {len(book.series)}")
+
+    print(f"Opportunities with cost vectors: {len(opportunities)}")
+
+    print(f"Scenarios: {engine.n_scenarios}")
+
+
+
+    for r in engine.evaluate(opportunities)[:10]:
+
+        print(f"\n{r['name']}")
+
+        print(f"  point {r['point_profit']:.2f} | mean {r['mean_profit']:.2f} "
+
+              f"| p5 {r['p5']:.2f} | p95 {r['p95']:.2f} | P(loss) {r['prob_loss']*100:.1f}%")
+
+        for s in r['sensitivities'][:3]:
+
+            print(f"    {s['input']:<35} +10% -> {s['delta_10pct']:+.2f} div ({s['source']})")
+
+
+
+
+
+if __name__ == "__main__":
+
+    main()
+
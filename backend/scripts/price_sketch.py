@@ -0,0 +1,367 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Streaming Price Sketches
+
+One KLL quantile sketch per item keeps a bounded summary of every listing
+
+price seen, normalised to Divine at ingest. Sketches merge, so sharded
+
+collectors (or later passes) combine by merging instead of re-scanning.
+
+Estimates reject price-fixer outliers with a log-IQR fence before taking
+
+the trimmed floor.
+
+"""
+
+import math
+
+import os
+
+import random
+
+import sqlite3
+
+import sys
+
+from datetime import datetime, timedelta
+
+from typing import Dict, List, Optional, Tuple
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+from scripts.currency_normalizer import CurrencyNormalizer
+
+
+
+KLL_K = 100                 # top compactor size; error ~ 1.7 / K of rank
+
+TRIM_QUANTILE = 0.1         # floor = this quantile of the non-outlier listings
+
+OUTLIER_IQR = 1.5           # fence in log-IQR units below Q1 / above Q3
+
+SKETCH_MAX_AGE_HOURS = 24   # older sketches restart (tumbling window)
+
+
+
+
+
+class KLLSketch:
+
+    def __init__(self, k: int = KLL_K):
+
+        self.k = k
+
+        self.n = 0
+
+        self.compactors: List[List[float]] = [[]]
+
+        self.size = 0
+
+        self.max_size = self._max_size()
+
+
+
+    def __len__(self) -> int:
+
+        return self.n
+
+
+
+    def _capacity(self, level: int) -> int:
+
+        depth = len(self.compactors) - level - 1
+
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+
+
+    def _max_size(self) -> int:
+
+        return sum(self._capacity(h) for h in range(len(self.compactors)))
+
+
+
+    def _compress(self):
+
+        while self.size >= self.max_size:
+
+            for h, items in enumerate(self.compactors):
+
+                if len(items) >= self._capacity(h):
+
+                    if h + 1 == len(self.compactors):
+
+                        self.compactors.append([])
+
+                        self.max_size = self._max_size()
+
+                    items.sort()
+
+                    keep = [items.pop()] if len(items) % 2 else []
+
+                    promoted = items[random.randint(0, 1)::2]
+
+                    self.compactors[h + 1].extend(promoted)
+
+                    self.compactors[h] = keep
+
+                    self.size -= len(items) - len(promoted)
+
+                    break
+
+
+
+    def update(self, value: float):
+
+        self.compactors[0].append(value)
+
+        self.n += 1
+
+        self.size += 1
+
+        if self.size >= self.max_size:
+
+            self._compress()
+
+
+
+    def merge(self, other: 'KLLSketch') -> 'KLLSketch':
+
+        while len(self.compactors) < len(other.compactors):
+
+            self.compactors.append([])
+
+        for h, items in enumerate(other.compactors):
+
+            self.compactors[h].extend(items)
+
+        self.n += other.n
+
+        self.size += other.size
+
+        self.max_size = self._max_size()
+
+        self._compress()
+
+        return self
+
+
+
+    def _weighted(self) -> List[tuple]:
+
+        return sorted((v, 1 << h) for h, items in enumerate(self.compactors) for v in items)
+
+
+
+    def quantile(self, q: float) -> Optional[float]:
+
+        weighted = self._weighted()
+
+        if not weighted:
+
+            return None
+
+        total = sum(w for _, w in weighted)
+
+        target = q * total
+
+        seen = 0
+
+        for value, weight in weighted:
+
+            seen += weight
+
+            if seen >= target:
+
+                return value
+
+        return weighted[-1][0]
+
+
+
+    def rank(self, value: float) -> float:
+
+        """Fraction of the stream <= value"""
+
+        weighted = self._weighted()
+
+        total = sum(w for _, w in weighted)
+
+        return sum(w for v, w in weighted if v <= value) / total if total else 0.0
+
+
+
+    def to_dict(self) -> dict:
+
+        return {'k': self.k, 'n': self.n, 'compactors': self.compactors}
+
+
+
+    @classmethod
+
+    def from_dict(cls, data: dict) -> 'KLLSketch':
+
+        sketch = cls(data.get('k', KLL_K))
+
+        sketch.n = data.get('n', 0)
+
+        sketch.compactors = [list(c) for c in data.get('compactors', [[]])] or [[]]
+
+        sketch.size = sum(len(c) for c in sketch.compactors)
+
+        sketch.max_size = sketch._max_size()
+
+        return sketch
+
+
+
+
+
+def summarize(sketch: KLLSketch) -> Optional[dict]:
+
+    """Trimmed floor / median / spread (Q3/Q1) with log-IQR outlier rejection"""
+
+    if not sketch.n:
+
+        return None
+
+    q1, median, q3 = sketch.quantile(0.25), sketch.quantile(0.5), sketch.quantile(0.75)
+
+    if q1 <= 0:
+
+        return {'floor': q1, 'median': median, 'spread': None, 'count': sketch.n, 'outliers_low': 0.0}
+
+    log_iqr = math.log(q3 / q1)
+
+    low_fence = q1 * math.exp(-OUTLIER_IQR * log_iqr)
+
+    outliers_low = sketch.rank(low_fence * (1 - 1e-9))
+
+    floor = sketch.quantile(min(1.0, outliers_low + TRIM_QUANTILE * (1 - outliers_low)))
+
+    return {
+
+        'floor': floor,
+
+        'median': median,
+
+        'spread': q3 / q1,
+
+        'count': sketch.n,
+
+        'outliers_low': round(outliers_low, 3),
+
+    }
+
+
+
+
+
+class PriceSketchBook:
+
+    """Per-item sketches with currency normalised to Divine at ingest"""
+
+
+
+    def __init__(self, rates: Dict[str, float], k: int = KLL_K):
+
+        self.rates = rates
+
+        self.k = k
+
+        self.sketches: Dict[str, KLLSketch] = {}
+
+
+
+    @classmethod
+
+    def from_db(cls, conn: sqlite3.Connection) -> 'PriceSketchBook':
+
+        return cls(CurrencyNormalizer(conn).as_dict())
+
+
+
+    def add(self, item: str, amount: float, currency: str) -> bool:
+
+        rate = self.rates.get(currency)
+
+        if not rate or not amount or amount <= 0:
+
+            return False
+
+        self.sketches.setdefault(item, KLLSketch(self.k)).update(amount * rate)
+
+        return True
+
+
+
+    def add_prices(self, item: str, prices: List[dict]) -> int:
+
+        """prices: [{'amount', 'currency'}] as stored in collected_prices.json"""
+
+        return sum(1 for p in prices if self.add(item, p.get('amount'), p.get('currency')))
+
+
+
+    def merge(self, other: 'PriceSketchBook') -> 'PriceSketchBook':
+
+        for item, sketch in other.sketches.items():
+
+            if item in self.sketches:
+
+                self.sketches[item].merge(sketch)
+
+            else:
+
+                self.sketches[item] = KLLSketch.from_dict(sketch.to_dict())
+
+        return self
+
+
+
+    def estimate(self, item: str) -> Optional[dict]:
+
+        sketch = self.sketches.get(item)
+
+        return summarize(sketch) if sketch else None
+
+
+
+
+
+def merge_stored(entry: Optional[dict], sketch: KLLSketch,
+
+                 max_age_hours: float = SKETCH_MAX_AGE_HOURS) -> Tuple[KLLSketch, str]:
+
+    """
+
+    Merge a new pass into the sketch stored on a collected_prices entry.
+
+    Returns (sketch, window start); a stale stored sketch is dropped.
+
+    """
+
+    stored = (entry or {}).get('sketch')
+
+    started = (entry or {}).get('sketch_started')
+
+    if stored and started:
+
+        age = datetime.now() - datetime.fromisoformat(started)
+
+        if age <= timedelta(hours=max_age_hours):
+
+            return KLLSketch.from_dict(stored).merge(sketch), started
+
+    return sketch, datetime.now().isoformat()
+
@@ -9,6 +9,8 @@ PoE2 Profit Analyzer - Uses existing DB schema
 
 import os
 
+import sys
+
 import sqlite3
 
 import json
@@ -17,79 +19,93 @@ from datetime import datetime
 
 
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+from scripts.currency_normalizer import CurrencyNormalizer
+
+from scripts.mod_parser import canonical, load_tier_index, tier_ladder
+
+from scripts.mod_pool import compile_pool
+
+from scripts.outcome_index import OutcomeIndex
+
+from scripts.pool_reweighting import PoolReweighter, catalyst_multipliers
+
+
+
 DB_PATH = os.path.expanduser("~/poe2-profit-optimizer/backend/poe2_profit_optimizer.db")
 
 LEAGUE_ID = 1
 
 
 
+# Breach Ring flat-damage prefixes the triple craft aims for
 
+FLAT_ATTACK_MODS = ["Lightning damage to Attacks", "Cold damage to Attacks", "Fire damage to Attacks"]
 
-class ProfitAnalyzer:
 
-    def __init__(self):
 
-        self.conn = sqlite3.connect(DB_PATH)
 
-        self.conn.row_factory = sqlite3.Row
 
-        self.load_prices()
+def hit_count_distribution(probs):
 
-        
+    """P(exactly k of the mods hit) for independent per-mod hit chances, k = 0..len(probs)"""
 
-    def close(self):
+    dist = [1.0]
 
-        self.conn.close()
+    for p in probs:
 
-        
+        nxt = [0.0] * (len(dist) + 1)
 
-    def load_prices(self):
+        for k, q in enumerate(dist):
 
-        cursor = self.conn.cursor()
+            nxt[k] += q * (1 - p)
 
-        
+            nxt[k + 1] += q * p
 
-        # Load exchange rate
+        dist = nxt
 
-        cursor.execute("""
+    return dist
 
-            SELECT divine_to_exalt, divine_to_chaos 
 
-            FROM currency_exchange_rates 
 
-            WHERE league_id = ? 
 
-            ORDER BY last_updated DESC LIMIT 1
 
-        """, (LEAGUE_ID,))
+class ProfitAnalyzer:
+
+    def __init__(self):
 
-        row = cursor.fetchone()
+        self.conn = sqlite3.connect(DB_PATH)
 
-        self.divine_to_exalt = row[0] if row else 80
+        self.conn.row_factory = sqlite3.Row
 
-        self.divine_to_chaos = row[1] if row else 200
+        self.load_prices()
+
+        self.outcomes = OutcomeIndex.from_db(self.conn, league_id=LEAGUE_ID)
 
         
 
-        # Load currency prices
+    def close(self):
 
-        self.currency_prices = {}
+        self.conn.close()
 
-        cursor.execute("""
+        
 
-            SELECT c.name, cp.price_divine
+    def load_prices(self):
 
-            FROM currency_prices cp
+        cursor = self.conn.cursor()
 
-            JOIN currencies c ON cp.currency_id = c.id
+        
 
-            WHERE cp.league_id = ?
+        # Exchange rate and currency prices (shared normalizer)
 
-        """, (LEAGUE_ID,))
+        self.rates = CurrencyNormalizer(self.conn, LEAGUE_ID)
 
-        for row in cursor.fetchall():
+        self.divine_to_exalt = self.rates.rate("divine", "exalted")
 
-            self.currency_prices[row[0]] = row[1]
+        self.divine_to_chaos = self.rates.rate("divine", "chaos")
 
             
 
@@ -105,7 +121,7 @@ class ProfitAnalyzer:
 
             JOIN item_bases ib ON bp.item_base_id = ib.id
 
-            WHERE bp.league_id = ?
+            WHERE bp.league_id = ? AND bp.price_divine IS NOT NULL
 
         """, (LEAGUE_ID,))
 
@@ -117,7 +133,7 @@ class ProfitAnalyzer:
 
     def get_currency_price(self, name):
 
-        return self.currency_prices.get(name, 0)
+        return self.rates.value(name)
 
         
 
@@ -127,6 +143,104 @@ class ProfitAnalyzer:
 
         
 
+    def catalyst_lift(self, item_type, target_mod, catalyst, quality, ilvl=82):
+
+        """How much a catalyst multiplies the per-roll chance of target_mod"""
+
+        try:
+
+            pool = compile_pool(self.conn, item_type, ilvl)
+
+        except sqlite3.OperationalError:
+
+            return 1.0  # modifier tables not imported yet
+
+        target = pool.find(target_mod, 'prefix')
+
+        if not target:
+
+            return 1.0
+
+        reweighter = PoolReweighter(pool)
+
+        base = reweighter.probability(target)
+
+        boosted = reweighter.probability(target, catalyst_multipliers(catalyst, quality))
+
+        return boosted / base if base > 0 else 1.0
+
+        
+
+    def flat_outcome_prices(self, item_type="Rings", ilvl=82):
+
+        """
+
+        Price the triple / double / single flat-damage outcomes through the outcome index.
+
+        T9 / T8 are the best and next-best tier rows of each mod in mod_tiers - the
+
+        same tiers mod_parser resolves listings to.
+
+        Returns {bucket: price or None}; None when the mods, tier rows or listings are missing.
+
+        """
+
+        prices = {"t9_triple": None, "t9_double": None, "t8_single": None}
+
+        try:
+
+            pool = compile_pool(self.conn, item_type, ilvl)
+
+        except sqlite3.OperationalError:
+
+            return prices
+
+        tier_index = load_tier_index(self.conn)
+
+        top, second = [], []
+
+        for name in FLAT_ATTACK_MODS:
+
+            for i in pool.find(name, 'prefix'):
+
+                rows = tier_ladder(tier_index, canonical(pool.names[i])[0], item_type, 'prefix')
+
+                if len(rows) >= 2:
+
+                    top.append((pool.modifier_ids[i], rows[0][0]))
+
+                    second.append((pool.modifier_ids[i], rows[1][0]))
+
+                    break
+
+        if len(top) < len(FLAT_ATTACK_MODS):
+
+            return prices
+
+        
+
+        candidates = {
+
+            "t9_triple": top,
+
+            "t9_double": top[:2],
+
+            "t8_single": second[:1],
+
+        }
+
+        for bucket, mods in candidates.items():
+
+            stats = self.outcomes.lookup(mods)['stats']
+
+            if stats:
+
+                prices[bucket] = stats['median']
+
+        return prices
+
+        
+
     def analyze_breach_ring(self):
 
         """Breach Ring crafting analysis"""
@@ -169,6 +283,8 @@ class ProfitAnalyzer:
 
         catalyst_cost = 0.25  # Lightning Catalyst x50
 
+        catalyst_lift = self.catalyst_lift("Rings", "Lightning damage to Attacks", "Esh's Catalyst", 20)
+
         
 
         # Total investment
@@ -191,13 +307,41 @@ class ProfitAnalyzer:
 
         
 
-        # Expected prices
+        # Catalyst quality raises the lightning hit chance only: lift that one mod's chance,
+
+        # recompute the joint 3/2/1-hit odds and scale the buckets by the change.
+
+        # Extra hits come out of vendor outcomes.
+
+        per_mod = prob_t9_triple ** (1 / 3)
+
+        base_dist = hit_count_distribution([per_mod] * 3)
+
+        lifted_dist = hit_count_distribution([min(1.0, per_mod * catalyst_lift), per_mod, per_mod])
+
+        boosted = [
+
+            prob * (lifted_dist[k] / base_dist[k] if base_dist[k] > 0 else 1.0)
+
+            for prob, k in ((prob_t9_triple, 3), (prob_t9_double, 2), (prob_t8_single, 1))
+
+        ]
+
+        prob_vendor = max(0.0, prob_vendor - (sum(boosted) - prob_t9_triple - prob_t9_double - prob_t8_single))
+
+        prob_t9_triple, prob_t9_double, prob_t8_single = boosted
+
+        
+
+        # Expected prices: outcome index when listings cover the mod set, else estimates
+
+        indexed = self.flat_outcome_prices()
 
-        price_t9_triple = 55
+        price_t9_triple = indexed["t9_triple"] or 55
 
-        price_t9_double = 25
+        price_t9_double = indexed["t9_double"] or 25
 
-        price_t8_single = 8
+        price_t8_single = indexed["t8_single"] or 8
 
         price_sellable = 2
 
@@ -245,17 +389,19 @@ class ProfitAnalyzer:
 
         
 
-        print("\nExpected Outcomes:")
+        print("\nExpected Outcomes (catalyst lift x{:.2f}, {} priced from listings):".format(
 
-        print("  T9 Triple (2%): {} Divine".format(price_t9_triple))
+            catalyst_lift, sum(1 for p in indexed.values() if p)))
 
-        print("  T9 Double (8%): {} Divine".format(price_t9_double))
+        print("  T9 Triple ({:.1f}%): {} Divine".format(prob_t9_triple * 100, price_t9_triple))
 
-        print("  T8 Single (20%): {} Divine".format(price_t8_single))
+        print("  T9 Double ({:.1f}%): {} Divine".format(prob_t9_double * 100, price_t9_double))
 
-        print("  Sellable (40%): {} Divine".format(price_sellable))
+        print("  T8 Single ({:.1f}%): {} Divine".format(prob_t8_single * 100, price_t8_single))
 
-        print("  Vendor (30%): {} Divine".format(price_vendor))
+        print("  Sellable ({:.1f}%): {} Divine".format(prob_sellable * 100, price_sellable))
+
+        print("  Vendor ({:.1f}%): {} Divine".format(prob_vendor * 100, price_vendor))
 
         
 
@@ -295,6 +441,38 @@ class ProfitAnalyzer:
 
             "roi": roi,
 
+            # Cost vector for price scenario sweeps (price_scenarios.py)
+
+            "inputs": {
+
+                "Breach Ring": 1,
+
+                "Essence of Rage": 1,
+
+                "Omen of Sinistral Exaltation": 1,
+
+                "Exalted Orb": 2,
+
+                "Divine Orb": catalyst_cost,
+
+            },
+
+            "outputs": {"Breach Ring Triple Flat": 1},
+
+            "prices": {
+
+                "Breach Ring": base_cost,
+
+                "Essence of Rage": essence_cost,
+
+                "Omen of Sinistral Exaltation": omen_cost,
+
+                "Exalted Orb": exalt_cost / 2,
+
+                "Breach Ring Triple Flat": expected_value,
+
+            },
+
         }
 
         
@@ -389,9 +567,11 @@ class ProfitAnalyzer:
 
         
 
+        recipe = "+3 {} Amulet".format(skill_type)
+
         return {
 
-            "recipe": "+3 {} Amulet".format(skill_type),
+            "recipe": recipe,
 
             "investment": total_cost,
 
@@ -401,6 +581,32 @@ class ProfitAnalyzer:
 
             "roi": roi,
 
+            "inputs": {
+
+                "Tenebrous Ring": 1,
+
+                "Chaos Orb": 500,
+
+                "Omen of Sinistral Exaltation": 1,
+
+                "Divine Orb": catalyst_cost,
+
+            },
+
+            "outputs": {recipe: 1},
+
+            "prices": {
+
+                "Tenebrous Ring": base_cost,
+
+                "Chaos Orb": chaos_cost / 500,
+
+                "Omen of Sinistral Exaltation": omen_cost,
+
+                recipe: expected_price,
+
+            },
+
         }
 
         
@@ -441,7 +647,17 @@ class ProfitAnalyzer:
 
                 "Medium" if r["roi"] > 50 else "High",
 
-                json.dumps({"recipe": r["recipe"]}),
+                json.dumps({
+
+                    "recipe": r["recipe"],
+
+                    "inputs": r.get("inputs", {}),
+
+                    "outputs": r.get("outputs", {}),
+
+                    "prices": r.get("prices", {}),
+
+                }),
 
                 datetime.now()
 
@@ -475,9 +691,9 @@ def main():
 
     print("\nLoaded Prices:")
 
-    print("  Exchange: 1 Divine = {} Exalt".format(analyzer.divine_to_exalt))
+    print("  Exchange: 1 Divine = {:.1f} Exalt".format(analyzer.divine_to_exalt))
 
-    print("  Currencies: {}".format(len(analyzer.currency_prices)))
+    print("  Currencies: {}".format(len(analyzer.rates.codes)))
 
     print("  Base items: {}".format(len(analyzer.base_prices)))
 
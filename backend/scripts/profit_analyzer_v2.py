@@ -9,12 +9,24 @@ PoE2 Profit Analyzer V2 - With Realistic Probabilities
 
 import os
 
+import sys
+
 import sqlite3
 
 from datetime import datetime
 
 
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+from scripts.currency_normalizer import CurrencyNormalizer
+
+from scripts.price_scenarios import PriceHistoryBook, ScenarioEngine
+
+
+
 DB_PATH = os.path.expanduser("~/poe2-profit-optimizer/backend/poe2_profit_optimizer.db")
 
 LEAGUE_ID = 1
@@ -91,29 +103,21 @@ def load_prices():
 
     
 
-    # Exchange rate
+    # Exchange rate (shared normalizer)
 
-    cursor.execute("""
+    rates = CurrencyNormalizer(conn, LEAGUE_ID)
 
-        SELECT divine_to_chaos FROM currency_exchange_rates 
-
-        WHERE league_id = ? ORDER BY last_updated DESC LIMIT 1
-
-    """, (LEAGUE_ID,))
-
-    row = cursor.fetchone()
-
-    divine_to_chaos = row[0] if row else 200
+    divine_to_chaos = rates.rate("divine", "chaos")
 
     
 
-    # Currency prices
+    # Currency prices (newest row per currency)
 
     prices = {}
 
     cursor.execute("""
 
-        SELECT c.name, cp.price_divine
+        SELECT DISTINCT c.name
 
         FROM currency_prices cp
 
@@ -125,7 +129,7 @@ def load_prices():
 
     for row in cursor.fetchall():
 
-        prices[row[0]] = row[1]
+        prices[row[0]] = rates.value(row[0])
 
     
 
@@ -139,7 +143,7 @@ def load_prices():
 
         JOIN item_bases ib ON bp.item_base_id = ib.id
 
-        WHERE bp.league_id = ?
+        WHERE bp.league_id = ? AND bp.price_divine IS NOT NULL
 
     """, (LEAGUE_ID,))
 
@@ -265,6 +269,32 @@ def analyze_amulet(name, data, divine_to_chaos, prices):
 
         "status": status,
 
+        "inputs": {
+
+            "Tenebrous Ring": 1,
+
+            "Chaos Orb": avg_chaos,
+
+            "Omen of Sinistral Exaltation": 1,
+
+            "Divine Orb": catalyst_cost,
+
+        },
+
+        "outputs": {name: 1},
+
+        "prices": {
+
+            "Tenebrous Ring": base_cost,
+
+            "Chaos Orb": chaos_price,
+
+            "Omen of Sinistral Exaltation": omen_cost,
+
+            name: sale_price,
+
+        },
+
     }
 
 
@@ -377,6 +407,36 @@ def analyze_breach_ring(name, data, prices):
 
         "status": status,
 
+        "inputs": {
+
+            "Breach Ring": avg_attempts,
+
+            "Essence of Rage": avg_attempts,
+
+            "Omen of Sinistral Exaltation": avg_attempts,
+
+            "Exalted Orb": 2 * avg_attempts,
+
+            "Divine Orb": catalyst_cost * avg_attempts,
+
+        },
+
+        "outputs": {name: 1},
+
+        "prices": {
+
+            "Breach Ring": base_cost,
+
+            "Essence of Rage": essence_cost,
+
+            "Omen of Sinistral Exaltation": omen_cost,
+
+            "Exalted Orb": exalt_cost / 2,
+
+            name: sale_price,
+
+        },
+
     }
 
 
@@ -399,7 +459,7 @@ def main():
 
     
 
-    print(f"\nLoaded: 1 Divine = {divine_to_chaos} Chaos")
+    print(f"\nLoaded: 1 Divine = {divine_to_chaos:.1f} Chaos")
 
     print(f"Prices loaded: {len(prices)} items")
 
@@ -459,6 +519,40 @@ def main():
 
     
 
+    # Price risk across bootstrapped scenarios
+
+    print("\n" + "="*60)
+
+    print("PRICE RISK (bootstrapped scenarios)")
+
+    print("="*60)
+
+    
+
+    conn = sqlite3.connect(DB_PATH)
+
+    engine = ScenarioEngine(PriceHistoryBook.load(conn, LEAGUE_ID), seed=42)
+
+    conn.close()
+
+    
+
+    for r in engine.evaluate(results):
+
+        print(f"\n{r['name']}")
+
+        print(f"   Mean Profit: {r['mean_profit']:.2f} Divine (p5 {r['p5']:.2f}, p95 {r['p95']:.2f})")
+
+        print(f"   P(loss): {r['prob_loss']*100:.1f}%")
+
+        top = r['sensitivities'][0] if r['sensitivities'] else None
+
+        if top:
+
+            print(f"   Most sensitive to: {top['input']} (+10% -> {top['delta_10pct']:+.2f} Divine)")
+
+    
+
     print("\n" + "="*60)
 
     print("Analysis Complete!")
@@ -0,0 +1,565 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Rare-Event Estimator for Ultra-Low-Probability Crafts
+
+Importance sampling over weighted mod draws without replacement.
+
+Target mods are drawn from a tilted (boosted) pool and every sample is
+
+corrected by its exact likelihood ratio, so 1-in-a-million outcomes get
+
+tight confidence intervals from ~10^5 samples instead of ~10^9.
+
+"""
+
+import math
+
+import os
+
+import random
+
+import sys
+
+import time
+
+from typing import Dict, List, Optional, Sequence
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+from scripts.mod_pool import CompiledModPool
+
+
+
+# Prefix count after a Chaos Orb / Alchemy (existing analyses assume ~2.5)
+
+DEFAULT_SLOT_PROBS = {2: 0.5, 3: 0.5}
+
+
+
+Z_SCORES = {0.90: 1.645, 0.95: 1.96, 0.99: 2.576}
+
+
+
+
+
+class RareEventEstimator:
+
+    """
+
+    P(every requirement is met) when `slots` mods are drawn by weight
+
+    without replacement (one mod per group).
+
+
+
+    Args:
+
+        weights: weight of each pool entry
+
+        requirements: list of index sets; each needs one distinct drawn entry
+
+        groups: exclusive group per entry (tiers of one mod); defaults to entry itself
+
+        slot_probs: {number of draws: probability}
+
+    """
+
+    def __init__(self, weights: Sequence[float], requirements: List[Sequence[int]],
+
+                 groups: Optional[Sequence[int]] = None,
+
+                 slot_probs: Optional[Dict[int, float]] = None,
+
+                 seed: Optional[int] = None):
+
+        self.weights = [float(w) for w in weights]
+
+        self.requirements = [frozenset(r) for r in requirements]
+
+        self.groups = list(groups) if groups is not None else list(range(len(self.weights)))
+
+        self.slot_probs = dict(slot_probs or DEFAULT_SLOT_PROBS)
+
+        self.rng = random.Random(seed)
+
+
+
+        self.members: Dict[int, List[int]] = {}
+
+        for i, g in enumerate(self.groups):
+
+            self.members.setdefault(g, []).append(i)
+
+        self.target_entries = frozenset().union(*self.requirements) if self.requirements else frozenset()
+
+
+
+    @classmethod
+
+    def from_pool(cls, pool: CompiledModPool, mod_type: str,
+
+                  requirements: List[Sequence[int]], **kwargs) -> 'RareEventEstimator':
+
+        """Build from one affix pool of a compiled pool (requirements use pool indices)"""
+
+        indices = pool.indices_by_type[mod_type]
+
+        position = {idx: k for k, idx in enumerate(indices)}
+
+        weights = [pool.weights[i] for i in indices]
+
+        groups = [pool.modifier_ids[i] for i in indices]
+
+        local = [[position[i] for i in req if i in position] for req in requirements]
+
+        return cls(weights, local, groups=groups, **kwargs)
+
+
+
+    # ------------------------------------------------------------
+
+    # Success test
+
+    # ------------------------------------------------------------
+
+    def _satisfied(self, drawn: List[int]) -> bool:
+
+        """Distinct drawn entries cover every requirement (small bipartite match)"""
+
+        reqs = sorted(self.requirements, key=len)
+
+
+
+        def assign(k: int, used: frozenset) -> bool:
+
+            if k == len(reqs):
+
+                return True
+
+            for idx in drawn:
+
+                if idx in reqs[k] and idx not in used:
+
+                    if assign(k + 1, used | {idx}):
+
+                        return True
+
+            return False
+
+
+
+        return assign(0, frozenset())
+
+
+
+    # ------------------------------------------------------------
+
+    # Exact enumeration (validation on small pools)
+
+    # ------------------------------------------------------------
+
+    def exact(self, max_paths: int = 2_000_000) -> float:
+
+        n = len(self.weights)
+
+        if n ** max(self.slot_probs) > max_paths:
+
+            raise ValueError("Pool too large for exact enumeration")
+
+
+
+        def walk(depth: int, slots: int, removed: frozenset, drawn: List[int]) -> float:
+
+            if depth == slots:
+
+                return 1.0 if self._satisfied(drawn) else 0.0
+
+            total = sum(w for i, w in enumerate(self.weights) if self.groups[i] not in removed)
+
+            if total <= 0:
+
+                return 1.0 if self._satisfied(drawn) else 0.0
+
+            prob = 0.0
+
+            for i, w in enumerate(self.weights):
+
+                if w <= 0 or self.groups[i] in removed:
+
+                    continue
+
+                prob += (w / total) * walk(depth + 1, slots, removed | {self.groups[i]}, drawn + [i])
+
+            return prob
+
+
+
+        return sum(p * walk(0, k, frozenset(), []) for k, p in self.slot_probs.items())
+
+
+
+    # ------------------------------------------------------------
+
+    # Sampling
+
+    # ------------------------------------------------------------
+
+    def _sample(self, proposal: List[float], slot_values: List[int], slot_cum: List[float],
+
+                slot_ratio: Dict[int, float]) -> float:
+
+        """One draw sequence from the proposal; returns LR * indicator"""
+
+        rng = self.rng
+
+        u = rng.random() * slot_cum[-1]
+
+        k = 0
+
+        while slot_cum[k] < u:
+
+            k += 1
+
+        slots = slot_values[k]
+
+        ratio = slot_ratio[slots]
+
+
+
+        weights = self.weights
+
+        groups = self.groups
+
+        members = self.members
+
+        total_p = self._total_p
+
+        total_q = self._total_q
+
+        removed = set()
+
+        drawn = []
+
+
+
+        for _ in range(slots):
+
+            if total_q <= 0:
+
+                break
+
+            u = rng.random() * total_q
+
+            acc = 0.0
+
+            pick = -1
+
+            for i, q in enumerate(proposal):
+
+                if q <= 0 or groups[i] in removed:
+
+                    continue
+
+                acc += q
+
+                if acc >= u:
+
+                    pick = i
+
+                    break
+
+            if pick < 0:
+
+                break
+
+            ratio *= (weights[pick] / total_p) / (proposal[pick] / total_q)
+
+            drawn.append(pick)
+
+            g = groups[pick]
+
+            removed.add(g)
+
+            for j in members[g]:
+
+                total_p -= weights[j]
+
+                total_q -= proposal[j]
+
+
+
+        return ratio if self._satisfied(drawn) else 0.0
+
+
+
+    def _slot_proposal(self, tilted: bool):
+
+        """Skip slot counts that cannot satisfy every requirement"""
+
+        need = len(self.requirements)
+
+        slots = {k: p for k, p in self.slot_probs.items() if p > 0 and (not tilted or k >= need)}
+
+        mass = sum(slots.values())
+
+        values = sorted(slots)
+
+        cum, acc = [], 0.0
+
+        for k in values:
+
+            acc += slots[k]
+
+            cum.append(acc)
+
+        # LR of the slot draw: p(k) / q(k) = mass
+
+        ratio = {k: (mass if tilted else 1.0) for k in values}
+
+        return values, cum, ratio
+
+
+
+    def _boost_for_share(self, share: float) -> float:
+
+        """Boost putting `share` of the proposal mass on target entries"""
+
+        target_w = sum(self.weights[i] for i in self.target_entries)
+
+        other_w = sum(self.weights) - target_w
+
+        if target_w <= 0 or other_w <= 0:
+
+            return 1.0
+
+        return max(1.0, share / (1 - share) * other_w / target_w)
+
+
+
+    def estimate(self, samples: int = 100_000, boost: Optional[float] = None,
+
+                 target_share: float = 0.6, confidence: float = 0.95) -> dict:
+
+        """
+
+        Importance-sampling estimate with a normal confidence interval.
+
+        boost=1.0 gives crude Monte Carlo (no tilt on mods or slot counts).
+
+        """
+
+        started = time.time()
+
+        if boost is None:
+
+            boost = self._boost_for_share(target_share)
+
+        tilted = boost != 1.0
+
+
+
+        proposal = [w * boost if i in self.target_entries else w
+
+                    for i, w in enumerate(self.weights)]
+
+        self._total_p = sum(self.weights)
+
+        self._total_q = sum(proposal)
+
+        slot_values, slot_cum, slot_ratio = self._slot_proposal(tilted)
+
+
+
+        total = 0.0
+
+        total_sq = 0.0
+
+        hits = 0
+
+        for _ in range(samples):
+
+            value = self._sample(proposal, slot_values, slot_cum, slot_ratio)
+
+            if value > 0:
+
+                hits += 1
+
+                total += value
+
+                total_sq += value * value
+
+
+
+        mean = total / samples
+
+        variance = max(total_sq / samples - mean * mean, 0.0) * samples / max(samples - 1, 1)
+
+        std_error = math.sqrt(variance / samples)
+
+        z = Z_SCORES.get(confidence, 1.96)
+
+        ess = (total * total / total_sq) if total_sq > 0 else 0.0
+
+
+
+        return {
+
+            'probability': mean,
+
+            'std_error': std_error,
+
+            'ci_low': max(mean - z * std_error, 0.0),
+
+            'ci_high': mean + z * std_error,
+
+            'confidence': confidence,
+
+            'relative_error': std_error / mean if mean > 0 else float('inf'),
+
+            'samples': samples,
+
+            'hits': hits,
+
+            'effective_samples': round(ess, 1),
+
+            'boost': boost,
+
+            'avg_attempts': 1 / mean if mean > 0 else float('inf'),
+
+            'elapsed_sec': round(time.time() - started, 3),
+
+        }
+
+
+
+    def estimate_until(self, relative_error: float = 0.03, batch: int = 20_000,
+
+                       max_samples: int = 2_000_000, boost: Optional[float] = None,
+
+                       target_share: float = 0.6, confidence: float = 0.95) -> dict:
+
+        """Keep sampling in batches until the target relative error is reached"""
+
+        runs = [self.estimate(batch, boost, target_share, confidence)]
+
+        boost = runs[0]['boost']
+
+        result = runs[0]
+
+        while result['relative_error'] > relative_error and result['samples'] < max_samples:
+
+            runs.append(self.estimate(batch, boost, confidence=confidence))
+
+            result = _pool_runs(runs)
+
+        return result
+
+
+
+
+
+def _pool_runs(runs: List[dict]) -> dict:
+
+    """Combine independent equal-proposal runs into one estimate"""
+
+    n = sum(r['samples'] for r in runs)
+
+    mean = sum(r['probability'] * r['samples'] for r in runs) / n
+
+    # Within-run variance recovered from std errors
+
+    var = sum((r['std_error'] ** 2 * r['samples']) * (r['samples'] - 1) +
+
+              r['samples'] * (r['probability'] - mean) ** 2 for r in runs) / max(n - 1, 1)
+
+    std_error = math.sqrt(var / n)
+
+    z = Z_SCORES.get(runs[0]['confidence'], 1.96)
+
+    merged = dict(runs[-1])
+
+    merged.update({
+
+        'probability': mean,
+
+        'std_error': std_error,
+
+        'ci_low': max(mean - z * std_error, 0.0),
+
+        'ci_high': mean + z * std_error,
+
+        'relative_error': std_error / mean if mean > 0 else float('inf'),
+
+        'samples': n,
+
+        'hits': sum(r['hits'] for r in runs),
+
+        'effective_samples': sum(r['effective_samples'] for r in runs),
+
+        'avg_attempts': 1 / mean if mean > 0 else float('inf'),
+
+        'elapsed_sec': round(sum(r['elapsed_sec'] for r in runs), 3),
+
+    })
+
+    return merged
+
+
+
+
+
+def demo():
+
+    print("="*60)
+
+    print("Rare-Event Estimator - synthetic 1-in-a-million target")
+
+    print("="*60)
+
+
+
+    # Three specific prefixes in a 40-mod pool
+
+    weights = [280, 280, 250] + [1000] * 37
+
+    estimator = RareEventEstimator(weights, [[0], [1], [2]], slot_probs={3: 0.5, 2: 0.5}, seed=7)
+
+
+
+    exact = estimator.exact()
+
+    print(f"\nExact: {exact:.3e}")
+
+
+
+    result = estimator.estimate_until(relative_error=0.02)
+
+    print(f"IS:    {result['probability']:.3e} "
+
+          f"[{result['ci_low']:.3e}, {result['ci_high']:.3e}] "
+
+          f"rel.err {result['relative_error']*100:.2f}% in {result['elapsed_sec']}s")
+
+
+
+    crude = estimator.estimate(100_000, boost=1.0)
+
+    print(f"Crude: {crude['probability']:.3e} ({crude['hits']} hits)")
+
+
+
+
+
+if __name__ == "__main__":
+
+    demo()
+
@@ -0,0 +1,531 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Exchange Rate Fusion
+
+Pulls Divine/Exalt/Chaos rates from poe2scout, poe.ninja and the trade exchange
+
+concurrently, rejects sources that disagree with recent history (median/MAD),
+
+and writes one fused CurrencyExchangeRate with per-source provenance.
+
+A bad scrape is dropped instead of repricing every opportunity.
+
+Collectors that read a rate on their own submit it through submit_sample().
+
+"""
+
+import math
+
+import os
+
+import sqlite3
+
+import sys
+
+import time
+
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from datetime import datetime
+
+from pathlib import Path
+
+from typing import Dict, List, Optional
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
+
+DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
+
+LEAGUE_ID = 1
+
+
+
+SOURCE_TIMEOUT = 90         # seconds - fusion waits for the slowest source, no longer
+
+HISTORY_SIZE = 48           # recent fused rates used as reference (any length > 0 is used)
+
+MAD_K = 4.0                 # rejection threshold in robust standard deviations
+
+MIN_LOG_SPREAD = 0.05       # never reject moves under ~5%
+
+METRICS = ('divine_to_exalt', 'divine_to_chaos')
+
+
+
+
+
+# ------------------------------------------------------------
+
+# Sources - each returns {'divine_to_exalt', 'divine_to_chaos'}
+
+# ------------------------------------------------------------
+
+def fetch_poe2scout() -> Optional[Dict[str, float]]:
+
+    from scrapers.poe2scout_exchange_scraper import PoE2ScoutExchangeScraper
+
+    rates = PoE2ScoutExchangeScraper().get_exchange_rates()
+
+    if not rates:
+
+        return None
+
+    return {m: rates[m] for m in METRICS}
+
+
+
+
+
+def fetch_poe_ninja() -> Optional[Dict[str, float]]:
+
+    """Both rates from chaos values; no fixed exalt/chaos ratio"""
+
+    from scripts.poe_ninja_fetcher import ENDPOINTS, fetch_api, parse_currency_data
+
+    prices = parse_currency_data(fetch_api(ENDPOINTS['currency']))
+
+    divine, exalt = prices.get('Divine Orb'), prices.get('Exalted Orb')
+
+    if not divine or not exalt:
+
+        return None
+
+    return {'divine_to_exalt': divine / exalt, 'divine_to_chaos': divine}
+
+
+
+
+
+def fetch_trade_exchange() -> Optional[Dict[str, float]]:
+
+    from scripts.exchange_pricer import ExchangePricer
+
+    fit = ExchangePricer().fetch().fit
+
+    to_exalt, to_chaos = fit.rate('exalted', 'divine'), fit.rate('chaos', 'divine')
+
+    if not to_exalt or not to_chaos:
+
+        return None
+
+    return {'divine_to_exalt': to_exalt, 'divine_to_chaos': to_chaos}
+
+
+
+
+
+SOURCES = {
+
+    'poe2scout': fetch_poe2scout,
+
+    'poe.ninja': fetch_poe_ninja,
+
+    'trade_exchange': fetch_trade_exchange,
+
+}
+
+
+
+
+
+def fetch_all(sources: Dict[str, callable] = None, timeout: float = SOURCE_TIMEOUT) -> List[dict]:
+
+    """Run every source concurrently; latency is bounded by the slowest one (or timeout)"""
+
+    sources = sources or SOURCES
+
+    samples = []
+
+
+
+    def timed(fn):
+
+        start = time.time()
+
+        return fn(), int((time.time() - start) * 1000)
+
+
+
+    pool = ThreadPoolExecutor(max_workers=len(sources))
+
+    futures = {pool.submit(timed, fn): name for name, fn in sources.items()}
+
+    done, _ = wait(futures, timeout=timeout)
+
+    for future, name in futures.items():
+
+        sample = {'source': name, 'rates': None, 'latency_ms': None, 'error': None}
+
+        if future not in done:
+
+            sample['error'] = 'timeout'
+
+        else:
+
+            try:
+
+                sample['rates'], sample['latency_ms'] = future.result()
+
+                if not sample['rates']:
+
+                    sample['error'] = 'no data'
+
+            except Exception as e:
+
+                sample['error'] = f"{type(e).__name__}: {e}"
+
+        samples.append(sample)
+
+    pool.shutdown(wait=False)
+
+    return samples
+
+
+
+
+
+# ------------------------------------------------------------
+
+# Fusion
+
+# ------------------------------------------------------------
+
+def _median(values: List[float]) -> float:
+
+    ordered = sorted(values)
+
+    n = len(ordered)
+
+    return ordered[n // 2] if n % 2 else (ordered[n // 2 - 1] + ordered[n // 2]) / 2
+
+
+
+
+
+def robust_band(values: List[float]) -> tuple:
+
+    """(median, spread) of log values; spread = MAD_K * 1.4826 * MAD, floored"""
+
+    logs = [math.log(v) for v in values if v and v > 0]
+
+    center = _median(logs)
+
+    mad = _median([abs(x - center) for x in logs])
+
+    return center, max(MAD_K * 1.4826 * mad, MIN_LOG_SPREAD)
+
+
+
+
+
+def fuse(samples: List[dict], history: List[Dict[str, float]]) -> Optional[dict]:
+
+    """
+
+    Accept a source only if every metric lies inside the robust band of history
+
+    (or of the other sources when there is no history at all). Two sources
+
+    without history have no majority: both are rejected if they disagree.
+
+    Fused value = median of accepted. Marks each sample with 'accepted' and 'reason'.
+
+    """
+
+    usable = [s for s in samples if s.get('rates')]
+
+    for s in samples:
+
+        s['accepted'] = False
+
+        s['reason'] = s.get('error')
+
+
+
+    for metric in METRICS:
+
+        if history:
+
+            reference = [h[metric] for h in history if h.get(metric)]
+
+        else:
+
+            reference = [s['rates'][metric] for s in usable]
+
+        if not reference:
+
+            continue
+
+        if not history and len(usable) == 2 and all(v > 0 for v in reference):
+
+            gap = abs(math.log(reference[0] / reference[1]))
+
+            if gap > MIN_LOG_SPREAD:
+
+                for s in usable:
+
+                    if not s['reason']:
+
+                        s['reason'] = f"{metric} sources disagree ({math.exp(gap) - 1:+.0%}), no history"
+
+            continue
+
+        center, spread = robust_band(reference)
+
+        for s in usable:
+
+            gap = abs(math.log(s['rates'][metric]) - center) if s['rates'][metric] > 0 else float('inf')
+
+            if gap > spread and not s['reason']:
+
+                s['reason'] = f"{metric} outlier ({math.exp(gap) - 1:+.0%} vs reference)"
+
+
+
+    accepted = [s for s in usable if not s['reason']]
+
+    if not accepted and len(usable) >= 2 and history:
+
+        # Every source disagrees with history: trust a consensus of sources (regime change)
+
+        history_reasons = {id(s): s['reason'] for s in usable}
+
+        fused = fuse(samples, [])
+
+        agreeing = [s for s in samples if s['accepted']]
+
+        if len(agreeing) >= 2:
+
+            spread = max(math.log(max(s['rates'][m] for s in agreeing) / min(s['rates'][m] for s in agreeing))
+
+                         for m in METRICS)
+
+        if len(agreeing) < 2 or spread > 2 * MIN_LOG_SPREAD:
+
+            for s in usable:
+
+                s['accepted'] = False
+
+                s['reason'] = f"{history_reasons[id(s)]}, no consensus"
+
+            return None
+
+        for s in agreeing:
+
+            s['reason'] = 'accepted (consensus, history disagrees)'
+
+        return fused
+
+    for s in accepted:
+
+        s['accepted'] = True
+
+        s['reason'] = 'accepted'
+
+    if not accepted:
+
+        return None
+
+
+
+    fused = {m: _median([s['rates'][m] for s in accepted]) for m in METRICS}
+
+    fused['exalt_to_chaos'] = fused['divine_to_chaos'] / fused['divine_to_exalt']
+
+    fused['sources'] = [s['source'] for s in accepted]
+
+    return fused
+
+
+
+
+
+def load_history(conn: sqlite3.Connection, league_id: int = LEAGUE_ID) -> List[Dict[str, float]]:
+
+    rows = conn.execute("""
+
+        SELECT divine_to_exalt, divine_to_chaos FROM currency_exchange_rates
+
+        WHERE league_id = ? ORDER BY last_updated DESC LIMIT ?
+
+    """, (league_id, HISTORY_SIZE)).fetchall()
+
+    return [{'divine_to_exalt': r[0], 'divine_to_chaos': r[1]} for r in rows]
+
+
+
+
+
+def ensure_source_table(conn: sqlite3.Connection):
+
+    """Same schema as models.ExchangeRateSource, for DBs created before it existed"""
+
+    conn.execute("""
+
+        CREATE TABLE IF NOT EXISTS exchange_rate_sources (
+
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+
+            exchange_rate_id INTEGER REFERENCES currency_exchange_rates(id),
+
+            source VARCHAR(50),
+
+            divine_to_exalt FLOAT,
+
+            divine_to_chaos FLOAT,
+
+            accepted BOOLEAN,
+
+            reason VARCHAR(200),
+
+            latency_ms INTEGER,
+
+            recorded_at DATETIME
+
+        )
+
+    """)
+
+
+
+
+
+def write_fused(conn: sqlite3.Connection, fused: Optional[dict], samples: List[dict],
+
+                league_id: int = LEAGUE_ID, now: datetime = None) -> Optional[int]:
+
+    """One fused rate (if any) plus a provenance row per source"""
+
+    now = now or datetime.now()
+
+    rate_id = None
+
+    with conn:
+
+        ensure_source_table(conn)
+
+        if fused:
+
+            cur = conn.execute("""
+
+                INSERT INTO currency_exchange_rates
+
+                (league_id, divine_to_exalt, divine_to_chaos, exalt_to_chaos, last_updated)
+
+                VALUES (?, ?, ?, ?, ?)
+
+            """, (league_id, fused['divine_to_exalt'], fused['divine_to_chaos'], fused['exalt_to_chaos'], now))
+
+            rate_id = cur.lastrowid
+
+        conn.executemany("""
+
+            INSERT INTO exchange_rate_sources
+
+            (exchange_rate_id, source, divine_to_exalt, divine_to_chaos, accepted, reason, latency_ms, recorded_at)
+
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+
+        """, [(rate_id, s['source'],
+
+               (s['rates'] or {}).get('divine_to_exalt'), (s['rates'] or {}).get('divine_to_chaos'),
+
+               s['accepted'], s['reason'], s['latency_ms'], now) for s in samples])
+
+    return rate_id
+
+
+
+
+
+def submit_sample(conn: sqlite3.Connection, source: str, rates: Dict[str, float],
+
+                  league_id: int = LEAGUE_ID, now: datetime = None) -> Optional[dict]:
+
+    """
+
+    Fuse one collector's own rate reading against history and write the result.
+
+    Collectors call this instead of inserting into currency_exchange_rates, so the
+
+    newest rate row is always a fused one.
+
+    """
+
+    sample = {'source': source, 'rates': rates, 'latency_ms': None, 'error': None}
+
+    fused = fuse([sample], load_history(conn, league_id))
+
+    write_fused(conn, fused, [sample], league_id, now)
+
+    return fused
+
+
+
+
+
+def main():
+
+    print("="*60)
+
+    print("Exchange Rate Fusion")
+
+    print(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    print("="*60)
+
+
+
+    samples = fetch_all()
+
+    conn = sqlite3.connect(DB_PATH)
+
+    fused = fuse(samples, load_history(conn))
+
+
+
+    for s in samples:
+
+        rates = s['rates'] or {}
+
+        print(f"  {s['source']:<16} exalt {rates.get('divine_to_exalt', 0):8.2f}  "
+
+              f"chaos {rates.get('divine_to_chaos', 0):8.2f}  {s['reason']}")
+
+
+
+    write_fused(conn, fused, samples)
+
+    conn.close()
+
+
+
+    if fused:
+
+        print(f"\nFused: 1 Divine = {fused['divine_to_exalt']:.2f} Exalt = {fused['divine_to_chaos']:.2f} Chaos "
+
+              f"({', '.join(fused['sources'])})")
+
+    else:
+
+        print("\n[WARN] No source accepted - previous rate kept")
+
+
+
+
+
+if __name__ == "__main__":
+
+    main()
+
@@ -0,0 +1,451 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Value-of-Information Re-pricing Scheduler
+
+Ranks items for (re)pricing so the limited trade API budget goes where a
+
+fresh price is most likely to change a decision:
+
+
+
+  score = price uncertainty (Divine) * (1 + DECISION_WEIGHT * P(rank flip))
+
+
+
+price uncertainty = price * volatility * sqrt(days since last price)
+
+P(rank flip)     = chance the drift moves an opportunity using the item
+
+                   past its neighbour in the profit ranking
+
+"""
+
+import json
+
+import math
+
+import os
+
+import sqlite3
+
+import sys
+
+from datetime import datetime
+
+from pathlib import Path
+
+from typing import Dict, List, Optional
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+from scripts.currency_normalizer import CurrencyNormalizer
+
+
+
+BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
+
+DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
+
+LEAGUE_ID = 1
+
+
+
+DEFAULT_DAILY_VOL = 0.10       # volatility when an item has no history
+
+NEVER_PRICED_DAYS = 30.0       # staleness assigned to never-collected items
+
+FAILED_RETRY_WEIGHT = 0.25     # "no listings" items are retried, at lower priority
+
+DECISION_WEIGHT = 4.0
+
+REQUESTS_PER_ITEM = 2          # search + fetch
+
+
+
+
+
+def _normal_cdf(x: float) -> float:
+
+    return 0.5 * (1 + math.erf(x / math.sqrt(2)))
+
+
+
+
+
+class RepricingScheduler:
+
+    def __init__(self, conn: Optional[sqlite3.Connection] = None, league_id: int = LEAGUE_ID,
+
+                 now: Optional[datetime] = None):
+
+        self.conn = conn
+
+        self.league_id = league_id
+
+        self.now = now or datetime.now()
+
+        # Without a DB the normalizer falls back to its built-in rates
+
+        self.rates = CurrencyNormalizer(conn or sqlite3.connect(':memory:'), league_id)
+
+        self.volatility: Dict[str, float] = {}
+
+        self.price_hints: Dict[str, float] = {}
+
+        self.exposure: Dict[str, List[tuple]] = {}  # item -> [(qty, profit gap)]
+
+        if conn is not None:
+
+            self._load_volatility()
+
+            self._load_price_hints()
+
+            self._load_exposure()
+
+
+
+    # ------------------------------------------------------------
+
+    # Loading
+
+    # ------------------------------------------------------------
+
+    def _load_volatility(self):
+
+        """Std of log price changes per base, from PriceHistory"""
+
+        series: Dict[str, List[float]] = {}
+
+        for name, price in self.conn.execute("""
+
+            SELECT ib.name, ph.price_divine
+
+            FROM price_history ph
+
+            JOIN item_bases ib ON ph.item_base_id = ib.id
+
+            WHERE ph.league_id = ? AND ph.price_divine > 0
+
+            ORDER BY ph.recorded_at
+
+        """, (self.league_id,)):
+
+            series.setdefault(name, []).append(price)
+
+        for name, prices in series.items():
+
+            rets = [math.log(b / a) for a, b in zip(prices, prices[1:])]
+
+            if len(rets) >= 2:
+
+                mean = sum(rets) / len(rets)
+
+                self.volatility[name] = math.sqrt(sum((r - mean) ** 2 for r in rets) / (len(rets) - 1))
+
+
+
+    def _load_price_hints(self):
+
+        """Last stored base prices, for items without fresh listings"""
+
+        for name, price in self.conn.execute("""
+
+            SELECT ib.name, bp.price_divine
+
+            FROM base_prices bp
+
+            JOIN item_bases ib ON bp.item_base_id = ib.id
+
+            WHERE bp.league_id = ?
+
+        """, (self.league_id,)):
+
+            if price:
+
+                self.price_hints[name] = price
+
+
+
+    def _load_exposure(self):
+
+        """
+
+        Which opportunities consume each item, and their profit gap to the next rank.
+
+        Analyzers append a row per run: only the latest row per recipe is ranked.
+
+        """
+
+        seen = set()
+
+        rows = []
+
+        for row_id, profit, path in self.conn.execute("""
+
+            SELECT id, net_profit_divine, crafting_path FROM profit_opportunities
+
+            WHERE league_id = ? AND net_profit_divine IS NOT NULL
+
+            ORDER BY calculated_at DESC, id DESC
+
+        """, (self.league_id,)):
+
+            data = json.loads(path) if path else {}
+
+            recipe = data.get('recipe') or data.get('name') or f"opportunity #{row_id}"
+
+            if recipe not in seen:
+
+                seen.add(recipe)
+
+                rows.append((profit, data.get('inputs', {})))
+
+        rows.sort(key=lambda r: -r[0])
+
+        profits = [r[0] for r in rows]
+
+        for k, (profit, inputs) in enumerate(rows):
+
+            neighbours = [abs(profit - profits[j]) for j in (k - 1, k + 1) if 0 <= j < len(profits)]
+
+            gap = min(neighbours) if neighbours else abs(profit)
+
+            for name, qty in inputs.items():
+
+                self.exposure.setdefault(name, []).append((qty, gap))
+
+
+
+    # ------------------------------------------------------------
+
+    # Scoring
+
+    # ------------------------------------------------------------
+
+    def to_divine(self, amount: float, currency: str) -> float:
+
+        return self.rates.to_divine(amount, currency)
+
+
+
+    def staleness_days(self, collected_at: Optional[str]) -> float:
+
+        if not collected_at:
+
+            return NEVER_PRICED_DAYS
+
+        try:
+
+            seen = datetime.fromisoformat(collected_at)
+
+        except ValueError:
+
+            return NEVER_PRICED_DAYS
+
+        return max((self.now - seen).total_seconds() / 86400, 0.0)
+
+
+
+    def score(self, item: dict) -> dict:
+
+        name = item['name']
+
+        prices = [self.to_divine(p.get('amount') or 0, p.get('currency', ''))
+
+                  for p in item.get('prices', [])]
+
+        prices = [p for p in prices if p > 0]
+
+        price = min(prices) if prices else self.price_hints.get(name, 0.0)
+
+
+
+        vol = self.volatility.get(name)
+
+        if vol is None and len(prices) >= 2:
+
+            vol = math.log(max(prices) / min(prices)) / 2  # listing spread as a proxy
+
+        if not vol:
+
+            vol = DEFAULT_DAILY_VOL
+
+
+
+        days = self.staleness_days(item.get('collected_at'))
+
+        drift = price * vol * math.sqrt(max(days, 1e-6))
+
+
+
+        flip = 0.0
+
+        for qty, gap in self.exposure.get(name, []):
+
+            sigma = drift * abs(qty)
+
+            if sigma > 0:
+
+                flip = max(flip, 2 * (1 - _normal_cdf(gap / sigma)))
+
+
+
+        score = drift * (1 + DECISION_WEIGHT * flip)
+
+        if not prices:
+
+            score = max(score, days)  # unknown prices first, failures as they age
+
+        if item.get('failed'):
+
+            score *= FAILED_RETRY_WEIGHT
+
+
+
+        return {
+
+            'name': name,
+
+            'score': score,
+
+            'price_divine': price,
+
+            'volatility': vol,
+
+            'staleness_days': days,
+
+            'flip_probability': flip,
+
+            'failed': bool(item.get('failed')),
+
+        }
+
+
+
+    def rank(self, items: List[dict]) -> List[dict]:
+
+        return sorted((self.score(i) for i in items), key=lambda s: -s['score'])
+
+
+
+    def plan(self, items: List[dict], request_budget: int,
+
+             requests_per_item: int = REQUESTS_PER_ITEM) -> List[dict]:
+
+        """Highest-value items that fit in the request budget"""
+
+        return self.rank(items)[:max(request_budget // requests_per_item, 0)]
+
+
+
+
+
+def items_from_collected(collected: dict, all_names: List[str]) -> List[dict]:
+
+    """Adapter for step5d's collected_prices.json"""
+
+    entries = collected.get('items', {})
+
+    failed = set(collected.get('failed', []))
+
+    items = []
+
+    for name in all_names:
+
+        entry = entries.get(name, {})
+
+        items.append({
+
+            'name': name,
+
+            'prices': entry.get('all_prices') or ([entry['lowest']] if entry.get('lowest') else []),
+
+            'collected_at': entry.get('collected_at') or collected.get('failed_at', {}).get(name),
+
+            'failed': name in failed,
+
+        })
+
+    return items
+
+
+
+
+
+def items_from_profitable(data: dict) -> List[dict]:
+
+    """Adapter for step6b's profitable_items.json"""
+
+    items = []
+
+    for name in data.get('valuable_bases', {}):
+
+        entry = data.get('base_prices', {}).get(name, {})
+
+        price = entry.get('base_price')
+
+        items.append({
+
+            'name': name,
+
+            'prices': [price] if price else [],
+
+            'collected_at': entry.get('collected_at'),
+
+        })
+
+    return items
+
+
+
+
+
+def main():
+
+    print("="*60)
+
+    print("Re-pricing Priorities")
+
+    print("="*60)
+
+
+
+    conn = sqlite3.connect(DB_PATH)
+
+    price_file = BASE_DIR / "data" / "collected_prices.json"
+
+    collected = json.loads(price_file.read_text()) if price_file.exists() else {}
+
+    names = [r[0] for r in conn.execute("SELECT name FROM item_bases ORDER BY name")]
+
+
+
+    scheduler = RepricingScheduler(conn)
+
+    for s in scheduler.plan(items_from_collected(collected, names), request_budget=60):
+
+        flag = " (retry)" if s['failed'] else ""
+
+        print(f"  {s['score']:8.3f}  {s['name'][:35]:<35} {s['price_divine']:8.3f} div "
+
+              f"age {s['staleness_days']:5.1f}d  flip {s['flip_probability']*100:4.1f}%{flag}")
+
+    conn.close()
+
+
+
+
+
+if __name__ == "__main__":
+
+    main()
+
@@ -0,0 +1,503 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Reverse Craft Search
+
+Desired mod set (modifier_id + minimum tier) -> every item_type / base whose
+
+pool can roll all of it, ranked by expected total cost (base + craft, Divine).
+
+- inverted index modifier_id -> item_type -> tier rows narrows the candidates
+
+- a best-case lower bound orders them and prunes before the pool-based engine
+
+
+
+  python scripts/reverse_search.py 12:5 40     # modifier 12 at T5+, modifier 40 any tier
+
+"""
+
+import os
+
+import sqlite3
+
+import sys
+
+import time
+
+from pathlib import Path
+
+from typing import Dict, List, Optional, Tuple
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+from scripts.build_catalog import load_builds
+
+from scripts.currency_normalizer import CurrencyNormalizer
+
+from scripts.mod_pool import ModPoolCache
+
+from scripts.step7b_fixed_analysis import CRAFT_ILVL, CraftCostCalculator
+
+
+
+BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
+
+DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
+
+LEAGUE_ID = 1
+
+
+
+MAX_AFFIXES = 3             # per affix type on a rare
+
+DEFAULT_BASE_EXALT = 1.0    # unpriced base (same default as step7b)
+
+
+
+Target = Tuple[int, int]    # (modifier_id, minimum tier; higher tier = better, 0 = any)
+
+
+
+
+
+def parse_targets(text: str) -> List[Target]:
+
+    """"12:5,40" -> [(12, 5), (40, 0)]"""
+
+    targets = []
+
+    for token in text.replace(' ', ',').split(','):
+
+        if not token:
+
+            continue
+
+        mod_id, _, tier = token.partition(':')
+
+        try:
+
+            targets.append((int(mod_id), int(tier) if tier else 0))
+
+        except ValueError:
+
+            raise ValueError(f"bad mod '{token}' (expected modifier_id[:min_tier])")
+
+    if not targets:
+
+        raise ValueError("no mods given")
+
+    return targets
+
+
+
+
+
+class ReverseSearchIndex:
+
+    def __init__(self, conn: sqlite3.Connection, league_id: int = LEAGUE_ID):
+
+        self.conn = conn
+
+        self.league_id = league_id
+
+        # modifier_id -> item_type -> [(tier, min_ilvl, weight)]
+
+        self.postings: Dict[int, Dict[str, List[tuple]]] = {}
+
+        self.mod_info: Dict[int, Tuple[str, str]] = {}       # modifier_id -> (name, mod_type)
+
+        # (item_type, mod_type) -> weight rollable at the pool's lowest ilvl (total weight floor)
+
+        self.floor_weight: Dict[tuple, int] = {}
+
+        self.bases: Dict[str, List[tuple]] = {}              # item_type -> [(price_divine, base)]
+
+        self._version = None
+
+        self.refresh()
+
+
+
+    def refresh(self) -> bool:
+
+        """Rebuild when another connection has committed since the last build"""
+
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+        if version == self._version:
+
+            return False
+
+        self._version = version
+
+
+
+        self.rates = CurrencyNormalizer(self.conn, self.league_id)
+
+        self.divine_exalt = self.rates.rate('divine', 'exalted')
+
+        self.pools = ModPoolCache(self.conn)
+
+        self.crafting = CraftCostCalculator(self.pools, self.divine_exalt)
+
+
+
+        self.mod_info = {mod_id: (name, mod_type) for mod_id, name, mod_type
+
+                         in self.conn.execute("SELECT id, name, mod_type FROM modifiers")}
+
+        self.postings = {}
+
+        lowest: Dict[tuple, tuple] = {}
+
+        for mod_id, item_type, tier, min_ilvl, weight in self.conn.execute("""
+
+            SELECT modifier_id, item_type, tier, min_ilvl, weight
+
+            FROM modifier_tiers WHERE is_desecrated = 0
+
+        """):
+
+            weight = weight or 0
+
+            self.postings.setdefault(mod_id, {}).setdefault(item_type, []).append(
+
+                (tier, min_ilvl, weight))
+
+            key = (item_type, self.mod_info.get(mod_id, (None, None))[1])
+
+            floor_ilvl, total = lowest.get(key, (min_ilvl, 0))
+
+            if min_ilvl < floor_ilvl:
+
+                lowest[key] = (min_ilvl, weight)
+
+            elif min_ilvl == floor_ilvl:
+
+                lowest[key] = (min_ilvl, total + weight)
+
+        self.floor_weight = {key: total for key, (_, total) in lowest.items()}
+
+        self._load_bases()
+
+        return True
+
+
+
+    def _load_bases(self):
+
+        default = DEFAULT_BASE_EXALT / self.divine_exalt
+
+        prices = {}
+
+        try:
+
+            for name, item_type, price in self.conn.execute("""
+
+                SELECT ib.name, it.name, (
+
+                    SELECT bp.price_divine FROM base_prices bp
+
+                    WHERE bp.item_base_id = ib.id AND bp.league_id = ? AND bp.price_divine > 0
+
+                    ORDER BY bp.last_updated DESC LIMIT 1
+
+                )
+
+                FROM item_bases ib
+
+                JOIN item_types it ON ib.item_type_id = it.id
+
+            """, (self.league_id,)):
+
+                prices[(item_type, name)] = price or default
+
+        except sqlite3.OperationalError:
+
+            pass  # item tables not created yet
+
+        for build in load_builds(self.conn).values():
+
+            for item in build['items']:
+
+                prices.setdefault((item['item_type'], item['base']), default)
+
+
+
+        self.bases = {}
+
+        for (item_type, name), price in prices.items():
+
+            self.bases.setdefault(item_type, []).append((price, name))
+
+        for rows in self.bases.values():
+
+            rows.sort()
+
+
+
+    # ------------------------------------------------------------
+
+    # Candidates and bounds
+
+    # ------------------------------------------------------------
+
+    def _rollable(self, rows: List[tuple], tier: int, ilvl: int) -> List[tuple]:
+
+        return [r for r in rows if r[0] >= tier and r[1] <= ilvl and r[2] > 0]
+
+
+
+    def candidates(self, targets: List[Target], ilvl: int = CRAFT_ILVL) -> set:
+
+        """Item types that can roll every target (posting list intersection, rarest first)"""
+
+        ordered = sorted(targets, key=lambda t: len(self.postings.get(t[0], {})))
+
+        result = None
+
+        for mod_id, tier in ordered:
+
+            types = {item_type for item_type, rows in self.postings.get(mod_id, {}).items()
+
+                     if (result is None or item_type in result) and self._rollable(rows, tier, ilvl)}
+
+            result = types
+
+            if not result:
+
+                break
+
+        return result or set()
+
+
+
+    def _split(self, targets: List[Target], probabilities: List[float]) -> tuple:
+
+        prefixes = [p for (m, _), p in zip(targets, probabilities) if self.mod_info[m][1] == 'prefix']
+
+        suffixes = [p for (m, _), p in zip(targets, probabilities) if self.mod_info[m][1] != 'prefix']
+
+        return prefixes, suffixes
+
+
+
+    def craft_lower_bound(self, item_type: str, targets: List[Target], ilvl: int) -> float:
+
+        """Craft cost (Divine) with each hit chance at its best case: own weight / total-weight floor"""
+
+        best = []
+
+        for mod_id, tier in targets:
+
+            weight = sum(r[2] for r in self._rollable(self.postings[mod_id][item_type], tier, ilvl))
+
+            floor = self.floor_weight.get((item_type, self.mod_info[mod_id][1]), 0)
+
+            best.append(min(1.0, weight / floor) if floor > 0 else 1.0)
+
+        return self.crafting.craft_cost(*self._split(targets, best))['total_exalt'] / self.divine_exalt
+
+
+
+    def craft(self, item_type: str, targets: List[Target], ilvl: int) -> Optional[dict]:
+
+        """Full engine: exact hit chances from the compiled pool (None if one can't roll)"""
+
+        pool = self.pools.get(item_type, ilvl)
+
+        probabilities = []
+
+        for mod_id, tier in targets:
+
+            p = sum(pool.probability(i) for i in range(len(pool))
+
+                    if pool.modifier_ids[i] == mod_id and pool.tiers[i] >= tier)
+
+            if p <= 0:
+
+                return None
+
+            probabilities.append(p)
+
+        result = self.crafting.craft_cost(*self._split(targets, probabilities))
+
+        result['probabilities'] = {str(m): round(p, 6) for (m, _), p in zip(targets, probabilities)}
+
+        return result
+
+
+
+    # ------------------------------------------------------------
+
+    # Search
+
+    # ------------------------------------------------------------
+
+    def search(self, targets: List[Target], ilvl: int = CRAFT_ILVL, limit: int = 10) -> dict:
+
+        unknown = [m for m, _ in targets if m not in self.mod_info]
+
+        if unknown:
+
+            raise ValueError(f"unknown modifier ids: {unknown}")
+
+        prefixes = sum(1 for m, _ in targets if self.mod_info[m][1] == 'prefix')
+
+        if prefixes > MAX_AFFIXES or len(targets) - prefixes > MAX_AFFIXES:
+
+            raise ValueError(f"at most {MAX_AFFIXES} prefixes and {MAX_AFFIXES} suffixes")
+
+
+
+        item_types = self.candidates(targets, ilvl)
+
+        bounded = []
+
+        for item_type in item_types:
+
+            craft_lb = self.craft_lower_bound(item_type, targets, ilvl)
+
+            for price, base in self.bases.get(item_type, []):
+
+                bounded.append((price + craft_lb, price, base, item_type))
+
+        bounded.sort()
+
+
+
+        results, crafts, evaluated = [], {}, 0
+
+        for lower_bound, price, base, item_type in bounded:
+
+            # Remaining candidates can't beat the current top `limit`
+
+            if len(results) >= limit and lower_bound >= results[-1]['total_cost_divine']:
+
+                break
+
+            if item_type not in crafts:
+
+                crafts[item_type] = self.craft(item_type, targets, ilvl)
+
+            craft = crafts[item_type]
+
+            evaluated += 1
+
+            if craft is None:
+
+                continue
+
+            craft_divine = craft['total_exalt'] / self.divine_exalt
+
+            results.append({
+
+                'item_type': item_type,
+
+                'base': base,
+
+                'base_cost_divine': round(price, 3),
+
+                'craft_cost_divine': round(craft_divine, 2),
+
+                'total_cost_divine': round(price + craft_divine, 2),
+
+                'lower_bound_divine': round(lower_bound, 2),
+
+                'craft': craft,
+
+            })
+
+            results.sort(key=lambda r: r['total_cost_divine'])
+
+            del results[limit:]
+
+
+
+        return {
+
+            'targets': [{'modifier_id': m, 'name': self.mod_info[m][0], 'type': self.mod_info[m][1],
+
+                         'min_tier': t} for m, t in targets],
+
+            'ilvl': ilvl,
+
+            'item_types': sorted(item_types),
+
+            'candidates': len(bounded),
+
+            'evaluated': evaluated,
+
+            'pruned': len(bounded) - evaluated,
+
+            'results': results,
+
+        }
+
+
+
+
+
+def main():
+
+    print("="*60)
+
+    print("Reverse Craft Search")
+
+    print("="*60)
+
+
+
+    targets = parse_targets(','.join(sys.argv[1:]))
+
+    conn = sqlite3.connect(DB_PATH)
+
+    start = time.time()
+
+    index = ReverseSearchIndex(conn)
+
+    print(f"Index: {len(index.postings)} mods in {time.time() - start:.2f}s")
+
+
+
+    start = time.time()
+
+    found = index.search(targets)
+
+    print(f"Search: {(time.time() - start) * 1000:.1f} ms, {len(found['item_types'])} item types, "
+
+          f"{found['evaluated']} evaluated / {found['pruned']} pruned")
+
+    for t in found['targets']:
+
+        print(f"  target: {t['name']} ({t['type']}, T{t['min_tier']}+)")
+
+
+
+    print()
+
+    for r in found['results']:
+
+        print(f"  {r['item_type']:<20} {r['base']:<22} base {r['base_cost_divine']:.2f} + "
+
+              f"craft {r['craft_cost_divine']:.2f} = {r['total_cost_divine']:.2f} Divine")
+
+    conn.close()
+
+
+
+
+
+if __name__ == "__main__":
+
+    main()
+
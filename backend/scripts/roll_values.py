@@ -0,0 +1,485 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Roll Value Probabilities & Divine Orb Reroll Costs
+
+Modifier names encode value ranges like "(15—25)% increased Global Defences".
+
+Each tier gets a precomputed value table (values + tail probabilities),
+
+so "at least X" queries over many thresholds are bisect lookups.
+
+"""
+
+import math
+
+import os
+
+import re
+
+import sqlite3
+
+import sys
+
+from bisect import bisect_left
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+from scripts.mod_pool import CompiledModPool, ModPoolCache
+
+
+
+# "(15—25)", "(1.5-2.5)", "(10–14)"
+
+RANGE_PATTERN = re.compile(r'\((-?\d+(?:\.\d+)?)\s*[—–-]\s*(-?\d+(?:\.\d+)?)\)')
+
+
+
+
+
+def parse_value_ranges(name: str) -> List[Tuple[float, float]]:
+
+    """All (min, max) ranges in a modifier name, in order"""
+
+    return [(float(lo), float(hi)) for lo, hi in RANGE_PATTERN.findall(name)]
+
+
+
+
+
+def template_of(text: str) -> str:
+
+    """Replace rolled numbers and ranges with '#' ("+(15—25)% to X" -> "#% to X")"""
+
+    text = RANGE_PATTERN.sub('#', text)
+
+    return re.sub(r'\d+(?:\.\d+)?', '#', text).replace('+#', '#').strip()
+
+
+
+
+
+def load_mod_tier_bounds(conn: sqlite3.Connection) -> Dict[tuple, Tuple[float, float]]:
+
+    """
+
+    (template, item_type, mod_type, tier) -> (min_value, max_value) from mod_tiers.
+
+    item_type / mod_type come from the row's mod group, so groups sharing a template
+
+    (Rings vs Belts life, prefix vs suffix rarity) keep separate ladders; rows
+
+    without a typed group get None for both.
+
+    """
+
+    try:
+
+        rows = conn.execute("""
+
+            SELECT mt.mod_text, mg.item_type,
+
+                   CASE mg.is_prefix WHEN 1 THEN 'prefix' WHEN 0 THEN 'suffix' END,
+
+                   mt.tier, mt.min_value, mt.max_value
+
+            FROM mod_tiers mt
+
+            LEFT JOIN mod_groups mg ON mt.mod_group_id = mg.id
+
+            WHERE mt.mod_text IS NOT NULL
+
+            AND mt.min_value IS NOT NULL AND mt.max_value IS NOT NULL
+
+        """).fetchall()
+
+    except sqlite3.OperationalError:
+
+        try:
+
+            # mod_groups missing or created before it had item_type
+
+            rows = conn.execute("""
+
+                SELECT mod_text, NULL, NULL, tier, min_value, max_value
+
+                FROM mod_tiers
+
+                WHERE mod_text IS NOT NULL
+
+                AND min_value IS NOT NULL AND max_value IS NOT NULL
+
+            """).fetchall()
+
+        except sqlite3.OperationalError:
+
+            return {}
+
+    return {(template_of(r[0]), r[1], r[2], r[3]): (r[4], r[5]) for r in rows}
+
+
+
+
+
+def _decimals(value: float) -> int:
+
+    text = repr(float(value))
+
+    return len(text.split('.')[1].rstrip('0')) if '.' in text else 0
+
+
+
+
+
+class RollTable:
+
+    """
+
+    Discrete distribution of one tier's rolled value.
+
+    Values are uniform on the grid lo, lo+step, ..., hi; several ranges
+
+    (e.g. "Adds (a—b) to (c—d)") can be summed into one table.
+
+    """
+
+    def __init__(self, values: List[float], probs: List[float]):
+
+        self.values = values
+
+        # tail[i] = P(value >= values[i]); tail[len] = 0
+
+        self.tail = [0.0] * (len(values) + 1)
+
+        acc = 0.0
+
+        for i in range(len(values) - 1, -1, -1):
+
+            acc += probs[i]
+
+            self.tail[i] = min(acc, 1.0)
+
+
+
+    @classmethod
+
+    def uniform(cls, lo: float, hi: float) -> 'RollTable':
+
+        if hi < lo:
+
+            lo, hi = hi, lo
+
+        step = 10 ** -max(_decimals(lo), _decimals(hi))
+
+        count = int(round((hi - lo) / step)) + 1
+
+        values = [round(lo + k * step, 10) for k in range(count)]
+
+        return cls(values, [1.0 / count] * count)
+
+
+
+    @classmethod
+
+    def from_ranges(cls, ranges: List[Tuple[float, float]]) -> Optional['RollTable']:
+
+        """Sum of independent uniform rolls (convolution of the value grids)"""
+
+        if not ranges:
+
+            return None
+
+        dist: Dict[float, float] = {0.0: 1.0}
+
+        for lo, hi in ranges:
+
+            part = cls.uniform(lo, hi)
+
+            probs = [part.tail[i] - part.tail[i + 1] for i in range(len(part.values))]
+
+            merged: Dict[float, float] = {}
+
+            for v1, p1 in dist.items():
+
+                for v2, p2 in zip(part.values, probs):
+
+                    key = round(v1 + v2, 10)
+
+                    merged[key] = merged.get(key, 0.0) + p1 * p2
+
+            dist = merged
+
+        values = sorted(dist)
+
+        return cls(values, [dist[v] for v in values])
+
+
+
+    @property
+
+    def min_value(self) -> float:
+
+        return self.values[0]
+
+
+
+    @property
+
+    def max_value(self) -> float:
+
+        return self.values[-1]
+
+
+
+    def prob_at_least(self, threshold: float) -> float:
+
+        return self.tail[bisect_left(self.values, threshold - 1e-9)]
+
+
+
+    def prob_at_least_many(self, thresholds: Iterable[float]) -> List[float]:
+
+        """Tail probability for every threshold in one pass"""
+
+        values, tail = self.values, self.tail
+
+        return [tail[bisect_left(values, t - 1e-9)] for t in thresholds]
+
+
+
+    def threshold_for_fraction(self, fraction: float) -> float:
+
+        """Value at `fraction` of the way from min to max (1.0 = perfect roll)"""
+
+        return self.min_value + fraction * (self.max_value - self.min_value)
+
+
+
+
+
+def expected_divines(prob_success: float) -> float:
+
+    """Divine Orbs until every tracked value meets its threshold (geometric)"""
+
+    return 1.0 / prob_success if prob_success > 0 else float('inf')
+
+
+
+
+
+def divines_for_confidence(prob_success: float, confidence: float = 0.9) -> float:
+
+    """Divines needed to succeed with the given confidence"""
+
+    if prob_success >= 1.0:
+
+        return 0.0
+
+    if prob_success <= 0:
+
+        return float('inf')
+
+    return math.ceil(math.log(1 - confidence) / math.log(1 - prob_success))
+
+
+
+
+
+class RollTableIndex:
+
+    """
+
+    Per-entry roll tables for a compiled pool.
+
+    Ranges come from the modifier name, else from `bounds`
+
+    (see load_mod_tier_bounds); entries with neither have no table.
+
+    """
+
+    def __init__(self, pool: CompiledModPool, combine: str = 'sum',
+
+                 bounds: Optional[Dict[tuple, Tuple[float, float]]] = None):
+
+        self.pool = pool
+
+        self.tables: List[Optional[RollTable]] = []
+
+        cache: Dict[tuple, Optional[RollTable]] = {}
+
+        bounds = bounds or {}
+
+        for name, mod_type, tier in zip(pool.names, pool.mod_types, pool.tiers):
+
+            ranges = parse_value_ranges(name)
+
+            if not ranges:
+
+                template = template_of(name)
+
+                bound = (bounds.get((template, pool.item_type, mod_type, tier))
+
+                         or bounds.get((template, None, None, tier)))
+
+                if bound:
+
+                    ranges = [bound]
+
+            if combine == 'first':
+
+                ranges = ranges[:1]
+
+            key = tuple(ranges)
+
+            if key not in cache:
+
+                cache[key] = RollTable.from_ranges(ranges)
+
+            self.tables.append(cache[key])
+
+
+
+    def set_bounds(self, index: int, min_value: float, max_value: float):
+
+        """Attach explicit bounds (e.g. ModTier.min_value/max_value) to an entry"""
+
+        self.tables[index] = RollTable.uniform(min_value, max_value)
+
+
+
+    def roll_probabilities(self, index: int, thresholds: Iterable[float]) -> List[float]:
+
+        table = self.tables[index]
+
+        if table is None:
+
+            return [1.0 for _ in thresholds]  # fixed-value mod: any hit qualifies
+
+        return table.prob_at_least_many(thresholds)
+
+
+
+    def price_targets(self, targets: Dict[int, Iterable[float]],
+
+                      cost_per_attempt: float, divine_price: float = 1.0) -> List[dict]:
+
+        """
+
+        Bulk pricing of "tier hit + roll >= threshold" targets.
+
+        Hit the tier by spamming (cost_per_attempt each), then Divine the values.
+
+        """
+
+        results = []
+
+        for index, thresholds in targets.items():
+
+            thresholds = list(thresholds)
+
+            p_tier = self.pool.probability(index)
+
+            p_rolls = self.roll_probabilities(index, thresholds)
+
+            craft_cost = cost_per_attempt / p_tier if p_tier > 0 else float('inf')
+
+            for threshold, p_roll in zip(thresholds, p_rolls):
+
+                divines = expected_divines(p_roll) - 1 if p_roll > 0 else float('inf')
+
+                results.append({
+
+                    'index': index,
+
+                    'mod': self.pool.names[index],
+
+                    'tier': self.pool.tiers[index],
+
+                    'threshold': threshold,
+
+                    'prob_tier': p_tier,
+
+                    'prob_roll': p_roll,
+
+                    'prob_joint': p_tier * p_roll,
+
+                    'expected_divines': divines,
+
+                    'divines_90pct': max(divines_for_confidence(p_roll) - 1, 0),
+
+                    'expected_cost': craft_cost + divines * divine_price,
+
+                })
+
+        return results
+
+
+
+
+
+def demo():
+
+    print("="*60)
+
+    print("Roll Value Probabilities - Amulets @ ilvl 82")
+
+    print("="*60)
+
+
+
+    cache = ModPoolCache()
+
+    pool = cache.get('Amulets', 82, include_desecrated=True)
+
+    index = RollTableIndex(pool, bounds=load_mod_tier_bounds(cache.conn))
+
+
+
+    ranged = [i for i, t in enumerate(index.tables) if t is not None]
+
+    if not ranged:
+
+        print("[WARN] No ranged modifiers found - import modifier data first")
+
+        cache.close()
+
+        return
+
+
+
+    for i in ranged[:5]:
+
+        table = index.tables[i]
+
+        thresholds = [table.threshold_for_fraction(f) for f in (0.5, 0.8, 0.95)]
+
+        probs = table.prob_at_least_many(thresholds)
+
+        print(f"\n{pool.names[i][:55]}")
+
+        for t, p in zip(thresholds, probs):
+
+            print(f"  >= {t:8.2f}: {p*100:6.2f}%  (~{expected_divines(p):.1f} divines)")
+
+
+
+    cache.close()
+
+
+
+
+
+if __name__ == "__main__":
+
+    demo()
+
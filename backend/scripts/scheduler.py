@@ -117,51 +117,73 @@ class DataScheduler:
 
         try:
 
-            from scrapers.poe2scout_exchange_scraper import PoE2ScoutExchangeScraper
+            from scripts.rate_fusion import fetch_all, fuse, HISTORY_SIZE
 
             from sqlalchemy import create_engine
 
             from sqlalchemy.orm import sessionmaker
 
-            from models.database_models import CurrencyExchangeRate, League
+            from models.database_models import CurrencyExchangeRate, ExchangeRateSource, League
 
             
 
-            scraper = PoE2ScoutExchangeScraper()
+            # poe2scout / poe.ninja / trade exchange, fetched concurrently
 
-            rates = scraper.get_exchange_rates()
+            samples = fetch_all()
 
             
 
-            if rates:
+            db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'poe2_profit_optimizer.db')
 
-                db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'poe2_profit_optimizer.db')
+            engine = create_engine(f'sqlite:///{db_path}')
 
-                engine = create_engine(f'sqlite:///{db_path}')
+            ExchangeRateSource.__table__.create(engine, checkfirst=True)
 
-                Session = sessionmaker(bind=engine)
+            Session = sessionmaker(bind=engine)
 
-                session = Session()
+            session = Session()
 
-                
+            
+
+            try:
+
+                league = session.query(League).filter_by(is_active=True).first()
+
+                if league:
+
+                    history = [
+
+                        {'divine_to_exalt': r.divine_to_exalt, 'divine_to_chaos': r.divine_to_chaos}
+
+                        for r in session.query(CurrencyExchangeRate)
 
-                try:
+                        .filter_by(league_id=league.id)
 
-                    league = session.query(League).filter_by(is_active=True).first()
+                        .order_by(CurrencyExchangeRate.last_updated.desc())
 
-                    if league:
+                        .limit(HISTORY_SIZE)
 
-                        sydney_time = datetime.now(SYDNEY_TZ)
+                    ]
+
+                    fused = fuse(samples, history)
+
+                    sydney_time = datetime.now(SYDNEY_TZ)
+
+                    
+
+                    rate = None
+
+                    if fused:
 
                         rate = CurrencyExchangeRate(
 
                             league_id=league.id,
 
-                            divine_to_exalt=rates['divine_to_exalt'],
+                            divine_to_exalt=fused['divine_to_exalt'],
 
-                            divine_to_chaos=rates['divine_to_chaos'],
+                            divine_to_chaos=fused['divine_to_chaos'],
 
-                            exalt_to_chaos=rates['exalt_to_chaos'],
+                            exalt_to_chaos=fused['exalt_to_chaos'],
 
                             last_updated=sydney_time
 
@@ -169,21 +191,57 @@ class DataScheduler:
 
                         session.add(rate)
 
-                        session.commit()
+                        session.flush()
+
+                    
+
+                    for s in samples:
+
+                        rates = s['rates'] or {}
+
+                        session.add(ExchangeRateSource(
+
+                            exchange_rate_id=rate.id if rate else None,
+
+                            source=s['source'],
+
+                            divine_to_exalt=rates.get('divine_to_exalt'),
+
+                            divine_to_chaos=rates.get('divine_to_chaos'),
+
+                            accepted=s['accepted'],
+
+                            reason=s['reason'],
+
+                            latency_ms=s['latency_ms'],
+
+                            recorded_at=sydney_time
+
+                        ))
+
+                        logger.info(f"  {s['source']}: {rates} ({s['reason']})")
+
+                    session.commit()
+
+                    
+
+                    if fused:
+
+                        logger.info(f"Exchange rates updated: Divine={fused['divine_to_exalt']:.2f} Exalt "
 
-                        logger.info(f"Exchange rates updated: Divine={rates['divine_to_exalt']} Exalt")
+                                    f"from {', '.join(fused['sources'])}")
 
                     else:
 
-                        logger.error("No active league found")
+                        logger.error("All sources rejected - keeping previous exchange rate")
 
-                finally:
+                else:
 
-                    session.close()
+                    logger.error("No active league found")
 
-            else:
+            finally:
 
-                logger.error("Failed to fetch exchange rates")
+                session.close()
 
                 
 
@@ -7,22 +7,44 @@
 
 Import modifier_data_v5.json to database
 
+Per-tier value ranges (mod_groups / mod_tiers) come from modifier_data_v4.json,
+
+the tiered export with one row per tier; mod_parser resolves listing tiers from them.
+
 """
 
 import json
 
+import os
+
 import sqlite3
 
+import sys
+
 from pathlib import Path
 
 
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+from scripts.modifier_search import rebuild_search_index
+
+from scripts.mod_parser import canonical
+
+from scripts.roll_values import parse_value_ranges
+
+
+
 BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
 
 DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
 
 MODIFIER_JSON = BASE_DIR / "data" / "modifier_data_v5.json"
 
+TIER_RANGE_JSON = BASE_DIR / "data" / "modifier_data_v4.json"
+
 
 
 def create_tables(conn):
@@ -41,6 +63,10 @@ def create_tables(conn):
 
     cursor.execute("DROP TABLE IF EXISTS item_type_modifiers")
 
+    cursor.execute("DROP TABLE IF EXISTS mod_tiers")
+
+    cursor.execute("DROP TABLE IF EXISTS mod_groups")
+
     
 
     # 1. modifiers - unique modifiers
@@ -93,6 +119,54 @@ def create_tables(conn):
 
     
 
+    # 3. mod_groups / mod_tiers - value range per tier (models.ModGroup / ModTier)
+
+    cursor.execute("""
+
+        CREATE TABLE mod_groups (
+
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+
+            name VARCHAR(200) NOT NULL,
+
+            display_name VARCHAR(200),
+
+            is_prefix BOOLEAN,
+
+            tags JSON,
+
+            item_type VARCHAR(100)
+
+        )
+
+    """)
+
+    cursor.execute("""
+
+        CREATE TABLE mod_tiers (
+
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+
+            mod_group_id INTEGER REFERENCES mod_groups(id),
+
+            tier INTEGER,
+
+            min_value FLOAT,
+
+            max_value FLOAT,
+
+            min_ilvl INTEGER,
+
+            weight INTEGER,
+
+            mod_text VARCHAR(500)
+
+        )
+
+    """)
+
+    
+
     # Create indexes
 
     cursor.execute("CREATE INDEX idx_mod_name ON modifiers(name)")
@@ -235,6 +309,116 @@ def import_data(conn, json_data):
 
 
 
+def import_tier_ranges(conn, json_data, tier_data):
+
+    """
+
+    One mod group per (item type, modifier, affix) with a mod_tiers row per tier.
+
+    The tiered export appends tags and weight to each line ("+(5—8) to Strength
+
+    Attribute 1000"), so a line is cut back to the longest leading part that is a
+
+    modifier of that item type. Affix comes from the mod name ("of the Brute" =
+
+    suffix). Tiers are renumbered so the best is highest, as in modifier_tiers.
+
+    """
+
+    cursor = conn.cursor()
+
+    stats = {'groups': 0, 'tiers': 0, 'skipped': 0}
+
+    
+
+    for item_type, data in tier_data.items():
+
+        names = {}
+
+        for section in ('prefix', 'suffix'):
+
+            for mod in json_data.get(item_type, {}).get(section, []):
+
+                names.setdefault(canonical(mod['name'])[0], mod)
+
+        
+
+        ladders = {}  # (template, is_prefix) -> [(export tier, mod row, text, weight)]
+
+        for section in ('prefix', 'suffix'):
+
+            for mod in data.get(section, []):
+
+                words = mod.get('name', '').split()
+
+                for n in range(len(words), 0, -1):
+
+                    text = ' '.join(words[:n])
+
+                    key = canonical(text)[0]
+
+                    if key in names and parse_value_ranges(text):
+
+                        break
+
+                else:
+
+                    stats['skipped'] += 1
+
+                    continue
+
+                rest = words[n:]
+
+                weight = int(rest[-1]) if rest and rest[-1].isdigit() else None
+
+                is_prefix = not (mod.get('mod_name') or '').startswith('of ')
+
+                ladders.setdefault((key, is_prefix), []).append((mod['tier'], mod, text, weight))
+
+        
+
+        for (key, is_prefix), rows in ladders.items():
+
+            base = names[key]
+
+            rows.sort(key=lambda r: r[0])
+
+            cursor.execute("""
+
+                INSERT INTO mod_groups (name, display_name, is_prefix, tags, item_type)
+
+                VALUES (?, ?, ?, ?, ?)
+
+            """, (base['name'], rows[0][1].get('mod_name'), is_prefix,
+
+                  json.dumps(base.get('tags', [])), item_type))
+
+            group_id = cursor.lastrowid
+
+            stats['groups'] += 1
+
+            for rank, (_, mod, text, weight) in enumerate(rows):
+
+                lo, hi = parse_value_ranges(text)[0]
+
+                cursor.execute("""
+
+                    INSERT INTO mod_tiers (mod_group_id, tier, min_value, max_value, min_ilvl, weight, mod_text)
+
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+
+                """, (group_id, len(rows) - rank, lo, hi, mod.get('ilvl'), weight, text))
+
+                stats['tiers'] += 1
+
+    
+
+    conn.commit()
+
+    return stats
+
+
+
 def show_sample_data(conn):
 
     """Show sample data for verification"""
@@ -393,6 +577,32 @@ def main():
 
     
 
+    # Tier value ranges
+
+    if TIER_RANGE_JSON.exists():
+
+        with open(TIER_RANGE_JSON, 'r', encoding='utf-8') as f:
+
+            ranges = import_tier_ranges(conn, json_data, json.load(f))
+
+        print(f"  - Tier ranges: {ranges['tiers']} in {ranges['groups']} mod groups "
+
+              f"({ranges['skipped']} unmatched lines)")
+
+    else:
+
+        print(f"  [WARN] {TIER_RANGE_JSON} missing - listing tiers cannot be resolved")
+
+    
+
+    # Keep the FTS / tag search index in sync with the new modifiers
+
+    indexed = rebuild_search_index(conn)
+
+    print(f"  - Search index: {indexed} modifiers")
+
+    
+
     # Show samples
 
     show_sample_data(conn)
@@ -13,6 +13,10 @@ Step 5: Check API status and proceed accordingly
 
 """
 
+import os
+
+import sys
+
 import requests
 
 import json
@@ -27,6 +31,14 @@ from typing import Dict, List, Optional
 
 
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+from scripts.currency_normalizer import CurrencyNormalizer
+
+
+
 BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
 
 DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
@@ -427,35 +439,39 @@ class ProfitCalculator:
 
         
 
-        # Default currency values (in Chaos)
+        # Currency values in Exalts (base unit for PoE2), from the shared normalizer
 
-        # Will be updated with real prices when available
+        self.rates = CurrencyNormalizer(self.conn)
 
         self.currency_values = {
 
-            'divine': 150,      # 1 Divine = 150 Chaos
+            code: self.rates.rate(code, 'exalted')
 
-            'exalt': 1,         # 1 Exalt = 1 Chaos (base unit for PoE2)
+            for code in ('divine', 'exalt', 'chaos', 'alchemy', 'transmute', 'augment', 'regal', 'annul')
 
-            'chaos': 0.007,     # relative to exalt
+        }
 
-            'alchemy': 0.05,
+        self.currency_values.update({
 
-            'transmute': 0.01,
+            'essence_lesser': self._essence_value('Lesser Essence', 0.5),
 
-            'augment': 0.01,
+            'essence_greater': self._essence_value('Greater Essence', 2),
 
-            'regal': 2,
+            'essence_perfect': self._essence_value('Perfect Essence', 10),
 
-            'annul': 3,
+        })
 
-            'essence_lesser': 0.5,
+    
 
-            'essence_greater': 2,
+    def _essence_value(self, prefix: str, default: float) -> float:
 
-            'essence_perfect': 10,
+        """Average Exalt price of the essences of one tier; `default` until any is priced"""
 
-        }
+        values = [self.rates.rate(code, 'exalted') for code in self.rates.codes if code.startswith(prefix)]
+
+        values = [v for v in values if v > 0]
+
+        return sum(values) / len(values) if values else default
 
     
 
@@ -15,8 +15,16 @@ Full Price Collector - Collects ALL items with safe rate limiting
 
 - Can resume if interrupted
 
+- Queue mode: several workers share one durable job queue (price_job_queue.py)
+
 """
 
+import fcntl
+
+import os
+
+import sys
+
 import requests
 
 import json
@@ -25,18 +33,38 @@ import sqlite3
 
 import time
 
+from contextlib import contextmanager
+
 from pathlib import Path
 
 from datetime import datetime
 
 
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+from scripts.reprice_scheduler import RepricingScheduler, items_from_collected, REQUESTS_PER_ITEM
+
+from scripts.price_job_queue import IDLE_POLL, PriceJobQueue, default_worker_id
+
+from scripts.listing_snapshots import ListingSnapshotStore
+
+from scripts.price_sketch import PriceSketchBook, KLLSketch, merge_stored, summarize
+
+from scripts.currency_normalizer import shared_normalizer
+
+
+
 BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
 
 DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
 
 PRICE_FILE = BASE_DIR / "data" / "collected_prices.json"
 
+LOCK_FILE = BASE_DIR / "data" / "collected_prices.lock"
+
 
 
 # SETTINGS - Safe but reasonable
@@ -49,6 +77,34 @@ BATCH_BREAK = 30            # 30 second break every batch
 
 FETCH_DELAY = 1.5           # Delay between search and fetch
 
+FETCH_LIMIT = 10            # Listings per fetch call (API maximum)
+
+
+
+
+
+@contextmanager
+
+def collected_prices_lock():
+
+    """Exclusive file lock held by every writer of collected_prices.json"""
+
+    LOCK_FILE.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(LOCK_FILE, 'w') as lock:
+
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        try:
+
+            yield
+
+        finally:
+
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+
 
 
 class FullPriceCollector:
@@ -77,6 +133,8 @@ class FullPriceCollector:
 
         self.collected = self._load_existing()
 
+        self.snapshots = ListingSnapshotStore()
+
         self.start_time = None
 
     
@@ -109,6 +167,20 @@ class FullPriceCollector:
 
     
 
+    def _merge_progress(self, update):
+
+        """Reload, apply `update`, save - under a file lock so queue workers don't clobber each other"""
+
+        with collected_prices_lock():
+
+            self.collected = self._load_existing()
+
+            update()
+
+            self._save_progress()
+
+    
+
     def get_all_items(self) -> list:
 
         """Get all items from database"""
@@ -151,6 +223,76 @@ class FullPriceCollector:
 
     
 
+    def get_priority_items(self, request_budget: int) -> list:
+
+        """Items worth (re)pricing now - stale, volatile, valuable or ranking-critical"""
+
+        all_items = self.get_all_items()
+
+        types = {item['name']: item['type'] for item in all_items}
+
+        scheduler = RepricingScheduler(self.conn)
+
+        plan = scheduler.plan(items_from_collected(self.collected, list(types)), request_budget)
+
+        return [{'name': s['name'], 'type': types[s['name']], 'priority': s['score']} for s in plan]
+
+    
+
+    def _record_success(self, item: dict, result: dict):
+
+        # Only listings that are new or repriced since the last pass feed the sketch
+
+        known = self.snapshots.known_prices(item['name'])
+
+        fresh = [p for lid, p in (result.get('priced') or {}).items()
+
+                 if known.get(lid) != (p['amount'], p['currency'])]
+
+        # Shared normalizer re-checks the DB every few minutes, so long runs use current rates
+
+        book = PriceSketchBook(shared_normalizer(DB_PATH).as_dict())
+
+        book.add_prices(item['name'], fresh)
+
+        sketch, started = merge_stored(self.collected['items'].get(item['name']),
+
+                                       book.sketches.get(item['name'], KLLSketch()))
+
+        
+
+        self.collected['items'][item['name']] = {
+
+            'type': item['type'],
+
+            'lowest': result['lowest'],
+
+            'all_prices': result['all_prices'],
+
+            'listings_total': result.get('total'),
+
+            'estimate': summarize(sketch),
+
+            'sketch': sketch.to_dict(),
+
+            'sketch_started': started,
+
+            'collected_at': datetime.now().isoformat()
+
+        }
+
+        self.snapshots.record(item['name'], result.get('result_ids', []), result.get('priced'),
+
+                              result.get('total'), base_type=item['name'])
+
+        if item['name'] in self.collected.get('failed', []):
+
+            self.collected['failed'].remove(item['name'])
+
+            self.collected.get('failed_at', {}).pop(item['name'], None)
+
+    
+
     def search_single_item(self, item_name: str, min_ilvl: int = 75) -> dict:
 
         """Search for one item"""
@@ -213,13 +355,15 @@ class FullPriceCollector:
 
             data = response.json()
 
-            result_ids = data.get('result', [])[:3]
+            all_ids = data.get('result', [])
+
+            result_ids = all_ids[:FETCH_LIMIT]
 
             
 
             if not result_ids:
 
-                return {'error': 'No listings', 'no_listings': True}
+                return {'error': 'No listings', 'no_listings': True, 'empty_search': True}
 
             
 
@@ -255,6 +399,8 @@ class FullPriceCollector:
 
             prices = []
 
+            priced = {}
+
             
 
             for item in items:
@@ -275,14 +421,32 @@ class FullPriceCollector:
 
                     })
 
+                    # Snapshot data for sales velocity (listing_snapshots.py)
+
+                    priced[item.get('id')] = {
+
+                        'amount': price.get('amount'),
+
+                        'currency': price.get('currency'),
+
+                        'indexed': listing.get('indexed')
+
+                    }
+
             
 
             if prices:
 
-                return {'success': True, 'listings': len(prices), 'lowest': prices[0], 'all_prices': prices}
+                return {'success': True, 'listings': len(prices), 'total': data.get('total'),
+
+                        'lowest': prices[0], 'all_prices': prices,
+
+                        'result_ids': all_ids, 'priced': priced}
 
             
 
+            # Listings exist but none parsed a price: not evidence that anything sold
+
             return {'error': 'No prices', 'no_listings': True}
 
             
@@ -335,9 +499,165 @@ class FullPriceCollector:
 
     
 
-    def collect_all(self):
+    def _record_no_listings(self, name: str, empty_search: bool = False):
+
+        if 'failed' not in self.collected:
+
+            self.collected['failed'] = []
+
+        if name not in self.collected['failed']:
+
+            self.collected['failed'].append(name)
+
+        # Timestamp lets the re-pricing scheduler retry it later
+
+        self.collected.setdefault('failed_at', {})[name] = datetime.now().isoformat()
+
+        # Only a search that returned zero ids is an empty snapshot (everything delisted)
+
+        if empty_search:
+
+            self.snapshots.record(name, [], total=0, base_type=name)
+
+    
+
+    def enqueue(self, items: list = None) -> int:
+
+        """Push items (default: uncollected) onto the shared job queue"""
+
+        queue = PriceJobQueue()
+
+        if items is None:
+
+            added = queue.enqueue(self.get_uncollected_items())
+
+        else:
+
+            added = queue.enqueue(items, requeue_done=True)
+
+        print(f"Enqueued {added} jobs - queue: {queue.stats()}")
 
-        """Collect prices for all uncollected items"""
+        queue.close()
+
+        return added
+
+    
+
+    def run_worker(self, worker_id: str = None):
+
+        """Drain the job queue; safe to run in several processes at once.
+
+        Waits out retry backoffs and other workers' leases, and exits only when
+
+        no job is pending or leased."""
+
+        worker_id = worker_id or default_worker_id()
+
+        queue = PriceJobQueue()
+
+        self.start_time = time.time()
+
+        success = failed = 0
+
+        
+
+        print("="*60)
+
+        print(f"Price Worker {worker_id}")
+
+        print(f"Queue: {queue.stats()}")
+
+        print("="*60)
+
+        
+
+        while True:
+
+            job = queue.lease(worker_id)
+
+            if job is None:
+
+                wait = queue.next_ready()
+
+                if wait is None:
+
+                    break
+
+                time.sleep(min(max(wait, 1.0), IDLE_POLL))
+
+                continue
+
+            
+
+            # Wait for the shared budget, then make sure the lease survived the wait
+
+            queue.wait_for_requests(REQUESTS_PER_ITEM)
+
+            if not queue.heartbeat(job['id'], worker_id):
+
+                continue
+
+            
+
+            item = {'name': job['item_name'], 'type': job['item_type']}
+
+            print(f"[{worker_id}] {item['name'][:40]:<40}", end=" ")
+
+            result = self.search_single_item(item['name'])
+
+            
+
+            if result.get('success'):
+
+                lowest = result['lowest']
+
+                print(f"✓ {lowest['amount']} {lowest['currency']}")
+
+                self._merge_progress(lambda: self._record_success(item, result))
+
+                queue.complete(job['id'], worker_id, lowest)
+
+                success += 1
+
+            elif result.get('no_listings'):
+
+                print(f"✗ {result['error']}")
+
+                self._merge_progress(lambda: self._record_no_listings(item['name'], result.get('empty_search', False)))
+
+                queue.complete(job['id'], worker_id, {'no_listings': True})
+
+                failed += 1
+
+            else:
+
+                if result.get('retry'):
+
+                    queue.drain_budget()  # every worker backs off after a 429
+
+                status = queue.fail(job['id'], worker_id, result.get('error', 'Unknown'))
+
+                print(f"✗ {result.get('error', 'Unknown')} -> {status}")
+
+                failed += 1
+
+        
+
+        print("\n" + "="*60)
+
+        print(f"Worker done: {success} success, {failed} failed in {self.format_time(time.time() - self.start_time)}")
+
+        print(f"Queue: {queue.stats()}")
+
+        print("="*60)
+
+        queue.close()
+
+    
+
+    def collect_all(self, items: list = None):
+
+        """Collect prices for all uncollected items (or the given refresh list)"""
 
         self.start_time = time.time()
 
@@ -345,7 +665,7 @@ class FullPriceCollector:
 
         all_items = self.get_all_items()
 
-        uncollected = self.get_uncollected_items()
+        uncollected = self.get_uncollected_items() if items is None else items
 
         
 
@@ -423,17 +743,7 @@ class FullPriceCollector:
 
                 
 
-                self.collected['items'][name] = {
-
-                    'type': item['type'],
-
-                    'lowest': lowest,
-
-                    'all_prices': result['all_prices'],
-
-                    'collected_at': datetime.now().isoformat()
-
-                }
+                self._record_success(item, result)
 
                 success += 1
 
@@ -461,17 +771,7 @@ class FullPriceCollector:
 
                     print(f"  Retry OK: {lowest['amount']} {lowest['currency']}")
 
-                    self.collected['items'][name] = {
-
-                        'type': item['type'],
-
-                        'lowest': lowest,
-
-                        'all_prices': result['all_prices'],
-
-                        'collected_at': datetime.now().isoformat()
-
-                    }
+                    self._record_success(item, result)
 
                     success += 1
 
@@ -485,15 +785,9 @@ class FullPriceCollector:
 
             elif result.get('no_listings'):
 
-                print(f"✗ No listings")
-
-                if 'failed' not in self.collected:
-
-                    self.collected['failed'] = []
-
-                if name not in self.collected['failed']:
+                print(f"✗ {result['error']}")
 
-                    self.collected['failed'].append(name)
+                self._record_no_listings(name, result.get('empty_search', False))
 
                 failed += 1
 
@@ -635,6 +929,8 @@ class FullPriceCollector:
 
     def close(self):
 
+        self.snapshots.close()
+
         self.conn.close()
 
 
@@ -643,10 +939,6 @@ class FullPriceCollector:
 
 def main():
 
-    import sys
-
-    
-
     collector = FullPriceCollector()
 
     
@@ -655,6 +947,38 @@ def main():
 
         collector.show_summary()
 
+    elif '--enqueue' in sys.argv:
+
+        # --enqueue [--refresh N]: fill the shared queue (uncollected or top re-price items)
+
+        if '--refresh' in sys.argv:
+
+            idx = sys.argv.index('--refresh')
+
+            budget = int(sys.argv[idx + 1]) if len(sys.argv) > idx + 1 else BATCH_SIZE * 5 * REQUESTS_PER_ITEM
+
+            collector.enqueue(collector.get_priority_items(budget))
+
+        else:
+
+            collector.enqueue()
+
+    elif '--worker' in sys.argv:
+
+        idx = sys.argv.index('--worker')
+
+        collector.run_worker(sys.argv[idx + 1] if len(sys.argv) > idx + 1 else None)
+
+    elif '--refresh' in sys.argv:
+
+        # --refresh [request budget]: re-price the highest value-of-information items
+
+        idx = sys.argv.index('--refresh')
+
+        budget = int(sys.argv[idx + 1]) if len(sys.argv) > idx + 1 else BATCH_SIZE * 5 * REQUESTS_PER_ITEM
+
+        collector.collect_all(collector.get_priority_items(budget))
+
     else:
 
         collector.collect_all()
@@ -9,10 +9,16 @@ Resume Price Collection - Balanced rate limiting
 
 """
 
+import os
+
+import sys
+
 import requests
 
 import json
 
+import sqlite3
+
 import time
 
 from pathlib import Path
@@ -21,8 +27,18 @@ from datetime import datetime
 
 
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+from scripts.reprice_scheduler import RepricingScheduler, items_from_profitable
+
+
+
 BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
 
+DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
+
 DATA_FILE = BASE_DIR / "data" / "profitable_items.json"
 
 
@@ -215,9 +231,23 @@ class ResumePriceCollector:
 
     
 
-    def resume_collection(self):
+    def refresh_priorities(self, request_budget: int) -> list:
+
+        """Bases to re-price first, by value of information"""
+
+        conn = sqlite3.connect(DB_PATH)
+
+        plan = RepricingScheduler(conn).plan(items_from_profitable(self.data), request_budget)
+
+        conn.close()
+
+        return [s['name'] for s in plan]
+
+    
+
+    def resume_collection(self, to_collect: list = None):
 
-        """Resume collecting base prices"""
+        """Resume collecting base prices (or re-price the given bases)"""
 
         print("="*60)
 
@@ -235,7 +265,9 @@ class ResumePriceCollector:
 
         
 
-        to_collect = [b for b in valuable_bases.keys() if b not in already_collected]
+        if to_collect is None:
+
+            to_collect = [b for b in valuable_bases.keys() if b not in already_collected]
 
         
 
@@ -321,7 +353,9 @@ class ResumePriceCollector:
 
                     },
 
-                    'sample_mods': base_info.get('sample_mods', [])
+                    'sample_mods': base_info.get('sample_mods', []),
+
+                    'collected_at': datetime.now().isoformat()
 
                 }
 
@@ -367,5 +401,17 @@ class ResumePriceCollector:
 
 if __name__ == "__main__":
 
-    ResumePriceCollector().resume_collection()
+    collector = ResumePriceCollector()
+
+    if '--refresh' in sys.argv:
+
+        idx = sys.argv.index('--refresh')
+
+        budget = int(sys.argv[idx + 1]) if len(sys.argv) > idx + 1 else BATCH_SIZE * 4
+
+        collector.resume_collection(collector.refresh_priorities(budget))
+
+    else:
+
+        collector.resume_collection()
 
@@ -11,311 +11,39 @@ Step 7: Popular Builds Analysis
 
 - Calculate crafting costs and ROI
 
+- Builds are loaded from the build catalog (see build_catalog.py)
+
 """
 
 import json
 
+import os
+
 import sqlite3
 
+import sys
+
 from pathlib import Path
 
 from typing import Dict, List
 
 
 
-BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
-
-DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
-
-OUTPUT_FILE = BASE_DIR / "data" / "build_based_opportunities.json"
-
-
-
-# ============================================================
-
-# Popular Builds Data (PoE2 Current Meta)
-
-# ============================================================
-
-POPULAR_BUILDS = {
-
-    "Witch_ES_Caster": {
-
-        "description": "Energy Shield 기반 마법사 (인기도: 매우 높음)",
-
-        "demand": "very_high",
-
-        "items": {
-
-            "Body Armour": {
-
-                "base": "Exquisite Leather",  # ES base
-
-                "priority_mods": [
-
-                    {"name": "maximum Energy Shield", "type": "prefix", "tier": 1},
-
-                    {"name": "increased Energy Shield", "type": "prefix", "tier": 1},
-
-                    {"name": "maximum Life", "type": "prefix", "tier": 2},
-
-                    {"name": "Fire Resistance", "type": "suffix", "tier": 2},
-
-                    {"name": "Cold Resistance", "type": "suffix", "tier": 2},
-
-                ],
-
-                "estimated_value": 80  # Divine
-
-            },
-
-            "Helmet": {
-
-                "base": "Sandsworn Tiara",
-
-                "priority_mods": [
-
-                    {"name": "maximum Energy Shield", "type": "prefix", "tier": 1},
-
-                    {"name": "increased Energy Shield", "type": "prefix", "tier": 1},
-
-                    {"name": "Fire Resistance", "type": "suffix", "tier": 2},
-
-                ],
-
-                "estimated_value": 50
-
-            }
-
-        }
-
-    },
-
-    "Warrior_Life_Melee": {
-
-        "description": "Life 기반 근접 전사 (인기도: 높음)",
-
-        "demand": "high",
-
-        "items": {
-
-            "Body Armour": {
-
-                "base": "Sacrificial Regalia",
-
-                "priority_mods": [
-
-                    {"name": "maximum Life", "type": "prefix", "tier": 1},
-
-                    {"name": "increased Armour", "type": "prefix", "tier": 1},
-
-                    {"name": "Fire Resistance", "type": "suffix", "tier": 2},
-
-                    {"name": "Cold Resistance", "type": "suffix", "tier": 2},
-
-                    {"name": "Lightning Resistance", "type": "suffix", "tier": 2},
-
-                ],
-
-                "estimated_value": 60
-
-            },
-
-            "Gloves": {
-
-                "base": "Cultist Gauntlets",
-
-                "priority_mods": [
-
-                    {"name": "Physical Damage", "type": "prefix", "tier": 1},
-
-                    {"name": "maximum Life", "type": "prefix", "tier": 2},
-
-                    {"name": "Attack Speed", "type": "suffix", "tier": 2},
-
-                ],
-
-                "estimated_value": 40
-
-            }
-
-        }
-
-    },
-
-    "Ranger_Evasion_Bow": {
-
-        "description": "Evasion 기반 활 레인저 (인기도: 높음)",
-
-        "demand": "high",
-
-        "items": {
-
-            "Bow": {
-
-                "base": "Obliterator Bow",
-
-                "priority_mods": [
-
-                    {"name": "Physical Damage", "type": "prefix", "tier": 1},
-
-                    {"name": "increased Physical Damage", "type": "prefix", "tier": 1},
-
-                    {"name": "Critical", "type": "suffix", "tier": 2},
-
-                    {"name": "Attack Speed", "type": "suffix", "tier": 2},
-
-                ],
-
-                "estimated_value": 100
-
-            },
-
-            "Boots": {
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-                "base": "Drakeskin Boots",
 
-                "priority_mods": [
 
-                    {"name": "Movement Speed", "type": "prefix", "tier": 1},
+from scripts.build_catalog import load_builds
 
-                    {"name": "maximum Life", "type": "prefix", "tier": 2},
+from scripts.currency_normalizer import CurrencyNormalizer
 
-                    {"name": "Fire Resistance", "type": "suffix", "tier": 2},
 
-                ],
 
-                "estimated_value": 40
-
-            }
-
-        }
-
-    },
-
-    "Monk_Attack_Speed": {
-
-        "description": "공격 속도 기반 몽크 (인기도: 매우 높음)",
-
-        "demand": "very_high",
-
-        "items": {
-
-            "Amulet": {
-
-                "base": "Gold Amulet",
-
-                "priority_mods": [
-
-                    {"name": "maximum Life", "type": "prefix", "tier": 1},
-
-                    {"name": "Physical Damage", "type": "prefix", "tier": 2},
-
-                    {"name": "Attack Speed", "type": "suffix", "tier": 1},
-
-                    {"name": "Critical", "type": "suffix", "tier": 2},
-
-                ],
-
-                "estimated_value": 70
-
-            },
-
-            "Ring": {
-
-                "base": "Ruby Ring",
-
-                "priority_mods": [
-
-                    {"name": "Physical Damage", "type": "prefix", "tier": 1},
-
-                    {"name": "maximum Life", "type": "prefix", "tier": 2},
-
-                    {"name": "Attack Speed", "type": "suffix", "tier": 2},
-
-                ],
-
-                "estimated_value": 50
-
-            }
-
-        }
-
-    },
-
-    "Sorceress_Spell_Damage": {
-
-        "description": "스펠 데미지 소서리스 (인기도: 높음)",
-
-        "demand": "high",
-
-        "items": {
-
-            "Wand": {
-
-                "base": "Dueling Wand",
-
-                "priority_mods": [
-
-                    {"name": "Spell Damage", "type": "prefix", "tier": 1},
-
-                    {"name": "Extra Fire Damage", "type": "prefix", "tier": 1},
-
-                    {"name": "Cast Speed", "type": "suffix", "tier": 1},
-
-                ],
-
-                "estimated_value": 80
-
-            },
-
-            "Staff": {
-
-                "base": "Voltaic Staff",
-
-                "priority_mods": [
-
-                    {"name": "Spell Damage", "type": "prefix", "tier": 1},
-
-                    {"name": "Extra Lightning Damage", "type": "prefix", "tier": 1},
-
-                    {"name": "Cast Speed", "type": "suffix", "tier": 1},
-
-                ],
-
-                "estimated_value": 100
-
-            }
-
-        }
-
-    }
-
-}
-
-
-
-# Currency values (in Exalted)
-
-CURRENCY_TO_EXALT = {
-
-    'divine': 150,
-
-    'exalted': 1,
-
-    'regal': 0.02,
-
-    'chaos': 0.007,
-
-    'alchemy': 0.005,
-
-    'alch': 0.005,
-
-    'transmute': 0.001,
+BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
 
-    'aug': 0.001,
+DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
 
-}
+OUTPUT_FILE = BASE_DIR / "data" / "build_based_opportunities.json"
 
 
 
@@ -329,8 +57,14 @@ class BuildBasedAnalyzer:
 
         self.conn.row_factory = sqlite3.Row
 
+        self.rates = CurrencyNormalizer(self.conn)
+
+        self.divine_exalt = self.rates.rate('divine', 'exalted')
+
         self.base_prices = self._load_base_prices()
 
+        self.builds = load_builds(self.conn)
+
     
 
     def _load_base_prices(self) -> dict:
@@ -367,11 +101,7 @@ class BuildBasedAnalyzer:
 
         currency = price_data.get('currency', 'exalted')
 
-        multiplier = CURRENCY_TO_EXALT.get(currency, 1)
-
-        
-
-        return amount * multiplier
+        return self.rates.convert(amount, currency, 'exalted')
 
     
 
@@ -397,9 +127,9 @@ class BuildBasedAnalyzer:
 
         
 
-        # Try to match item type
+        # Catalog item types are exact DB types; otherwise try to match
 
-        matched_type = None
+        matched_type = item_type if item_type in available_types else None
 
         item_type_lower = item_type.lower()
 
@@ -407,12 +137,14 @@ class BuildBasedAnalyzer:
 
         for t in available_types:
 
+            if matched_type:
+
+                break
+
             if item_type_lower in t.lower() or t.lower() in item_type_lower:
 
                 matched_type = t
 
-                break
-
         
 
         if not matched_type:
@@ -635,7 +367,7 @@ class BuildBasedAnalyzer:
 
             'total_exalt': round(total_cost, 1),
 
-            'total_divine': round(total_cost / CURRENCY_TO_EXALT['divine'], 2),
+            'total_divine': round(total_cost / self.divine_exalt, 2),
 
             'details': mod_details
 
@@ -651,15 +383,17 @@ class BuildBasedAnalyzer:
 
         
 
-        for build_name, build_info in POPULAR_BUILDS.items():
+        for build_name, build_info in self.builds.items():
+
+            for item_info in build_info['items']:
 
-            for slot, item_info in build_info['items'].items():
+                slot = item_info['slot']
 
                 base_name = item_info['base']
 
-                priority_mods = item_info['priority_mods']
+                priority_mods = item_info['target_mods']
 
-                estimated_value = item_info['estimated_value']
+                estimated_value = item_info['estimated_sale']
 
                 
 
@@ -671,7 +405,7 @@ class BuildBasedAnalyzer:
 
                 # Calculate crafting cost
 
-                craft_result = self.calculate_crafting_cost(slot, priority_mods)
+                craft_result = self.calculate_crafting_cost(item_info['item_type'], priority_mods)
 
                 craft_cost = craft_result['total_exalt']
 
@@ -681,7 +415,7 @@ class BuildBasedAnalyzer:
 
                 total_cost = base_cost + craft_cost
 
-                finished_value = estimated_value * CURRENCY_TO_EXALT['divine']
+                finished_value = estimated_value * self.divine_exalt
 
                 profit = finished_value - total_cost
 
@@ -703,17 +437,17 @@ class BuildBasedAnalyzer:
 
                     'craft_cost_exalt': round(craft_cost, 1),
 
-                    'craft_cost_divine': round(craft_cost / CURRENCY_TO_EXALT['divine'], 2),
+                    'craft_cost_divine': round(craft_cost / self.divine_exalt, 2),
 
                     'total_cost_exalt': round(total_cost, 1),
 
-                    'total_cost_divine': round(total_cost / CURRENCY_TO_EXALT['divine'], 2),
+                    'total_cost_divine': round(total_cost / self.divine_exalt, 2),
 
                     'estimated_sale_divine': estimated_value,
 
                     'profit_exalt': round(profit, 1),
 
-                    'profit_divine': round(profit / CURRENCY_TO_EXALT['divine'], 1),
+                    'profit_divine': round(profit / self.divine_exalt, 1),
 
                     'roi_percent': round(roi, 1),
 
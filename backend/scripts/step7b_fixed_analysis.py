@@ -7,775 +7,699 @@
 
 Fixed Build-Based Analysis - Using correct mod names from DB
 
+- Builds come from the build catalog (data/builds.json + build_catalog table)
+
+- Mod pools are compiled once and shared read-only with worker processes
+
 """
 
 import json
 
-import sqlite3
-
-from pathlib import Path
+import os
 
-from typing import Dict, List
+import sqlite3
 
+import sys
 
+import time
 
-BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
+from concurrent.futures import ProcessPoolExecutor
 
-DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
+from pathlib import Path
 
-OUTPUT_FILE = BASE_DIR / "data" / "build_based_opportunities.json"
+from typing import Dict, List
 
 
 
-# Currency values (in Exalted)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-CURRENCY_TO_EXALT = {
 
-    'divine': 150,
 
-    'exalted': 1,
+from scripts.build_catalog import load_builds
 
-    'regal': 0.02,
+from scripts.currency_normalizer import CurrencyNormalizer
 
-    'chaos': 0.007,
+from scripts.mod_pool import ModPoolCache
 
-    'alchemy': 0.005,
+from scripts.valuation_model import MODEL_FILE, ValuationModel
 
-    'alch': 0.005,
 
-    'transmute': 0.001,
 
-    'aug': 0.001,
+BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
 
-}
+DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
 
+OUTPUT_FILE = BASE_DIR / "data" / "build_based_opportunities.json"
 
 
-# ============================================================
 
-# Popular Builds - FIXED with correct DB mod names
+# Use the valuation model's sale price once it knows this share of an item's features
 
-# ============================================================
+MODEL_MIN_COVERAGE = 0.75
 
-POPULAR_BUILDS = {
+CRAFT_ILVL = 82
 
-    "ES_Caster": {
+# Below this many distinct crafts the process pool start-up costs more than it saves
 
-        "description": "Energy Shield 마법사 (인기: 매우 높음)",
+PARALLEL_MIN_ITEMS = 32
 
-        "demand": "very_high",
 
-        "items": [
 
-            {
 
-                "slot": "Body Armour (ES)",
 
-                "item_type": "Body_Armours_int",
+def model_outcome(pool, item: dict) -> dict:
 
-                "base": "Conjurer Mantle",
+    """
 
-                "target_mods": [
+    Valuation model outcome for a catalog item: one modifier id per target mod
 
-                    {"name": "# to maximum Energy Shield", "type": "prefix"},
+    (exact name, first id wins). Tier and roll are left open - the crafted
 
-                    {"name": "#% increased Energy Shield", "type": "prefix"},
+    result's tier is unknown, so the model prices them at its trained mean.
 
-                    {"name": "# to maximum Life", "type": "prefix"},
+    """
 
-                    {"name": "#% to Fire Resistance", "type": "suffix"},
+    mods = []
 
-                    {"name": "#% to Cold Resistance", "type": "suffix"},
+    for mod in item['target_mods']:
 
-                ],
+        ids = [pool.modifier_ids[i] for i in pool.indices_by_type.get(mod['type'], [])
 
-                "estimated_sale": 80
+               if pool.names[i] == mod['name']]
 
-            },
+        if ids:
 
-            {
+            mods.append((min(ids), None, None))
 
-                "slot": "Helmet (ES)",
+    return {'base_type': item['base'], 'ilvl': CRAFT_ILVL, 'mods': mods}
 
-                "item_type": "Helmets_int",
 
-                "base": "Sandsworn Tiara",
 
-                "target_mods": [
 
-                    {"name": "# to maximum Energy Shield", "type": "prefix"},
 
-                    {"name": "#% increased Energy Shield", "type": "prefix"},
+class CraftCostCalculator:
 
-                    {"name": "#% to Fire Resistance", "type": "suffix"},
+    """Crafting cost from compiled mod pools only - no DB access, safe to run in workers"""
 
-                ],
+    def __init__(self, pools: ModPoolCache, divine_exalt: float):
 
-                "estimated_sale": 50
+        self.pools = pools
 
-            }
+        self.divine_exalt = divine_exalt
 
-        ]
+    
 
-    },
+    def get_mod_probability(self, item_type: str, mod_name: str, 
 
-    "Life_Melee": {
+                            mod_type: str, ilvl: int = CRAFT_ILVL) -> dict:
 
-        "description": "Life 근접 전사 (인기: 높음)",
+        """Get probability of hitting a mod"""
 
-        "demand": "high",
+        pool = self.pools.get(item_type, ilvl)
 
-        "items": [
+        indices = pool.indices_by_type.get(mod_type, [])
 
-            {
+        if not indices:
 
-                "slot": "Body Armour (Armour)",
+            return {'error': f'No {mod_type} mods for {item_type}'}
 
-                "item_type": "Body_Armours_str",
+        
 
-                "base": "Sacrificial Regalia",
+        # Find target mod ('#' symbols ignored): exact name first, then partial match,
 
-                "target_mods": [
+        # so "#% increased Physical Damage" is not taken for its Accuracy hybrid
 
-                    {"name": "# to maximum Life", "type": "prefix"},
+        clean_target = mod_name.replace('#', '').strip().lower()
 
-                    {"name": "#% increased Armour", "type": "prefix"},
+        cleaned = [(i, pool.names[i].replace('#', '').strip().lower()) for i in indices]
 
-                    {"name": "#% to Fire Resistance", "type": "suffix"},
+        exact = [i for i, clean_mod in cleaned if clean_mod == clean_target]
 
-                    {"name": "#% to Cold Resistance", "type": "suffix"},
+        partial = [i for i, clean_mod in cleaned
 
-                    {"name": "#% to Lightning Resistance", "type": "suffix"},
+                   if clean_target in clean_mod or clean_mod in clean_target]
 
-                ],
+        matches = exact or partial
 
-                "estimated_sale": 60
+        if matches:
 
-            },
+            i = matches[0]
 
-            {
+            prob = pool.probability(i)
 
-                "slot": "Gloves (Armour)",
+            return {
 
-                "item_type": "Gloves_str",
+                'found': True,
 
-                "base": "Cultist Gauntlets",
+                'mod': pool.names[i],
 
-                "target_mods": [
+                'tier': pool.tiers[i],
 
-                    {"name": "# to maximum Life", "type": "prefix"},
+                'weight': pool.weights[i],
 
-                    {"name": "#% to Fire Resistance", "type": "suffix"},
+                'total_weight': pool.total_weight[mod_type],
 
-                ],
+                'probability': prob,
 
-                "estimated_sale": 40
+                'avg_attempts': 1 / prob if prob > 0 else 9999
 
             }
 
-        ]
-
-    },
-
-    "Evasion_Bow": {
-
-        "description": "Evasion 활 레인저 (인기: 높음)",
-
-        "demand": "high",
+        
 
-        "items": [
+        return {'error': f'Mod "{mod_name}" not found'}
 
-            {
+    
 
-                "slot": "Bow",
+    def calculate_crafting_cost(self, item_type: str, target_mods: List[dict]) -> dict:
 
-                "item_type": "Bows",
+        """
 
-                "base": "Obliterator Bow",
+        Calculate realistic crafting cost
 
-                "target_mods": [
+        
 
-                    {"name": "Adds # to # Physical Damage", "type": "prefix"},
+        Method: Essence for first mod, then Chaos/Annul/Exalt for rest
 
-                    {"name": "#% increased Physical Damage", "type": "prefix"},
+        """
 
-                ],
+        details = []
 
-                "estimated_sale": 100
+        
 
-            },
+        # Separate by prefix/suffix
 
-            {
+        prefixes = [m for m in target_mods if m['type'] == 'prefix']
 
-                "slot": "Boots (Evasion)",
+        suffixes = [m for m in target_mods if m['type'] == 'suffix']
 
-                "item_type": "Boots_dex",
+        
 
-                "base": "Drakeskin Boots",
+        # Calculate prefix probabilities
 
-                "target_mods": [
+        prefix_probs = []
 
-                    {"name": "#% increased Movement Speed", "type": "prefix"},
+        for mod in prefixes:
 
-                    {"name": "# to maximum Life", "type": "prefix"},
+            prob_data = self.get_mod_probability(item_type, mod['name'], 'prefix')
 
-                    {"name": "#% to Fire Resistance", "type": "suffix"},
+            if prob_data.get('found'):
 
-                ],
+                prefix_probs.append(prob_data)
 
-                "estimated_sale": 40
+                details.append({
 
-            }
+                    'mod': prob_data['mod'],
 
-        ]
+                    'type': 'prefix',
 
-    },
+                    'probability': round(prob_data['probability'] * 100, 2),
 
-    "Spell_Caster": {
+                    'weight': prob_data['weight']
 
-        "description": "스펠 캐스터 (인기: 높음)",
+                })
 
-        "demand": "high",
+            else:
 
-        "items": [
+                details.append({'mod': mod['name'], 'error': prob_data.get('error')})
 
-            {
+        
 
-                "slot": "Wand",
+        # Calculate suffix probabilities
 
-                "item_type": "Wands",
+        suffix_probs = []
 
-                "base": "Dueling Wand",
+        for mod in suffixes:
 
-                "target_mods": [
+            prob_data = self.get_mod_probability(item_type, mod['name'], 'suffix')
 
-                    {"name": "#% increased Spell Damage", "type": "prefix"},
+            if prob_data.get('found'):
 
-                    {"name": "# to Level of all", "type": "suffix"},
+                suffix_probs.append(prob_data)
 
-                ],
+                details.append({
 
-                "estimated_sale": 80
+                    'mod': prob_data['mod'],
 
-            },
+                    'type': 'suffix',
 
-            {
+                    'probability': round(prob_data['probability'] * 100, 2),
 
-                "slot": "Staff",
+                    'weight': prob_data['weight']
 
-                "item_type": "Staves",
+                })
 
-                "base": "Voltaic Staff",
+            else:
 
-                "target_mods": [
+                details.append({'mod': mod['name'], 'error': prob_data.get('error')})
 
-                    {"name": "#% increased Spell Damage", "type": "prefix"},
+        
 
-                    {"name": "# to Level of all", "type": "suffix"},
+        result = self.craft_cost([p['probability'] for p in prefix_probs],
 
-                ],
+                                 [p['probability'] for p in suffix_probs])
 
-                "estimated_sale": 100
+        result['details'] = details
 
-            }
+        return result
 
-        ]
+    
 
-    },
+    def craft_cost(self, prefix_probs: List[float], suffix_probs: List[float]) -> dict:
 
-    "Ring_Amulet": {
+        """Expected cost (exalted) for the per-mod hit probabilities of the target prefixes / suffixes"""
 
-        "description": "악세서리 (인기: 매우 높음)",
+        # ============================================================
 
-        "demand": "very_high",
+        # REALISTIC COST CALCULATION
 
-        "items": [
+        # ============================================================
 
-            {
+        # Method: Essence spam + Annul/Exalt
 
-                "slot": "Amulet",
+        # - Essence guarantees 1 mod
 
-                "item_type": "Amulets",
+        # - Need to hit other mods via RNG
 
-                "base": "Gold Amulet",
+        # - Chaos spam average cost = 1 / combined_probability
 
-                "target_mods": [
+        
 
-                    {"name": "# to maximum Life", "type": "prefix"},
+        # Combined probability for all prefixes hitting together (simplified)
 
-                    {"name": "#% increased maximum Life", "type": "prefix"},
+        if prefix_probs:
 
-                    {"name": "# to Strength", "type": "suffix"},
+            combined_prefix_prob = 1
 
-                ],
+            for p in prefix_probs:
 
-                "estimated_sale": 70
+                combined_prefix_prob *= p
 
-            },
+            
 
-            {
+            # How many chaos/essence to hit all prefixes?
 
-                "slot": "Ring",
+            avg_attempts_prefix = 1 / combined_prefix_prob if combined_prefix_prob > 0 else 1000
 
-                "item_type": "Rings",
+        else:
 
-                "base": "Ruby Ring",
+            avg_attempts_prefix = 1
 
-                "target_mods": [
+        
 
-                    {"name": "# to maximum Life", "type": "prefix"},
+        # Combined probability for suffixes
 
-                    {"name": "#% to Fire Resistance", "type": "suffix"},
+        if suffix_probs:
 
-                    {"name": "#% to Cold Resistance", "type": "suffix"},
+            combined_suffix_prob = 1
 
-                ],
+            for p in suffix_probs:
 
-                "estimated_sale": 50
+                combined_suffix_prob *= p
 
-            }
+            
 
-        ]
+            avg_attempts_suffix = 1 / combined_suffix_prob if combined_suffix_prob > 0 else 1000
 
-    }
+        else:
 
-}
+            avg_attempts_suffix = 1
 
+        
 
+        # Cost calculation
 
+        # - Essence: 2-5 exalt each
 
+        # - Chaos: 0.007 exalt each
 
-class FixedAnalyzer:
+        # - Annulment: 3 exalt each
 
-    def __init__(self):
+        # - Exalt: 1 exalt each
 
-        self.conn = sqlite3.connect(DB_PATH)
+        
 
-        self.conn.row_factory = sqlite3.Row
+        essence_cost = 3  # Average essence cost
 
-        self.base_prices = self._load_base_prices()
+        chaos_cost = 0.007
 
-    
+        annul_cost = 3
 
-    def _load_base_prices(self) -> dict:
+        exalt_cost = 1
 
-        price_file = BASE_DIR / "data" / "profitable_items.json"
+        
 
-        if price_file.exists():
+        # Strategy 1: Essence spam for prefixes
 
-            with open(price_file, 'r') as f:
+        prefix_craft_cost = avg_attempts_prefix * essence_cost
 
-                data = json.load(f)
+        
 
-                return data.get('base_prices', {})
+        # Strategy 2: Exalt spam for suffixes (after getting prefixes)
 
-        return {}
+        # Each exalt has 50% suffix chance, then need specific mod
 
-    
+        if suffix_probs:
 
-    def get_base_price_exalt(self, base_name: str) -> float:
+            avg_exalts_per_suffix = sum(2 / p for p in suffix_probs)
 
-        """Get base price in exalted"""
+            suffix_craft_cost = avg_exalts_per_suffix * exalt_cost
 
-        price_data = self.base_prices.get(base_name, {}).get('base_price', {})
+        else:
 
-        if not price_data:
+            avg_exalts_per_suffix = 0
 
-            return 1.0
+            suffix_craft_cost = 0
 
         
 
-        amount = price_data.get('amount', 1)
-
-        currency = price_data.get('currency', 'exalted')
+        # Total cost
 
-        multiplier = CURRENCY_TO_EXALT.get(currency, 1)
+        total_cost = prefix_craft_cost + suffix_craft_cost
 
         
 
-        return amount * multiplier
-
-    
-
-    def get_mod_probability(self, item_type: str, mod_name: str, 
+        # Cap at reasonable max
 
-                            mod_type: str, ilvl: int = 82) -> dict:
+        uncapped_cost = total_cost
 
-        """Get probability of hitting a mod"""
+        total_cost = min(total_cost, 5000)  # Max 5000 exalts
 
-        cursor = self.conn.cursor()
+        cap_scale = total_cost / uncapped_cost if uncapped_cost > 0 else 1
 
         
 
-        # Get all mods for this item type
+        return {
 
-        cursor.execute("""
+            'total_exalt': round(total_cost, 1),
 
-            SELECT m.name, mt.weight, mt.tier
+            'total_divine': round(total_cost / self.divine_exalt, 2),
 
-            FROM modifiers m
+            'prefix_cost': round(prefix_craft_cost, 1),
 
-            JOIN modifier_tiers mt ON m.id = mt.modifier_id
+            'suffix_cost': round(suffix_craft_cost, 1),
 
-            WHERE mt.item_type = ?
+            'avg_essence_attempts': round(avg_attempts_prefix, 1),
 
-            AND mt.min_ilvl <= ?
+            # Currency actually consumed (after the cap), for price scenario sweeps
 
-            AND m.mod_type = ?
+            'essences_used': avg_attempts_prefix * cap_scale,
 
-            AND mt.is_desecrated = 0
+            'exalts_used': avg_exalts_per_suffix * cap_scale,
 
-        """, (item_type, ilvl, mod_type))
+            'essence_cost_exalt': essence_cost
 
-        
+        }
 
-        mods = cursor.fetchall()
 
-        if not mods:
 
-            return {'error': f'No {mod_type} mods for {item_type}'}
 
-        
 
-        total_weight = sum(m['weight'] for m in mods)
+# Per-process calculator, built once by the pool initializer from the parent's pools
 
-        
+_worker_calculator = None
 
-        # Find target mod (partial match)
 
-        for m in mods:
 
-            # Remove # symbols for comparison
 
-            clean_target = mod_name.replace('#', '').strip().lower()
 
-            clean_mod = m['name'].replace('#', '').strip().lower()
+def _init_worker(pools: dict, divine_exalt: float):
 
-            
+    global _worker_calculator
 
-            if clean_target in clean_mod or clean_mod in clean_target:
+    _worker_calculator = CraftCostCalculator(ModPoolCache(pools=pools), divine_exalt)
 
-                prob = m['weight'] / total_weight
 
-                return {
 
-                    'found': True,
 
-                    'mod': m['name'],
 
-                    'tier': m['tier'],
+def _worker_craft_cost(job: tuple) -> dict:
 
-                    'weight': m['weight'],
+    item_type, target_mods = job
 
-                    'total_weight': total_weight,
+    return _worker_calculator.calculate_crafting_cost(item_type, target_mods)
 
-                    'probability': prob,
 
-                    'avg_attempts': 1 / prob if prob > 0 else 9999
 
-                }
-
-        
 
-        return {'error': f'Mod "{mod_name}" not found'}
-
-    
 
-    def calculate_crafting_cost(self, item_type: str, target_mods: List[dict]) -> dict:
+class FixedAnalyzer:
 
-        """
+    def __init__(self, builds: Dict[str, dict] = None):
 
-        Calculate realistic crafting cost
+        self.conn = sqlite3.connect(DB_PATH)
 
-        
+        self.conn.row_factory = sqlite3.Row
 
-        Method: Essence for first mod, then Chaos/Annul/Exalt for rest
+        self.rates = CurrencyNormalizer(self.conn)
 
-        """
+        self.divine_exalt = self.rates.rate('divine', 'exalted')
 
-        details = []
+        self.base_prices = self._load_base_prices()
 
-        
+        self.model = ValuationModel.load(MODEL_FILE) if MODEL_FILE.exists() else None
 
-        # Separate by prefix/suffix
+        self.pools = ModPoolCache(self.conn)
 
-        prefixes = [m for m in target_mods if m['type'] == 'prefix']
+        self.crafting = CraftCostCalculator(self.pools, self.divine_exalt)
 
-        suffixes = [m for m in target_mods if m['type'] == 'suffix']
+        self.builds = builds if builds is not None else load_builds(self.conn)
 
-        
-
-        # Calculate prefix probabilities
+    
 
-        prefix_probs = []
+    def _load_base_prices(self) -> dict:
 
-        for mod in prefixes:
+        price_file = BASE_DIR / "data" / "profitable_items.json"
 
-            prob_data = self.get_mod_probability(item_type, mod['name'], 'prefix')
+        if price_file.exists():
 
-            if prob_data.get('found'):
+            with open(price_file, 'r') as f:
 
-                prefix_probs.append(prob_data)
+                data = json.load(f)
 
-                details.append({
+                return data.get('base_prices', {})
 
-                    'mod': prob_data['mod'],
+        return {}
 
-                    'type': 'prefix',
+    
 
-                    'probability': round(prob_data['probability'] * 100, 2),
+    def get_base_price_exalt(self, base_name: str) -> float:
 
-                    'weight': prob_data['weight']
+        """Get base price in exalted"""
 
-                })
+        price_data = self.base_prices.get(base_name, {}).get('base_price', {})
 
-            else:
+        if not price_data:
 
-                details.append({'mod': mod['name'], 'error': prob_data.get('error')})
+            return 1.0
 
         
 
-        # Calculate suffix probabilities
-
-        suffix_probs = []
-
-        for mod in suffixes:
-
-            prob_data = self.get_mod_probability(item_type, mod['name'], 'suffix')
-
-            if prob_data.get('found'):
-
-                suffix_probs.append(prob_data)
-
-                details.append({
+        amount = price_data.get('amount', 1)
 
-                    'mod': prob_data['mod'],
+        currency = price_data.get('currency', 'exalted')
 
-                    'type': 'suffix',
+        return self.rates.convert(amount, currency, 'exalted')
 
-                    'probability': round(prob_data['probability'] * 100, 2),
+    
 
-                    'weight': prob_data['weight']
+    def model_sale_prices(self, items: List[dict]) -> List[dict]:
 
-                })
+        """Batch-price the target outcomes with the valuation model (None = no model)"""
 
-            else:
+        if self.model is None:
 
-                details.append({'mod': mod['name'], 'error': prob_data.get('error')})
+            return [None] * len(items)
 
         
 
-        # ============================================================
-
-        # REALISTIC COST CALCULATION
+        outcomes = [model_outcome(self.pools.get(item['item_type'], CRAFT_ILVL), item) for item in items]
 
-        # ============================================================
+        return self.model.predict_many(outcomes)
 
-        # Method: Essence spam + Annul/Exalt
-
-        # - Essence guarantees 1 mod
-
-        # - Need to hit other mods via RNG
-
-        # - Chaos spam average cost = 1 / combined_probability
+    
 
-        
+    def craft_costs(self, items: List[dict], workers: int = None) -> List[dict]:
 
-        # Combined probability for all prefixes hitting together (simplified)
+        """
 
-        if prefix_probs:
+        Crafting cost per item. Identical (item_type, target mods) pairs are
 
-            combined_prefix_prob = 1
+        computed once; large catalogs fan out over a process pool whose workers
 
-            for p in prefix_probs:
+        all receive the same compiled pools instead of querying the DB.
 
-                combined_prefix_prob *= p['probability']
+        """
 
-            
+        keys = [(item['item_type'], tuple((m['name'], m['type']) for m in item['target_mods']))
 
-            # How many chaos/essence to hit all prefixes?
+                for item in items]
 
-            avg_attempts_prefix = 1 / combined_prefix_prob if combined_prefix_prob > 0 else 1000
+        jobs = {}
 
-        else:
+        for key, item in zip(keys, items):
 
-            avg_attempts_prefix = 1
+            jobs.setdefault(key, (item['item_type'], item['target_mods']))
 
         
 
-        # Combined probability for suffixes
-
-        if suffix_probs:
+        # Compile every pool up front so the workers only read them
 
-            combined_suffix_prob = 1
+        for item_type in {item_type for item_type, _ in jobs}:
 
-            for p in suffix_probs:
+            self.pools.get(item_type, CRAFT_ILVL)
 
-                combined_suffix_prob *= p['probability']
+        
 
-            
+        if workers == 1 or len(jobs) < PARALLEL_MIN_ITEMS:
 
-            avg_attempts_suffix = 1 / combined_suffix_prob if combined_suffix_prob > 0 else 1000
+            results = [self.crafting.calculate_crafting_cost(*job) for job in jobs.values()]
 
         else:
 
-            avg_attempts_suffix = 1
-
-        
-
-        # Cost calculation
+            workers = workers or os.cpu_count() or 1
 
-        # - Essence: 2-5 exalt each
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
 
-        # - Chaos: 0.007 exalt each
+                                     initargs=(self.pools.snapshot(), self.divine_exalt)) as executor:
 
-        # - Annulment: 3 exalt each
+                chunksize = max(1, len(jobs) // (workers * 4))
 
-        # - Exalt: 1 exalt each
+                results = list(executor.map(_worker_craft_cost, jobs.values(), chunksize=chunksize))
 
         
 
-        essence_cost = 3  # Average essence cost
-
-        chaos_cost = 0.007
+        by_key = dict(zip(jobs, results))
 
-        annul_cost = 3
+        return [by_key[key] for key in keys]
 
-        exalt_cost = 1
+    
 
-        
+    def analyze_all(self, workers: int = None) -> List[dict]:
 
-        # Strategy 1: Essence spam for prefixes
+        """Analyze all opportunities"""
 
-        prefix_craft_cost = avg_attempts_prefix * essence_cost
+        opportunities = []
 
         
 
-        # Strategy 2: Exalt spam for suffixes (after getting prefixes)
-
-        # Each exalt has 50% suffix chance, then need specific mod
-
-        if suffix_probs:
-
-            avg_exalts_per_suffix = sum(2 / p['probability'] for p in suffix_probs)
+        entries = [(build_name, build_info, item)
 
-            suffix_craft_cost = avg_exalts_per_suffix * exalt_cost
+                   for build_name, build_info in self.builds.items()
 
-        else:
-
-            suffix_craft_cost = 0
+                   for item in build_info['items']]
 
-        
+        items = [item for _, _, item in entries]
 
-        # Total cost
+        model_prices = self.model_sale_prices(items)
 
-        total_cost = prefix_craft_cost + suffix_craft_cost
+        craft_results = self.craft_costs(items, workers)
 
         
 
-        # Cap at reasonable max
+        for (build_name, build_info, item), model_price, craft_result in zip(
 
-        total_cost = min(total_cost, 5000)  # Max 5000 exalts
+                entries, model_prices, craft_results):
 
-        
+            slot = item['slot']
 
-        return {
+            item_type = item['item_type']
 
-            'total_exalt': round(total_cost, 1),
+            base_name = item['base']
 
-            'total_divine': round(total_cost / CURRENCY_TO_EXALT['divine'], 2),
+            estimated_sale = item['estimated_sale']
 
-            'prefix_cost': round(prefix_craft_cost, 1),
+            sale_source = 'estimate'
 
-            'suffix_cost': round(suffix_craft_cost, 1),
+            if model_price and model_price['coverage'] >= MODEL_MIN_COVERAGE:
 
-            'avg_essence_attempts': round(avg_attempts_prefix, 1),
+                estimated_sale = round(model_price['price_divine'], 1)
 
-            'details': details
+                sale_source = 'model'
 
-        }
+            
 
-    
+            # Get base price
 
-    def analyze_all(self) -> List[dict]:
+            base_cost = self.get_base_price_exalt(base_name)
 
-        """Analyze all opportunities"""
+            
 
-        opportunities = []
+            craft_cost = craft_result['total_exalt']
 
-        
+            
 
-        for build_name, build_info in POPULAR_BUILDS.items():
+            # Calculate ROI
 
-            for item in build_info['items']:
+            total_cost = base_cost + craft_cost
 
-                slot = item['slot']
+            finished_value = estimated_sale * self.divine_exalt
 
-                item_type = item['item_type']
+            profit = finished_value - total_cost
 
-                base_name = item['base']
+            roi = (profit / total_cost * 100) if total_cost > 0 else 0
 
-                target_mods = item['target_mods']
+            
 
-                estimated_sale = item['estimated_sale']
+            opportunities.append({
 
-                
+                'build': build_name,
 
-                # Get base price
+                'demand': build_info['demand'],
 
-                base_cost = self.get_base_price_exalt(base_name)
+                'slot': slot,
 
-                
+                'base': base_name,
 
-                # Calculate crafting cost
+                'item_type': item_type,
 
-                craft_result = self.calculate_crafting_cost(item_type, target_mods)
+                'base_cost_exalt': round(base_cost, 2),
 
-                craft_cost = craft_result['total_exalt']
+                'craft_cost_exalt': round(craft_cost, 1),
 
-                
+                'craft_cost_divine': round(craft_cost / self.divine_exalt, 2),
 
-                # Calculate ROI
+                'total_cost_divine': round(total_cost / self.divine_exalt, 2),
 
-                total_cost = base_cost + craft_cost
+                'estimated_sale_divine': estimated_sale,
 
-                finished_value = estimated_sale * CURRENCY_TO_EXALT['divine']
+                'sale_source': sale_source,
 
-                profit = finished_value - total_cost
+                'profit_divine': round(profit / self.divine_exalt, 1),
 
-                roi = (profit / total_cost * 100) if total_cost > 0 else 0
+                'roi_percent': round(roi, 1),
 
-                
+                'craft_details': craft_result,
 
-                opportunities.append({
+                # Cost vector in Divine for price_scenarios.py
 
-                    'build': build_name,
+                'name': f"{build_name} - {slot}",
 
-                    'demand': build_info['demand'],
+                'inputs': {
 
-                    'slot': slot,
+                    base_name: 1,
 
-                    'base': base_name,
+                    'Essence (avg)': craft_result['essences_used'],
 
-                    'item_type': item_type,
+                    'Exalted Orb': craft_result['exalts_used'],
 
-                    'base_cost_exalt': round(base_cost, 2),
+                },
 
-                    'craft_cost_exalt': round(craft_cost, 1),
+                'outputs': {f"{slot} ({base_name})": 1},
 
-                    'craft_cost_divine': round(craft_cost / CURRENCY_TO_EXALT['divine'], 2),
+                'prices': {
 
-                    'total_cost_divine': round(total_cost / CURRENCY_TO_EXALT['divine'], 2),
+                    base_name: base_cost / self.divine_exalt,
 
-                    'estimated_sale_divine': estimated_sale,
+                    'Essence (avg)': craft_result['essence_cost_exalt'] / self.divine_exalt,
 
-                    'profit_divine': round(profit / CURRENCY_TO_EXALT['divine'], 1),
+                    'Exalted Orb': 1 / self.divine_exalt,
 
-                    'roi_percent': round(roi, 1),
+                    f"{slot} ({base_name})": estimated_sale,
 
-                    'craft_details': craft_result
+                }
 
-                })
+            })
 
         
 
@@ -791,7 +715,7 @@ class FixedAnalyzer:
 
     def close(self):
 
-        self.conn.close()
+        self.pools.close()
 
 
 
@@ -809,8 +733,14 @@ def main():
 
     analyzer = FixedAnalyzer()
 
+    start = time.time()
+
     opportunities = analyzer.analyze_all()
 
+    items = sum(len(b['items']) for b in analyzer.builds.values())
+
+    print(f"\nBuilds: {len(analyzer.builds)} ({items} items), analyzed in {time.time() - start:.2f}s")
+
     
 
     # Display results
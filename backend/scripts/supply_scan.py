@@ -0,0 +1,473 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Supply Scan - depth of market from search totals only
+
+One trade search per base (no fetch) = half the requests of a full price sweep.
+
+- `total` of the search response -> BasePrice.listings_count
+
+- optional price bands: listings under N x known floor (one extra search each)
+
+- optional mod combinations: stat filters on top of the base query
+
+Progress is checkpointed to data/supply_scan.json.
+
+"""
+
+import requests
+
+import json
+
+import sqlite3
+
+import time
+
+from pathlib import Path
+
+from datetime import datetime, timedelta
+
+from typing import Dict, List, Optional
+
+
+
+BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
+
+DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
+
+PRICE_FILE = BASE_DIR / "data" / "collected_prices.json"
+
+SCAN_FILE = BASE_DIR / "data" / "supply_scan.json"
+
+LEAGUE_ID = 1
+
+
+
+# SETTINGS - search-only requests
+
+REQUEST_DELAY = 3           # seconds between searches
+
+BATCH_SIZE = 20
+
+BATCH_BREAK = 30
+
+MIN_ILVL = 75
+
+MAX_AGE_HOURS = 12          # checkpointed scans younger than this are skipped
+
+BAND_MULTIPLIERS = (1.5, 3.0)
+
+
+
+
+
+class SupplyScanner:
+
+    def __init__(self, league: str = "Fate of the Vaal"):
+
+        self.session = requests.Session()
+
+        self.session.headers.update({
+
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+
+            "Accept": "application/json",
+
+            "Content-Type": "application/json"
+
+        })
+
+        self.league = league
+
+        self.base_url = "https://www.pathofexile.com/api/trade2"
+
+        self.conn = sqlite3.connect(DB_PATH)
+
+        self.scans = self._load_checkpoint()
+
+        self.requests_made = 0
+
+
+
+    def _load_checkpoint(self) -> dict:
+
+        if SCAN_FILE.exists():
+
+            with open(SCAN_FILE, 'r') as f:
+
+                return json.load(f)
+
+        return {'scans': {}, 'last_update': None}
+
+
+
+    def _save_checkpoint(self):
+
+        self.scans['last_update'] = datetime.now().isoformat()
+
+        SCAN_FILE.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(SCAN_FILE, 'w') as f:
+
+            json.dump(self.scans, f, indent=2, ensure_ascii=False)
+
+
+
+    # ------------------------------------------------------------
+
+    # Queries
+
+    # ------------------------------------------------------------
+
+    @staticmethod
+
+    def build_query(base_type: str, min_ilvl: int = MIN_ILVL, stat_ids: List[str] = (),
+
+                    price_max: Optional[float] = None, currency: Optional[str] = None) -> dict:
+
+        filters = {
+
+            "misc_filters": {"filters": {"ilvl": {"min": min_ilvl}}},
+
+            "type_filters": {"filters": {"rarity": {"option": "nonunique"}}}
+
+        }
+
+        if price_max is not None:
+
+            filters["trade_filters"] = {"filters": {"price": {"max": price_max, "option": currency}}}
+
+        query = {
+
+            "query": {
+
+                "status": {"option": "online"},
+
+                "type": base_type,
+
+                "filters": filters
+
+            },
+
+            "sort": {"price": "asc"}
+
+        }
+
+        if stat_ids:
+
+            query["query"]["stats"] = [{"type": "and", "filters": [{"id": s} for s in stat_ids]}]
+
+        return query
+
+
+
+    def count(self, query: dict) -> dict:
+
+        """Search only - returns the listing total without fetching any item"""
+
+        try:
+
+            response = self.session.post(
+
+                f"{self.base_url}/search/poe2/{self.league}",
+
+                json=query,
+
+                timeout=20
+
+            )
+
+            self.requests_made += 1
+
+            if response.status_code == 429:
+
+                return {'error': 'RATE_LIMITED', 'retry': True}
+
+            if response.status_code != 200:
+
+                return {'error': f'HTTP {response.status_code}'}
+
+            return {'success': True, 'total': response.json().get('total', 0)}
+
+        except requests.exceptions.Timeout:
+
+            return {'error': 'Timeout', 'retry': True}
+
+        except Exception as e:
+
+            return {'error': str(e)}
+
+
+
+    # ------------------------------------------------------------
+
+    # Scanning
+
+    # ------------------------------------------------------------
+
+    @staticmethod
+
+    def scan_key(base_type: str, stat_ids: List[str] = ()) -> str:
+
+        return base_type + ('|' + '+'.join(sorted(stat_ids)) if stat_ids else '')
+
+
+
+    def known_floors(self) -> Dict[str, dict]:
+
+        """Lowest listing per base from the full price collector, if any"""
+
+        if not PRICE_FILE.exists():
+
+            return {}
+
+        with open(PRICE_FILE, 'r') as f:
+
+            items = json.load(f).get('items', {})
+
+        return {name: data['lowest'] for name, data in items.items() if data.get('lowest')}
+
+
+
+    def scan_target(self, base_type: str, stat_ids: List[str] = (), floor: Optional[dict] = None) -> dict:
+
+        result = self.count(self.build_query(base_type, stat_ids=stat_ids))
+
+        if not result.get('success'):
+
+            return result
+
+        entry = {'total': result['total'], 'bands': {}, 'scanned_at': datetime.now().isoformat()}
+
+        if floor and result['total'] > 0 and floor.get('amount'):
+
+            entry['floor'] = floor
+
+            for mult in BAND_MULTIPLIERS:
+
+                time.sleep(REQUEST_DELAY)
+
+                band = self.count(self.build_query(base_type, stat_ids=stat_ids,
+
+                                                   price_max=floor['amount'] * mult,
+
+                                                   currency=floor.get('currency')))
+
+                if band.get('success'):
+
+                    entry['bands'][f"{mult}x"] = band['total']
+
+        return entry
+
+
+
+    def scan(self, targets: List[dict], bands: bool = False):
+
+        """targets: [{'base': name, 'stats': [stat ids]}]"""
+
+        cutoff = datetime.now() - timedelta(hours=MAX_AGE_HOURS)
+
+        floors = self.known_floors() if bands else {}
+
+        todo = []
+
+        for t in targets:
+
+            prev = self.scans['scans'].get(self.scan_key(t['base'], t.get('stats', ())))
+
+            if not prev or datetime.fromisoformat(prev['scanned_at']) < cutoff:
+
+                todo.append(t)
+
+
+
+        print("="*60)
+
+        print("Supply Scan (search-only)")
+
+        print("="*60)
+
+        print(f"Targets: {len(targets)}, to scan: {len(todo)}")
+
+        band_requests = sum(len(BAND_MULTIPLIERS) for t in todo if t['base'] in floors)
+
+        print(f"Requests: ~{len(todo) + band_requests} "
+
+              f"(full price sweep: {len(todo) * 2})")
+
+        print("="*60)
+
+
+
+        for i, t in enumerate(todo):
+
+            key = self.scan_key(t['base'], t.get('stats', ()))
+
+            print(f"[{i+1}/{len(todo)}] {key[:50]:<50}", end=" ")
+
+            entry = self.scan_target(t['base'], t.get('stats', ()), floors.get(t['base']))
+
+
+
+            if entry.get('retry'):
+
+                print("⚠ RATE LIMITED - stopping, progress saved")
+
+                break
+
+            if 'error' in entry:
+
+                print(f"✗ {entry['error']}")
+
+            else:
+
+                bands_txt = ' '.join(f"<{k}:{v}" for k, v in entry['bands'].items())
+
+                print(f"✓ {entry['total']} listed {bands_txt}")
+
+                self.scans['scans'][key] = entry
+
+                self._save_checkpoint()
+
+
+
+            if (i + 1) % BATCH_SIZE == 0 and i < len(todo) - 1:
+
+                print(f"\n--- Batch break: {BATCH_BREAK}s ---\n")
+
+                time.sleep(BATCH_BREAK)
+
+            elif i < len(todo) - 1:
+
+                time.sleep(REQUEST_DELAY)
+
+
+
+        written = self.write_listing_counts()
+
+        print(f"\nRequests made: {self.requests_made}")
+
+        print(f"BasePrice.listings_count updated: {written['updated']}, "
+
+              f"inserted (unpriced bases): {written['inserted']}")
+
+        if written['unknown']:
+
+            print(f"Not in item_bases ({len(written['unknown'])}): "
+
+                  f"{', '.join(written['unknown'][:10])}")
+
+
+
+    def write_listing_counts(self) -> dict:
+
+        """
+
+        Plain-base totals go to the latest BasePrice row of each base;
+
+        bases never priced get a new row (prices NULL) so supply is not lost
+
+        """
+
+        cursor = self.conn.cursor()
+
+        result = {'updated': 0, 'inserted': 0, 'unknown': []}
+
+        for key, entry in self.scans['scans'].items():
+
+            if '|' in key:
+
+                continue  # mod combinations have no BasePrice row
+
+            cursor.execute("""
+
+                UPDATE base_prices SET listings_count = ?
+
+                WHERE id = (
+
+                    SELECT bp.id FROM base_prices bp
+
+                    JOIN item_bases ib ON bp.item_base_id = ib.id
+
+                    WHERE ib.name = ? AND bp.league_id = ?
+
+                    ORDER BY bp.last_updated DESC LIMIT 1
+
+                )
+
+            """, (entry['total'], key, LEAGUE_ID))
+
+            if cursor.rowcount:
+
+                result['updated'] += cursor.rowcount
+
+                continue
+
+            cursor.execute("SELECT id FROM item_bases WHERE name = ?", (key,))
+
+            row = cursor.fetchone()
+
+            if not row:
+
+                result['unknown'].append(key)
+
+                continue
+
+            cursor.execute("""
+
+                INSERT INTO base_prices (league_id, item_base_id, ilvl, price_chaos, price_divine, listings_count, last_updated)
+
+                VALUES (?, ?, ?, NULL, NULL, ?, ?)
+
+            """, (LEAGUE_ID, row[0], MIN_ILVL, entry['total'], datetime.now()))
+
+            result['inserted'] += 1
+
+        self.conn.commit()
+
+        return result
+
+
+
+    def get_targets(self) -> List[dict]:
+
+        cursor = self.conn.cursor()
+
+        cursor.execute("SELECT name FROM item_bases ORDER BY name")
+
+        return [{'base': row[0]} for row in cursor.fetchall()]
+
+
+
+    def close(self):
+
+        self.conn.close()
+
+
+
+
+
+def main():
+
+    import sys
+
+
+
+    scanner = SupplyScanner()
+
+    scanner.scan(scanner.get_targets(), bands='--bands' in sys.argv)
+
+    scanner.close()
+
+
+
+
+
+if __name__ == "__main__":
+
+    main()
+
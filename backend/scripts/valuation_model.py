@@ -0,0 +1,589 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Finished-Item Valuation Model
+
+Ridge regression of log(price in Divine) on sparse mod features, trained from
+
+parsed listings (mod_parser.py). Only sufficient statistics (X'X, X'y) are
+
+kept, so new collections are folded in without revisiting old listings;
+
+the solve is conjugate gradient warm-started from the previous weights.
+
+Predictions fill FinishedPrice and price simulated craft outcomes in batch.
+
+"""
+
+import hashlib
+
+import json
+
+import math
+
+import os
+
+import sqlite3
+
+import sys
+
+from datetime import datetime
+
+from pathlib import Path
+
+from typing import Dict, Iterable, List, Optional
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+from scripts.build_demand import load_base_item_types
+
+from scripts.currency_normalizer import CurrencyNormalizer
+
+from scripts.mod_parser import ModParser
+
+
+
+BASE_DIR = Path("/home/ubuntu/poe2-profit-optimizer/backend")
+
+DB_PATH = BASE_DIR / "poe2_profit_optimizer.db"
+
+LISTINGS_FILE = BASE_DIR / "data" / "profitable_items.json"
+
+MODEL_FILE = BASE_DIR / "data" / "valuation_model.json"
+
+LEAGUE_ID = 1
+
+
+
+RIDGE_LAMBDA = 1.0
+
+CG_ITERATIONS = 300
+
+CG_TOLERANCE = 1e-10
+
+MIN_FEATURE_COUNT = 2       # features seen less often count as unknown for coverage
+
+
+
+
+
+def outcome_features(base_type: Optional[str], ilvl: Optional[int],
+
+                     mods: Iterable[tuple]) -> Dict[str, float]:
+
+    """mods: (modifier_id, tier or None, first rolled value or None); tiers as resolved by mod_parser"""
+
+    features = {'bias': 1.0}
+
+    if base_type:
+
+        features[f"base:{base_type}"] = 1.0
+
+    if ilvl:
+
+        features['ilvl'] = (ilvl - 80) / 5.0
+
+    for mod_id, tier, value in mods:
+
+        features[f"mod:{mod_id}"] = 1.0
+
+        if value:
+
+            features[f"mod:{mod_id}:roll"] = math.log1p(abs(value))
+
+        if tier:
+
+            features[f"mod:{mod_id}:tier"] = float(tier)
+
+    return features
+
+
+
+
+
+def listing_mods(parsed: dict) -> List[tuple]:
+
+    return [(m['modifier_id'], m.get('tier'), m['values'][0] if m['values'] else None)
+
+            for m in parsed['explicit'] if m.get('modifier_id')]
+
+
+
+
+
+class ValuationModel:
+
+    def __init__(self, ridge: float = RIDGE_LAMBDA):
+
+        self.ridge = ridge
+
+        self.xtx: Dict[str, Dict[str, float]] = {}
+
+        self.xty: Dict[str, float] = {}
+
+        self.counts: Dict[str, int] = {}
+
+        self.n = 0
+
+        self.yy = 0.0
+
+        self.weights: Dict[str, float] = {}
+
+        self.seen: set = set()
+
+
+
+    # ------------------------------------------------------------
+
+    # Training
+
+    # ------------------------------------------------------------
+
+    def add(self, features: Dict[str, float], log_price: float):
+
+        """Fold one observation into X'X / X'y"""
+
+        items = list(features.items())
+
+        for a, va in items:
+
+            row = self.xtx.setdefault(a, {})
+
+            for b, vb in items:
+
+                row[b] = row.get(b, 0.0) + va * vb
+
+            self.xty[a] = self.xty.get(a, 0.0) + va * log_price
+
+            self.counts[a] = self.counts.get(a, 0) + 1
+
+        self.n += 1
+
+        self.yy += log_price * log_price
+
+
+
+    @staticmethod
+
+    def listing_key(parsed: dict) -> str:
+
+        raw = json.dumps([parsed['base_type'], parsed['ilvl'], parsed['price'],
+
+                          [m['text'] for m in parsed['explicit']]], sort_keys=True)
+
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+
+
+    def update(self, parsed_listings: List[dict], rates: Dict[str, float]) -> int:
+
+        """Add listings not seen before; returns how many were added"""
+
+        added = 0
+
+        for parsed in parsed_listings:
+
+            price = parsed['price']
+
+            value = (price.get('amount') or 0) * rates.get(price.get('currency'), 0.0)
+
+            key = self.listing_key(parsed)
+
+            if value <= 0 or key in self.seen:
+
+                continue
+
+            self.seen.add(key)
+
+            self.add(outcome_features(parsed['base_type'], parsed['ilvl'], listing_mods(parsed)),
+
+                     math.log(value))
+
+            added += 1
+
+        return added
+
+
+
+    def _matvec(self, w: Dict[str, float]) -> Dict[str, float]:
+
+        """(X'X + ridge I) w, bias left unpenalised"""
+
+        out = {}
+
+        for a, row in self.xtx.items():
+
+            out[a] = sum(v * w.get(b, 0.0) for b, v in row.items())
+
+            if a != 'bias':
+
+                out[a] += self.ridge * w.get(a, 0.0)
+
+        return out
+
+
+
+    def fit(self) -> int:
+
+        """Conjugate gradient on the normal equations; returns iterations used"""
+
+        keys = list(self.xtx)
+
+        w = {k: self.weights.get(k, 0.0) for k in keys}
+
+        aw = self._matvec(w)
+
+        r = {k: self.xty[k] - aw[k] for k in keys}
+
+        p = dict(r)
+
+        rr = sum(v * v for v in r.values())
+
+        it = 0
+
+        for it in range(1, CG_ITERATIONS + 1):
+
+            if rr < CG_TOLERANCE:
+
+                break
+
+            ap = self._matvec(p)
+
+            alpha = rr / sum(p[k] * ap[k] for k in keys)
+
+            for k in keys:
+
+                w[k] += alpha * p[k]
+
+                r[k] -= alpha * ap[k]
+
+            rr_new = sum(v * v for v in r.values())
+
+            beta = rr_new / rr
+
+            rr = rr_new
+
+            for k in keys:
+
+                p[k] = r[k] + beta * p[k]
+
+        self.weights = w
+
+        return it
+
+
+
+    def rmse(self) -> float:
+
+        """In-sample RMSE of log price, from the sufficient statistics alone"""
+
+        if not self.n:
+
+            return 0.0
+
+        w = self.weights
+
+        wxtxw = sum(w.get(a, 0.0) * sum(v * w.get(b, 0.0) for b, v in row.items())
+
+                    for a, row in self.xtx.items())
+
+        sse = self.yy - 2 * sum(w.get(k, 0.0) * v for k, v in self.xty.items()) + wxtxw
+
+        return math.sqrt(max(sse, 0.0) / self.n)
+
+
+
+    # ------------------------------------------------------------
+
+    # Prediction
+
+    # ------------------------------------------------------------
+
+    def coverage(self, features: Dict[str, float]) -> float:
+
+        keys = [k for k in features if k != 'bias']
+
+        if not keys:
+
+            return 0.0
+
+        return sum(1 for k in keys if self.counts.get(k, 0) >= MIN_FEATURE_COUNT) / len(keys)
+
+
+
+    def predict(self, features: Dict[str, float]) -> float:
+
+        w = self.weights
+
+        return math.exp(sum(v * w.get(k, 0.0) for k, v in features.items()))
+
+
+
+    def fill_unknown(self, features: Dict[str, float], mods: Iterable[tuple]) -> Dict[str, float]:
+
+        """Tier / roll left open (None) by an outcome -> its mean over the trained listings"""
+
+        for mod_id, tier, value in mods:
+
+            for key, known in ((f"mod:{mod_id}:tier", tier), (f"mod:{mod_id}:roll", value)):
+
+                if not known and self.counts.get(key):
+
+                    features[key] = self.xtx[key]['bias'] / self.counts[key]
+
+        return features
+
+
+
+    def predict_many(self, outcomes: List[dict]) -> List[dict]:
+
+        """
+
+        outcomes: {'base_type', 'ilvl', 'mods': [(modifier_id, tier, value)]} -> price + coverage.
+
+        Crafted outcomes usually leave tier and roll open (None); those are priced at the
+
+        trained mean instead of dropping the feature.
+
+        """
+
+        results = []
+
+        for outcome in outcomes:
+
+            mods = outcome.get('mods', [])
+
+            features = self.fill_unknown(
+
+                outcome_features(outcome.get('base_type'), outcome.get('ilvl'), mods), mods)
+
+            results.append({'price_divine': self.predict(features), 'coverage': self.coverage(features)})
+
+        return results
+
+
+
+    # ------------------------------------------------------------
+
+    # Persistence
+
+    # ------------------------------------------------------------
+
+    def save(self, path: Path = MODEL_FILE):
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(path, 'w') as f:
+
+            json.dump({
+
+                'ridge': self.ridge, 'n': self.n, 'yy': self.yy,
+
+                'xtx': self.xtx, 'xty': self.xty, 'counts': self.counts,
+
+                'weights': self.weights, 'seen': sorted(self.seen),
+
+                'last_update': datetime.now().isoformat(),
+
+            }, f)
+
+
+
+    @classmethod
+
+    def load(cls, path: Path = MODEL_FILE) -> 'ValuationModel':
+
+        model = cls()
+
+        if path.exists():
+
+            with open(path, 'r') as f:
+
+                data = json.load(f)
+
+            model.ridge = data['ridge']
+
+            model.n, model.yy = data['n'], data['yy']
+
+            model.xtx, model.xty = data['xtx'], data['xty']
+
+            model.counts, model.weights = data['counts'], data['weights']
+
+            model.seen = set(data['seen'])
+
+        return model
+
+
+
+
+
+def write_finished_prices(conn: sqlite3.Connection, model: ValuationModel, parsed_listings: List[dict],
+
+                          rates: Dict[str, float], league_id: int = LEAGUE_ID) -> int:
+
+    """One FinishedPrice row per (base, mod set): model price + observed min/max"""
+
+    groups: Dict[tuple, dict] = {}
+
+    for parsed in parsed_listings:
+
+        mods = listing_mods(parsed)
+
+        signature = tuple(sorted((m[0], m[1] or 0) for m in mods))
+
+        group = groups.setdefault((parsed['base_type'], signature), {'listing': parsed, 'prices': []})
+
+        price = parsed['price']
+
+        value = (price.get('amount') or 0) * rates.get(price.get('currency'), 0.0)
+
+        if value > 0:
+
+            group['prices'].append(value)
+
+
+
+    base_ids = dict(conn.execute("SELECT name, id FROM item_bases").fetchall())
+
+    names = {m['modifier_id']: m['name'] for p in parsed_listings for m in p['explicit'] if m.get('modifier_id')}
+
+    now = datetime.now()
+
+    written = 0
+
+    with conn:
+
+        for (base_type, signature), group in groups.items():
+
+            if base_type not in base_ids or not signature:
+
+                continue
+
+            listing = group['listing']
+
+            predicted = model.predict(outcome_features(base_type, listing['ilvl'], listing_mods(listing)))
+
+            target = json.dumps([{'modifier_id': m, 'tier': t, 'name': names.get(m)} for m, t in signature],
+
+                                ensure_ascii=False)
+
+            prices = group['prices'] or [predicted]
+
+            row = (predicted, min(prices), max(prices), now)
+
+            cur = conn.execute("""
+
+                UPDATE finished_prices SET avg_price_divine = ?, min_price_divine = ?,
+
+                    max_price_divine = ?, last_updated = ?
+
+                WHERE league_id = ? AND item_base_id = ? AND target_mods = ?
+
+            """, row + (league_id, base_ids[base_type], target))
+
+            if cur.rowcount == 0:
+
+                conn.execute("""
+
+                    INSERT INTO finished_prices
+
+                    (league_id, item_base_id, target_mods, avg_price_divine, min_price_divine,
+
+                     max_price_divine, last_updated)
+
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+
+                """, (league_id, base_ids[base_type], target) + row)
+
+            written += 1
+
+    return written
+
+
+
+
+
+def main():
+
+    print("="*60)
+
+    print("Finished-Item Valuation Model")
+
+    print("="*60)
+
+
+
+    conn = sqlite3.connect(DB_PATH)
+
+    parser = ModParser(conn)
+
+    rates = CurrencyNormalizer(conn).as_dict()
+
+    # Item type per base, so mods and tiers resolve the same way as for crafted outcomes
+
+    base_types = load_base_item_types(conn)
+
+
+
+    with open(LISTINGS_FILE, 'r') as f:
+
+        listings = json.load(f).get('expensive_items', [])
+
+    parsed = [parser.parse_listing(l, base_types.get(l.get('base_type'))) for l in listings]
+
+
+
+    model = ValuationModel.load()
+
+    added = model.update(parsed, rates)
+
+    iterations = model.fit()
+
+    model.save()
+
+
+
+    print(f"Listings: {len(parsed)}, new: {added}, total trained: {model.n}")
+
+    print(f"Features: {len(model.xtx)}, CG iterations: {iterations}")
+
+    print(f"In-sample RMSE (log price): {model.rmse():.3f}")
+
+
+
+    top = sorted(((k, v) for k, v in model.weights.items() if k.startswith('mod:') and k.count(':') == 1),
+
+                 key=lambda kv: -kv[1])[:10]
+
+    names = {str(m['modifier_id']): m['name'] for p in parsed for m in p['explicit'] if m.get('modifier_id')}
+
+    print("\nMost valuable mods (price multiplier):")
+
+    for key, weight in top:
+
+        print(f"  x{math.exp(weight):6.2f}  {names.get(key.split(':')[1], key)}")
+
+
+
+    written = write_finished_prices(conn, model, parsed, rates)
+
+    conn.close()
+
+    print(f"\n[DB] FinishedPrice rows written: {written}")
+
+
+
+
+
+if __name__ == "__main__":
+
+    main()
+
@@ -0,0 +1,89 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Backtester - a five-day replay with hand-computed PnL; days before an input's
+
+first observation are not priced
+
+"""
+
+import os
+
+import sys
+
+
+
+import pytest
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.backtester import Backtester, PricePanel
+
+from scripts.price_scenarios import PriceHistoryBook
+
+
+
+DAYS = ['2026-10-01', '2026-10-02', '2026-10-03', '2026-10-04', '2026-10-05']
+
+
+
+
+
+def book() -> PriceHistoryBook:
+
+    # The base is first seen on day 2, the finished ring is listed every other day
+
+    return PriceHistoryBook({}, {
+
+        'Gold Ring': {DAYS[1]: 1.0, DAYS[3]: 2.0},
+
+        'Ring of Haste': {DAYS[0]: 5.0, DAYS[2]: 3.0, DAYS[4]: 4.0},
+
+    })
+
+
+
+
+
+def test_inputs_are_unpriced_before_first_observation():
+
+    panel = PricePanel(book())
+
+    assert panel.row('Gold Ring') == [None, 1.0, 1.0, 2.0, 2.0]
+
+    assert panel.curve({'Gold Ring': 2, 'Ring of Haste': 1}, {}) == [None, 7.0, 5.0, 7.0, 8.0]
+
+
+
+
+
+def test_replay_pnl():
+
+    opportunity = {'recipe': 'Haste ring', 'inputs': {'Gold Ring': 1}, 'outputs': {'Ring of Haste': 1}}
+
+    result = Backtester(book(), [opportunity], hold_days=2, min_roi=20.0,
+
+                        daily_budget=100.0, max_per_day=5).run()
+
+
+
+    # Day 1 is skipped (no base price yet); days 4-5 have no exit inside the history
+
+    assert [(t['entry_day'], t['exit_day']) for t in result['trades']] == [(DAYS[1], DAYS[3]), (DAYS[2], DAYS[4])]
+
+    assert [t['predicted_roi'] for t in result['trades']] == pytest.approx([400.0, 200.0])
+
+    assert [t['realized_pnl'] for t in result['trades']] == pytest.approx([2.0, 3.0])
+
+    assert [c['cumulative_pnl'] for c in result['curve']] == pytest.approx([0, 0, 0, 2.0, 5.0])
+
+    recipe = result['recipes'][0]
+
+    assert (recipe['trades'], recipe['realized_roi'], recipe['hit_rate']) == (2, pytest.approx(250.0), 1.0)
+
@@ -0,0 +1,299 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Build demand - serial, chunked and worker ingest of tests/fixtures/build_dump.jsonl
+
+agree, and SpaceSaving stays within its error bounds
+
+"""
+
+import os
+
+import random
+
+import sqlite3
+
+import sys
+
+from collections import Counter
+
+from pathlib import Path
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+from scripts import build_demand
+
+from scripts.build_demand import DemandAggregator, SpaceSaving
+
+from scripts.mod_parser import ModParser
+
+
+
+DUMP = Path(__file__).parent / "fixtures" / "build_dump.jsonl"
+
+BASE_TYPES = {'Gold Ring': 'Ring', 'Jade Amulet': 'Amulet'}
+
+MODS = {
+
+    'Ring': ["+# to maximum Life", "+#% to Fire Resistance", "+#% to Cold Resistance",
+
+             "+# to Strength", "+#% increased Rarity of Items found"],
+
+    'Amulet': ["+# to maximum Life", "+# to Spirit", "+#% to Lightning Resistance",
+
+               "+# to Intelligence"],
+
+}
+
+
+
+
+
+def mod_db(path: Path) -> Path:
+
+    conn = sqlite3.connect(path)
+
+    conn.executescript("""
+
+        CREATE TABLE modifiers (id INTEGER PRIMARY KEY, name TEXT, mod_type TEXT, tags TEXT);
+
+        CREATE TABLE modifier_tiers (
+
+            id INTEGER PRIMARY KEY, modifier_id INTEGER, item_type TEXT, tier INTEGER,
+
+            min_ilvl INTEGER, weight INTEGER, is_desecrated BOOLEAN DEFAULT 0
+
+        );
+
+        CREATE TABLE mod_tiers (
+
+            id INTEGER PRIMARY KEY, mod_group_id INTEGER, tier INTEGER, min_value FLOAT,
+
+            max_value FLOAT, min_ilvl INTEGER, weight INTEGER, mod_text VARCHAR(500)
+
+        );
+
+    """)
+
+    ids = {}
+
+    for item_type, names in MODS.items():
+
+        for name in names:
+
+            if name not in ids:
+
+                ids[name] = conn.execute("INSERT INTO modifiers (name, mod_type) VALUES (?, 'prefix')",
+
+                                         (name,)).lastrowid
+
+            conn.execute("INSERT INTO modifier_tiers (modifier_id, item_type, tier, min_ilvl, weight) "
+
+                         "VALUES (?, ?, 1, 1, 1000)", (ids[name], item_type))
+
+    conn.commit()
+
+    conn.close()
+
+    return path
+
+
+
+
+
+def aggregator(db_path: Path, capacity: int = build_demand.SKETCH_CAPACITY) -> DemandAggregator:
+
+    conn = sqlite3.connect(db_path)
+
+    parser = ModParser(conn)
+
+    conn.close()
+
+    return DemandAggregator(parser, BASE_TYPES, capacity)
+
+
+
+
+
+def counts(agg: DemandAggregator) -> dict:
+
+    state = agg.to_dict()
+
+    state.pop('files')
+
+    state['mod_counts'] = sorted(state['mod_counts'])
+
+    state['base_counts'] = sorted(state['base_counts'])
+
+    state['combos'] = sorted(map(tuple, state['combos']['entries']))
+
+    return state
+
+
+
+
+
+def test_chunked_and_worker_ingest_match_serial(tmp_path, monkeypatch):
+
+    db_path = mod_db(tmp_path / "mods.db")
+
+    serial = aggregator(db_path)
+
+    serial.ingest_range(DUMP)
+
+
+
+    # Ranges far smaller than the dump: most lines straddle a chunk boundary
+
+    monkeypatch.setattr(build_demand, 'CHUNK_BYTES', 700)
+
+    chunked = aggregator(db_path)
+
+    chunked.ingest_files([DUMP], workers=1)
+
+    pooled = aggregator(db_path)
+
+    pooled.ingest_files([DUMP], workers=2, db_path=db_path)
+
+
+
+    assert serial.characters == 24 and serial.bad_lines == 1 and serial.unmapped == 5
+
+    assert serial.mod_counts and len(serial.combos)
+
+    assert counts(chunked) == counts(serial)
+
+    assert counts(pooled) == counts(serial)
+
+
+
+
+
+def test_ingest_skips_seen_files_and_state_round_trips(tmp_path):
+
+    db_path = mod_db(tmp_path / "mods.db")
+
+    agg = aggregator(db_path)
+
+    agg.ingest_files([DUMP], workers=1)
+
+    assert agg.ingest_files([DUMP], workers=1) == 0
+
+
+
+    restored = aggregator(db_path)
+
+    restored.load_state(agg.to_dict())
+
+    assert counts(restored) == counts(agg)
+
+    assert restored.ingest_files([DUMP], workers=1) == 0
+
+
+
+
+
+def test_reingest_reads_only_appended_lines(tmp_path):
+
+    db_path = mod_db(tmp_path / "mods.db")
+
+    lines = DUMP.read_bytes().splitlines(keepends=True)
+
+    dump = tmp_path / "dump.jsonl"
+
+    dump.write_bytes(b''.join(lines[:12]))
+
+    agg = aggregator(db_path)
+
+    agg.ingest_files([dump], workers=1)
+
+    first = counts(agg)
+
+
+
+    # Touched but unchanged: nothing is counted twice
+
+    os.utime(dump, (1, 1))
+
+    assert agg.ingest_files([dump], workers=1) == 0
+
+    assert counts(agg) == first
+
+
+
+    # Appended: only the new lines are read
+
+    with open(dump, 'ab') as f:
+
+        f.write(b''.join(lines[12:]))
+
+    agg.ingest_files([dump], workers=1)
+
+    whole = aggregator(db_path)
+
+    whole.ingest_range(DUMP)
+
+    assert counts(agg) == counts(whole)
+
+
+
+    # Rewritten shorter: skipped rather than counted on top of the old contents
+
+    dump.write_bytes(b''.join(lines[:3]))
+
+    assert agg.ingest_files([dump], workers=1) == 0
+
+    assert counts(agg) == counts(whole)
+
+
+
+
+
+def test_space_saving_bounds_true_counts():
+
+    rng = random.Random(48)
+
+    stream = [min(int(rng.paretovariate(1.2)), 400) for _ in range(20000)]
+
+    halves = (stream[:len(stream) // 2], stream[len(stream) // 2:])
+
+    sketches = []
+
+    for part in halves:
+
+        sketch = SpaceSaving(50)
+
+        for key in part:
+
+            sketch.add(key)
+
+        sketches.append(sketch)
+
+    merged = sketches[0].merge(sketches[1])
+
+
+
+    for sketch, part in ((sketches[0], halves[0]), (sketches[1], halves[1]), (merged, stream)):
+
+        true = Counter(part)
+
+        assert sketch.total == len(part)
+
+        assert len(sketch) <= sketch.capacity
+
+        for key, count, error in sketch.top():
+
+            assert count - error <= true[key] <= count
+
+        floor = sketch.min_count()
+
+        assert all(n <= floor for key, n in true.items() if key not in sketch.counts)
+
@@ -0,0 +1,147 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Currency arbitrage - negative cycle detection, incremental rate updates and
+
+syncing a long-lived graph to the latest rows
+
+"""
+
+import math
+
+import os
+
+import sys
+
+
+
+import pytest
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.currency_arbitrage import ArbitrageGraph
+
+
+
+
+
+def triangle(chaos_per_exalt: float) -> ArbitrageGraph:
+
+    """Divine -> 400 Exalt -> Chaos -> Divine at 40 Chaos per Divine"""
+
+    graph = ArbitrageGraph()
+
+    graph.update_rate('Divine Orb', 'Exalted Orb', 400)
+
+    graph.update_rate('Exalted Orb', 'Chaos Orb', chaos_per_exalt)
+
+    graph.update_rate('Chaos Orb', 'Divine Orb', 1 / 40)
+
+    return graph
+
+
+
+
+
+def test_detects_profitable_triangle():
+
+    assert triangle(0.1).detect() is None
+
+    assert triangle(0.099).cycles() == []
+
+
+
+    graph = triangle(0.11)
+
+    assert sorted(graph.detect()) == ['Chaos Orb', 'Divine Orb', 'Exalted Orb']
+
+    found = graph.cycles()
+
+    assert len(found) == 1
+
+    assert found[0]['profit_pct'] == pytest.approx(10.0)
+
+    assert found[0]['cycle'][0] == found[0]['cycle'][-1]
+
+
+
+
+
+def test_update_rate_is_incremental_and_rejects_bad_rates():
+
+    graph = triangle(0.099)
+
+    assert graph.detect() is None and graph.clean
+
+
+
+    assert graph.update_rate('Exalted Orb', 'Chaos Orb', 0.098) is None
+
+    assert graph.clean
+
+    cycle = graph.update_rate('Exalted Orb', 'Chaos Orb', 0.12)
+
+    assert sorted(cycle) == ['Chaos Orb', 'Divine Orb', 'Exalted Orb']
+
+    assert graph.cycle_gain(cycle) == pytest.approx(0.2)
+
+
+
+    for received in (0, -1.5):
+
+        with pytest.raises(ValueError):
+
+            graph.update_rate('Chaos Orb', 'Exalted Orb', received)
+
+
+
+
+
+def test_sync_matches_a_fresh_build():
+
+    rate = (400, 40, 0.1)
+
+    stale = [('Regal Orb', 2.0, 0.05)]
+
+    graph = ArbitrageGraph()
+
+    graph.sync(ArbitrageGraph.from_rows([], rate, stale))
+
+    assert graph.cycles() == []
+
+
+
+    # A new quote, a new currency, and Regal Orb gone from the latest rows
+
+    quotes = [('Chaos Orb', 'Exalted Orb', 5.0)]
+
+    prices = [('Vaal Orb', 1.0, 0.025)]
+
+    fresh = ArbitrageGraph.from_rows(quotes, rate, prices)
+
+    assert graph.sync(fresh) > 0
+
+    assert 'Regal Orb' not in graph.adj
+
+    assert graph.adj == fresh.adj
+
+    assert graph.cycles() == fresh.cycles()
+
+    assert graph.sync(fresh) == 0
+
+
+
+
+
+def test_from_rows_uses_newest_price_per_currency():
+
+    graph = ArbitrageGraph.from_rows(prices=[('Regal Orb', 2.0, None), ('Regal Orb', 1.0, None)])
+
+    assert math.exp(-graph.adj['Regal Orb']['Chaos Orb']) == pytest.approx(2.0 * 0.99)
+
@@ -0,0 +1,151 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Exchange pricer replay - trade exchange responses in tests/fixtures/exchange
+
+
+
+The fixtures carry the full trade2 response shape (listing ids, account, whisper
+
+tokens, multi-offer listings, static entries without ids) at the reference rates
+
+of currency_normalizer.FALLBACK_DIVINE_VALUE (~150 ex / ~370 chaos per Divine).
+
+Replace them with a live capture, same file names, via:
+
+    python scripts/exchange_pricer.py --record tests/fixtures/exchange --dry-run
+
+"""
+
+import os
+
+import sys
+
+import sqlite3
+
+from pathlib import Path
+
+
+
+import pytest
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.exchange_pricer import ExchangePricer, RecordedTransport
+
+
+
+FIXTURES = Path(__file__).parent / "fixtures" / "exchange"
+
+
+
+
+
+def replay() -> ExchangePricer:
+
+    return ExchangePricer(RecordedTransport(FIXTURES)).fetch()
+
+
+
+
+
+def test_replay_prices_every_recorded_currency():
+
+    pricer = replay()
+
+    prices = pricer.prices()
+
+
+
+    assert pricer.transport.requests_made == 4   # static + one chunk per anchor
+
+    assert set(prices) == {'Orb of Alchemy', 'Chaos Orb', 'Divine Orb', 'Exalted Orb',
+
+                           'Greater Essence of Haste', 'Omen of Dextral Exaltation'}
+
+    assert prices['Divine Orb']['price_divine'] == pytest.approx(1.0)
+
+    assert prices['Chaos Orb']['price_chaos'] == pytest.approx(1.0)
+
+    assert prices['Greater Essence of Haste']['type'] == 'Essence'
+
+    assert prices['Omen of Dextral Exaltation']['type'] == 'Omen'
+
+
+
+
+
+def test_replay_cross_rates_are_consistent():
+
+    pricer = replay()
+
+    fit = pricer.fit
+
+
+
+    # Quotes are near-consistent; the 165 ex/div offer is beyond QUOTE_DEPTH
+
+    assert fit.rate('exalted', 'divine') == pytest.approx(150, rel=0.01)
+
+    assert fit.rate('chaos', 'divine') == pytest.approx(370, rel=0.01)
+
+    via_chaos = fit.rate('exalted', 'chaos') * fit.rate('chaos', 'divine')
+
+    assert via_chaos == pytest.approx(fit.rate('exalted', 'divine'))
+
+    assert fit.max_residual() < 0.02
+
+
+
+
+
+def test_replay_writes_prices_in_one_transaction():
+
+    conn = sqlite3.connect(":memory:")
+
+    conn.execute("CREATE TABLE currencies (id INTEGER PRIMARY KEY, name VARCHAR, type VARCHAR)")
+
+    conn.execute("""
+
+        CREATE TABLE currency_prices (
+
+            id INTEGER PRIMARY KEY, league_id INTEGER, currency_id INTEGER,
+
+            price_chaos FLOAT, price_divine FLOAT, last_updated DATETIME
+
+        )
+
+    """)
+
+    pricer = replay()
+
+
+
+    assert pricer.write(conn) == 6
+
+    assert conn.execute("SELECT COUNT(*) FROM currency_prices").fetchone()[0] == 6
+
+    assert conn.execute("SELECT COUNT(*) FROM currency_pair_quotes").fetchone()[0] == len(pricer.quotes)
+
+    conn.close()
+
+
+
+
+
+def test_missing_recording_raises(tmp_path):
+
+    (tmp_path / "static.json").write_text((FIXTURES / "static.json").read_text())
+
+
+
+    with pytest.raises(FileNotFoundError):
+
+        ExchangePricer(RecordedTransport(tmp_path)).fetch()
+
@@ -0,0 +1,139 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Mod parser tiers on the imported schema - step3 imports data/modifier_data_v5.json
+
+and the per-tier ranges, listing lines resolve to the tier of their item type
+
+"""
+
+import json
+
+import os
+
+import sqlite3
+
+import sys
+
+from pathlib import Path
+
+
+
+import pytest
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.mod_parser import ModParser, load_tier_index
+
+from scripts.step3_import_v5_data import create_tables, import_data, import_tier_ranges
+
+
+
+DATA = Path(__file__).parent.parent / "data"
+
+
+
+
+
+@pytest.fixture(scope="module")
+
+def imported() -> sqlite3.Connection:
+
+    conn = sqlite3.connect(":memory:")
+
+    create_tables(conn)
+
+    with open(DATA / "modifier_data_v5.json", encoding='utf-8') as f:
+
+        mods = json.load(f)
+
+    with open(DATA / "modifier_data_v4.json", encoding='utf-8') as f:
+
+        tiers = json.load(f)
+
+    import_data(conn, mods)
+
+    import_tier_ranges(conn, mods, tiers)
+
+    return conn
+
+
+
+
+
+def test_import_fills_mod_tiers(imported):
+
+    groups = imported.execute("SELECT COUNT(*) FROM mod_groups WHERE item_type = 'Rings'").fetchone()[0]
+
+    tiers = imported.execute("SELECT COUNT(*) FROM mod_tiers").fetchone()[0]
+
+
+
+    assert groups > 0 and tiers > groups
+
+    # Best tier numbered highest, matching modifier_tiers.tier of the same mod
+
+    top = imported.execute("""
+
+        SELECT MAX(mt.tier) FROM mod_tiers mt JOIN mod_groups mg ON mt.mod_group_id = mg.id
+
+        WHERE mg.item_type = 'Rings' AND mg.name = '# to Strength'
+
+    """).fetchone()[0]
+
+    assert top == imported.execute("""
+
+        SELECT t.tier FROM modifier_tiers t JOIN modifiers m ON t.modifier_id = m.id
+
+        WHERE t.item_type = 'Rings' AND m.name = '# to Strength' AND t.is_desecrated = 0
+
+    """).fetchone()[0]
+
+
+
+
+
+def test_listing_tiers_resolve_per_item_type(imported):
+
+    parser = ModParser(imported)
+
+
+
+    ring = parser.parse_line("+30 to Strength", 'Rings', 82)
+
+    assert (ring['tier'], ring['tier_exact']) == (7, True)
+
+
+
+    # Same template, different ladders per item type
+
+    amulet = parser.parse_line("+130 to maximum Life", 'Amulets', 82)
+
+    ring = parser.parse_line("+130 to maximum Life", 'Rings', 82)
+
+    assert (amulet['tier'], amulet['tier_exact']) == (9, True)
+
+    assert (ring['tier'], ring['tier_exact']) == (8, False)
+
+
+
+
+
+def test_prefix_and_suffix_ladders_stay_separate(imported):
+
+    index = load_tier_index(imported)
+
+    key = '#% increased rarity of items found'
+
+
+
+    assert index[(key, 'Rings', 'prefix')][0][1:] == (16.0, 19.0)
+
+    assert index[(key, 'Rings', 'suffix')][0][1:] == (15.0, 18.0)
+
@@ -0,0 +1,137 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Modifier search index - built on first use and rebuilt after any write to
+
+modifiers, including writers that never call rebuild_search_index
+
+"""
+
+import json
+
+import os
+
+import sqlite3
+
+import sys
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.modifier_search import ensure_search_index, search_modifiers
+
+
+
+
+
+def modifier_db(path) -> sqlite3.Connection:
+
+    conn = sqlite3.connect(path)
+
+    conn.executescript("""
+
+        CREATE TABLE modifiers (id INTEGER PRIMARY KEY, name TEXT, mod_type TEXT, tags TEXT);
+
+        CREATE TABLE modifier_tiers (
+
+            id INTEGER PRIMARY KEY, modifier_id INTEGER, item_type TEXT, tier INTEGER
+
+        );
+
+    """)
+
+    conn.executemany("INSERT INTO modifiers (name, mod_type, tags) VALUES (?, ?, ?)", [
+
+        ('+# to maximum Life', 'prefix', json.dumps(['life'])),
+
+        ('+#% to Fire Resistance', 'suffix', json.dumps(['elemental', 'fire', 'resistance'])),
+
+    ])
+
+    conn.commit()
+
+    return conn
+
+
+
+
+
+def names(conn, q='', tags=None):
+
+    return [r['name'] for r in search_modifiers(conn, q, tags)['results']]
+
+
+
+
+
+def test_index_follows_writes_from_other_connections(tmp_path):
+
+    conn = modifier_db(tmp_path / "mods.db")
+
+    assert ensure_search_index(conn)
+
+    assert not ensure_search_index(conn)
+
+    assert names(conn, 'fire res') == ['+#% to Fire Resistance']
+
+
+
+    # Another writer (step1-style import) that knows nothing about the index
+
+    writer = sqlite3.connect(tmp_path / "mods.db")
+
+    writer.execute("INSERT INTO modifiers (name, mod_type, tags) VALUES (?, ?, ?)",
+
+                   ('+#% to Cold Resistance', 'suffix', json.dumps(['elemental', 'cold', 'resistance'])))
+
+    writer.execute("UPDATE modifiers SET tags = ? WHERE name = '+# to maximum Life'",
+
+                   (json.dumps(['life', 'resource']),))
+
+    writer.commit()
+
+    writer.close()
+
+
+
+    assert ensure_search_index(conn)
+
+    assert names(conn, 'resistance') == ['+#% to Cold Resistance', '+#% to Fire Resistance']
+
+    assert names(conn, tags=['resource']) == ['+# to maximum Life']
+
+    assert not ensure_search_index(conn)
+
+
+
+
+
+def test_recreated_modifiers_table_is_reindexed(tmp_path):
+
+    conn = modifier_db(tmp_path / "mods.db")
+
+    ensure_search_index(conn)
+
+
+
+    # Dropping the table drops its triggers with it
+
+    conn.execute("DROP TABLE modifiers")
+
+    conn.execute("CREATE TABLE modifiers (id INTEGER PRIMARY KEY, name TEXT, mod_type TEXT, tags TEXT)")
+
+    conn.execute("INSERT INTO modifiers (name, mod_type, tags) VALUES ('+# to Spirit', 'prefix', '[]')")
+
+    conn.commit()
+
+
+
+    assert ensure_search_index(conn)
+
+    assert names(conn) == ['+# to Spirit']
+
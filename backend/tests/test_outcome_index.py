@@ -0,0 +1,83 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Outcome index sources - listed prices stay observed, FinishedPrice predictions only
+
+fill signatures nobody has listed
+
+"""
+
+import json
+
+import os
+
+import sqlite3
+
+import sys
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.outcome_index import OutcomeIndex
+
+
+
+
+
+def listing(mods, amount: float) -> dict:
+
+    return {'price': {'amount': amount, 'currency': 'divine'},
+
+            'explicit': [{'modifier_id': m, 'tier': t} for m, t in mods]}
+
+
+
+
+
+def test_finished_prices_only_fill_unlisted_signatures(tmp_path):
+
+    conn = sqlite3.connect(":memory:")
+
+    conn.execute("""
+
+        CREATE TABLE finished_prices (
+
+            id INTEGER PRIMARY KEY, league_id INTEGER, item_base_id INTEGER,
+
+            target_mods JSON, avg_price_divine FLOAT
+
+        )
+
+    """)
+
+    # Model predictions for a listed signature and for one nobody listed
+
+    for mods, price in (([(1, 5), (2, 3)], 9.0), ([(3, 4)], 2.5)):
+
+        conn.execute("INSERT INTO finished_prices (league_id, item_base_id, target_mods, avg_price_divine) "
+
+                     "VALUES (1, 1, ?, ?)",
+
+                     (json.dumps([{'modifier_id': m, 'tier': t} for m, t in mods]), price))
+
+    parsed_file = tmp_path / "parsed_listings.json"
+
+    parsed_file.write_text(json.dumps([listing([(2, 3), (1, 5)], 4.0), listing([(1, 5), (2, 3)], 6.0)]))
+
+
+
+    index = OutcomeIndex.from_db(conn, parsed_file=parsed_file)
+
+
+
+    listed = index.stats(((1, 5), (2, 3)))
+
+    assert (listed['count'], listed['median']) == (2, 5.0)
+
+    assert index.stats(((3, 4),))['median'] == 2.5
+
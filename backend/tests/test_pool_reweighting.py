@@ -0,0 +1,95 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Pool reweighting - mixed-affix targets and catalyst lift measured against the
+
+omen-only baseline
+
+"""
+
+import os
+
+import sys
+
+
+
+import pytest
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.mod_pool import CompiledModPool
+
+from scripts.pool_reweighting import PoolReweighter
+
+
+
+ROWS = [
+
+    {'id': 1, 'name': 'Adds # to # Lightning damage to Attacks', 'mod_type': 'prefix', 'tier': 1,
+
+     'min_ilvl': 1, 'weight': 100, 'tags': ['lightning', 'attack']},
+
+    {'id': 2, 'name': '+# to maximum Life', 'mod_type': 'prefix', 'tier': 1,
+
+     'min_ilvl': 1, 'weight': 300, 'tags': ['life']},
+
+    {'id': 3, 'name': '+#% to Lightning Resistance', 'mod_type': 'suffix', 'tier': 1,
+
+     'min_ilvl': 1, 'weight': 200, 'tags': ['lightning']},
+
+    {'id': 4, 'name': '+# to Strength', 'mod_type': 'suffix', 'tier': 1,
+
+     'min_ilvl': 1, 'weight': 400, 'tags': ['attribute']},
+
+]
+
+
+
+
+
+def test_mixed_affix_targets_use_both_pools():
+
+    reweighter = PoolReweighter(CompiledModPool('Rings', 82, ROWS))
+
+
+
+    assert reweighter.probability([0]) == pytest.approx(100 / 400)
+
+    assert reweighter.probability([2]) == pytest.approx(200 / 600)
+
+    # Prefix + suffix target: one roll over both pools, whatever order the indices come in
+
+    assert reweighter.probability([0, 2]) == pytest.approx(300 / 1000)
+
+    assert reweighter.probability([2, 0]) == pytest.approx(300 / 1000)
+
+
+
+
+
+def test_catalyst_lift_is_against_the_omen_baseline():
+
+    reweighter = PoolReweighter(CompiledModPool('Rings', 82, ROWS))
+
+    rows = reweighter.scan_catalysts([0], qualities=(20,), omens=['Omen of Sinistral Exaltation'])
+
+    esh = next(r for r in rows if r['option'] == "Esh's Catalyst @20%")
+
+
+
+    # Suffixes masked: 120 / (120 + 300) with the catalyst, 100 / 400 without
+
+    assert esh['probability'] == pytest.approx(120 / 420)
+
+    assert esh['lift'] == pytest.approx((120 / 420) / (100 / 400))
+
+    unrelated = next(r for r in rows if r['option'] == "Xoph's Catalyst @20%")
+
+    assert unrelated['lift'] == pytest.approx(1.0)
+
@@ -0,0 +1,137 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Portfolio optimizer - the bounded knapsack matches brute force on small
+
+instances and never spends past the budget
+
+"""
+
+import itertools
+
+import math
+
+import os
+
+import random
+
+import sys
+
+
+
+import pytest
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.portfolio_optimizer import optimize, risk_adjusted_value
+
+
+
+
+
+def brute_force(candidates, budget, risk_aversion):
+
+    best = 0.0
+
+    ranges = [range(c['max_count'] + 1) for c in candidates]
+
+    for counts in itertools.product(*ranges):
+
+        cost = sum(n * c['cost'] for n, c in zip(counts, candidates))
+
+        if cost <= budget + 1e-9:
+
+            value = sum(n * risk_adjusted_value(c, risk_aversion) for n, c in zip(counts, candidates))
+
+            best = max(best, value)
+
+    return best
+
+
+
+
+
+def test_matches_brute_force_optimum():
+
+    rng = random.Random(30)
+
+    for _ in range(25):
+
+        candidates = [{
+
+            'id': i, 'name': f'craft {i}',
+
+            'cost': rng.randint(1, 12),
+
+            'expected_profit': rng.uniform(-1, 8),
+
+            'profit_std': rng.uniform(0, 4),
+
+            'max_count': rng.randint(1, 4),
+
+        } for i in range(4)]
+
+        # Integer costs on a one-Divine grid: the DP is exact
+
+        result = optimize(candidates, 20, risk_aversion=0.5, cells=20)
+
+
+
+        assert result['risk_adjusted_profit'] == pytest.approx(brute_force(candidates, 20, 0.5))
+
+        assert result['spent'] <= 20
+
+        chosen = sum(s['count'] * risk_adjusted_value(candidates[s['id']], 0.5) for s in result['selections'])
+
+        assert chosen == pytest.approx(result['risk_adjusted_profit'])
+
+        assert all(s['count'] <= candidates[s['id']]['max_count'] for s in result['selections'])
+
+
+
+
+
+def test_rounding_never_overspends():
+
+    candidates = [{'id': 0, 'name': 'a', 'cost': 3.34, 'expected_profit': 2.0, 'max_count': 5},
+
+                  {'id': 1, 'name': 'b', 'cost': 0.99, 'expected_profit': 0.5, 'max_count': 5}]
+
+    result = optimize(candidates, 10.0, risk_aversion=0.0, cells=7)
+
+
+
+    assert result['spent'] <= 10.0
+
+    assert result['expected_profit'] == pytest.approx(result['risk_adjusted_profit'])
+
+    assert result['expected_profit'] <= brute_force(candidates, 10.0, 0.0) + 1e-9
+
+
+
+
+
+def test_risk_aversion_prefers_steady_crafts():
+
+    candidates = [{'id': 0, 'name': 'gamble', 'cost': 10, 'expected_profit': 6, 'profit_std': 8, 'max_count': 1},
+
+                  {'id': 1, 'name': 'steady', 'cost': 10, 'expected_profit': 4, 'profit_std': 0.5, 'max_count': 1}]
+
+
+
+    assert [s['name'] for s in optimize(candidates, 10, risk_aversion=0.0)['selections']] == ['gamble']
+
+    steady = optimize(candidates, 10, risk_aversion=0.5)
+
+    assert [s['name'] for s in steady['selections']] == ['steady']
+
+    assert steady['profit_std'] == pytest.approx(0.5)
+
+    assert math.isclose(steady['unspent'], 0.0)
+
@@ -0,0 +1,161 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Price job queue - priority leasing, reclaiming a crashed worker's lease,
+
+retry backoff and dead-lettering, and when an idle worker may exit
+
+"""
+
+import os
+
+import sys
+
+
+
+import pytest
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts import price_job_queue
+
+from scripts.price_job_queue import LEASE_SECONDS, MAX_ATTEMPTS, RETRY_BACKOFF, PriceJobQueue
+
+
+
+
+
+@pytest.fixture
+
+def clock(monkeypatch):
+
+    now = [1_000_000.0]
+
+    monkeypatch.setattr(price_job_queue, '_now', lambda: now[0])
+
+    return now
+
+
+
+
+
+@pytest.fixture
+
+def queue(tmp_path, clock):
+
+    q = PriceJobQueue(tmp_path / "queue.db")
+
+    yield q
+
+    q.close()
+
+
+
+
+
+def test_lease_in_priority_order(queue):
+
+    queue.enqueue([{'name': 'Gold Ring', 'priority': 1}, {'name': 'Jade Amulet', 'priority': 5}])
+
+    assert queue.enqueue([{'name': 'Gold Ring'}]) == 0
+
+
+
+    first, second = queue.lease('w1'), queue.lease('w2')
+
+    assert (first['item_name'], second['item_name']) == ('Jade Amulet', 'Gold Ring')
+
+    assert queue.lease('w3') is None
+
+    assert queue.complete(first['id'], 'w1', {'amount': 3})
+
+    assert not queue.complete(second['id'], 'w1')      # not w1's lease
+
+    assert queue.stats() == {'done': 1, 'leased': 1}
+
+
+
+
+
+def test_expired_lease_is_reclaimed(queue, clock):
+
+    queue.enqueue([{'name': 'Gold Ring'}])
+
+    crashed = queue.lease('crashed')
+
+
+
+    clock[0] += LEASE_SECONDS + 1
+
+    job = queue.lease('w2')
+
+    assert job['id'] == crashed['id'] and job['attempts'] == 2
+
+    assert not queue.heartbeat(crashed['id'], 'crashed')
+
+    assert queue.heartbeat(job['id'], 'w2')
+
+
+
+
+
+def test_failures_back_off_then_dead_letter(queue, clock):
+
+    queue.enqueue([{'name': 'Gold Ring'}])
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+
+        job = queue.lease('w1')
+
+        assert job['attempts'] == attempt
+
+        status = queue.fail(job['id'], 'w1', 'HTTP 500')
+
+        if attempt < MAX_ATTEMPTS:
+
+            assert status == 'pending'
+
+            assert queue.lease('w1') is None
+
+            assert queue.next_ready() == pytest.approx(RETRY_BACKOFF * 2 ** (attempt - 1))
+
+            clock[0] += RETRY_BACKOFF * 2 ** (attempt - 1)
+
+
+
+    assert status == 'dead'
+
+    assert queue.dead_letters() == [{'item_name': 'Gold Ring', 'attempts': MAX_ATTEMPTS, 'last_error': 'HTTP 500'}]
+
+    assert queue.next_ready() is None
+
+
+
+
+
+def test_idle_worker_waits_for_other_leases(queue, clock):
+
+    assert queue.next_ready() is None
+
+    queue.enqueue([{'name': 'Gold Ring'}])
+
+    assert queue.next_ready() == 0.0
+
+
+
+    job = queue.lease('w1')
+
+    assert queue.lease('w2') is None
+
+    assert queue.next_ready() == pytest.approx(LEASE_SECONDS)
+
+    queue.complete(job['id'], 'w1')
+
+    assert queue.next_ready() is None
+
@@ -0,0 +1,159 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Exchange rate fusion - outlier rejection against history, regime-change consensus
+
+and single-collector submissions
+
+"""
+
+import os
+
+import sqlite3
+
+import sys
+
+
+
+import pytest
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.rate_fusion import fuse, load_history, submit_sample
+
+
+
+HISTORY = [{'divine_to_exalt': 400, 'divine_to_chaos': 40}] * 5
+
+
+
+
+
+def sample(source: str, to_exalt: float, to_chaos: float) -> dict:
+
+    return {'source': source, 'rates': {'divine_to_exalt': to_exalt, 'divine_to_chaos': to_chaos},
+
+            'latency_ms': 10, 'error': None}
+
+
+
+
+
+def rate_db() -> sqlite3.Connection:
+
+    conn = sqlite3.connect(":memory:")
+
+    conn.execute("""
+
+        CREATE TABLE currency_exchange_rates (
+
+            id INTEGER PRIMARY KEY, league_id INTEGER, divine_to_exalt FLOAT,
+
+            divine_to_chaos FLOAT, exalt_to_chaos FLOAT, last_updated DATETIME
+
+        )
+
+    """)
+
+    return conn
+
+
+
+
+
+def test_outlier_vs_history_is_rejected():
+
+    samples = [sample('a', 402, 40.5), sample('b', 398, 39.8), sample('c', 4000, 40)]
+
+    fused = fuse(samples, HISTORY)
+
+
+
+    assert fused['sources'] == ['a', 'b']
+
+    assert fused['divine_to_exalt'] == pytest.approx(400)
+
+    assert not samples[2]['accepted'] and 'outlier' in samples[2]['reason']
+
+
+
+
+
+def test_consensus_overrides_history_on_regime_change():
+
+    samples = [sample('a', 800, 80), sample('b', 805, 80.5), sample('c', 798, 79.8)]
+
+    fused = fuse(samples, HISTORY)
+
+
+
+    assert fused['divine_to_exalt'] == pytest.approx(800)
+
+    assert all(s['reason'] == 'accepted (consensus, history disagrees)' for s in samples)
+
+
+
+
+
+def test_no_consensus_against_history_rejects_everything():
+
+    # Both disagree with history and with each other: nothing accepted, no crash
+
+    samples = [sample('a', 800, 80), sample('b', 1200, 120)]
+
+
+
+    assert fuse(samples, HISTORY) is None
+
+    assert not any(s['accepted'] for s in samples)
+
+    assert all(s['reason'].endswith('no consensus') for s in samples)
+
+
+
+
+
+def test_two_disagreeing_sources_without_history():
+
+    samples = [sample('a', 300, 30), sample('b', 3000, 300)]
+
+
+
+    assert fuse(samples, []) is None
+
+    assert all('disagree' in s['reason'] for s in samples)
+
+
+
+
+
+def test_submit_sample_writes_only_accepted_rates():
+
+    conn = rate_db()
+
+    conn.executemany("INSERT INTO currency_exchange_rates (league_id, divine_to_exalt, divine_to_chaos, "
+
+                     "last_updated) VALUES (1, ?, ?, ?)",
+
+                     [(h['divine_to_exalt'], h['divine_to_chaos'], f"2026-10-0{i + 1}")
+
+                      for i, h in enumerate(HISTORY)])
+
+
+
+    assert submit_sample(conn, 'poe.ninja', {'divine_to_exalt': 160, 'divine_to_chaos': 40}) is None
+
+    assert submit_sample(conn, 'poe.ninja', {'divine_to_exalt': 401, 'divine_to_chaos': 40}) is not None
+
+    assert load_history(conn)[0]['divine_to_exalt'] == 401
+
+    reasons = [r for r, in conn.execute("SELECT reason FROM exchange_rate_sources ORDER BY id")]
+
+    assert len(reasons) == 2 and reasons[1] == 'accepted'
+
@@ -0,0 +1,193 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Re-pricing scheduler - value-of-information ordering and exposure from the latest
+
+profit_opportunities row per recipe
+
+"""
+
+import json
+
+import os
+
+import sqlite3
+
+import sys
+
+from datetime import datetime, timedelta
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.reprice_scheduler import FAILED_RETRY_WEIGHT, NEVER_PRICED_DAYS, RepricingScheduler
+
+
+
+NOW = datetime(2026, 10, 19, 12, 0)
+
+
+
+
+
+def scheduler_db(runs: int = 3) -> sqlite3.Connection:
+
+    conn = sqlite3.connect(":memory:")
+
+    conn.executescript("""
+
+        CREATE TABLE item_bases (id INTEGER PRIMARY KEY, name TEXT);
+
+        CREATE TABLE price_history (
+
+            id INTEGER PRIMARY KEY, item_base_id INTEGER, league_id INTEGER,
+
+            price_divine FLOAT, recorded_at DATETIME
+
+        );
+
+        CREATE TABLE base_prices (
+
+            id INTEGER PRIMARY KEY, league_id INTEGER, item_base_id INTEGER,
+
+            price_divine FLOAT, last_updated DATETIME
+
+        );
+
+        CREATE TABLE profit_opportunities (
+
+            id INTEGER PRIMARY KEY, league_id INTEGER, net_profit_divine FLOAT,
+
+            crafting_path JSON, calculated_at DATETIME
+
+        );
+
+    """)
+
+    conn.executemany("INSERT INTO item_bases (id, name) VALUES (?, ?)",
+
+                     [(1, 'Volatile Ring'), (2, 'Calm Ring')])
+
+    for day, (volatile, calm) in enumerate([(1.0, 1.0), (1.5, 1.01), (0.9, 1.0), (1.6, 1.02)]):
+
+        conn.execute("INSERT INTO price_history (item_base_id, league_id, price_divine, recorded_at) "
+
+                     "VALUES (1, 1, ?, ?)", (volatile, NOW - timedelta(days=10 - day)))
+
+        conn.execute("INSERT INTO price_history (item_base_id, league_id, price_divine, recorded_at) "
+
+                     "VALUES (2, 1, ?, ?)", (calm, NOW - timedelta(days=10 - day)))
+
+    # Every analyzer run appends the same two recipes again
+
+    for run in range(runs):
+
+        for recipe, profit, base in (('Ring craft A', 5.0, 'Calm Ring'), ('Ring craft B', 4.9, 'Calm Ring')):
+
+            conn.execute("INSERT INTO profit_opportunities (league_id, net_profit_divine, crafting_path, "
+
+                         "calculated_at) VALUES (1, ?, ?, ?)",
+
+                         (profit, json.dumps({'recipe': recipe, 'inputs': {base: 1}}),
+
+                          NOW - timedelta(hours=runs - run)))
+
+    return conn
+
+
+
+
+
+def item(name: str, price: float = None, days: float = None, failed: bool = False) -> dict:
+
+    return {
+
+        'name': name,
+
+        'prices': [{'amount': price, 'currency': 'divine'}] if price else [],
+
+        'collected_at': (NOW - timedelta(days=days)).isoformat() if days is not None else None,
+
+        'failed': failed,
+
+    }
+
+
+
+
+
+def test_value_of_information_ordering():
+
+    scheduler = RepricingScheduler(scheduler_db(), now=NOW)
+
+    ranked = scheduler.rank([
+
+        item('Calm Ring', 1.0, days=2),
+
+        item('Volatile Ring', 1.0, days=2),
+
+        item('Volatile Ring fresh', 1.0, days=0.01),
+
+        item('Never Priced'),
+
+        item('Failed Base', failed=True),
+
+    ])
+
+    order = [s['name'] for s in ranked]
+
+
+
+    assert order[0] == 'Never Priced'
+
+    assert order.index('Volatile Ring') < order.index('Calm Ring')
+
+    assert order.index('Calm Ring') < order.index('Volatile Ring fresh')
+
+    failed = next(s for s in ranked if s['name'] == 'Failed Base')
+
+    assert failed['score'] == NEVER_PRICED_DAYS * FAILED_RETRY_WEIGHT
+
+
+
+
+
+def test_exposure_ranks_latest_row_per_recipe():
+
+    scheduler = RepricingScheduler(scheduler_db(runs=3), now=NOW)
+
+
+
+    # Duplicate runs would put 0-gap neighbours next to each other (flip = 1)
+
+    exposure = scheduler.exposure['Calm Ring']
+
+    assert len(exposure) == 2
+
+    assert all(abs(gap - 0.1) < 1e-9 for _, gap in exposure)
+
+    flip = scheduler.score(item('Calm Ring', 1.0, days=2))['flip_probability']
+
+    assert 0 < flip < 1
+
+
+
+
+
+def test_plan_respects_request_budget():
+
+    scheduler = RepricingScheduler(now=NOW)
+
+    items = [item(f'Base {i}', 1.0, days=i) for i in range(10)]
+
+
+
+    plan = scheduler.plan(items, request_budget=7, requests_per_item=2)
+
+    assert [s['name'] for s in plan] == ['Base 9', 'Base 8', 'Base 7']
+
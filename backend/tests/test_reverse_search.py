@@ -0,0 +1,201 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Reverse search - candidate item types, ranking against full evaluation, and a
+
+pruning bound that never exceeds the real cost
+
+"""
+
+import os
+
+import sqlite3
+
+import sys
+
+
+
+import pytest
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.reverse_search import ReverseSearchIndex, parse_targets
+
+from scripts.step7b_fixed_analysis import CRAFT_ILVL
+
+
+
+LIFE, FIRE_RES, FILLER_PREFIX, FILLER_SUFFIX = 1, 2, 3, 4
+
+
+
+# item_type -> [(modifier_id, tier, min_ilvl, weight)]
+
+TIERS = {
+
+    'Rings': [(LIFE, 1, 1, 60), (LIFE, 2, 30, 30), (LIFE, 3, 75, 10), (FILLER_PREFIX, 1, 1, 100),
+
+              (FIRE_RES, 1, 1, 100), (FILLER_SUFFIX, 1, 1, 100)],
+
+    'Amulets': [(LIFE, 1, 1, 100), (FILLER_PREFIX, 1, 1, 900),
+
+                (FIRE_RES, 1, 1, 100), (FILLER_SUFFIX, 1, 1, 100)],
+
+    'Belts': [(LIFE, 1, 1, 100), (FILLER_PREFIX, 1, 1, 100), (FILLER_SUFFIX, 1, 1, 100)],
+
+}
+
+BASES = {'Rings': [('Gold Ring', 1.0), ('Iron Ring', 40.0), ('Ruby Ring', 80.0)],
+
+         'Amulets': [('Jade Amulet', 0.5), ('Gold Amulet', 30.0)],
+
+         'Belts': [('Leather Belt', 0.1)]}
+
+
+
+
+
+@pytest.fixture(scope="module")
+
+def index() -> ReverseSearchIndex:
+
+    conn = sqlite3.connect(":memory:")
+
+    conn.executescript("""
+
+        CREATE TABLE modifiers (id INTEGER PRIMARY KEY, name TEXT, mod_type TEXT, tags TEXT);
+
+        CREATE TABLE modifier_tiers (
+
+            id INTEGER PRIMARY KEY, modifier_id INTEGER, item_type TEXT, tier INTEGER,
+
+            min_ilvl INTEGER, weight INTEGER, is_desecrated BOOLEAN DEFAULT 0
+
+        );
+
+        CREATE TABLE item_types (id INTEGER PRIMARY KEY, name TEXT);
+
+        CREATE TABLE item_bases (id INTEGER PRIMARY KEY, name TEXT, item_type_id INTEGER);
+
+        CREATE TABLE base_prices (
+
+            id INTEGER PRIMARY KEY, league_id INTEGER, item_base_id INTEGER,
+
+            price_divine FLOAT, last_updated DATETIME
+
+        );
+
+    """)
+
+    conn.executemany("INSERT INTO modifiers (id, name, mod_type, tags) VALUES (?, ?, ?, '[]')", [
+
+        (LIFE, '+# to maximum Life', 'prefix'), (FIRE_RES, '+#% to Fire Resistance', 'suffix'),
+
+        (FILLER_PREFIX, '+# to Accuracy Rating', 'prefix'), (FILLER_SUFFIX, '+# to Strength', 'suffix'),
+
+    ])
+
+    for item_type, rows in TIERS.items():
+
+        conn.executemany("INSERT INTO modifier_tiers (modifier_id, item_type, tier, min_ilvl, weight) "
+
+                         "VALUES (?, ?, ?, ?, ?)", [(m, item_type, t, lvl, w) for m, t, lvl, w in rows])
+
+        type_id = conn.execute("INSERT INTO item_types (name) VALUES (?)", (item_type,)).lastrowid
+
+        for base, price in BASES[item_type]:
+
+            base_id = conn.execute("INSERT INTO item_bases (name, item_type_id) VALUES (?, ?)",
+
+                                   (base, type_id)).lastrowid
+
+            conn.execute("INSERT INTO base_prices (league_id, item_base_id, price_divine, last_updated) "
+
+                         "VALUES (1, ?, ?, '2026-10-19')", (base_id, price))
+
+    conn.commit()
+
+    return ReverseSearchIndex(conn)
+
+
+
+
+
+def full_ranking(index, targets):
+
+    """Every (item type, base) evaluated with the full engine, cheapest first"""
+
+    rows = []
+
+    for item_type in index.candidates(targets):
+
+        craft = index.craft(item_type, targets, CRAFT_ILVL)
+
+        for price, base in index.bases[item_type]:
+
+            rows.append((round(price + craft['total_exalt'] / index.divine_exalt, 2), base))
+
+    return sorted(rows)
+
+
+
+
+
+def test_candidates_need_every_target_at_tier(index):
+
+    assert index.candidates(parse_targets("1,2")) == {'Rings', 'Amulets'}
+
+    assert index.candidates(parse_targets("1:3,2")) == {'Rings'}
+
+    assert index.candidates(parse_targets("1:4")) == set()
+
+
+
+
+
+def test_lower_bound_never_exceeds_the_real_cost(index):
+
+    for targets in (parse_targets("1,2"), parse_targets("1:2,2"), parse_targets("1:3")):
+
+        for item_type in index.candidates(targets):
+
+            bound = index.craft_lower_bound(item_type, targets, CRAFT_ILVL)
+
+            real = index.craft(item_type, targets, CRAFT_ILVL)['total_exalt'] / index.divine_exalt
+
+            assert bound <= real + 1e-9
+
+
+
+
+
+def test_ranking_matches_full_evaluation_and_prunes(index):
+
+    targets = parse_targets("1,2")
+
+    everything = full_ranking(index, targets)
+
+
+
+    found = index.search(targets, limit=len(everything))
+
+    assert [(r['total_cost_divine'], r['base']) for r in found['results']] == everything
+
+    assert found['pruned'] == 0
+
+
+
+    top = index.search(targets, limit=2)
+
+    assert [(r['total_cost_divine'], r['base']) for r in top['results']] == everything[:2]
+
+    assert top['candidates'] == len(everything) and top['pruned'] > 0
+
+    assert all(r['lower_bound_divine'] <= r['total_cost_divine'] for r in top['results'])
+
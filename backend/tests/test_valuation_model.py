@@ -0,0 +1,187 @@
+
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+"""
+
+Valuation model - listings parsed with their item type train the same tier
+
+encoding the build analysis predicts with, so catalog items reach model coverage
+
+"""
+
+import os
+
+import random
+
+import sqlite3
+
+import sys
+
+from pathlib import Path
+
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.build_catalog import load_builds
+
+from scripts.mod_parser import ModParser
+
+from scripts.mod_pool import ModPoolCache
+
+from scripts.step7b_fixed_analysis import CRAFT_ILVL, MODEL_MIN_COVERAGE, model_outcome
+
+from scripts.valuation_model import ValuationModel
+
+
+
+BUILDS_FILE = Path(__file__).parent.parent / "data" / "builds.json"
+
+# tier -> (min, max) rolled value, higher tier is better
+
+TIER_BOUNDS = {1: (10, 29), 2: (30, 59), 3: (60, 89), 4: (90, 120)}
+
+
+
+
+
+def catalog_item() -> dict:
+
+    return load_builds(path=BUILDS_FILE)['ES_Caster']['items'][0]
+
+
+
+
+
+def mod_db(item: dict) -> sqlite3.Connection:
+
+    conn = sqlite3.connect(":memory:")
+
+    conn.executescript("""
+
+        CREATE TABLE modifiers (id INTEGER PRIMARY KEY, name TEXT, mod_type TEXT, tags TEXT);
+
+        CREATE TABLE modifier_tiers (
+
+            id INTEGER PRIMARY KEY, modifier_id INTEGER, item_type TEXT, tier INTEGER,
+
+            min_ilvl INTEGER, weight INTEGER, is_desecrated BOOLEAN DEFAULT 0
+
+        );
+
+        CREATE TABLE mod_tiers (
+
+            id INTEGER PRIMARY KEY, mod_group_id INTEGER, tier INTEGER, min_value FLOAT,
+
+            max_value FLOAT, min_ilvl INTEGER, weight INTEGER, mod_text VARCHAR(500)
+
+        );
+
+    """)
+
+    for mod in item['target_mods']:
+
+        mod_id = conn.execute("INSERT INTO modifiers (name, mod_type) VALUES (?, ?)",
+
+                              (mod['name'], mod['type'])).lastrowid
+
+        conn.execute("INSERT INTO modifier_tiers (modifier_id, item_type, tier, min_ilvl, weight) "
+
+                     "VALUES (?, ?, ?, ?, ?)", (mod_id, item['item_type'], len(TIER_BOUNDS), 1, 1000))
+
+        for tier, (lo, hi) in TIER_BOUNDS.items():
+
+            conn.execute("INSERT INTO mod_tiers (tier, min_value, max_value, min_ilvl, weight, mod_text) "
+
+                         "VALUES (?, ?, ?, ?, ?, ?)",
+
+                         (tier, lo, hi, 1, 100, mod['name'].replace('#', f"({lo}—{hi})")))
+
+    return conn
+
+
+
+
+
+def listings(item: dict, count: int = 40, seed: int = 7) -> list:
+
+    rng = random.Random(seed)
+
+    out = []
+
+    for _ in range(count):
+
+        mods = rng.sample(item['target_mods'], 3)
+
+        tiers = [rng.choice(list(TIER_BOUNDS)) for _ in mods]
+
+        out.append({
+
+            'base_type': item['base'],
+
+            'ilvl': rng.choice([80, 82, 84]),
+
+            'price_amount': round(sum(tiers) * rng.uniform(0.8, 1.2), 2),
+
+            'price_currency': 'divine',
+
+            'mods': {'explicit': [m['name'].replace('#', str(rng.randint(*TIER_BOUNDS[t])))
+
+                                  for m, t in zip(mods, tiers)]},
+
+        })
+
+    return out
+
+
+
+
+
+def test_training_resolves_tiers_with_item_type():
+
+    item = catalog_item()
+
+    parser = ModParser(mod_db(item))
+
+    parsed = parser.parse_listing(listings(item, 1)[0], item['item_type'])
+
+
+
+    assert all(m['modifier_id'] for m in parsed['explicit'])
+
+    assert all(m['tier'] in TIER_BOUNDS and m['tier_exact'] for m in parsed['explicit'])
+
+
+
+
+
+def test_catalog_item_reaches_model_coverage():
+
+    item = catalog_item()
+
+    conn = mod_db(item)
+
+    parser = ModParser(conn)
+
+    model = ValuationModel()
+
+    model.update([parser.parse_listing(l, item['item_type']) for l in listings(item)], {'divine': 1.0})
+
+    model.fit()
+
+
+
+    outcome = model_outcome(ModPoolCache(conn).get(item['item_type'], CRAFT_ILVL), item)
+
+    prediction = model.predict_many([outcome])[0]
+
+
+
+    assert len(outcome['mods']) == len(item['target_mods'])
+
+    assert prediction['coverage'] >= MODEL_MIN_COVERAGE
+
+    assert prediction['price_divine'] > 0
+